@@ -46,7 +46,14 @@ class AssessInput(Action):
         Respond only with the JSON object.
         """
 
-        response = await ModelsAPI.call_llm(prompt, model=ModelType.DEFAULT)
+        response = await ModelsAPI.call_llm(
+            prompt,
+            model=ModelType.DEFAULT,
+            cache=True,
+            semantic_cache=True,
+            semantic_text=last_user_message.content,
+            template="assess_input",
+        )
         content = extract_json_from_response(response)
         try:
             params_dict = json.loads(content)
@@ -10,9 +10,9 @@ from llm_mas.communication.interface import CommunicationState
 from llm_mas.communication.messages import EndMessage, ErrorMessage, ProposalMessage
 from llm_mas.communication.task.agent_task import Task
 from llm_mas.mas.agent import Agent
+from llm_mas.mas.conversation import Conversation
 from llm_mas.model_providers.api import ModelsAPI
-from llm_mas.utils.config.models_config import ModelType
-from llm_mas.utils.embeddings import EmbeddingFunction, VectorSelector
+from llm_mas.utils.embeddings import EmbeddingFunction, VectorSelector, embed_all
 from llm_mas.utils.random_id import generate_random_id
 
 
@@ -55,17 +55,7 @@ class Communicate(Action):
             res.set_param("response", "No agent friends available to ask for help.")
             return res
 
-        friend = self.vector_selector.select(
-            query_vector=await self.embedding_model(last_message, ModelType.EMBEDDING),
-            items_with_vectors=[
-                (friend, await self.embedding_model(friend.get_description(), ModelType.EMBEDDING))
-                for friend in agent_friends
-            ],
-        )[0]
-
-        if not friend:
-            msg = "No friends available to ask for help."
-            raise ValueError(msg)
+        friend = await self.select_friend(last_message, agent_friends)
 
         friend_name = friend.get_name()
 
@@ -85,7 +75,8 @@ class Communicate(Action):
 
         task_description = await self.get_task_description(context_str, last_message["content"])
 
-        task = Task(description=task_description, action_context=context)
+        delegated = self.make_delegated_context(context)
+        task = Task(description=task_description, action_context=delegated)
 
         # create conversation
         conversation_name = self.convert_description_to_conversation_name(task_description)
@@ -105,12 +96,56 @@ class Communicate(Action):
             f"Please assist me in any way you can. Thank you!",
         )
 
+        await self.exchange_messages(proposal, friend, comm_state, delegated, conversation)
+
+        # get the message before the last one (the last one is the StopAction)
+        action_history_tuple = friend.workspace.action_history.get_history_at_index(-2)
+
+        if action_history_tuple is None:
+            msg = "No action history found for the friend agent."
+            raise ValueError(msg)
+
+        action, action_result, action_context = action_history_tuple
+
+        return action_result
+
+    def make_delegated_context(self, context: ActionContext) -> ActionContext:
+        """Create the context the friend works in from the last result."""
+        # the friend works in its own context, so its responses are not streamed to the user
+        return ActionContext.from_action_result(context.last_result, context, stream_responses=False)
+
+    async def select_friend(self, last_message: str, agent_friends: list[Agent]) -> Agent:
+        """Select the friend whose description is closest to the last message."""
+        query_vector, *friend_vectors = await embed_all(
+            self.embedding_model,
+            [last_message, *(friend.get_description() for friend in agent_friends)],
+        )
+        friend = self.vector_selector.select(
+            query_vector=query_vector,
+            items_with_vectors=list(zip(agent_friends, friend_vectors, strict=True)),
+        )[0]
+
+        if not friend:
+            msg = "No friends available to ask for help."
+            raise ValueError(msg)
+
+        return friend
+
+    async def exchange_messages(
+        self,
+        proposal: ProposalMessage,
+        friend: Agent,
+        comm_state: CommunicationState,
+        delegated: ActionContext,
+        conversation: Conversation,
+    ) -> None:
+        """Pass messages between the agents, starting with the proposal to the friend, until one ends it."""
         message = proposal
 
         max_messages = 20
         count = 0
 
-        sender = context.agent
+        sender = proposal.sender
         recipient = friend
 
         while not isinstance(message, EndMessage) and count < max_messages:
@@ -118,9 +153,9 @@ class Communicate(Action):
             conversation.add_message(message.sender, message.content)
 
             # set context agent to the recipient
-            context.agent = recipient
+            delegated.agent = recipient
 
-            message = await context.agent.communication_interface.handle_message(message, comm_state)
+            message = await delegated.agent.communication_interface.handle_message(message, comm_state)
 
             if message is None:
                 msg = "Received no message from friend agent."
@@ -138,17 +173,6 @@ class Communicate(Action):
 
         conversation.add_message(message.sender, message.content)
 
-        # get the message before the last one (the last one is the StopAction)
-        action_history_tuple = friend.workspace.action_history.get_history_at_index(-2)
-
-        if action_history_tuple is None:
-            msg = "No action history found for the friend agent."
-            raise ValueError(msg)
-
-        action, action_result, action_context = action_history_tuple
-
-        return action_result
-
     async def get_task_description(self, context_str: str, last_message: str) -> str:
         """Generate a task description based on the context and last message."""
         # use LLM to generate a task description
@@ -160,7 +184,7 @@ class Communicate(Action):
         Last Message: {last_message}
         Task Description:
         """
-        return await ModelsAPI.call_llm(prompt)
+        return await ModelsAPI.call_llm(prompt, cache=True, template="task_description")
 
     def convert_description_to_conversation_name(self, description: str) -> str:
         """Convert a task description to a valid conversation name."""
@@ -49,7 +49,12 @@ class Contextualise(Action):
         # cap it to last 10 messages
         messages = messages[-10:]
 
-        response = await ModelsAPI.call_llm_with_chat_history(messages, model=ModelType.DEFAULT)
+        response = await ModelsAPI.call_llm_with_chat_history(
+            messages,
+            model=ModelType.DEFAULT,
+            cache=True,
+            template="contextualise",
+        )
 
         res = ActionResult()
         res.set_param("contextualised_message", response)
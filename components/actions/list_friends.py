@@ -7,8 +7,7 @@ from llm_mas.action_system.core.action_context import ActionContext
 from llm_mas.action_system.core.action_params import ActionParams
 from llm_mas.action_system.core.action_result import ActionResult
 from llm_mas.mas.agent import Agent
-from llm_mas.utils.config.models_config import ModelType
-from llm_mas.utils.embeddings import EmbeddingFunction, VectorSelector
+from llm_mas.utils.embeddings import EmbeddingFunction, VectorSelector, embed_all
 from llm_mas.utils.random_id import generate_random_id
 
 
@@ -63,12 +62,13 @@ class AskFriendForHelp(Action):
 
         agent_friends = [friend for friend in friends if isinstance(friend, Agent)]
 
+        query_vector, *friend_vectors = await embed_all(
+            self.embedding_model,
+            [last_message, *(friend.get_description() for friend in agent_friends)],
+        )
         friend = self.vector_selector.select(
-            query_vector=await self.embedding_model(last_message, ModelType.EMBEDDING),
-            items_with_vectors=[
-                (friend, await self.embedding_model(friend.get_description(), ModelType.EMBEDDING))
-                for friend in agent_friends
-            ],
+            query_vector=query_vector,
+            items_with_vectors=list(zip(agent_friends, friend_vectors, strict=True)),
         )[0]
 
         if not friend:
@@ -1,25 +1,58 @@
 """Retrieve knowledge relevant to the current conversation from the KB."""
 
+import os
 from typing import override
 
 from llm_mas.action_system.core.action import Action
 from llm_mas.action_system.core.action_context import ActionContext
 from llm_mas.action_system.core.action_params import ActionParams
 from llm_mas.action_system.core.action_result import ActionResult
-from llm_mas.knowledge_base.knowledge_base import GLOBAL_KB
+from llm_mas.knowledge_base.knowledge_base import QueryMode
+from llm_mas.knowledge_base.registry import DEFAULT_COLLECTION, KB_REGISTRY, collection_name
+
+
+def _latency_budget_ms() -> float | None:
+    """Return ``KB_RETRIEVE_BUDGET_MS``, the query embedding latency above which retrieval is lexical-only."""
+    try:
+        budget = float(os.getenv("KB_RETRIEVE_BUDGET_MS", ""))
+    except ValueError:
+        return None
+    return budget if budget > 0 else None
+
+
+def _diversity() -> float:
+    """Return ``KB_MMR_DIVERSITY`` if it is set, else a mild weight that mainly drops near-repeated facts.
+
+    The retrieved facts are pasted into the prompt, where a chunk repeating a higher-ranked one only costs tokens.
+    """
+    try:
+        return min(1.0, max(0.0, float(os.getenv("KB_MMR_DIVERSITY", ""))))
+    except ValueError:
+        return 0.2
 
 
 class RetrieveKnowledge(Action):
     """Action: query the Knowledge Base to retrieve relevant facts for RAG."""
 
-    def __init__(self) -> None:
-        """Initialize the RetrieveKnowledge action."""
+    def __init__(self, collections: list[str] | None = None) -> None:
+        """Initialize the RetrieveKnowledge action.
+
+        ``collections`` names the KB collections to search. By default the shared
+        collection and the acting agent's own collection (if it has one) are searched.
+        """
         super().__init__(description="Retrieves knowledge from the knowledge base.")
+        self.collections = collections
 
     @override
     async def _do(self, params: ActionParams, context: ActionContext) -> ActionResult:
         """Query the KB using the latest user message as the retrieval query.
 
+        Uses hybrid (lexical + vector) retrieval so exact identifiers are found, and
+        skips the embedding call when it has recently been slower than
+        ``KB_RETRIEVE_BUDGET_MS``. Several collections are searched concurrently, and
+        the results are diversified by maximal marginal relevance (``KB_MMR_DIVERSITY``,
+        default 0.2 here) so near-duplicate chunks do not crowd out other facts.
+
         Returns an ActionResult with:
         - facts: list[str] of the top result texts
         - sources: list[dict] with source_path and score for traceability
@@ -32,7 +65,19 @@ class RetrieveKnowledge(Action):
                 user_query = str(msg.get("content", "")).strip()
                 break
 
-        results = GLOBAL_KB.query(user_query, top_k=5) if user_query else []
+        collections = self.collections or [DEFAULT_COLLECTION, collection_name(context.agent.name)]
+        results = (
+            await KB_REGISTRY.aquery(
+                user_query,
+                collections,
+                top_k=5,
+                mode=QueryMode.HYBRID,
+                latency_budget_ms=_latency_budget_ms(),
+                diversity=_diversity(),
+            )
+            if user_query
+            else []
+        )
         facts = [r["text"] for r in results]
         sources = [{"source_path": r["source_path"], "score": r["score"]} for r in results]
 
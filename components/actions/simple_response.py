@@ -50,7 +50,11 @@ class SimpleResponse(Action):
         # cap it to last 10 messages
         messages = messages[-10:]
 
-        response = await ModelsAPI.call_llm_with_chat_history(messages, model=ModelType.DEFAULT)
+        response = await ModelsAPI.call_llm_with_chat_history(
+            messages,
+            model=ModelType.DEFAULT,
+            on_text=context.on_response_text,
+        )
 
         res = ActionResult()
         res.set_param("response", response)
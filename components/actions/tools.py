@@ -15,7 +15,7 @@ from llm_mas.logging.loggers import APP_LOGGER
 from llm_mas.model_providers.api import ModelsAPI
 from llm_mas.tools.tool_action_creator import ToolActionCreator
 from llm_mas.utils.config.models_config import ModelType
-from llm_mas.utils.embeddings import EmbeddingFunction, VectorSelector
+from llm_mas.utils.embeddings import EmbeddingFunction, VectorSelector, embed_all
 from llm_mas.utils.json_parser import extract_json_from_response
 
 if TYPE_CHECKING:
@@ -127,13 +127,15 @@ class GetRelevantTools(Action):
 
         logging.getLogger("textual_app").info("Finding relevant tools for: %s", embedding_target)
 
-        user_embedding = np.array(await self.embedding_model(embedding_target, ModelType.EMBEDDING))
-
         tools = context.agent.tool_manager.get_all_tools()
 
+        user_vector, *tool_vectors = await embed_all(
+            self.embedding_model,
+            [embedding_target, *(f"{tool.name} {tool.description or ''}" for tool in tools)],
+        )
+        user_embedding = np.array(user_vector)
         tool_embeddings: list[tuple[Tool, np.ndarray]] = [
-            (tool, np.array(await self.embedding_model(f"{tool.name} {tool.description or ''}", ModelType.EMBEDDING)))
-            for tool in tools
+            (tool, np.array(vector)) for tool, vector in zip(tools, tool_vectors, strict=True)
         ]
 
         # select best tool
@@ -208,7 +210,7 @@ class GetParamsForToolCall(Action):
         ```
         """
 
-        response = await ModelsAPI.call_llm(prompt, ModelType.DEFAULT)
+        response = await ModelsAPI.call_llm(prompt, ModelType.DEFAULT, cache=True, template="tool_params")
 
         content = extract_json_from_response(response)
 
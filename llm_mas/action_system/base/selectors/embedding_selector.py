@@ -9,8 +9,7 @@ from llm_mas.action_system.core.action import Action
 from llm_mas.action_system.core.action_context import ActionContext
 from llm_mas.action_system.core.action_selector import ActionSelector
 from llm_mas.action_system.core.action_space import ActionSpace
-from llm_mas.utils.config.models_config import ModelType
-from llm_mas.utils.embeddings import EmbeddingFunction, VectorSelector
+from llm_mas.utils.embeddings import EmbeddingFunction, VectorSelector, embed_all
 
 
 class EmbeddingSelector(ActionSelector):
@@ -46,10 +45,13 @@ class EmbeddingSelector(ActionSelector):
         # log
         logging.getLogger("textual_app").info("Selecting action using prompt: %s", prompt)
 
-        user_embedding = np.array(await self.embedding_model(prompt, ModelType.EMBEDDING))
+        user_vector, *action_vectors = await embed_all(
+            self.embedding_model,
+            [prompt, *(f"{action.name} - {action.description}" for action in actions)],
+        )
+        user_embedding = np.array(user_vector)
         action_embeddings: list[tuple[Action, np.ndarray]] = [
-            (action, np.array(await self.embedding_model(f"{action.name} - {action.description}", ModelType.EMBEDDING)))
-            for action in actions
+            (action, np.array(vector)) for action, vector in zip(actions, action_vectors, strict=True)
         ]
 
         action, _ = self.vector_selector.select(user_embedding, action_embeddings)
@@ -8,6 +8,8 @@ from llm_mas.communication.task.agent_task import Task
 from llm_mas.fragment.kind import FragmentKind
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     from llm_mas.action_system.core.action_result import ActionResult
     from llm_mas.fragment.fragment import Fragment
     from llm_mas.mas.agent import Agent
@@ -28,8 +30,14 @@ class ActionContext:
         user: User,
         conversation_manager: ConversationManager,
         task: Task | None = None,
+        *,
+        on_response_text: Callable[[str], None] | None = None,
     ) -> None:
-        """Initialize the action context with a conversation and an optional last result."""
+        """Initialize the action context with a conversation and an optional last result.
+
+        ``on_response_text`` receives the text deltas of responses streamed to the user (e.g. by a chat UI). It
+        is only set on the user-facing agent's contexts, never on those of delegated work.
+        """
         self.conversation = conversation
         self.last_result = last_result
         self.mcp_client = mcp_client
@@ -37,6 +45,7 @@ class ActionContext:
         self.user = user
         self.conversation_manager = conversation_manager
         self.task = task
+        self.on_response_text = on_response_text
 
         self.fragments: list[Fragment] = []
         self.available_fragment_kinds: list[type[FragmentKind]] = []
@@ -47,8 +56,14 @@ class ActionContext:
         action_result: ActionResult,
         context: ActionContext,
         task: Task | None = None,
+        *,
+        stream_responses: bool = True,
     ) -> ActionContext:
-        """Create a new ActionContext from an ActionResult and an existing context."""
+        """Create a new ActionContext from an ActionResult and an existing context.
+
+        With ``stream_responses=False`` the new context does not stream responses to the user; used for work
+        delegated to other agents, whose responses are not the user-facing answer.
+        """
         return cls(
             conversation=context.conversation,
             last_result=action_result,
@@ -57,6 +72,7 @@ class ActionContext:
             user=context.user,
             conversation_manager=context.conversation_manager,
             task=task,
+            on_response_text=context.on_response_text if stream_responses else None,
         )
 
     def add_fragment(self, fragment: Fragment) -> None:
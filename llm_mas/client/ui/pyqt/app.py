@@ -31,6 +31,7 @@ from llm_mas.mas.checkpointer import CheckPointer
 from llm_mas.mas.mas import MAS
 from llm_mas.mcp_client.client import MCPClient
 from llm_mas.mcp_client.connected_server import HTTPConnectedServer, SSEConnectedServer
+from llm_mas.model_providers.api import ModelsAPI
 from llm_mas.utils.background_tasks import BACKGROUND_TASKS
 from llm_mas.utils.config.general_config import GENERAL_CONFIG
 from network_server.client import NetworkClient
@@ -250,6 +251,7 @@ class PyQtApp(QStackedWidget):
                 task.cancel()
         if BACKGROUND_TASKS:
             await asyncio.gather(*BACKGROUND_TASKS, return_exceptions=True)
+        await ModelsAPI.aclose()
 
 
 def run_app(client, checkpoint):
@@ -2,7 +2,7 @@
 
 import asyncio
 
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtWidgets import QLabel, QVBoxLayout
 
 from llm_mas.agent.work_step import WorkStep
@@ -11,6 +11,9 @@ from llm_mas.mas.agent import Agent
 from .message_bubble import MessageBubble
 from .work_step_indicator import WorkStepIndicator
 
+STREAM_FLUSH_INTERVAL_MS = 50
+"""Streamed text is buffered and drawn at most once per interval, not once per token."""
+
 
 class AgentMessage(MessageBubble):
     """Message bubble for agent messages, supports thinking steps."""
@@ -27,6 +30,12 @@ class AgentMessage(MessageBubble):
         self.agent = agent
         self.show_thinking = show_thinking
         self.work_steps: list[WorkStepIndicator] = []
+        self.stream_label: QLabel | None = None
+        self._stream_parts: list[str] = []
+        self._stream_timer = QTimer(self)
+        self._stream_timer.setSingleShot(True)
+        self._stream_timer.setInterval(STREAM_FLUSH_INTERVAL_MS)
+        self._stream_timer.timeout.connect(self._flush_stream)
 
         self.sender_label = QLabel(agent.name)
         self.layout.addWidget(self.sender_label)
@@ -65,9 +74,34 @@ class AgentMessage(MessageBubble):
             else:
                 indicator.mark_grey()
 
+    def start_stream(self) -> None:
+        """Start a new streamed response; its text replaces that of the previous one."""
+        self._stream_parts.clear()
+
+    def append_stream_text(self, text: str) -> None:
+        """Append a streamed text delta; the label is redrawn by a timer to batch updates."""
+        self._stream_parts.append(text)
+        if not self._stream_timer.isActive():
+            self._stream_timer.start()
+
+    def _flush_stream(self) -> None:
+        """Show the text streamed so far."""
+        if self.stream_label is None:
+            self.stream_label = QLabel()
+            self.stream_label.setWordWrap(True)
+            self.stream_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+            self.stream_label.setMaximumWidth(600)
+            self.layout.addWidget(self.stream_label)
+        self.stream_label.setText("".join(self._stream_parts))
+
     async def collapse_thinking_and_show_response(self, response_text: str):
         if hasattr(self, "thinking_label"):
             self.thinking_label.setText("Thinking collapsed")
+        self._stream_timer.stop()
+        if self.stream_label is not None:
+            # the response was streamed; show the final text in the same label
+            self.stream_label.setText(response_text)
+            return
         if response_text:
             self.content_label = QLabel(response_text)
             self.content_label.setWordWrap(True)
@@ -7,6 +7,7 @@ import json
 import re
 import time
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from PyQt6.QtCore import QThread, QTimer, pyqtSignal
 from PyQt6.QtGui import QColor
@@ -23,15 +24,19 @@ from PyQt6.QtWidgets import (
     QWidget,
 )
 
-from llm_mas.knowledge_base.knowledge_base import GLOBAL_KB
+from llm_mas.knowledge_base.registry import KB_REGISTRY
+from llm_mas.knowledge_base.watcher import KBWatcher, watch_enabled
 from llm_mas.logging.loggers import APP_LOGGER
 
+if TYPE_CHECKING:
+    from llm_mas.knowledge_base.knowledge_base import IndexReport
+
 
 class IndexingWorker(QThread):
     """Background worker thread for indexing files without blocking UI."""
 
     progress = pyqtSignal(str)
-    finished = pyqtSignal(int)
+    finished = pyqtSignal(object)
     error = pyqtSignal(str)
 
     def __init__(self, path: Path) -> None:
@@ -47,17 +52,21 @@ class IndexingWorker(QThread):
             asyncio.set_event_loop(loop)
 
             self.progress.emit(f"Starting indexing of: {self.path}")
-            chunks_added = loop.run_until_complete(GLOBAL_KB.index_path(self.path))
+            report = loop.run_until_complete(KB_REGISTRY.get().index_path(self.path))
 
-            if chunks_added == 0:
+            if report.files_scanned == 0:
                 self.progress.emit(
                     "No indexable files found (supported: .txt, .md, .py, .json, .csv, "
                     ".yaml, .yml, .toml, .pdf, .docx, .html, .htm, .rtf)",
                 )
             else:
-                self.progress.emit(f"✓ Successfully indexed {chunks_added} chunks")
+                self.progress.emit(
+                    f"✓ Indexed {report.chunks_added} chunks "
+                    f"(new files: {report.files_indexed}, updated: {report.files_updated}, "
+                    f"unchanged: {report.files_skipped}, removed: {report.files_removed})",
+                )
 
-            self.finished.emit(chunks_added)
+            self.finished.emit(report)
             loop.close()
         except Exception as exc:
             APP_LOGGER.exception("Indexing failed")
@@ -74,13 +83,15 @@ class UploadScreen(QWidget):
         self.nav = nav
         self.selected_path: Path | None = None
         self._worker: IndexingWorker | None = None
-        self._roots_file = GLOBAL_KB.storage_path.with_name("kb_ingested_roots.json")
+        self._roots_file = KB_REGISTRY.get().storage_path.with_name("kb_ingested_roots.json")
         self._ingested_roots: set[str] = set()
         self._progress_timer: QTimer | None = None
         self._last_progress_line: str = ""
+        self._watcher: KBWatcher | None = None
         self._init_ui()
         self._load_ingested_roots()
         self._refresh_ingested_list()
+        self._start_watcher()
 
     def _init_ui(self) -> None:
         """Initialize the PyQt6 UI."""
@@ -186,7 +197,7 @@ class UploadScreen(QWidget):
 
     def _update_stats(self) -> None:
         """Update the knowledge base statistics display."""
-        count = GLOBAL_KB.record_count()
+        count = KB_REGISTRY.get().record_count()
         self.stats_label.setText(f"📊 Knowledge Base: {count:,} chunks indexed")
 
     def _add_status(self, message: str, msg_type: str = "info") -> None:
@@ -281,7 +292,7 @@ class UploadScreen(QWidget):
     def _poll_progress(self) -> None:
         """Poll the knowledge base for the latest progress."""
         try:
-            recent = GLOBAL_KB.recent_progress(1)
+            recent = KB_REGISTRY.get().recent_progress(1)
             if recent and recent[0] != self._last_progress_line:
                 self._last_progress_line = recent[0]
 
@@ -336,19 +347,22 @@ class UploadScreen(QWidget):
         if msg_type in ("success", "error"):
             self.current_progress_label.setText(message)
 
-    def _on_finished(self, chunks_added: int) -> None:
+    def _on_finished(self, report: IndexReport) -> None:
         """Handle successful completion of indexing."""
         self._stop_progress_polling()
 
         # Hide progress bar but keep final message visible briefly
         self.progress_bar.setVisible(False)
 
-        if chunks_added > 0 and self.selected_path:
+        if (report.chunks_added > 0 or report.files_skipped > 0) and self.selected_path:
             self._ingested_roots.add(str(self.selected_path))
             self._save_ingested_roots()
+            if self._watcher is not None:
+                self._watcher.add_root(self.selected_path)
             self._refresh_ingested_list()
             self._add_status(
-                f"✅ Indexing complete! Added {chunks_added:,} chunks to knowledge base.",
+                f"✅ Indexing complete! Added {report.chunks_added:,} chunks to knowledge base "
+                f"({report.files_skipped:,} unchanged files skipped).",
                 "success",
             )
         else:
@@ -400,6 +414,14 @@ class UploadScreen(QWidget):
             # If corrupt, start fresh
             self._ingested_roots = set()
 
+    def _start_watcher(self) -> None:
+        """Keep ingested roots indexed in the background when ``KB_WATCH`` is set."""
+        if not watch_enabled():
+            return
+        self._watcher = KBWatcher(KB_REGISTRY.get(), [Path(p) for p in self._ingested_roots if Path(p).exists()])
+        self._watcher.start()
+        self._add_status(f"👀 Watching {len(self._watcher.roots)} ingested item(s) for changes", "info")
+
     def _save_ingested_roots(self) -> None:
         """Save the list of ingested paths."""
         try:
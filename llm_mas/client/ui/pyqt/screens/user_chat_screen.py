@@ -180,15 +180,6 @@ class UserChatScreen(QWidget):
     async def _run_agent_workflow(self, agent: Agent, user_msg: str):
         try:
             # Create context
-            context = ActionContext(
-                self.conversation,
-                ActionResult(),
-                self.client.mcp_client,
-                agent,
-                self.client.user,
-                self.client.get_mas().conversation_manager,
-            )
-
             agent.workspace.action_history.clear()
 
             # just as one
@@ -198,6 +189,17 @@ class UserChatScreen(QWidget):
             if was_at_bottom:
                 QTimer.singleShot(0, self._force_scroll_to_bottom)
 
+            # Create context; response actions stream their text into the bubble
+            context = ActionContext(
+                self.conversation,
+                ActionResult(),
+                self.client.mcp_client,
+                agent,
+                self.client.user,
+                self.client.get_mas().conversation_manager,
+                on_response_text=agent_bubble.append_stream_text,
+            )
+
             while not agent.finished_working():
                 # Selecting step
                 selecting_step = SelectingActionWorkStep()
@@ -211,6 +213,8 @@ class UserChatScreen(QWidget):
                 performing_indicator = await agent_bubble.add_work_step(performing_step)
 
                 params = ActionParams()
+                # a response streamed by this action replaces any streamed by an earlier one
+                agent_bubble.start_stream()
                 result = await agent.do_selected_action(selected_action, context, params)
                 context = ActionContext.from_action_result(result, context)
 
@@ -9,6 +9,7 @@ from textual.app import App
 
 from llm_mas.client.ui.textual_app.screens.main_menu import MainMenu
 from llm_mas.logging.loggers import APP_LOGGER
+from llm_mas.model_providers.api import ModelsAPI
 from llm_mas.utils.background_tasks import BACKGROUND_TASKS
 
 if TYPE_CHECKING:
@@ -52,3 +53,6 @@ class TextualApp(App):
         # wait for tasks to complete cancellation
         if BACKGROUND_TASKS:
             await asyncio.gather(*BACKGROUND_TASKS, return_exceptions=True)
+
+        # close the model providers' pooled connections
+        await ModelsAPI.aclose()
@@ -128,7 +128,7 @@ class DefaultQueryHandler(QueryHandler):
         result = ActionResult()
         result.set_param("query", prompt)
 
-        action_context = ActionContext.from_action_result(result, message.action_context)
+        action_context = ActionContext.from_action_result(result, message.action_context, stream_responses=False)
 
         try:
             action_result, context = await state.talking_to.work(action_context)
@@ -0,0 +1,175 @@
+"""Inverted-file (IVF-flat) approximate nearest-neighbour index.
+
+The normalised embedding rows are clustered with spherical k-means into ``nlist``
+cells. A query is scored against the centroids first and only the rows of the
+``nprobe`` closest cells are scanned exactly, so the cost of a search drops from
+``n * dim`` to roughly ``nlist * dim + n * nprobe / nlist * dim``.
+
+``nprobe`` is the recall/latency knob: ``nprobe == nlist`` is an exact search.
+Use ``evaluate_recall`` to measure recall@k against the exact scan for a corpus.
+
+The index stores one cell id per store row (``assignments``). Rows added after
+training are assigned to their nearest existing centroid, and removals apply the
+same keep-mask as the store, so the index never needs a full rebuild to stay
+consistent; it is only retrained when the corpus has grown enough for the
+centroids to be stale. Arrays are replaced rather than modified in place, so a
+search holding an older ``assignments`` array reads a consistent snapshot.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from llm_mas.knowledge_base.vector_store import normalise_rows, top_k_indices
+
+_ASSIGN_BLOCK_ROWS = 65_536
+_TRAIN_SAMPLES_PER_CELL = 64
+
+
+def default_nlist(rows: int) -> int:
+    """Return the conventional ``~4 * sqrt(n)`` cell count for ``rows`` vectors."""
+    return max(1, min(rows, round(4 * math.sqrt(rows))))
+
+
+class IVFIndex:
+    """IVF-flat index over the rows of a ``VectorStore`` matrix."""
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, trained_rows: int) -> None:
+        """Wrap trained ``centroids`` and the per-row cell ``assignments``."""
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.assignments = np.ascontiguousarray(assignments, dtype=np.int32)
+        self.trained_rows = trained_rows
+
+    @property
+    def nlist(self) -> int:
+        """Return the number of cells."""
+        return self.centroids.shape[0]
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        nlist: int | None = None,
+        *,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> IVFIndex:
+        """Cluster the (normalised) rows of ``matrix`` and assign every row to a cell.
+
+        k-means runs on a random sample of at most ``64 * nlist`` rows; the full
+        matrix is then assigned in blocks so memory stays bounded.
+        """
+        rows = matrix.shape[0]
+        if rows == 0:
+            msg = "Cannot train an IVF index on an empty matrix."
+            raise ValueError(msg)
+        nlist = min(rows, nlist or default_nlist(rows))
+        rng = np.random.default_rng(seed)
+        sample_size = min(rows, nlist * _TRAIN_SAMPLES_PER_CELL)
+        sample = np.asarray(matrix[np.sort(rng.choice(rows, sample_size, replace=False))], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty cells with random sample rows
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalise_rows(sums)
+
+        index = cls(centroids, np.empty(0, dtype=np.int32), trained_rows=rows)
+        index.assignments = index.assign(matrix)
+        return index
+
+    def assign(self, rows: np.ndarray) -> np.ndarray:
+        """Return the nearest cell of every (normalised) row."""
+        out = np.empty(rows.shape[0], dtype=np.int32)
+        for lo in range(0, rows.shape[0], _ASSIGN_BLOCK_ROWS):
+            block = np.asarray(rows[lo : lo + _ASSIGN_BLOCK_ROWS], dtype=np.float32)
+            out[lo : lo + block.shape[0]] = np.argmax(block @ self.centroids.T, axis=1)
+        return out
+
+    def append(self, rows: np.ndarray) -> None:
+        """Assign rows appended to the store after training."""
+        self.assignments = np.concatenate([self.assignments, self.assign(rows)])
+
+    def keep(self, mask: np.ndarray) -> None:
+        """Drop the assignments of rows removed from the store."""
+        self.assignments = self.assignments[mask]
+
+    def candidates(self, assignments: np.ndarray, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Return the (sorted) rows of the ``nprobe`` cells nearest to normalised ``query``."""
+        probe = top_k_indices(self.centroids @ query, max(1, nprobe))
+        return np.flatnonzero(np.isin(assignments, probe))
+
+    def search(
+        self,
+        matrix: np.ndarray,
+        assignments: np.ndarray,
+        query: np.ndarray,
+        top_k: int,
+        nprobe: int,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return ``(rows, scores)`` of the best ``top_k`` rows among the ``nprobe`` nearest cells.
+
+        ``query`` must be normalised; ``matrix`` and ``assignments`` must be the same snapshot.
+        """
+        candidates = self.candidates(assignments, query, nprobe)
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = matrix[candidates] @ query
+        best = top_k_indices(scores, top_k)
+        return candidates[best], scores[best]
+
+
+@dataclass
+class RecallReport:
+    """Recall and latency of an IVF search setting compared to the exact scan."""
+
+    nprobe: int
+    k: int
+    queries: int
+    recall: float
+    """Mean fraction of the exact top-k that the IVF search also returned."""
+    ann_ms: float
+    exact_ms: float
+
+    @property
+    def speedup(self) -> float:
+        """Return how many times faster the IVF search was than the exact scan."""
+        return self.exact_ms / self.ann_ms if self.ann_ms > 0 else 0.0
+
+
+def evaluate_recall(
+    matrix: np.ndarray,
+    index: IVFIndex,
+    queries: np.ndarray,
+    k: int = 10,
+    nprobes: tuple[int, ...] = (1, 2, 4, 8, 16, 32),
+) -> list[RecallReport]:
+    """Measure recall@k and mean per-query latency of ``index`` for each ``nprobe``."""
+    queries = normalise_rows(queries)
+    start = time.perf_counter()
+    exact = [set(top_k_indices(matrix @ q, k).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / max(1, len(queries))
+
+    reports = []
+    for nprobe in sorted({min(p, index.nlist) for p in nprobes}):
+        hits = 0
+        start = time.perf_counter()
+        for q, truth in zip(queries, exact, strict=True):
+            rows, _ = index.search(matrix, index.assignments, q, k, nprobe)
+            hits += len(truth.intersection(rows.tolist()))
+        ann_ms = (time.perf_counter() - start) * 1000 / max(1, len(queries))
+        recall = hits / max(1, sum(len(t) for t in exact))
+        reports.append(
+            RecallReport(nprobe=nprobe, k=k, queries=len(queries), recall=recall, ann_ms=ann_ms, exact_ms=exact_ms),
+        )
+    return reports
@@ -0,0 +1,470 @@
+"""Offline benchmark suite for the knowledge base.
+
+Runs without Ollama: embeddings come from ``HashEmbedder``, a deterministic
+feature-hashing embedder, so every run over the same configuration does the same
+work. The suite measures:
+
+- ingestion of a synthetic corpus of text, PDF and DOCX files: file scan time,
+  chunking throughput per format, embedding throughput and end-to-end indexing,
+- for each record count in ``scales`` (default 10k, 100k and 1M): the time to
+  save a compacted base, the time to open it, and p50/p99 query latency in
+  vector, lexical and hybrid mode,
+- the peak resident set size after every stage.
+
+Results are written as JSON with sorted keys, so runs from two commits can be
+diffed directly or with ``--compare``::
+
+    python -m llm_mas.knowledge_base.benchmark --output before.json
+    python -m llm_mas.knowledge_base.benchmark --output after.json --compare before.json
+
+``KB_*`` settings (e.g. ``KB_QUANTIZATION``) apply as usual and are recorded in
+the results.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import docx
+import numpy as np
+from fpdf import FPDF
+
+from llm_mas.knowledge_base.ann import IVFIndex
+from llm_mas.knowledge_base.chunking import iter_chunks, iter_text
+from llm_mas.knowledge_base.embedder import EmbeddingProvider
+from llm_mas.knowledge_base.knowledge_base import KnowledgeBase, QueryMode
+from llm_mas.knowledge_base.lexical import BM25Index
+from llm_mas.knowledge_base.storage import BaseSnapshot, write_base
+from llm_mas.logging.loggers import APP_LOGGER
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_WORD = re.compile(r"\w+")
+_BLOCK_ROWS = 65536
+
+
+class HashEmbedder(EmbeddingProvider):
+    """Deterministic local embedder: signed feature hashing of lower-cased words, L2-normalised.
+
+    Texts sharing words get similar vectors, so rankings are meaningful, and no
+    network or model is involved.
+    """
+
+    def __init__(self, dim: int = 256) -> None:
+        """Initialize the embedder with output dimension ``dim``."""
+        super().__init__(batch_size=64, max_in_flight=4, max_retries=0)
+        self.dim = dim
+        self.model = f"hash-{dim}"
+
+    def word_slot(self, word: str) -> tuple[int, float]:
+        """Return the dimension and sign a lower-cased word contributes to."""
+        digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+        return digest % self.dim, 1.0 if digest >> 63 else -1.0
+
+    def embed_one(self, text: str) -> list[float]:
+        """Return the embedding of ``text``."""
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            slot, sign = self.word_slot(word)
+            vec[slot] += sign
+        norm = float(np.linalg.norm(vec))
+        return (vec / norm if norm else vec).tolist()
+
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        return [self.embed_one(text) for text in batch]
+
+    async def _aembed_batch(self, batch: list[str]) -> list[list[float]]:
+        return self._embed_batch(batch)
+
+
+@dataclass
+class BenchmarkConfig:
+    """Parameters of a benchmark run."""
+
+    files: int = 30
+    """Synthetic corpus files, split evenly between ``formats``."""
+    words_per_file: int = 3000
+    formats: tuple[str, ...] = ("txt", "pdf", "docx")
+    scales: tuple[int, ...] = (10_000, 100_000, 1_000_000)
+    """Record counts at which save, load and query latency are measured."""
+    queries: int = 200
+    """Queries per mode and scale."""
+    dim: int = 256
+    ann_min_rows: int = 50_000
+    """Scales of at least this many records get an IVF index, like ``KB_ANN_MIN_ROWS``; 0 disables."""
+    vocabulary: int = 20_000
+    seed: int = 0
+    workdir: Path | None = None
+    """Directory for the corpus and indexes; a temporary directory by default."""
+
+
+def _vocabulary(size: int, seed: int) -> list[str]:
+    """Return ``size`` distinct pronounceable pseudo-words, with a few identifier-like tokens mixed in."""
+    rng = random.Random(seed)  # noqa: S311
+    consonants, vowels = "bcdfghklmnprstvz", "aeiou"
+    words: dict[str, None] = {}
+    while len(words) < size:
+        if rng.random() < 0.02:  # noqa: PLR2004
+            word = f"{rng.choice(['err', 'sku', 'inv', 'ref'])}-{rng.randrange(10_000)}"
+        else:
+            word = "".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(rng.randint(1, 4)))
+        words[word] = None
+    return list(words)
+
+
+def _zipf_ids(rng: np.random.Generator, vocabulary: int, size: int | tuple[int, ...]) -> np.ndarray:
+    """Draw word ids with a Zipf-like skew so some words are common and most are rare."""
+    return np.minimum(rng.zipf(1.3, size=size) - 1, vocabulary - 1)
+
+
+def _paragraphs(words: list[str], rng: np.random.Generator, count: int) -> list[str]:
+    """Return paragraphs of sentences totalling about ``count`` words."""
+    ids = _zipf_ids(rng, len(words), count)
+    paragraphs, sentence, sentences = [], [], []
+    for i, word_id in enumerate(ids):
+        sentence.append(words[word_id])
+        if len(sentence) >= 8 + i % 9:
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            sentence = []
+        if len(sentences) >= 5 + i % 4:
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    paragraphs.append(" ".join([*sentences, " ".join(sentence)]).strip())
+    return [p for p in paragraphs if p]
+
+
+def generate_corpus(root: Path, config: BenchmarkConfig) -> dict[str, int]:
+    """Write the synthetic corpus under ``root``; returns the number of files per format."""
+    words = _vocabulary(config.vocabulary, config.seed)
+    rng = np.random.default_rng(config.seed)
+    root.mkdir(parents=True, exist_ok=True)
+    counts = dict.fromkeys(config.formats, 0)
+    for i in range(config.files):
+        fmt = config.formats[i % len(config.formats)]
+        paragraphs = _paragraphs(words, rng, config.words_per_file)
+        path = root / f"doc-{i:05d}.{fmt}"
+        if fmt == "txt":
+            path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+        elif fmt == "pdf":
+            pdf = FPDF()
+            pdf.set_font("Helvetica", size=10)
+            pdf.add_page()
+            for paragraph in paragraphs:
+                pdf.multi_cell(0, 5, paragraph)
+                pdf.ln(2)
+            pdf.output(str(path))
+        elif fmt == "docx":
+            document = docx.Document()
+            for paragraph in paragraphs:
+                document.add_paragraph(paragraph)
+            document.save(str(path))
+        else:
+            msg = f"Unsupported benchmark corpus format: {fmt}"
+            raise ValueError(msg)
+        counts[fmt] += 1
+    return counts
+
+
+def peak_rss_mb() -> float | None:
+    """Return the peak resident set size of this process in MiB, or None where it cannot be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _latency_summary(seconds: list[float]) -> dict[str, float]:
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+def _directory_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def bench_ingest(corpus: Path, index_dir: Path, config: BenchmarkConfig) -> dict[str, Any]:
+    """Measure chunking, embedding and end-to-end indexing of the synthetic corpus."""
+    embedder = HashEmbedder(config.dim)
+    chunking: dict[str, dict[str, float]] = {}
+    texts: list[str] = []
+    for path in sorted(corpus.iterdir()):
+        fmt = path.suffix.lstrip(".")
+        stats = chunking.setdefault(fmt, {"files": 0, "bytes": 0, "chunks": 0, "seconds": 0.0})
+        start = time.perf_counter()
+        spans = list(iter_chunks(iter_text(path), str(path)))
+        stats["seconds"] += time.perf_counter() - start
+        stats["files"] += 1
+        stats["bytes"] += path.stat().st_size
+        stats["chunks"] += len(spans)
+        texts.extend(s.text for s in spans)
+    for stats in chunking.values():
+        stats["mb_per_second"] = stats["bytes"] / 2**20 / stats["seconds"] if stats["seconds"] else 0.0
+        stats["chunks_per_second"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+
+    start = time.perf_counter()
+    embedded = embedder.embed_batches(texts)
+    embed_seconds = time.perf_counter() - start
+
+    kb = KnowledgeBase(index_dir, embedder=HashEmbedder(config.dim))
+    start = time.perf_counter()
+    report = asyncio.run(kb.index_path(corpus))
+    index_seconds = time.perf_counter() - start
+    return {
+        "chunking": chunking,
+        "embedding": {
+            "chunks": len(embedded.vectors),
+            "seconds": embed_seconds,
+            "chunks_per_second": len(embedded.vectors) / embed_seconds if embed_seconds else 0.0,
+        },
+        "index": {
+            "files": report.files_scanned,
+            "chunks": report.chunks_added,
+            "scan_seconds": report.scan_seconds,
+            "embed_seconds": report.embed_seconds,
+            "seconds": index_seconds,
+            "chunks_per_second": report.chunks_added / index_seconds if index_seconds else 0.0,
+            "index_bytes": _directory_bytes(index_dir),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _synthetic_snapshot(
+    records: int,
+    config: BenchmarkConfig,
+    embedder: HashEmbedder,
+    words: list[str],
+) -> tuple[BaseSnapshot, float | None]:
+    """Build a base of ``records`` short chunks whose vectors are their ``HashEmbedder`` embeddings.
+
+    Returns the snapshot and, if an IVF index was trained, its build time.
+    """
+    rng = np.random.default_rng(config.seed + records)
+    slots = np.empty(len(words), dtype=np.int64)
+    signs = np.empty(len(words), dtype=np.float32)
+    for i, word in enumerate(words):
+        slots[i], signs[i] = embedder.word_slot(word)
+    matrix = np.zeros((records, config.dim), dtype=np.float32)
+    rows, lexical = [], BM25Index()
+    now = time.time()
+    for lo in range(0, records, _BLOCK_ROWS):
+        hi = min(records, lo + _BLOCK_ROWS)
+        ids = _zipf_ids(rng, len(words), (hi - lo, 40))
+        block = np.zeros((hi - lo, config.dim), dtype=np.float32)
+        np.add.at(block, (np.arange(hi - lo)[:, None], slots[ids]), signs[ids])
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[lo:hi] = block / np.where(norms > 0, norms, 1)
+        for offset, row in enumerate(ids):
+            doc_id = lo + offset + 1
+            text = " ".join(words[w] for w in row)
+            source = f"synthetic/doc-{doc_id // 20:06d}.txt"
+            rows.append({"id": doc_id, "source_path": source, "chunk_id": doc_id % 20, "text": text})
+            rows[-1].update(root="synthetic", ingested_at=now)
+            lexical.add(doc_id, text)
+    ann, ann_seconds = None, None
+    if config.ann_min_rows and records >= config.ann_min_rows:
+        start = time.perf_counter()
+        ivf = IVFIndex.train(matrix)
+        ann_seconds = time.perf_counter() - start
+        ann = (ivf.centroids, ivf.assignments, ivf.trained_rows)
+    snapshot = BaseSnapshot(
+        seq=1,
+        matrix=matrix,
+        records=rows,
+        next_id=records + 1,
+        manifest={},
+        lexical=lexical.to_json(),
+        ann=ann,
+    )
+    return snapshot, ann_seconds
+
+
+def bench_scale(records: int, index_dir: Path, config: BenchmarkConfig) -> dict[str, Any]:
+    """Measure save, load and query latency of a knowledge base holding ``records`` chunks."""
+    embedder = HashEmbedder(config.dim)
+    words = _vocabulary(config.vocabulary, config.seed)
+    start = time.perf_counter()
+    snapshot, ann_seconds = _synthetic_snapshot(records, config, embedder, words)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    write_base(index_dir, snapshot)
+    save_seconds = time.perf_counter() - start
+    del snapshot
+
+    kb = KnowledgeBase(index_dir, embedder=embedder)
+    start = time.perf_counter()
+    loaded = kb.record_count()
+    load_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(config.seed)
+    queries = [" ".join(words[w] for w in row) for row in _zipf_ids(rng, len(words), (config.queries, 4))]
+    latency: dict[str, dict[str, float]] = {}
+    for mode in QueryMode:
+        kb.query(queries[0], mode=mode)  # warm up caches and lazily built state
+        seconds = []
+        for query in queries:
+            start = time.perf_counter()
+            kb.query(query, top_k=5, mode=mode)
+            seconds.append(time.perf_counter() - start)
+        latency[mode.value] = _latency_summary(seconds)
+    return {
+        "records": loaded,
+        "build_seconds": build_seconds,
+        "ann_build_seconds": ann_seconds,
+        "save_seconds": save_seconds,
+        "load_seconds": load_seconds,
+        "index_bytes": _directory_bytes(index_dir),
+        "query": latency,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run_benchmark(config: BenchmarkConfig) -> dict[str, Any]:
+    """Run every benchmark stage and return the results as a JSON-serialisable dict."""
+    results: dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "config": {k: v for k, v in asdict(config).items() if k != "workdir"},
+            "env": {k: v for k, v in sorted(os.environ.items()) if k.startswith("KB_")},
+        },
+    }
+    with tempfile.TemporaryDirectory(prefix="kb-bench-", dir=config.workdir) as tmp:
+        work = Path(tmp)
+        start = time.perf_counter()
+        results["corpus"] = {"files": generate_corpus(work / "corpus", config)}
+        results["corpus"]["generate_seconds"] = time.perf_counter() - start
+        results["corpus"]["bytes"] = _directory_bytes(work / "corpus")
+        APP_LOGGER.info("KB benchmark: corpus of %d files generated", config.files)
+        results["ingest"] = bench_ingest(work / "corpus", work / "ingest_index", config)
+        APP_LOGGER.info("KB benchmark: ingest done in %.2fs", results["ingest"]["index"]["seconds"])
+        results["scales"] = []
+        for records in config.scales:
+            scale = bench_scale(records, work / f"index-{records}", config)
+            results["scales"].append(scale)
+            APP_LOGGER.info(
+                "KB benchmark: records=%d load=%.2fs vector p50=%.2fms p99=%.2fms",
+                records,
+                scale["load_seconds"],
+                scale["query"]["vector"]["p50_ms"],
+                scale["query"]["vector"]["p99_ms"],
+            )
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def _flatten(value: Any, prefix: str = "") -> dict[str, float]:  # noqa: ANN401
+    """Return the numeric leaves of ``value`` keyed by dotted path; list items are keyed by ``records`` if present."""
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, int | float):
+        return {prefix: float(value)}
+    out: dict[str, float] = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key != "meta":
+                out.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            label = item.get("records", i) if isinstance(item, dict) else i
+            out.update(_flatten(item, f"{prefix}[{label}]"))
+    return out
+
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any], threshold: float = 0.1) -> list[str]:
+    """Return one line per metric that changed by more than ``threshold`` (relative) between two runs."""
+    old, new = _flatten(baseline), _flatten(current)
+    lines = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        if before and abs(after - before) / abs(before) > threshold:
+            lines.append(f"{key}: {before:.4g} -> {after:.4g} ({(after - before) / abs(before):+.1%})")
+    return lines
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    defaults = BenchmarkConfig()
+    parser = argparse.ArgumentParser(description="Benchmark the knowledge base with a deterministic local embedder")
+    parser.add_argument("--files", type=int, default=defaults.files, help="synthetic corpus files")
+    parser.add_argument("--words", type=int, default=defaults.words_per_file, help="words per corpus file")
+    parser.add_argument("--formats", default=",".join(defaults.formats), help="comma-separated: txt,pdf,docx")
+    parser.add_argument(
+        "--scales",
+        default=",".join(str(s) for s in defaults.scales),
+        help="comma-separated record counts for save/load/query benchmarks",
+    )
+    parser.add_argument("--queries", type=int, default=defaults.queries, help="queries per mode and scale")
+    parser.add_argument("--dim", type=int, default=defaults.dim, help="embedding dimension")
+    parser.add_argument("--ann-min-rows", type=int, default=defaults.ann_min_rows, help="IVF threshold; 0 disables")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--workdir", type=Path, default=None, help="where temporary files are created")
+    parser.add_argument("--output", type=Path, default=Path("kb_benchmark.json"), help="JSON results file")
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results to report changes against")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the benchmark from the command line and write the JSON results."""
+    args = _parse_args(argv)
+    config = BenchmarkConfig(
+        files=args.files,
+        words_per_file=args.words,
+        formats=tuple(f.strip() for f in args.formats.split(",") if f.strip()),
+        scales=tuple(int(s) for s in args.scales.split(",") if s.strip()),
+        queries=args.queries,
+        dim=args.dim,
+        ann_min_rows=args.ann_min_rows,
+        seed=args.seed,
+        workdir=args.workdir,
+    )
+    results = run_benchmark(config)
+    args.output.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    APP_LOGGER.info("KB benchmark results written to %s", args.output)
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        changes = compare_results(baseline, results)
+        for line in changes or ["no metric changed by more than 10%"]:
+            APP_LOGGER.info("KB benchmark vs %s: %s", args.compare, line)
+
+
+if __name__ == "__main__":
+    main()
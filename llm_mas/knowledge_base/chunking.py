@@ -0,0 +1,417 @@
+"""Streaming, offset-based chunking of source files for knowledge base ingestion.
+
+``iter_text`` reads a supported file as a stream of text blocks: plain text is
+decoded incrementally in fixed-size blocks, PDFs are extracted page by page and
+DOCX files paragraph by paragraph. Only HTML and RTF, whose parsers need the whole
+markup, are read in one piece. For PDFs the stream records where each page starts,
+so every chunk can be attributed to the page it starts on.
+
+``iter_chunks`` turns such a stream into ``ChunkSpan``s without ever holding more
+than one block plus one chunk of text. Every span is a verbatim slice of the
+extracted text, identified by its character offset and length, so consecutive
+overlapping chunks can be stored as offsets rather than as repeated text:
+``SourceText`` holds each character of a source's stored chunks once and reads a
+chunk back by its offset and length.
+
+Chunk boundaries prefer, in order: a paragraph break, the end of a sentence, a line
+break and a space, searched in the second half of the size window; a chunk is cut
+hard only if none is found. The overlap of the next chunk starts at a sentence or
+word boundary within the last ``chunk_overlap`` characters. With ``page_breaks``, a
+chunk of a paged format ends at the end of its page and the next page starts a new
+chunk, so page attribution is exact.
+
+Chunking strategies are ``Chunker`` subclasses: ``CharChunker`` bounds chunks in
+characters, ``TokenChunker`` in tokens of a tokenizer (see ``tokens``), so chunks
+of prose, code and CSV cost about the same in a prompt. Every chunk records its
+token count for ingestion and retrieval reports.
+"""
+
+from __future__ import annotations
+
+import bisect
+import codecs
+import re
+from abc import abstractmethod
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING
+
+import docx
+import pypdf
+from bs4 import BeautifulSoup
+
+from llm_mas.knowledge_base.tokens import Tokenizer, default_tokenizer_name, get_tokenizer
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator
+    from pathlib import Path
+
+PLAIN_TEXT_SUFFIXES = frozenset({".txt", ".md", ".py", ".json", ".csv", ".yaml", ".yml", ".toml"})
+
+_BLOCK_BYTES = 1 << 16
+"""Bytes decoded per read of a plain-text file."""
+
+_BREAKS = (
+    (re.compile(r"\n[ \t]*\n"), 0),
+    (re.compile(r"[.!?][\"')\]]?\s"), 1),
+    (re.compile(r"\n"), 0),
+    (re.compile(r"[ \t]"), 0),
+)
+"""Boundary patterns, most preferred first, with the number of matched characters kept in the chunk."""
+
+_MAX_CHARS_PER_TOKEN = 16
+"""Upper bound of characters per token; caps the text a token-budgeted chunk is cut from."""
+
+_SPACE = re.compile(r"\s*")
+_OVERLAP_STARTS = (re.compile(r"[.!?][\"')\]]?\s+"), re.compile(r"\s+"))
+
+
+@dataclass
+class ChunkSpan:
+    """A chunk of a source's extracted text: ``text == extracted[offset : offset + length]``."""
+
+    source: str
+    offset: int
+    """Character offset of the chunk in the text extracted from ``source``."""
+    length: int
+    text: str
+    page: int | None = None
+    """1-based page the chunk starts on, for paged formats."""
+    tokens: int | None = None
+    """Number of tokens in ``text``, if counted."""
+
+    @property
+    def end(self) -> int:
+        """Return the offset just past the chunk."""
+        return self.offset + self.length
+
+
+class SourceText:
+    """The text of one source's stored chunks, each character held once.
+
+    Spans are added in offset order; the part of a span that overlaps the spans
+    before it is not stored again, so overlapping chunks cost their new text only.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty text."""
+        self._starts: list[int] = []
+        self._pieces: list[str] = []
+        self._last = 0
+        self._end = 0
+
+    def add(self, offset: int, text: str) -> bool:
+        """Store the span ``text`` found at ``offset``.
+
+        Returns False, storing nothing, if the span starts before the last one added
+        or disagrees with the text already stored; the caller then needs a new ``SourceText``.
+        """
+        if offset < self._last:
+            return False
+        covered = min(max(0, self._end - offset), len(text))
+        if covered and self.slice(offset, covered) != text[:covered]:
+            return False
+        if covered < len(text):
+            self._starts.append(offset + covered)
+            self._pieces.append(text[covered:])
+            self._end = offset + len(text)
+        self._last = offset
+        return True
+
+    def slice(self, offset: int, length: int) -> str:
+        """Return the ``length`` characters stored from ``offset`` on."""
+        end = offset + length
+        i = max(0, bisect.bisect_right(self._starts, offset) - 1)
+        parts: list[str] = []
+        while offset < end and i < len(self._pieces) and self._starts[i] <= offset:
+            start, piece = self._starts[i], self._pieces[i]
+            parts.append(piece[offset - start : end - start])
+            offset = max(offset, min(end, start + len(piece)))
+            i += 1
+        return "".join(parts)
+
+
+def _plain_text_encoding(path: Path) -> str:
+    """Return ``utf-8`` if the whole file decodes as UTF-8, else ``latin-1``; reads in blocks."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with path.open("rb") as fh:
+            for block in iter(lambda: fh.read(_BLOCK_BYTES), b""):
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "latin-1"
+    return "utf-8"
+
+
+def _iter_plain_text(path: Path) -> Iterator[str]:
+    with path.open(encoding=_plain_text_encoding(path), newline="") as fh:
+        yield from iter(lambda: fh.read(_BLOCK_BYTES), "")
+
+
+class TextStream:
+    """Iterable of a file's text blocks that tracks the character offset where each page starts."""
+
+    def __init__(self, blocks: Callable[[TextStream], Iterator[str]]) -> None:
+        """Wrap a block generator; paged readers call ``start_page`` before each page's text."""
+        self._blocks = blocks
+        self.offset = 0
+        self.page_starts: list[int] = []
+
+    def __iter__(self) -> Iterator[str]:
+        """Yield the blocks, counting characters."""
+        for block in self._blocks(self):
+            self.offset += len(block)
+            yield block
+
+    def start_page(self) -> None:
+        """Record that the next block starts a new page."""
+        self.page_starts.append(self.offset)
+
+    def page_of(self, offset: int) -> int | None:
+        """Return the 1-based page containing ``offset``, or None for unpaged text."""
+        if not self.page_starts:
+            return None
+        return max(1, bisect.bisect_right(self.page_starts, offset))
+
+    def next_page_start(self, offset: int) -> int | None:
+        """Return the offset of the first page starting after ``offset``, or None if none has been read yet."""
+        i = bisect.bisect_right(self.page_starts, offset)
+        return self.page_starts[i] if i < len(self.page_starts) else None
+
+
+def _iter_pdf(path: Path, stream: TextStream) -> Iterator[str]:
+    reader = pypdf.PdfReader(str(path))
+    for i, page in enumerate(reader.pages):
+        if i:
+            yield "\n"
+        stream.start_page()
+        yield page.extract_text() or ""
+
+
+def _iter_docx(path: Path) -> Iterator[str]:
+    document = docx.Document(str(path))
+    for i, paragraph in enumerate(document.paragraphs):
+        if i:
+            yield "\n"
+        yield paragraph.text
+
+
+def _read_html(path: Path) -> str:
+    html = path.read_text(encoding="utf-8", errors="ignore")
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.get_text(separator="\n")
+
+
+def _read_rtf(path: Path) -> str:
+    content = path.read_text(encoding="latin-1", errors="ignore")
+    content = re.sub(r"\\[a-zA-Z]+-?\d* ?", "", content)
+    return content.replace("{", "").replace("}", "")
+
+
+def iter_text(path: Path) -> TextStream:
+    """Return the extracted text of a supported file (plain, PDF, DOCX, HTML, RTF) as a stream of blocks."""
+    suffix = path.suffix.lower()
+    if suffix in PLAIN_TEXT_SUFFIXES:
+        return TextStream(lambda _: _iter_plain_text(path))
+    if suffix == ".pdf":
+        return TextStream(lambda stream: _iter_pdf(path, stream))
+    if suffix == ".docx":
+        return TextStream(lambda _: _iter_docx(path))
+    if suffix in {".html", ".htm"}:
+        return TextStream(lambda _: iter([_read_html(path)]))
+    if suffix == ".rtf":
+        return TextStream(lambda _: iter([_read_rtf(path)]))
+    msg = f"Unsupported file type: {suffix}"
+    raise ValueError(msg)
+
+
+def _chunk_end(buffer: str, start: int, max_chunk_size: int) -> int:
+    """Return the end of the chunk starting at ``start``: the preferred boundary, or a hard cut."""
+    hi = start + max_chunk_size
+    if hi >= len(buffer):
+        return len(buffer)
+    lo = start + max_chunk_size // 2
+    for pattern, keep in _BREAKS:
+        last = None
+        for last in pattern.finditer(buffer, lo, hi + 1):  # noqa: B007
+            pass
+        if last is not None and last.start() + keep > lo:
+            return last.start() + keep
+    return hi
+
+
+def _overlap_start(buffer: str, start: int, end: int, chunk_overlap: int) -> int:
+    """Return where the chunk after ``buffer[start:end]`` starts so it overlaps by at most ``chunk_overlap``."""
+    if chunk_overlap <= 0 or end - start <= chunk_overlap:
+        return end
+    lo = end - chunk_overlap
+    for pattern in _OVERLAP_STARTS:
+        if (match := pattern.search(buffer, lo, end)) is not None and match.end() < end:
+            return match.end()
+    return end
+
+
+@dataclass
+class TokenBudget:
+    """Bounds chunks to ``max_tokens`` tokens as counted by ``count``, overlapping by about ``overlap_tokens``."""
+
+    count: Callable[[str], int]
+    max_tokens: int
+    overlap_tokens: int = 0
+    chars_per_token: float = 4.0
+    """Estimate taken from the previous chunk, used to size the next character window."""
+
+    def window(self, max_chunk_size: int) -> int:
+        """Return the characters to search for the next chunk's boundary, a little more than the budget holds."""
+        return max(1, min(max_chunk_size, int(self.max_tokens * self.chars_per_token * 1.1)))
+
+    def fit(self, buffer: str, start: int, end: int) -> int:
+        """Move ``end`` back to a boundary until ``buffer[start:end]`` is within the budget."""
+        while True:
+            length = len(buffer[start:end].rstrip())
+            tokens = self.count(buffer[start : start + length])
+            if tokens:
+                self.chars_per_token = max(1.0, length / tokens)
+            if tokens <= self.max_tokens or end - start <= 1:
+                return end
+            end = _chunk_end(buffer, start, max(1, int((end - start) * self.max_tokens / tokens * 0.95)))
+
+    def overlap_chars(self) -> int:
+        """Return the overlap in characters at the current characters-per-token estimate."""
+        return int(self.overlap_tokens * self.chars_per_token)
+
+
+def _next_end(
+    buffer: str,
+    start: int,
+    max_chunk_size: int,
+    page_end: int | None,
+    budget: TokenBudget | None,
+) -> int:
+    """Return the end of the chunk starting at ``start``: the end of its page if that fits, else a boundary."""
+    window = max_chunk_size if budget is None else budget.window(max_chunk_size)
+    end = page_end if page_end is not None and page_end - start <= window else _chunk_end(buffer, start, window)
+    return end if budget is None else budget.fit(buffer, start, end)
+
+
+def iter_chunks(  # noqa: PLR0913
+    blocks: Iterable[str],
+    source: str,
+    max_chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    *,
+    page_breaks: bool = False,
+    budget: TokenBudget | None = None,
+) -> Iterator[ChunkSpan]:
+    """Yield overlapping chunks of at most ``max_chunk_size`` characters from a stream of text blocks.
+
+    Leading and trailing whitespace is trimmed from every chunk and blank chunks
+    are skipped; offsets always refer to the untrimmed stream. If ``blocks`` is a
+    ``TextStream`` of a paged format, each chunk's ``page`` is set, and with
+    ``page_breaks`` no chunk spans two pages. With a ``budget``, chunks also hold
+    at most ``budget.max_tokens`` tokens, the overlap is ``budget.overlap_tokens``
+    tokens instead of ``chunk_overlap`` characters and each chunk's ``tokens`` is set.
+    """
+    if max_chunk_size <= 0:
+        max_chunk_size = 1 << 62
+    if chunk_overlap >= max_chunk_size:
+        chunk_overlap = max_chunk_size // 5
+    paged = blocks if isinstance(blocks, TextStream) else None
+    stream = iter(blocks)
+    buffer, base, pos = "", 0, 0  # buffer[pos] is at offset base + pos of the stream
+    exhausted = False
+    while True:
+        while not exhausted and len(buffer) - pos <= max_chunk_size:
+            block = next(stream, None)
+            if block is None:
+                exhausted = True
+            elif block:
+                buffer, base, pos = buffer[pos:] + block, base + pos, 0
+        pos = _SPACE.match(buffer, pos).end()
+        if not exhausted and len(buffer) - pos <= max_chunk_size:
+            continue
+        if pos >= len(buffer):
+            return
+        next_page = paged.next_page_start(base + pos) if paged is not None and page_breaks else None
+        page_end = next_page - base if next_page is not None else None
+        end = _next_end(buffer, pos, max_chunk_size, page_end, budget)
+        text = buffer[pos:end].rstrip()
+        page = paged.page_of(base + pos) if paged is not None else None
+        tokens = budget.count(text) if budget is not None else None
+        yield ChunkSpan(source=source, offset=base + pos, length=len(text), text=text, page=page, tokens=tokens)
+        if end >= len(buffer):
+            return
+        overlap = chunk_overlap if budget is None else budget.overlap_chars()
+        pos = end if end == page_end else _overlap_start(buffer, pos, pos + len(text), overlap)
+
+
+class ChunkStrategy(Enum):
+    """How ``Chunker``s bound the size of a chunk."""
+
+    CHARS = "chars"
+    TOKENS = "tokens"
+
+
+class Chunker:
+    """Base class of the chunking strategies: cut a stream of text blocks into ``ChunkSpan``s.
+
+    Chunkers are sent to the parse worker processes, so they hold settings only
+    and must be picklable. ``tokenizer`` names the tokenizer that counts every
+    chunk's tokens (default ``KB_TOKENIZER``).
+    """
+
+    def __init__(self, size: int, overlap: int = 0, *, page_breaks: bool = True, tokenizer: str | None = None) -> None:
+        """Initialize a chunker of ``size`` units overlapping by ``overlap`` (see ``iter_chunks``)."""
+        self.size = size
+        self.overlap = overlap
+        self.page_breaks = page_breaks
+        self.tokenizer = tokenizer or default_tokenizer_name()
+
+    def __repr__(self) -> str:
+        """Return the chunker's settings."""
+        return (
+            f"{type(self).__name__}(size={self.size}, overlap={self.overlap}, "
+            f"page_breaks={self.page_breaks}, tokenizer={self.tokenizer!r})"
+        )
+
+    def chunks(self, blocks: Iterable[str], source: str) -> Iterator[ChunkSpan]:
+        """Yield the chunks of ``blocks`` read from ``source``, with their token counts."""
+        tokenizer = get_tokenizer(self.tokenizer)
+        for span in self._spans(blocks, source, tokenizer):
+            if span.tokens is None:
+                span.tokens = tokenizer.count(span.text)
+            yield span
+
+    @abstractmethod
+    def _spans(self, blocks: Iterable[str], source: str, tokenizer: Tokenizer) -> Iterator[ChunkSpan]: ...
+
+
+class CharChunker(Chunker):
+    """Chunks of at most ``size`` characters overlapping by at most ``overlap`` characters."""
+
+    def _spans(self, blocks: Iterable[str], source: str, tokenizer: Tokenizer) -> Iterator[ChunkSpan]:  # noqa: ARG002
+        return iter_chunks(blocks, source, self.size, self.overlap, page_breaks=self.page_breaks)
+
+
+class TokenChunker(Chunker):
+    """Chunks of at most ``size`` tokens overlapping by about ``overlap`` tokens, cut at the same boundaries."""
+
+    def _spans(self, blocks: Iterable[str], source: str, tokenizer: Tokenizer) -> Iterator[ChunkSpan]:
+        budget = TokenBudget(tokenizer.count, max(1, self.size), max(0, min(self.overlap, self.size // 2)))
+        max_chars = budget.max_tokens * _MAX_CHARS_PER_TOKEN
+        return iter_chunks(blocks, source, max_chars, page_breaks=self.page_breaks, budget=budget)
+
+
+def make_chunker(
+    strategy: ChunkStrategy,
+    size: int,
+    overlap: int,
+    *,
+    page_breaks: bool = True,
+    tokenizer: str | None = None,
+) -> Chunker:
+    """Return the chunker for ``strategy``, with ``size`` and ``overlap`` in its units."""
+    if strategy == ChunkStrategy.TOKENS:
+        return TokenChunker(size, overlap, page_breaks=page_breaks, tokenizer=tokenizer)
+    return CharChunker(size, overlap, page_breaks=page_breaks, tokenizer=tokenizer)
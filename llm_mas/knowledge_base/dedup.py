@@ -0,0 +1,123 @@
+"""Near-duplicate detection for chunks and diversification of query results.
+
+Index time: every chunk gets a 64-bit SimHash of its word 3-shingles. Chunks
+whose fingerprints differ in at most ``max_distance`` bits are near-duplicates
+(repeated headers, licence text, the overlap of neighbouring chunks). Text with
+no words (punctuation, rules, tables of symbols) has no fingerprint and is never
+a near-duplicate of anything.
+``SimHashIndex`` finds them without comparing against every stored chunk: the
+fingerprint is split into ``max_distance + 1`` bands, and by the pigeonhole
+principle two fingerprints that close agree exactly on at least one band.
+
+Query time: ``mmr`` re-selects a ranked candidate list by maximal marginal
+relevance, trading a little relevance for results that do not repeat each
+other, using the chunk embeddings already in the vector store.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+
+import numpy as np
+
+FINGERPRINT_BITS = 64
+SHINGLE_WORDS = 3
+
+_WORD = re.compile(r"\w+")
+
+
+def simhash(text: str) -> int | None:
+    """Return the 64-bit SimHash of the word 3-shingles of ``text`` (case-insensitive; None if it has no words)."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    shingles = [" ".join(words[i : i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))]
+    digests = b"".join(hashlib.blake2b(s.encode(), digest_size=FINGERPRINT_BITS // 8).digest() for s in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(shingles), -1), axis=1)
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    """Return the number of bits in which two fingerprints differ."""
+    return (a ^ b).bit_count()
+
+
+class SimHashIndex:
+    """Fingerprints keyed by record id, searchable for near-duplicates by band lookup."""
+
+    def __init__(self, max_distance: int = 3) -> None:
+        """Create an empty index matching fingerprints at most ``max_distance`` bits apart (0 to 15)."""
+        if not 0 <= max_distance < FINGERPRINT_BITS // 4:
+            msg = f"max_distance must be between 0 and {FINGERPRINT_BITS // 4 - 1}, got {max_distance}."
+            raise ValueError(msg)
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        self._bands = [(i * width, FINGERPRINT_BITS if i == bands - 1 else (i + 1) * width) for i in range(bands)]
+        self._fingerprints: dict[int, int] = {}
+        self._buckets: dict[tuple[int, int], set[int]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of indexed fingerprints."""
+        return len(self._fingerprints)
+
+    def _keys(self, fingerprint: int) -> list[tuple[int, int]]:
+        return [(i, (fingerprint >> lo) & ((1 << (hi - lo)) - 1)) for i, (lo, hi) in enumerate(self._bands)]
+
+    def add(self, record_id: int, fingerprint: int) -> None:
+        """Index ``fingerprint`` under ``record_id``."""
+        self._fingerprints[record_id] = fingerprint
+        for key in self._keys(fingerprint):
+            self._buckets.setdefault(key, set()).add(record_id)
+
+    def remove(self, record_ids: list[int]) -> None:
+        """Forget the given record ids; unknown ids are ignored."""
+        for record_id in record_ids:
+            fingerprint = self._fingerprints.pop(record_id, None)
+            if fingerprint is None:
+                continue
+            for key in self._keys(fingerprint):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(record_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def find(self, fingerprint: int) -> int | None:
+        """Return the id of the closest indexed fingerprint within ``max_distance`` bits, or None."""
+        best: tuple[int, int] | None = None
+        for key in self._keys(fingerprint):
+            for record_id in self._buckets.get(key, ()):
+                distance = hamming(fingerprint, self._fingerprints[record_id])
+                if distance <= self.max_distance and (best is None or (distance, record_id) < best):
+                    best = (distance, record_id)
+        return best[1] if best is not None else None
+
+
+def mmr(relevance: np.ndarray, vectors: np.ndarray, top_k: int, diversity: float) -> list[int]:
+    """Return the positions of ``top_k`` candidates chosen by maximal marginal relevance.
+
+    ``relevance`` holds one score per candidate (any scale; it is divided by the
+    best score) and ``vectors`` their unit-length embeddings. Each pick maximises
+    ``(1 - diversity) * relevance - diversity * max_similarity_to_picked``, so
+    ``diversity=0`` keeps the relevance order and the first pick is always the
+    most relevant candidate.
+    """
+    n = relevance.shape[0]
+    if n == 0 or top_k <= 0:
+        return []
+    rel = np.asarray(relevance, dtype=np.float64)
+    rel = rel / rel.max() if rel.max() > 0 else np.ones(n)
+    similarity = np.asarray(vectors, dtype=np.float32) @ np.asarray(vectors, dtype=np.float32).T
+    closest = np.zeros(n)
+    available = np.ones(n, dtype=bool)
+    picked: list[int] = []
+    for _ in range(min(top_k, n)):
+        scores = np.where(available, (1.0 - diversity) * rel - diversity * closest, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        closest = np.maximum(closest, similarity[best])
+    return picked
@@ -0,0 +1,274 @@
+"""Batched embedding client used by the knowledge base.
+
+Texts are split into fixed-size batches that are sent through the list-accepting
+``ollama.embed`` API (or the OpenAI ``embeddings.create`` batch input). A bounded
+number of batches is kept in flight on a small thread pool, and each batch is
+retried with exponential backoff. A batch that still fails does not sink the
+other batches of the same call; its slots are returned as ``None`` instead.
+
+Texts already in the embedding cache (see ``embedding_cache``) are not sent at
+all, and duplicate texts within a call are embedded once.
+
+Tuning (environment variables):
+- ``KB_EMBED_BATCH_SIZE``: texts per request (default 32).
+- ``KB_EMBED_CONCURRENCY``: maximum batches in flight (default 4).
+- ``KB_EMBED_RETRIES``: retries per batch after the first attempt (default 3).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import ollama
+from openai import AsyncOpenAI, OpenAI
+
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from llm_mas.knowledge_base.embedding_cache import EmbeddingCache
+
+_NO_BACKEND_MSG = (
+    "No embedding backend available. Install/launch Ollama with an embedding model, or set OPENAI_API_KEY."
+)
+
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    try:
+        return max(minimum, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+@dataclass
+class EmbeddingBatchResult:
+    """Outcome of ``EmbeddingProvider.embed_batches``."""
+
+    vectors: list[list[float] | None]
+    """One entry per input text; ``None`` where the text's batch failed after all retries."""
+    batches: int = 0
+    failed_batches: int = 0
+    cached: int = 0
+    """Texts served from the embedding cache without a request."""
+    seconds: float = 0.0
+    errors: list[Exception] = field(default_factory=list)
+
+    @property
+    def embedded(self) -> int:
+        """Return the number of texts that received an embedding."""
+        return sum(v is not None for v in self.vectors)
+
+    @property
+    def chunks_per_second(self) -> float:
+        """Return the embedding throughput of the call."""
+        return self.embedded / self.seconds if self.seconds > 0 else 0.0
+
+
+class EmbeddingProvider:
+    """Embedding provider with batched, bounded-concurrency requests."""
+
+    def __init__(
+        self,
+        model: str | None = None,
+        *,
+        batch_size: int | None = None,
+        max_in_flight: int | None = None,
+        max_retries: int | None = None,
+        cache: EmbeddingCache | None = None,
+    ) -> None:
+        """Initialize the provider.
+
+        Uses the local Ollama embedding model unless an explicit ``model`` is given
+        and ``OPENAI_API_KEY`` is set, in which case OpenAI is used. Embeddings are
+        looked up in and written to ``cache`` if one is given.
+        """
+        self._use_ollama = None
+
+        if not model:
+            model = os.getenv("OLLAMA_EMBED_MODEL", "mxbai-embed-large")
+            self._use_ollama = True
+        self.model = model
+
+        self.batch_size = batch_size or _env_int("KB_EMBED_BATCH_SIZE", 32)
+        self.max_in_flight = max_in_flight or _env_int("KB_EMBED_CONCURRENCY", 4)
+        self.max_retries = max_retries if max_retries is not None else _env_int("KB_EMBED_RETRIES", 3, minimum=0)
+        self.retry_backoff = 0.5
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+        self.cache = cache
+        # Moving average of query embedding latency, used by latency-budgeted KB queries
+        self.query_seconds: float | None = None
+        # Async clients hold connection pools bound to the event loop they were created on
+        self._async_clients: tuple[asyncio.AbstractEventLoop, ollama.AsyncClient | AsyncOpenAI] | None = None
+
+        # Optional OpenAI fallback if API key is available
+        self._openai_client = None
+        if not self._use_ollama and os.getenv("OPENAI_API_KEY"):
+            try:
+                self._openai_client = OpenAI()
+                # Default embedding model for OpenAI
+                if self.model in (None, "mxbai-embed-large"):
+                    self.model = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+            except (ValueError, RuntimeError):
+                self._openai_client = None
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """Return embeddings for a list of texts without retrying, re-raising the first failure.
+
+        Meant for latency-sensitive callers such as queries. Prefers Ollama local
+        embeddings; falls back to OpenAI if configured; otherwise raises.
+        """
+        result = self.embed_batches(texts, retries=0)
+        if result.errors:
+            raise result.errors[0]
+        return [v for v in result.vectors if v is not None]
+
+    async def aembed_texts(self, texts: list[str]) -> list[list[float]]:
+        """Async ``embed_texts``: embed uncached texts on the async client without blocking the loop.
+
+        All texts are sent in as few requests as the batch size allows, with at most
+        ``max_in_flight`` requests open at once. The first failure is re-raised.
+        """
+        if not texts:
+            return []
+        if not self._use_ollama and self._openai_client is None:
+            raise RuntimeError(_NO_BACKEND_MSG)
+        cached = (
+            await asyncio.to_thread(self.cache.get_many, self.cache_key, texts)
+            if self.cache is not None
+            else [None] * len(texts)
+        )
+        pending = list(dict.fromkeys(t for t, v in zip(texts, cached, strict=True) if v is None))
+        if pending:
+            limit = asyncio.Semaphore(self.max_in_flight)
+
+            async def run(batch: list[str]) -> list[list[float]]:
+                async with limit:
+                    return await self._aembed_batch(batch)
+
+            batches = [pending[i : i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            outcomes = await asyncio.gather(*(run(b) for b in batches))
+            embedded = dict(zip(pending, (v for vectors in outcomes for v in vectors), strict=True))
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put_many, self.cache_key, pending, list(embedded.values()))
+            cached = [v if v is not None else embedded[t] for t, v in zip(texts, cached, strict=True)]
+        return [v for v in cached if v is not None]
+
+    def record_query_latency(self, elapsed: float) -> None:
+        """Fold the latency of one query embedding call into ``query_seconds``."""
+        previous = self.query_seconds
+        self.query_seconds = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+
+    def embed_batches(self, texts: list[str], retries: int | None = None) -> EmbeddingBatchResult:
+        """Embed ``texts`` in batches, keeping at most ``max_in_flight`` requests open.
+
+        Failed batches are retried up to ``retries`` times (default ``max_retries``);
+        if they still fail their vectors are ``None`` and the remaining batches are
+        unaffected.
+        """
+        retries = self.max_retries if retries is None else retries
+        start = time.monotonic()
+        if not texts:
+            return EmbeddingBatchResult(vectors=[])
+        if not self._use_ollama and self._openai_client is None:
+            raise RuntimeError(_NO_BACKEND_MSG)
+
+        cached = self.cache.get_many(self.cache_key, texts) if self.cache is not None else [None] * len(texts)
+        # Embed each distinct uncached text once
+        pending = list(dict.fromkeys(t for t, v in zip(texts, cached, strict=True) if v is None))
+        spans = [(i, min(i + self.batch_size, len(pending))) for i in range(0, len(pending), self.batch_size)]
+        result = EmbeddingBatchResult(
+            vectors=list(cached),
+            batches=len(spans),
+            cached=len(texts) - sum(v is None for v in cached),
+        )
+        if len(spans) <= 1:
+            outcomes = [self._embed_with_retry(pending, retries)] if spans else []
+        else:
+            pool = self._get_pool()
+            outcomes = list(pool.map(lambda span: self._embed_with_retry(pending[span[0] : span[1]], retries), spans))
+        embedded: dict[str, list[float]] = {}
+        for (lo, hi), outcome in zip(spans, outcomes, strict=True):
+            if isinstance(outcome, Exception):
+                result.failed_batches += 1
+                result.errors.append(outcome)
+                continue
+            embedded.update(zip(pending[lo:hi], outcome, strict=True))
+        if embedded:
+            if self.cache is not None:
+                self.cache.put_many(self.cache_key, list(embedded), list(embedded.values()))
+            result.vectors = [v if v is not None else embedded.get(t) for t, v in zip(texts, cached, strict=True)]
+        result.seconds = time.monotonic() - start
+        return result
+
+    @property
+    def cache_key(self) -> str:
+        """Return the model identity that cached embeddings are stored under."""
+        backend = "ollama" if self._use_ollama else "openai"
+        return f"{backend}:{self.model}"
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="kb-embed")
+            return self._pool
+
+    def _embed_with_retry(self, batch: list[str], retries: int) -> list[list[float]] | Exception:
+        """Embed one batch, retrying with exponential backoff; returns the last error on failure."""
+        last_exc: Exception = RuntimeError("embedding batch was never attempted")
+        for attempt in range(retries + 1):
+            try:
+                return self._embed_batch(batch)
+            except Exception as exc:  # noqa: BLE001
+                last_exc = exc
+                if attempt < retries:
+                    delay = self.retry_backoff * (2**attempt)
+                    APP_LOGGER.warning(
+                        "Embedding batch of %d failed (attempt %d/%d): %s; retrying in %.1fs",
+                        len(batch),
+                        attempt + 1,
+                        retries + 1,
+                        exc,
+                        delay,
+                    )
+                    time.sleep(delay)
+        if retries:
+            APP_LOGGER.warning("Embedding batch of %d failed permanently: %s", len(batch), last_exc)
+        return last_exc
+
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        """Send a single batched embedding request."""
+        if self._use_ollama:
+            return _ollama_vectors(ollama.embed(model=self.model, input=batch), len(batch))
+
+        # OpenAI new API: client.embeddings.create
+        resp = self._openai_client.embeddings.create(model=str(self.model), input=batch)
+        return [[float(v) for v in item.embedding] for item in resp.data]
+
+    async def _aembed_batch(self, batch: list[str]) -> list[list[float]]:
+        """Send a single batched embedding request on the async client."""
+        client = self._async_client()
+        if isinstance(client, ollama.AsyncClient):
+            return _ollama_vectors(await client.embed(model=self.model, input=batch), len(batch))
+        resp = await client.embeddings.create(model=str(self.model), input=batch)
+        return [[float(v) for v in item.embedding] for item in resp.data]
+
+    def _async_client(self) -> ollama.AsyncClient | AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        if self._async_clients is None or self._async_clients[0] is not loop:
+            client = ollama.AsyncClient() if self._use_ollama else AsyncOpenAI()
+            self._async_clients = (loop, client)
+        return self._async_clients[1]
+
+
+def _ollama_vectors(resp: ollama.EmbedResponse, expected: int) -> list[list[float]]:
+    vectors = resp.get("embeddings")
+    if not isinstance(vectors, list) or len(vectors) != expected:
+        msg = "Invalid embedding response from Ollama."
+        raise TypeError(msg)
+    return [[float(v) for v in vec] for vec in vectors]
@@ -0,0 +1,216 @@
+"""Persistent, content-addressed embedding cache.
+
+Embeddings are stored in SQLite keyed by ``(model, sha256(text))`` as raw float32
+blobs, so identical chunks (overlaps, files copied between folders, re-ingested
+folders) and repeated questions are embedded once per model, across sessions.
+
+The cache is bounded: when the stored vectors exceed the size cap, the least
+recently used entries are evicted. Hits and misses are counted per process and
+reported by ``stats``.
+
+Configuration (environment variables):
+- ``KB_EMBED_CACHE``: path of the SQLite file (default ``./kb_embed_cache.sqlite3``);
+  ``off`` disables the cache.
+- ``KB_EMBED_CACHE_MAX_MB``: size cap of the stored vectors in MiB (default 512).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    vector BLOB NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (model, digest)
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+_LOOKUP_CHUNK = 500
+"""Keys per ``IN (...)`` lookup, well below SQLite's bound-parameter limit."""
+
+_EVICT_TARGET = 0.9
+"""Fraction of the size cap to shrink to when evicting, so eviction is not triggered on every insert."""
+
+
+def text_digest(text: str) -> bytes:
+    """Return the cache key of ``text``."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+@dataclass
+class EmbeddingCacheStats:
+    """Counters of an ``EmbeddingCache``; hits, misses and evictions are counted since it was opened."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Return the fraction of lookups served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of embedding vectors."""
+
+    def __init__(self, path: str | Path, max_bytes: int = 512 * 1024 * 1024) -> None:
+        """Create a cache at ``path``; the database is opened on first use."""
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._conn: sqlite3.Connection | None = None
+        self._disabled = False
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = EmbeddingCacheStats()
+
+    @staticmethod
+    def from_env() -> EmbeddingCache | None:
+        """Build the cache configured by ``KB_EMBED_CACHE`` / ``KB_EMBED_CACHE_MAX_MB``, or None if disabled."""
+        location = os.getenv("KB_EMBED_CACHE", "kb_embed_cache.sqlite3")
+        if location.strip().lower() in {"", "0", "off", "false", "none"}:
+            return None
+        try:
+            max_mb = float(os.getenv("KB_EMBED_CACHE_MAX_MB", "512"))
+        except ValueError:
+            max_mb = 512.0
+        return EmbeddingCache(Path(location).expanduser(), max_bytes=int(max_mb * 1024 * 1024))
+
+    def get_many(self, model: str, texts: Sequence[str]) -> list[list[float] | None]:
+        """Return the cached embedding of each text (``None`` where missing) and refresh their recency."""
+        digests = [text_digest(t) for t in texts]
+        found: dict[bytes, list[float]] = {}
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                unique = list(dict.fromkeys(digests))
+                for lo in range(0, len(unique), _LOOKUP_CHUNK):
+                    keys = unique[lo : lo + _LOOKUP_CHUNK]
+                    placeholders = ",".join("?" * len(keys))
+                    rows = conn.execute(
+                        f"SELECT digest, vector FROM embeddings WHERE model = ? AND digest IN ({placeholders})",  # noqa: S608
+                        [model, *keys],
+                    ).fetchall()
+                    found.update((bytes(d), np.frombuffer(v, dtype=np.float32).tolist()) for d, v in rows)
+                if found:
+                    now = time.time_ns()
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND digest = ?",
+                        [(now, model, d) for d in found],
+                    )
+                    conn.commit()
+            out = [found.get(d) for d in digests]
+            hits = sum(v is not None for v in out)
+            self._stats.hits += hits
+            self._stats.misses += len(out) - hits
+        return out
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store embeddings, evicting least recently used entries past the size cap."""
+        now = time.time_ns()
+        rows = [
+            (model, text_digest(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors, strict=True)
+        ]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            for _, digest, blob, _ in rows:
+                old = conn.execute(
+                    "SELECT LENGTH(vector) FROM embeddings WHERE model = ? AND digest = ?",
+                    (model, digest),
+                ).fetchone()
+                self._bytes += len(blob) - (old[0] if old else 0)
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            if self._bytes > self.max_bytes:
+                self._evict(conn)
+            conn.commit()
+
+    def stats(self) -> EmbeddingCacheStats:
+        """Return a snapshot of the counters, including the current number of entries and bytes."""
+        with self._lock:
+            conn = self._connect()
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] if conn is not None else 0
+            return EmbeddingCacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                entries=int(entries),
+                bytes=self._bytes,
+            )
+
+    def clear(self) -> None:
+        """Delete every cached embedding."""
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                conn.execute("DELETE FROM embeddings")
+                conn.commit()
+            self._bytes = 0
+
+    def close(self) -> None:
+        """Close the database connection; it is reopened on next use."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self) -> sqlite3.Connection | None:
+        """Open the database on first use; returns None (cache disabled) if it cannot be opened."""
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._bytes = int(conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0])
+        except (OSError, sqlite3.Error) as exc:
+            APP_LOGGER.warning("Embedding cache %s is unavailable (%s); embedding without cache.", self.path, exc)
+            self._disabled = True
+            return None
+        self._conn = conn
+        return conn
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        target = int(self.max_bytes * _EVICT_TARGET)
+        while self._bytes > target:
+            victims = conn.execute(
+                "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 256",
+            ).fetchall()
+            if not victims:
+                self._bytes = 0
+                return
+            doomed = []
+            for rowid, size in victims:
+                doomed.append((rowid,))
+                self._bytes -= size
+                if self._bytes <= target:
+                    break
+            conn.executemany("DELETE FROM embeddings WHERE rowid = ?", doomed)
+            self._stats.evictions += len(doomed)
@@ -2,54 +2,130 @@
 
 This module provides a lightweight vector store with:
 - Simple text chunking
-- Embeddings via Ollama (local) when available, optional OpenAI fallback
-- JSON persistence on disk
-- Cosine similarity search
+- Batched embeddings via Ollama (local) when available, optional OpenAI fallback (see ``embedder``),
+  behind a persistent content-addressed embedding cache (see ``embedding_cache``)
+- Binary persistence on disk with memory-mapped embeddings; saves append a committed
+  segment and segments are compacted in the background (see ``storage``). Several
+  processes can share a knowledge base through the SQLite backend instead (see ``sqlite_store``)
+- Cosine similarity search over a contiguous float32 matrix (see ``vector_store``)
+- An optional IVF approximate-nearest-neighbour index for large corpora (see ``ann``)
+- Optional float16 / int8 / product-quantised codes for the scan (see ``quantization``)
+- A BM25 inverted index over chunk text for lexical and hybrid queries (see ``lexical``)
 
 Notes:
-- Default storage path: ``kb_index.json`` in the current working directory.
+- Default storage path: the ``kb_index/`` directory in the current working directory.
+  A legacy ``kb_index.json`` next to it is migrated on first open.
+- The index is opened lazily on first use, so constructing a KnowledgeBase is cheap, and
+  ``unload`` releases it again. Named collections are managed by ``registry``.
+- ``query`` modes: ``vector`` (default, ``KB_QUERY_MODE``), ``lexical`` (no embedding
+  call) and ``hybrid`` (reciprocal rank fusion of both rankings).
+- Every chunk records its root, path, suffix, ingestion time and page; ``query(where=...)``
+  narrows the candidates through secondary indexes over them (see ``metadata``).
+- Once the index holds ``KB_ANN_MIN_ROWS`` chunks (default 50000; 0 disables), queries
+  scan only the ``KB_ANN_NPROBE`` (default 16) nearest IVF cells. Use
+  ``KnowledgeBase.ann_recall_report`` to pick ``nprobe`` for a corpus.
+- ``KB_QUANTIZATION`` (``none``, ``float16``, ``int8`` or ``pq``; default ``none``) makes
+  searches scan compact codes and re-rank the best ``top_k * KB_RERANK_FACTOR``
+  (default 4; 0 disables) candidates exactly. Codes are (re)built after indexing and
+  by ``compact``; ``KnowledgeBase.quantization_report`` measures the recall cost.
+- A new base is compacted after ``KB_COMPACT_SEGMENTS`` (default 8) segments.
+- Files are read and chunked as streams (see ``chunking``); chunks are verbatim spans
+  of the extracted text. Records keep the offset and length of their chunk and each
+  source's text is held once (``SourceText``), so the overlap between consecutive
+  chunks is not duplicated in memory; persisted records store it as an offset too.
+- Plain-text files are chunked as they are read and embedded and stored a batch at a
+  time, so their size is not limited. PDF, DOCX, HTML and RTF files are parsed whole
+  in a worker process; those above ``KB_MAX_FILE_BYTES`` (default 64 MiB; 0 disables
+  the cap) are skipped.
+- Folder indexing parses files in ``KB_INGEST_WORKERS`` processes (default: up to 4;
+  0 parses on threads) while earlier files are embedded and stored.
+- ``KB_CHUNK_STRATEGY`` selects ``chars`` (default; ``KB_CHUNK_SIZE`` / ``KB_CHUNK_OVERLAP``
+  characters) or ``tokens`` (``KB_CHUNK_TOKENS`` / ``KB_CHUNK_OVERLAP_TOKENS``, default
+  512 / 64, tokens of ``KB_TOKENIZER``; see ``tokens``). Chunks of paged formats end at
+  page breaks unless ``KB_CHUNK_PAGE_BREAKS=0``. Index reports and query results carry
+  token counts.
+- Chunks carry a SimHash fingerprint. With ``KB_DEDUP_DISTANCE`` set to 0-15, a chunk
+  within that many bits of a stored chunk is not stored again but linked to it (see
+  ``dedup``); chunks without words are always stored. The default (-1) stores every
+  chunk. ``KB_MMR_DIVERSITY`` (0 to 1; default 0, the plain ranking) diversifies
+  query results by maximal marginal relevance with that weight; the ``RetrieveKnowledge``
+  action defaults to 0.2 instead.
+- Query results are cached per knowledge base and dropped whenever its ``generation``
+  changes (see ``query_cache``).
 
 """
 
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import itertools
 import json
 import logging
-import math
+import multiprocessing
+import operator
 import os
 import re
+import threading
 import time
 from collections import deque
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from enum import Enum, auto
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
-import docx
-import ollama
-import pypdf
-from bs4 import BeautifulSoup
-from openai import OpenAI
-
+import numpy as np
+
+from llm_mas.knowledge_base.ann import IVFIndex, RecallReport, evaluate_recall
+from llm_mas.knowledge_base.chunking import (
+    PLAIN_TEXT_SUFFIXES,
+    Chunker,
+    ChunkSpan,
+    ChunkStrategy,
+    SourceText,
+    iter_text,
+    make_chunker,
+)
+from llm_mas.knowledge_base.dedup import SimHashIndex, mmr, simhash
+from llm_mas.knowledge_base.embedder import EmbeddingBatchResult, EmbeddingProvider
+from llm_mas.knowledge_base.embedding_cache import EmbeddingCache, EmbeddingCacheStats
+from llm_mas.knowledge_base.lexical import BM25Index, reciprocal_rank_fusion
+from llm_mas.knowledge_base.metadata import MetadataIndex
+from llm_mas.knowledge_base.quantization import (
+    PQQuantizer,
+    QuantizationMode,
+    QuantizationReport,
+    Quantizer,
+    benchmark_quantization,
+    make_quantizer,
+)
+from llm_mas.knowledge_base.query_cache import QueryCache, QueryCacheStats, QueryKey, filter_key, normalise_query
+from llm_mas.knowledge_base.storage import (
+    BaseSnapshot,
+    IndexFormatError,
+    Segment,
+    has_index,
+    last_segment,
+    migrate_legacy_index,
+    read_ann,
+    read_index,
+    read_lexical,
+    read_manifest,
+    read_quant,
+    read_segments,
+    resolve_base,
+    write_base,
+    write_segment,
+)
+from llm_mas.knowledge_base.tokens import get_tokenizer
+from llm_mas.knowledge_base.vector_store import VectorStore
 from llm_mas.logging.loggers import APP_LOGGER
 
 if TYPE_CHECKING:
     import logging
-
-
-def _cosine_similarity(a: list[float], b: list[float]) -> float:
-    """Compute cosine similarity between two vectors.
-
-    Returns 0.0 if either vector has zero magnitude or dimensions mismatch.
-    """
-    if not a or not b or len(a) != len(b):
-        return 0.0
-    dot = sum(x * y for x, y in zip(a, b, strict=True))
-    na = math.sqrt(sum(x * x for x in a))
-    nb = math.sqrt(sum(y * y for y in b))
-    if na == 0.0 or nb == 0.0:
-        return 0.0
-    return dot / (na * nb)
+    from collections.abc import AsyncIterator, Callable, Iterable, Iterator
 
 
 def _fixed_size_chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
@@ -204,56 +280,8 @@ def _semantic_chunk_text(
     return chunks
 
 
-def _read_plain_text(path: Path) -> str:
-    try:
-        return path.read_text(encoding="utf-8")
-    except UnicodeDecodeError:
-        return path.read_text(encoding="latin-1")
-
-
-def _read_pdf(path: Path) -> str:
-    reader = pypdf.PdfReader(str(path))
-    texts = [page.extract_text() or "" for page in reader.pages]
-    return "\n".join(texts)
-
-
-def _read_docx(path: Path) -> str:
-    document = docx.Document(str(path))
-    return "\n".join(p.text for p in document.paragraphs)
-
-
-def _read_html(path: Path) -> str:
-    html = path.read_text(encoding="utf-8", errors="ignore")
-    soup = BeautifulSoup(html, "html.parser")
-    return soup.get_text(separator="\n")
-
-
-def _read_rtf(path: Path) -> str:
-    content = path.read_text(encoding="latin-1", errors="ignore")
-    content = re.sub(r"\\[a-zA-Z]+-?\d* ?", "", content)
-    return content.replace("{", "").replace("}", "")
-
-
-def _read_text_file(path: Path) -> str:
-    """Extract text content from a supported file (plain, PDF, DOCX, HTML, RTF)."""
-    suffix = path.suffix.lower()
-    if suffix in {".txt", ".md", ".py", ".json", ".csv", ".yaml", ".yml", ".toml"}:
-        return _read_plain_text(path)
-    if suffix == ".pdf":
-        return _read_pdf(path)
-    if suffix == ".docx":
-        return _read_docx(path)
-    if suffix in {".html", ".htm"}:
-        return _read_html(path)
-    if suffix == ".rtf":
-        return _read_rtf(path)
-    msg = f"Unsupported file type: {suffix}"
-    raise ValueError(msg)
-
-
-def _is_supported_file(path: Path) -> bool:
-    """Return True if the file suffix is supported for indexing."""
-    allowed = {
+SUPPORTED_SUFFIXES = frozenset(
+    {
         ".txt",
         ".md",
         ".py",
@@ -267,234 +295,1270 @@ def _is_supported_file(path: Path) -> bool:
         ".html",
         ".htm",
         ".rtf",
-    }
-    return path.is_file() and path.suffix.lower() in allowed
+    },
+)
 
 
-class _EmbeddingProvider:
-    """Simple embedding provider abstraction."""
+def _is_supported_file(path: Path) -> bool:
+    """Return True if the file suffix is supported for indexing."""
+    return path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES
 
-    def __init__(self, model: str | None = None) -> None:
-        self._use_ollama = None
 
-        if not model:
-            model = os.getenv("OLLAMA_EMBED_MODEL", "mxbai-embed-large")
-            self._use_ollama = True
-        self.model = model
+def _streams_text(path: Path) -> bool:
+    """Return True if ``path`` is chunked as it is read rather than parsed whole."""
+    return path.suffix.lower() in PLAIN_TEXT_SUFFIXES
 
-        # Optional OpenAI fallback if API key is available
-        self._openai_client = None
-        if not self._use_ollama and os.getenv("OPENAI_API_KEY"):
-            try:
-                self._openai_client = OpenAI()
-                # Default embedding model for OpenAI
-                if self.model in (None, "mxbai-embed-large"):
-                    self.model = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
-            except (ValueError, RuntimeError):
-                self._openai_client = None
 
-    def embed_texts(self, texts: list[str]) -> list[list[float]]:
-        """Return embeddings for a list of texts.
+def _max_file_bytes() -> int:
+    """Return ``KB_MAX_FILE_BYTES``, the size above which parsed-whole files are skipped (0 disables the cap)."""
+    return int(os.getenv("KB_MAX_FILE_BYTES", str(64 * 1024 * 1024)))
 
-        Prefers Ollama local embeddings; falls back to OpenAI if configured; otherwise raises.
-        """
-        if not texts:
-            return []
 
-        if self._use_ollama:
-            # Ollama API accepts one prompt at a time; batch sequentially
-            embeddings: list[list[float]] = []
-            for t in texts:
-                resp = ollama.embeddings(model=self.model, prompt=t)
-                vec = resp.get("embedding")
-                if not isinstance(vec, list):
-                    msg = "Invalid embedding response from Ollama."
-                    raise TypeError(msg)
-                embeddings.append([float(v) for v in vec])
-            return embeddings
+def _wanted_file(path: Path, max_file_bytes: int) -> bool:
+    """Return True if ``path`` is a supported file that is streamed or within the size cap."""
+    if not _is_supported_file(path):
+        return False
+    if not max_file_bytes or _streams_text(path):
+        return True
+    try:
+        return path.stat().st_size <= max_file_bytes
+    except OSError:  # pragma: no cover
+        return False
+
+
+def _chunk_settings() -> tuple[int, int]:
+    """Return ``(max_chunk_size, chunk_overlap)`` from ``KB_CHUNK_SIZE`` / ``KB_CHUNK_OVERLAP``."""
+    try:
+        max_chunk_size = int(os.getenv("KB_CHUNK_SIZE", "1000"))
+    except ValueError:
+        max_chunk_size = 1000
+    try:
+        chunk_overlap = int(os.getenv("KB_CHUNK_OVERLAP", "200"))
+    except ValueError:
+        chunk_overlap = 200
+    return max_chunk_size, chunk_overlap
+
+
+def _token_chunk_settings() -> tuple[int, int]:
+    """Return ``(max_tokens, overlap_tokens)`` from ``KB_CHUNK_TOKENS`` / ``KB_CHUNK_OVERLAP_TOKENS``."""
+    try:
+        max_tokens = max(1, int(os.getenv("KB_CHUNK_TOKENS", "512")))
+    except ValueError:
+        max_tokens = 512
+    try:
+        overlap_tokens = max(0, int(os.getenv("KB_CHUNK_OVERLAP_TOKENS", "64")))
+    except ValueError:
+        overlap_tokens = 64
+    return max_tokens, overlap_tokens
+
+
+def _default_chunker() -> Chunker:
+    """Return the chunker configured by ``KB_CHUNK_STRATEGY``, its size settings and ``KB_CHUNK_PAGE_BREAKS``."""
+    try:
+        strategy = ChunkStrategy(os.getenv("KB_CHUNK_STRATEGY", "chars").strip().lower())
+    except ValueError:
+        strategy = ChunkStrategy.CHARS
+    size, overlap = _token_chunk_settings() if strategy == ChunkStrategy.TOKENS else _chunk_settings()
+    page_breaks = os.getenv("KB_CHUNK_PAGE_BREAKS", "1").strip().lower() not in {"0", "false", "no", "off"}
+    return make_chunker(strategy, size, overlap, page_breaks=page_breaks)
+
+
+def _ann_settings() -> tuple[int, int]:
+    """Return ``(min_rows, nprobe)`` from ``KB_ANN_MIN_ROWS`` / ``KB_ANN_NPROBE``."""
+    try:
+        min_rows = max(0, int(os.getenv("KB_ANN_MIN_ROWS", "50000")))
+    except ValueError:
+        min_rows = 50000
+    try:
+        nprobe = max(1, int(os.getenv("KB_ANN_NPROBE", "16")))
+    except ValueError:
+        nprobe = 16
+    return min_rows, nprobe
+
 
-        if self._openai_client is not None:
-            # OpenAI new API: client.embeddings.create
-            resp = self._openai_client.embeddings.create(model=str(self.model), input=texts)
-            return [[float(v) for v in item.embedding] for item in resp.data]
+def _quant_settings() -> tuple[QuantizationMode, int]:
+    """Return ``(mode, rerank_factor)`` from ``KB_QUANTIZATION`` / ``KB_RERANK_FACTOR``."""
+    try:
+        mode = QuantizationMode(os.getenv("KB_QUANTIZATION", "none").strip().lower())
+    except ValueError:
+        mode = QuantizationMode.NONE
+    try:
+        rerank = max(0, int(os.getenv("KB_RERANK_FACTOR", "4")))
+    except ValueError:
+        rerank = 4
+    return mode, rerank
 
-        msg = "No embedding backend available. Install/launch Ollama with an embedding model, or set OPENAI_API_KEY."
-        raise RuntimeError(msg)
+
+def _compact_segments() -> int:
+    """Return the number of segments that triggers a compaction (``KB_COMPACT_SEGMENTS``)."""
+    try:
+        return max(1, int(os.getenv("KB_COMPACT_SEGMENTS", "8")))
+    except ValueError:
+        return 8
+
+
+def _dedup_distance() -> int | None:
+    """Return ``KB_DEDUP_DISTANCE``, the SimHash distance of near-duplicate chunks, or None when disabled."""
+    try:
+        distance = int(os.getenv("KB_DEDUP_DISTANCE", "-1"))
+    except ValueError:
+        distance = -1
+    return min(distance, 15) if distance >= 0 else None
+
+
+def _mmr_diversity() -> float:
+    """Return ``KB_MMR_DIVERSITY``, the weight of result diversity against relevance (0 to 1)."""
+    try:
+        return min(1.0, max(0.0, float(os.getenv("KB_MMR_DIVERSITY", "0"))))
+    except ValueError:
+        return 0.0
+
+
+def _extract_chunks(p: Path, chunker: Chunker) -> list[ChunkSpan] | None:
+    """Parse and chunk a whole file in a worker process; returns None if it is unreadable.
+
+    Used for the formats that are not streamed (see ``_streams_text``): the chunks
+    are sent back to the ingesting process as one list.
+    """
+    try:
+        return list(chunker.chunks(iter_text(p), str(p)))
+    except (OSError, UnicodeDecodeError, ValueError) as exc:
+        APP_LOGGER.warning("Skipping unreadable file %s: %s", p, exc)
+        return None
+
+
+def _stream_chunks(p: Path, chunker: Chunker) -> Iterator[ChunkSpan]:
+    """Yield the chunks of a streamed file as its text is read (see ``_streams_text``)."""
+    yield from chunker.chunks(iter_text(p), str(p))
+
+
+def _hash_file(path: Path) -> str:
+    """Return the SHA-256 hex digest of a file's bytes, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 
 @dataclass
 class _KBRecord:
-    """A single chunk record in the vector store."""
+    """Metadata for a single chunk; its embedding is the matching row of the vector store."""
 
     id: int
     source_path: str
     chunk_id: int
-    text: str
-    embedding: list[float]
-
-    def to_json(self) -> dict[str, Any]:
+    stored_text: str
+    """The chunk's text, or "" once ``source_text`` holds it."""
+    offset: int | None = None
+    """Character offset of the chunk in its source's extracted text (None for legacy records)."""
+    root: str | None = None
+    """Folder (or file) whose indexing run added the chunk."""
+    ingested_at: float | None = None
+    """Epoch seconds at which the chunk was stored."""
+    page: int | None = None
+    """1-based page the chunk starts on, for paged formats."""
+    simhash: int | None = None
+    """SimHash fingerprint of the text, used to find near-duplicate chunks (None for legacy records)."""
+    length: int | None = None
+    """Number of characters of the chunk, once its text is held by ``source_text``."""
+    source_text: SourceText | None = field(default=None, repr=False, compare=False)
+
+    @property
+    def text(self) -> str:
+        """Return the chunk's text."""
+        if self.source_text is not None and self.offset is not None and self.length is not None:
+            return self.source_text.slice(self.offset, self.length)
+        return self.stored_text
+
+    @property
+    def suffix(self) -> str:
+        """Return the lower-case suffix of the source file."""
+        return Path(self.source_path).suffix.lower()
+
+    def filter_fields(self) -> dict[str, Any]:
+        """Return the values the metadata index filters on (see ``metadata.FILTER_FIELDS``)."""
         return {
-            "id": self.id,
-            "source_path": self.source_path,
-            "chunk_id": self.chunk_id,
-            "text": self.text,
-            "embedding": self.embedding,
+            "root": self.root,
+            "path": self.source_path,
+            "suffix": self.suffix,
+            "ingested_at": self.ingested_at,
+            "page": self.page,
         }
 
+    def to_json(self, previous: _KBRecord | None = None) -> dict[str, Any]:
+        """Serialize the record; text shared with ``previous`` (the preceding chunk) is stored as an offset."""
+        d: dict[str, Any] = {"id": self.id, "source_path": self.source_path, "chunk_id": self.chunk_id}
+        optional = (
+            ("root", self.root),
+            ("ingested_at", self.ingested_at),
+            ("page", self.page),
+            ("simhash", self.simhash),
+        )
+        d.update((k, v) for k, v in optional if v is not None)
+        if self.offset is None:
+            d["text"] = self.text
+            return d
+        shared = 0
+        if (
+            previous is not None
+            and previous.offset is not None
+            and previous.source_path == self.source_path
+            and previous.offset <= self.offset < previous.offset + len(previous.text)
+        ):
+            overlap = previous.text[self.offset - previous.offset :]
+            if self.text.startswith(overlap):
+                shared = len(overlap)
+        d.update(offset=self.offset, length=len(self.text), text=self.text[shared:])
+        return d
+
     @staticmethod
-    def from_json(d: dict[str, Any]) -> _KBRecord:
+    def from_json(d: dict[str, Any], previous: _KBRecord | None = None) -> _KBRecord:
+        """Rebuild a record serialized by ``to_json`` with the same ``previous`` record."""
+        text = str(d["text"])
+        offset = d.get("offset")
+        if offset is not None and (shared := int(d["length"]) - len(text)) > 0:
+            start = int(offset) - previous.offset if previous is not None and previous.offset is not None else -1
+            if previous is None or previous.source_path != d["source_path"] or start < 0:
+                msg = f"Record {d['id']} shares text with a preceding chunk that is missing."
+                raise ValueError(msg)
+            text = previous.text[start : start + shared] + text
+            if len(text) != int(d["length"]):
+                msg = f"Record {d['id']} is longer than the text it shares with the preceding chunk."
+                raise ValueError(msg)
         return _KBRecord(
             id=int(d["id"]),
             source_path=str(d["source_path"]),
             chunk_id=int(d["chunk_id"]),
-            text=str(d["text"]),
-            embedding=[float(x) for x in d["embedding"]],
+            stored_text=text,
+            offset=int(offset) if offset is not None else None,
+            root=str(d["root"]) if d.get("root") is not None else None,
+            ingested_at=float(d["ingested_at"]) if d.get("ingested_at") is not None else None,
+            page=int(d["page"]) if d.get("page") is not None else None,
+            simhash=int(d["simhash"]) if d.get("simhash") is not None else None,
+        )
+
+
+def _records_to_json(records: list[_KBRecord]) -> list[dict[str, Any]]:
+    """Serialize consecutive records, storing each chunk's overlap with its predecessor only once."""
+    return [r.to_json(records[i - 1] if i else None) for i, r in enumerate(records)]
+
+
+def _records_from_json(rows: list[dict[str, Any]]) -> list[_KBRecord]:
+    """Rebuild records serialized by ``_records_to_json``."""
+    records: list[_KBRecord] = []
+    for row in rows:
+        records.append(_KBRecord.from_json(row, records[-1] if records else None))
+    return records
+
+
+def _hold_text(record: _KBRecord, texts: dict[str, SourceText]) -> None:
+    """Move the text of a record with an offset into its source's entry of ``texts``.
+
+    Consecutive chunks of a source then share their overlap. A chunk that does not
+    continue the source's text (an earlier offset or different content) starts a
+    new ``SourceText``; records already holding the old one keep it.
+    """
+    if record.offset is None or record.source_text is not None:
+        return
+    text = record.stored_text
+    held = texts.get(record.source_path)
+    if held is None or not held.add(record.offset, text):
+        held = texts[record.source_path] = SourceText()
+        held.add(record.offset, text)
+    record.length, record.source_text = len(text), held
+    record.stored_text = ""
+
+
+@dataclass
+class _ManifestEntry:
+    """Fingerprint of an indexed source file, used to skip unchanged files on re-index."""
+
+    mtime: float
+    size: int
+    sha256: str
+    chunks: int
+    linked: list[int] = field(default_factory=list)
+    """Ids of other files' chunks stored in place of near-duplicate chunks of this file."""
+
+    def to_json(self) -> dict[str, Any]:
+        d: dict[str, Any] = {"mtime": self.mtime, "size": self.size, "sha256": self.sha256, "chunks": self.chunks}
+        if self.linked:
+            d["linked"] = self.linked
+        return d
+
+    @staticmethod
+    def from_json(d: dict[str, Any]) -> _ManifestEntry:
+        return _ManifestEntry(
+            mtime=float(d["mtime"]),
+            size=int(d["size"]),
+            sha256=str(d["sha256"]),
+            chunks=int(d.get("chunks", 0)),
+            linked=[int(i) for i in d.get("linked", ())],
         )
 
 
+def _fingerprint_file(p: Path) -> _ManifestEntry | None:
+    """Return a fresh manifest entry for ``p``, or None if it cannot be read."""
+    try:
+        st = p.stat()
+        return _ManifestEntry(mtime=st.st_mtime, size=st.st_size, sha256=_hash_file(p), chunks=0)
+    except OSError:
+        return None
+
+
+class _FileStatus(Enum):
+    """How a scanned file compares with the manifest."""
+
+    NEW = auto()
+    CHANGED = auto()
+    UNCHANGED = auto()
+
+
+@dataclass
+class IndexReport:
+    """Summary of a single ``KnowledgeBase.index_path`` run."""
+
+    files_scanned: int = 0
+    files_indexed: int = 0
+    """Files that were not in the index before."""
+    files_updated: int = 0
+    """Files whose content changed and whose chunks were replaced."""
+    files_skipped: int = 0
+    """Files whose content was unchanged since the last run."""
+    files_removed: int = 0
+    """Previously indexed files under the root that no longer exist."""
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    chunks_cached: int = 0
+    """Added chunks whose embedding was served by the embedding cache."""
+    chunks_deduplicated: int = 0
+    """Chunks not stored because a near-duplicate chunk was already indexed."""
+    tokens_embedded: int = 0
+    """Tokens (see ``tokens``) in the chunks embedded, including deduplicated ones."""
+    max_chunk_tokens: int = 0
+    """Tokens in the largest chunk embedded."""
+    embed_seconds: float = 0.0
+    """Wall-clock time spent waiting on the embedding backend."""
+    scan_seconds: float = 0.0
+    """Wall-clock time spent enumerating the files under the path."""
+
+    @property
+    def chunks_per_second(self) -> float:
+        """Return the embedding throughput of the run."""
+        return self.chunks_added / self.embed_seconds if self.embed_seconds > 0 else 0.0
+
+    @property
+    def tokens_per_chunk(self) -> float:
+        """Return the mean number of tokens in the chunks embedded."""
+        embedded = self.chunks_added + self.chunks_deduplicated
+        return self.tokens_embedded / embedded if embedded else 0.0
+
+
+class QueryMode(Enum):
+    """How ``KnowledgeBase.query`` ranks chunks."""
+
+    VECTOR = "vector"
+    """Cosine similarity of embeddings."""
+    LEXICAL = "lexical"
+    """BM25 over the chunk text; needs no embedding call."""
+    HYBRID = "hybrid"
+    """Reciprocal rank fusion of the vector and lexical rankings."""
+
+
+def _default_query_mode() -> QueryMode:
+    try:
+        return QueryMode(os.getenv("KB_QUERY_MODE", QueryMode.VECTOR.value).lower())
+    except ValueError:
+        return QueryMode.VECTOR
+
+
+_HYBRID_CANDIDATES = 20
+"""Minimum number of candidates taken from each ranking before fusion."""
+
+_MMR_POOL = 4
+"""Candidates considered per requested result when diversifying."""
+
+
+def _candidate_count(mode: QueryMode, top_k: int, diversity: float = 0.0) -> int:
+    """Return how many hits to take from each ranking before they are combined and diversified."""
+    k = max(_HYBRID_CANDIDATES, top_k * 4) if mode == QueryMode.HYBRID else top_k
+    return max(k, top_k * _MMR_POOL) if diversity > 0 else k
+
+
+def _rank(
+    mode: QueryMode,
+    top_k: int,
+    vector: list[tuple[_KBRecord, float]] | None,
+    lexical: list[tuple[_KBRecord, float]],
+) -> list[tuple[_KBRecord, float]]:
+    """Combine the rankings of ``mode``; ``vector`` is None if the embedding call failed."""
+    if vector is None or mode == QueryMode.LEXICAL:
+        return lexical[:top_k]
+    if mode == QueryMode.VECTOR:
+        return vector[:top_k]
+    by_id = {r.id: r for r, _ in lexical} | {r.id: r for r, _ in vector}
+    fused = reciprocal_rank_fusion([[r.id for r, _ in vector], [r.id for r, _ in lexical]])
+    return [(by_id[i], score) for i, score in fused[:top_k]]
+
+
+def _id_array(ids: set[int] | None) -> np.ndarray | None:
+    """Return filtered record ids as the key array ``VectorStore.search_many`` restricts to."""
+    return np.fromiter(ids, dtype=np.int64, count=len(ids)) if ids is not None else None
+
+
+def _to_results(hits: list[tuple[_KBRecord, float]]) -> list[dict[str, Any]]:
+    tokenizer = get_tokenizer()
+    return [
+        {
+            "text": record.text,
+            "source_path": record.source_path,
+            "score": score,
+            "tokens": tokenizer.count(record.text),
+        }
+        for record, score in hits
+    ]
+
+
+def _log_retrieval(query: str, results: list[dict[str, Any]]) -> None:
+    """Log how many tokens of context a query retrieved."""
+    APP_LOGGER.debug(
+        "KB retrieval: query=%r results=%d tokens=%d",
+        query[:80],
+        len(results),
+        sum(r["tokens"] for r in results),
+    )
+
+
+@dataclass
+class _FileResult:
+    """What indexing a single file changed."""
+
+    added: int = 0
+    removed: int = 0
+    embed_seconds: float = 0.0
+    cached: int = 0
+    deduplicated: int = 0
+    tokens: int = 0
+    max_tokens: int = 0
+
+
+@dataclass
+class _IngestItem:
+    """A file travelling through the ingestion pipeline, one batch of chunks at a time."""
+
+    index: int
+    path: Path
+    root: Path | None
+    started: float
+    status: _FileStatus = _FileStatus.NEW
+    fingerprint: _ManifestEntry | None = None
+    chunks_future: asyncio.Future[list[ChunkSpan] | None] | None = None
+    """Chunks of a file parsed whole in a worker process (see ``_streams_text``)."""
+    result: _FileResult = field(default_factory=_FileResult)
+    chunks_read: int = 0
+    complete: bool = True
+    """False once a chunk of the file was not stored, so it is retried on the next run."""
+    skipped: bool = False
+    """Set when the file's embeddings cannot be stored; its remaining batches are dropped."""
+    batches: int = 0
+    failed_batches: int = 0
+    embedded: int = 0
+    candidates: int = 0
+    """Embedded chunks passed on to be stored, near-duplicates included."""
+    last_error: Exception | None = None
+    first_id: int | None = None
+    """Id of the file's first new record, set when its old chunks are removed."""
+    linked: set[int] = field(default_factory=set)
+    pending: list[tuple[list[tuple[int, ChunkSpan]], list[list[float]]]] = field(default_factory=list)
+    """Batches a backend holds back until the file is complete (see ``sqlite_store``)."""
+
+
+@dataclass
+class _IngestRun:
+    """One ``_run_ingest_pipeline`` call: its files and the queues joining its stages."""
+
+    paths: list[Path]
+    root: Path
+    report: IndexReport
+    logger: logging.Logger
+    chunker: Chunker
+    pool: ProcessPoolExecutor | None
+    parsed: asyncio.Queue[_IngestItem | None]
+    embedded: asyncio.Queue[tuple[_IngestItem, list[ChunkSpan] | None, EmbeddingBatchResult | None] | None] = field(
+        default_factory=lambda: asyncio.Queue(maxsize=2),
+    )
+
+
+def _ingest_workers() -> int:
+    """Return the number of parser processes from ``KB_INGEST_WORKERS`` (0 parses on threads)."""
+    default = min(4, os.cpu_count() or 1)
+    try:
+        return max(0, int(os.getenv("KB_INGEST_WORKERS", str(default))))
+    except ValueError:
+        return default
+
+
+def _make_parse_pool(workers: int) -> ProcessPoolExecutor | None:
+    """Create the process pool used for text extraction, or None to fall back to threads."""
+    if workers <= 0:
+        return None
+    try:
+        # spawn rather than fork: the caller may be a UI process with live threads.
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    except (OSError, ValueError, NotImplementedError) as exc:
+        APP_LOGGER.warning("Could not start KB parser processes (%s); parsing on threads instead.", exc)
+        return None
+
+
 class KnowledgeBase:
     """A simple, persistent vector-based knowledge base."""
 
-    def __init__(self, storage_path: str | Path | None = None, embed_model: str | None = None) -> None:
+    def __init__(
+        self,
+        storage_path: str | Path | None = None,
+        embed_model: str | None = None,
+        *,
+        embedder: EmbeddingProvider | None = None,
+        chunker: Chunker | None = None,
+    ) -> None:
         """Initialize the KnowledgeBase.
 
         Parameters
         ----------
         storage_path:
-            Path to the JSON index file. Defaults to ``./kb_index.json`` if not provided.
+            Path to the index directory. Defaults to ``./kb_index`` if not provided. A path
+            ending in ``.json`` is treated as a legacy index file; the binary index then
+            lives next to it with the suffix removed.
         embed_model:
             Optional embedding model name. If None, uses a sensible default for the provider.
+        embedder:
+            Optional embedding provider to use instead of creating one, so several
+            knowledge bases can share its clients, cache and latency statistics.
+        chunker:
+            Optional chunking strategy (see ``chunking``). If None, the one configured by
+            ``KB_CHUNK_STRATEGY`` when a file is indexed is used.
 
         """
-        self.storage_path = Path(storage_path) if storage_path is not None else Path.cwd() / "kb_index.json"
-        self._embedder = _EmbeddingProvider(embed_model)
-        self._records: list[_KBRecord] = []
-        self._next_id = 1
+        path = Path(storage_path) if storage_path is not None else Path.cwd() / "kb_index"
+        self.storage_path = path.with_suffix("") if path.suffix == ".json" else path
+        self._legacy_path = self.storage_path.with_name(self.storage_path.name + ".json")
+        self._embedder = embedder or EmbeddingProvider(embed_model, cache=EmbeddingCache.from_env())
+        self._chunker = chunker
+        self._reset_index_state()
+        self._write_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        # Ingests allocate ids and stage changes without ``_write_lock``; only one may run at a time
+        self._ingest_lock = threading.Lock()
+        self._compactor: threading.Thread | None = None
         # Simple in-memory rolling progress log (mirrors APP_LOGGER messages) - no callbacks
         self._progress_log: deque[str] = deque(maxlen=1000)
-        self._load()
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        # Queries, ingests and compactions in progress, and when the last one ended (see ``unload``)
+        self._users = 0
+        self._last_used = time.monotonic()
+        self._last_query = float("-inf")
+        # Bumped by every change to the records; tags cached query results
+        self._generation = 0
+        self._query_cache = QueryCache.from_env()
+
+    def _reset_index_state(self) -> None:
+        """Set the in-memory index to empty, as before the first load."""
+        self._store: VectorStore[_KBRecord] = VectorStore(key=operator.attrgetter("id"))
+        self._lexical = BM25Index()
+        self._metadata = MetadataIndex()
+        self._records_by_id: dict[int, _KBRecord] = {}
+        # The text of each source's chunks, held once however much the chunks overlap
+        self._texts: dict[str, SourceText] = {}
+        # Built on the first ingest that deduplicates (see ``_near_duplicate_index``)
+        self._dedup: SimHashIndex | None = None
+        self._next_id = 1
+        self._manifest: dict[str, _ManifestEntry] = {}
+        # Changes since the last committed segment
+        self._committed_next_id = 1
+        self._pending_deletes: list[int] = []
+        self._manifest_changes: dict[str, _ManifestEntry | None] = {}
+        # Segment log state
+        self._segment_seq = 0
+        self._segments_since_base = 0
+        # Set when the ANN index or quantised codes changed and the base should be rewritten
+        self._indexes_dirty = False
+        self._force_base = False
 
     # --------------- Persistence ---------------
+    def _ensure_loaded(self) -> None:
+        """Open the on-disk index the first time the KB is actually used."""
+        self._last_used = time.monotonic()
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    @contextmanager
+    def _in_use(self) -> Iterator[None]:
+        """Keep the index from being unloaded while a query, ingest or compaction runs."""
+        with self._load_lock:
+            self._users += 1
+        try:
+            yield
+        finally:
+            with self._load_lock:
+                self._users -= 1
+                self._last_used = time.monotonic()
+
+    @asynccontextmanager
+    async def _ingesting(self) -> AsyncIterator[None]:
+        """Hold the index in use and run ingests one at a time, across threads and event loops."""
+        with self._in_use():
+            # Wait off the loop; if cancelled meanwhile, release the lock once the waiting thread gets it
+            acquired = asyncio.get_running_loop().run_in_executor(None, self._ingest_lock.acquire)
+            try:
+                await asyncio.shield(acquired)
+            except asyncio.CancelledError:
+                acquired.add_done_callback(lambda _: self._ingest_lock.release())
+                raise
+            try:
+                yield
+            finally:
+                self._ingest_lock.release()
+
+    @property
+    def generation(self) -> int:
+        """Return a counter that changes whenever records are added, replaced, removed or cleared."""
+        return self._generation
+
+    @property
+    def is_loaded(self) -> bool:
+        """Return True if the index is currently held in memory."""
+        return self._loaded
+
+    def seconds_since_query(self) -> float:
+        """Return the seconds since the last query started (infinite if there was none)."""
+        return time.monotonic() - self._last_query
+
+    def idle_seconds(self) -> float:
+        """Return the seconds since the KB was last used, or 0 while it is in use."""
+        return 0.0 if self._users else time.monotonic() - self._last_used
+
+    def unload(self) -> bool:
+        """Release the in-memory index; it is reopened from disk on next use.
+
+        Uncommitted changes are saved and any running compaction is awaited first.
+        Returns False, keeping the index, while a query, ingest or compaction is in
+        progress.
+        """
+        with self._load_lock:
+            if self._users:
+                return False
+            if not self._loaded:
+                return True
+            self._save()
+            compactor = self._compactor
+            if compactor is not None:
+                compactor.join()
+            with self._write_lock:
+                self._reset_index_state()
+                self._loaded = False
+        APP_LOGGER.info("KB unloaded: %s", self.storage_path)
+        return True
+
     def _load(self) -> None:
-        if not self.storage_path.exists():
+        if not has_index(self.storage_path) and self._legacy_path.is_file():
+            try:
+                migrate_legacy_index(self._legacy_path, self.storage_path)
+            except (OSError, json.JSONDecodeError, ValueError):
+                APP_LOGGER.warning("Legacy KB index %s is corrupt or unreadable; ignoring it.", self._legacy_path)
+                return
+        if not has_index(self.storage_path):
             return
+        compacted_through = 0
         try:
-            data = json.loads(self.storage_path.read_text(encoding="utf-8"))
-            # Support both dict-based index { records: [...], next_id: n } and
-            # legacy/simple list-based index [ {...record...}, ... ]
-            if isinstance(data, list):
-                records: list[_KBRecord] = []
-                for item in data:
-                    if isinstance(item, dict):
-                        try:
-                            records.append(_KBRecord.from_json(item))
-                        except (KeyError, TypeError, ValueError) as exc:
-                            APP_LOGGER.warning(
-                                "Skipping invalid KB record in list index: %s",
-                                exc,
-                            )
-                    else:
-                        APP_LOGGER.warning(
-                            "Ignoring non-dict item in KB index list: %r",
-                            item,
-                        )
-                self._records = records
-                self._next_id = len(self._records) + 1
-            elif isinstance(data, dict):
-                self._records = [_KBRecord.from_json(d) for d in data.get("records", [])]
-                self._next_id = int(data.get("next_id", len(self._records) + 1))
+            base_dir, compacted_through = resolve_base(self.storage_path)
+            if base_dir is not None:
+                self._load_base(base_dir)
+        except (IndexFormatError, KeyError, TypeError, ValueError) as exc:
+            # Corrupt or incompatible index; start fresh and replace it on the next save
+            APP_LOGGER.warning("KB index is corrupt or unreadable (%s). Starting with a fresh index.", exc)
+            self._force_base = True
+            # The folded segments are pruned, so the replacement base must be newer than the corrupt one
+            self._segment_seq = max(compacted_through, last_segment(self.storage_path))
+            return
+        self._replay_segments(read_segments(self.storage_path, after=compacted_through))
+        self._segment_seq = max(compacted_through, last_segment(self.storage_path))
+        if self._records_by_id:
+            self._next_id = max(self._next_id, max(self._records_by_id) + 1)
+        self._committed_next_id = self._next_id
+        self._pending_deletes, self._manifest_changes = [], {}
+        self._generation += 1
+
+    def _load_base(self, base_dir: Path) -> None:
+        """Open a compacted base; raises ``IndexFormatError`` (or a parse error) if it is unusable."""
+        matrix, rows, next_id = read_index(base_dir)
+        records = _records_from_json(rows)
+        for record in records:
+            _hold_text(record, self._texts)
+        ann = None
+        if (saved_ann := read_ann(base_dir, len(records))) is not None:
+            centroids, assignments, trained_rows = saved_ann
+            ann = IVFIndex(centroids, assignments, trained_rows)
+        quantized = None
+        if (saved_quant := read_quant(base_dir, len(records))) is not None:
+            mode, codes, arrays = saved_quant
+            try:
+                quantized = (Quantizer.from_arrays(QuantizationMode(mode), matrix.shape[1], arrays), codes)
+            except (KeyError, ValueError) as exc:
+                APP_LOGGER.warning("KB quantised codes are invalid (%s); they will be rebuilt.", exc)
+        self._store.attach(matrix, records, ann, quantized)
+        self._records_by_id = {r.id: r for r in records}
+        self._lexical = self._load_lexical(base_dir, records)
+        for record in records:
+            self._metadata.add(record.id, record.filter_fields())
+        self._next_id = next_id
+        for src, entry in read_manifest(base_dir).items():
+            try:
+                self._manifest[src] = _ManifestEntry.from_json(entry)
+            except (KeyError, TypeError, ValueError):
+                APP_LOGGER.warning("Ignoring invalid KB manifest entry for %s", src)
+
+    def _replay_segments(self, segments: list[Segment]) -> None:
+        """Apply committed segments on top of the base, oldest first."""
+        for segment in segments:
+            try:
+                records = _records_from_json(segment.records)
+                if segment.deletes:
+                    deleted = set(segment.deletes)
+                    self._remove_records(lambda r, deleted=deleted: r.id in deleted)
+                self._add_records(segment.matrix, records)
+            except (KeyError, TypeError, ValueError) as exc:
+                APP_LOGGER.warning("Skipping unreadable KB segment %d (%s)", segment.seq, exc)
+                continue
+            for src, entry in segment.manifest.items():
+                if entry is None:
+                    self._manifest.pop(src, None)
+                    continue
+                try:
+                    self._manifest[src] = _ManifestEntry.from_json(entry)
+                except (KeyError, TypeError, ValueError):
+                    APP_LOGGER.warning("Ignoring invalid KB manifest entry for %s", src)
+            self._next_id = max(self._next_id, segment.next_id)
+            self._segments_since_base += 1
+
+    def _load_lexical(self, base_dir: Path, records: list[_KBRecord]) -> BM25Index:
+        """Open the persisted BM25 index, rebuilding it from ``records`` if it is missing or stale."""
+        data = read_lexical(base_dir)
+        if data is not None:
+            try:
+                lexical = BM25Index.from_json(data)
+            except (AttributeError, KeyError, TypeError, ValueError) as exc:
+                APP_LOGGER.warning("KB lexical index is invalid (%s); rebuilding it.", exc)
             else:
-                # Unknown format; reset
-                self._records = []
-                self._next_id = 1
-        except (OSError, json.JSONDecodeError):
-            # Corrupt or incompatible index; start fresh
-            APP_LOGGER.warning("KB index file is corrupt or unreadable. Starting with a fresh index.")
-            self._records = []
-            self._next_id = 1
+                if len(lexical) == len(records):
+                    return lexical
+        lexical = BM25Index()
+        for record in records:
+            lexical.add(record.id, record.text)
+        if records:
+            APP_LOGGER.info("Rebuilt KB lexical index for %d chunks", len(records))
+        return lexical
 
     def _save(self) -> None:
-        payload = {
-            "next_id": self._next_id,
-            "records": [r.to_json() for r in self._records],
-        }
-        self.storage_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        """Commit the changes since the last save as a new segment.
+
+        Only the added rows, the ids of removed rows and the changed manifest
+        entries are written, so the cost is proportional to the change rather than
+        to the index. Compaction is started in the background once it is due.
+        """
+        with self._write_lock:
+            if self._force_base:
+                self._force_base = False
+                snapshot = self._base_snapshot()
+                with self._compact_lock:
+                    written = write_base(self.storage_path, snapshot)
+                if not written:
+                    APP_LOGGER.warning("KB base %d was not written; a newer base exists.", snapshot.seq)
+                return
+            matrix, records = self._store.snapshot()
+            # Rows added since the last commit are always a suffix: ids only grow and removals keep order
+            start = len(records)
+            while start and records[start - 1].id >= self._committed_next_id:
+                start -= 1
+            if start == len(records) and not self._pending_deletes and not self._manifest_changes:
+                if self._indexes_dirty:
+                    self._start_compaction()
+                return
+            segment = Segment(
+                seq=self._segment_seq + 1,
+                matrix=matrix[start:] if matrix.shape[0] else np.empty((0, matrix.shape[1]), dtype=np.float32),
+                records=_records_to_json(records[start:]),
+                deletes=list(self._pending_deletes),
+                manifest={src: e.to_json() if e is not None else None for src, e in self._manifest_changes.items()},
+                next_id=self._next_id,
+            )
+            write_segment(self.storage_path, segment)
+            self._segment_seq = segment.seq
+            self._committed_next_id = self._next_id
+            self._pending_deletes, self._manifest_changes = [], {}
+            self._segments_since_base += 1
+            if self._indexes_dirty or self._segments_since_base >= _compact_segments():
+                self._start_compaction()
+
+    def compact(self) -> None:
+        """Fold all committed segments into a new base now, waiting for any background compaction.
+
+        The quantised codes are brought in line with ``KB_QUANTIZATION`` first.
+        """
+        with self._in_use():
+            self._ensure_loaded()
+            self._maybe_quantize()
+            self._save()
+            compactor = self._compactor
+            if compactor is not None:
+                compactor.join()
+            with self._write_lock:
+                snapshot = self._base_snapshot()
+            self._write_base(snapshot)
+
+    def _base_snapshot(self) -> BaseSnapshot:
+        """Capture the committed state for a new base; the caller holds ``_write_lock``."""
+        matrix, records = self._store.snapshot()
+        ann = self._store.ann
+        ann_state = None
+        if ann is not None and ann.assignments.shape[0] == matrix.shape[0]:
+            ann_state = (ann.centroids, ann.assignments, ann.trained_rows)
+        quantizer, codes = self._store.quantizer, self._store.codes
+        quant_state = None
+        if quantizer is not None and codes.shape[0] == matrix.shape[0]:
+            quant_state = (quantizer.mode.value, codes, quantizer.to_arrays())
+        # Reserve a sequence number so the new base never reuses the current base's directory
+        self._segment_seq += 1
+        self._segments_since_base = 0
+        self._indexes_dirty = False
+        return BaseSnapshot(
+            seq=self._segment_seq,
+            matrix=matrix,
+            records=_records_to_json(records),
+            next_id=self._next_id,
+            manifest={src: e.to_json() for src, e in self._manifest.items()},
+            lexical=self._lexical.to_json(),
+            ann=ann_state,
+            quant=quant_state,
+        )
+
+    def _start_compaction(self) -> None:
+        """Write a new base on a background thread; the caller holds ``_write_lock``."""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        snapshot = self._base_snapshot()
+        self._compactor = threading.Thread(
+            target=self._write_base,
+            args=(snapshot,),
+            name="kb-compact",
+            daemon=True,
+        )
+        self._compactor.start()
+
+    def _write_base(self, snapshot: BaseSnapshot) -> None:
+        start = time.monotonic()
+        with self._compact_lock:
+            try:
+                written = write_base(self.storage_path, snapshot)
+            except OSError as exc:
+                # The segments are still committed, so nothing is lost; compaction is retried later
+                APP_LOGGER.warning("KB compaction failed: %s", exc)
+                return
+        if not written:
+            APP_LOGGER.info("KB compaction through segment %d discarded; a newer base exists.", snapshot.seq)
+            return
+        APP_LOGGER.info(
+            "KB compacted: segments_through=%d rows=%d duration=%.2fs",
+            snapshot.seq,
+            len(snapshot.records),
+            time.monotonic() - start,
+        )
+
+    def _maybe_build_ann(self) -> bool:
+        """(Re)train the IVF index once the store is large enough or has doubled since training.
+
+        Returns True if a new index was installed.
+        """
+        min_rows, _ = _ann_settings()
+        size = len(self._store)
+        ann = self._store.ann
+        if not min_rows or size < min_rows:
+            if ann is not None:
+                self._store.drop_ann()
+                self._indexes_dirty = True
+                return True
+            return False
+        if ann is not None and size < 2 * ann.trained_rows:
+            return False
+        generation = self._store.generation
+        matrix, _ = self._store.snapshot()
+        start = time.monotonic()
+        trained = IVFIndex.train(matrix)
+        if not self._store.install_ann(trained, matrix.shape[0], generation):
+            return False
+        self._indexes_dirty = True
+        build_tpl = "KB ANN index built: rows=%d nlist=%d duration=%.2fs"
+        build_args = (matrix.shape[0], trained.nlist, time.monotonic() - start)
+        APP_LOGGER.info(build_tpl, *build_args)
+        self._progress_log.append(build_tpl % build_args)
+        return True
+
+    def _maybe_quantize(self) -> bool:
+        """Encode the store in the ``KB_QUANTIZATION`` mode if it is not already.
+
+        Product-quantisation codebooks are retrained once the store has doubled
+        since training. Returns True if the quantizer was installed or dropped.
+        """
+        mode, _ = _quant_settings()
+        current = self._store.quantizer
+        if mode == QuantizationMode.NONE or not len(self._store):
+            if current is None:
+                return False
+            self._store.drop_quantizer()
+            self._indexes_dirty = True
+            return True
+        size = len(self._store)
+        if (
+            current is not None
+            and current.mode == mode
+            and not (isinstance(current, PQQuantizer) and size >= 2 * max(1, current.trained_rows))
+        ):
+            return False
+        generation = self._store.generation
+        matrix, _ = self._store.snapshot()
+        start = time.monotonic()
+        quantizer = make_quantizer(mode, matrix.shape[1], matrix)
+        if not self._store.install_quantizer(quantizer, quantizer.encode_blocked(matrix), generation):
+            return False
+        self._indexes_dirty = True
+        build_tpl = "KB quantised codes built: mode=%s rows=%d bytes_per_vector=%d duration=%.2fs"
+        build_args = (mode.value, matrix.shape[0], quantizer.code_bytes, time.monotonic() - start)
+        APP_LOGGER.info(build_tpl, *build_args)
+        self._progress_log.append(build_tpl % build_args)
+        return True
 
     # --------------- Indexing ---------------
-    async def index_path(self, path: Path) -> int:
+    async def index_path(self, path: Path) -> IndexReport:
         """Asynchronously index a path without blocking the main event loop.
 
+        Indexing is incremental: files whose manifest fingerprint (mtime, size, then
+        content hash) is unchanged are skipped, changed files have their chunks
+        replaced, and files under ``path`` that no longer exist have their chunks removed.
+
         Strategy:
-        - Run file enumeration and each file's indexing in the default thread pool.
-        - Yield control to the event loop between files so TUI remains responsive.
+        - Run file enumeration in the default thread pool.
+        - Parse, embed and store files as overlapping pipeline stages
+          (see ``_run_ingest_pipeline``), yielding to the event loop between files
+          so the UI remains responsive.
         - Save once at the end (in executor) to minimize contention.
+
+        Concurrent calls, also from other threads or event loops, run one after another.
         """
-        loop = asyncio.get_running_loop()
-        logger = APP_LOGGER
-        start_msg = "KB indexing started: path=%s"
-
-        logger.info(start_msg, path)
-        self._progress_log.append(start_msg % (path,))
-        # Enumerate files off-thread
-        paths, scan_time = await loop.run_in_executor(
-            None,
-            self._gather_files_for_index,
-            path,
-            logger,
-        )
-        ctx = self._ProcessContext(
-            root_path=path,
-            enum_duration=scan_time,
+        async with self._ingesting():
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._ensure_loaded)
+            logger = APP_LOGGER
+            start_msg = "KB indexing started: path=%s"
+
+            logger.info(start_msg, path)
+            self._progress_log.append(start_msg % (path,))
+            # Enumerate files off-thread
+            paths, scan_time = await loop.run_in_executor(
+                None,
+                self._gather_files_for_index,
+                path,
+                logger,
+            )
+            ctx = self._ProcessContext(
+                root_path=path,
+                enum_duration=scan_time,
+                logger=logger,
+            )
+            report = IndexReport(files_scanned=len(paths), scan_seconds=scan_time)
+            total_local = len(paths)
+            ingest_start_local = time.monotonic()
+            await self._run_ingest_pipeline(paths, path, report, logger)
+
+            removed_files, removed_chunks = await loop.run_in_executor(None, self._remove_missing_sources, path)
+            report.files_removed += removed_files
+            report.chunks_removed += removed_chunks
+            if relink := self._broken_links(path):
+                await self._run_ingest_pipeline(relink, path, report, logger)
+            await loop.run_in_executor(None, self._commit_ingest, report)
+            ingest_duration_local = time.monotonic() - ingest_start_local
+            finish_tpl = (
+                "KB async indexing finished: root=%s files_processed=%d skipped=%d updated=%d removed=%d "
+                "chunks_added=%d chunks_removed=%d chunks_cached=%d chunks_deduplicated=%d scan_time=%.2fs "
+                "ingest_time=%.2fs "
+                "embed_rate=%.1f chunks/s"
+            )
+            finish_args = (
+                ctx.root_path,
+                total_local,
+                report.files_skipped,
+                report.files_updated,
+                report.files_removed,
+                report.chunks_added,
+                report.chunks_removed,
+                report.chunks_cached,
+                report.chunks_deduplicated,
+                ctx.enum_duration,
+                ingest_duration_local,
+                report.chunks_per_second,
+            )
+            logger.info(finish_tpl, *finish_args)
+            self._progress_log.append(finish_tpl % finish_args)
+            if report.chunks_added == 0 and report.files_skipped == 0:
+                warn_tpl = "KB async indexing produced no new chunks for path=%s"
+                logger.warning(warn_tpl, ctx.root_path)
+                self._progress_log.append(warn_tpl % (ctx.root_path,))
+            return report
+
+    async def index_files(self, paths: Iterable[Path], root: Path, parse_workers: int | None = None) -> IndexReport:
+        """Bring the given files under ``root`` up to date without scanning the rest of ``root``.
+
+        Files that exist are indexed like in ``index_path`` (unchanged ones are
+        skipped by their fingerprint). For paths that no longer exist, the chunks of
+        that file, or of every file under that folder, are removed. ``parse_workers`` overrides
+        ``KB_INGEST_WORKERS``; 0 parses on threads. Used by ``watcher`` for
+        continuous ingestion.
+        """
+        async with self._ingesting():
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._ensure_loaded)
+            max_file_bytes = _max_file_bytes()
+            present, gone = [], []
+            for p in dict.fromkeys(paths):
+                if _wanted_file(p, max_file_bytes):
+                    present.append(p)
+                elif not p.is_dir():
+                    gone.append(p)
+            report = IndexReport(files_scanned=len(present))
+            if present:
+                await self._run_ingest_pipeline(present, root, report, APP_LOGGER, parse_workers)
+            if gone:
+                removed = await loop.run_in_executor(None, lambda: self._remove_missing_sources(*gone))
+                report.files_removed, report.chunks_removed = removed
+            if relink := self._broken_links(root):
+                await self._run_ingest_pipeline(relink, root, report, APP_LOGGER, parse_workers)
+            await loop.run_in_executor(None, self._commit_ingest, report)
+            return report
+
+    def _commit_ingest(self, report: IndexReport) -> None:
+        """Refresh the derived indexes after an ingest and save if anything changed."""
+        ann_changed = self._maybe_build_ann()
+        quant_changed = self._maybe_quantize()
+        if report.chunks_added or report.chunks_removed or self._manifest_changes or ann_changed or quant_changed:
+            self._save()
+
+    async def _run_ingest_pipeline(
+        self,
+        paths: list[Path],
+        root: Path,
+        report: IndexReport,
+        logger: logging.Logger,
+        workers: int | None = None,
+    ) -> None:
+        """Parse, embed and store ``paths`` as three overlapping stages joined by bounded queues.
+
+        Stage 1 checks each file against the manifest and, for new or changed files
+        in formats parsed whole (PDF, DOCX, HTML, RTF), extracts and chunks the text
+        in a process pool, so their parsing is not serialised under the GIL. Stage 2
+        reads each file's chunks a batch at a time (plain text is chunked as it is
+        read) and embeds them. Stage 3 is the single writer that stores each batch and
+        completes the file once its last batch is in. While one batch is being
+        embedded, the next files are already being parsed. The bounded queues apply
+        backpressure, so only a few batches of chunks are held in memory at any time,
+        however large the files or the folder are. ``workers`` defaults to
+        ``KB_INGEST_WORKERS``.
+        """
+        workers = _ingest_workers() if workers is None else workers
+        run = _IngestRun(
+            paths=paths,
+            root=root,
+            report=report,
             logger=logger,
+            chunker=self._chunker or _default_chunker(),
+            pool=_make_parse_pool(workers) if len(paths) > 1 else None,
+            parsed=asyncio.Queue(maxsize=max(2, workers * 2)),
         )
-        total_local = len(paths)
-        added_local = 0
-        ingest_start_local = time.monotonic()
-        for idx, file_path in enumerate(paths, start=1):
-            start_file = time.monotonic()
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self._parse_stage(run))
+                tg.create_task(self._embed_stage(run))
+                tg.create_task(self._write_stage(run))
+        finally:
+            if run.pool is not None:
+                await asyncio.get_running_loop().run_in_executor(None, run.pool.shutdown)
+
+    async def _parse_stage(self, run: _IngestRun) -> None:
+        """Classify each file against the manifest and start parsing the changed ones that are not plain text."""
+        loop = asyncio.get_running_loop()
+        for idx, file_path in enumerate(run.paths, start=1):
+            item = _IngestItem(index=idx, path=file_path, root=run.root, started=time.monotonic())
+            item.status, item.fingerprint = await loop.run_in_executor(None, self._classify_file, file_path)
+            if item.status != _FileStatus.UNCHANGED and not _streams_text(file_path):
+                item.chunks_future = loop.run_in_executor(run.pool, _extract_chunks, file_path, run.chunker)
+            await run.parsed.put(item)
+        await run.parsed.put(None)
+
+    async def _embed_stage(self, run: _IngestRun) -> None:
+        """Embed each new or changed file a batch of chunks at a time, then mark the end of the file."""
+        loop = asyncio.get_running_loop()
+        while (item := await run.parsed.get()) is not None:
+            if item.status != _FileStatus.UNCHANGED:
+                batches = self._chunk_batches(item, await self._ingest_chunks(item, run.chunker, run.logger))
+                while not item.skipped and (chunks := await loop.run_in_executor(None, next, batches, None)):
+                    batch = await loop.run_in_executor(None, self._embed_chunks, item.path, chunks)
+                    await run.embedded.put((item, chunks, batch))
+            await run.embedded.put((item, None, None))
+        await run.embedded.put(None)
+
+    async def _write_stage(self, run: _IngestRun) -> None:
+        """Store each embedded batch and complete each file once its end is reached; the single writer."""
+        loop = asyncio.get_running_loop()
+        while (entry := await run.embedded.get()) is not None:
+            item, chunks, batch = entry
+            if chunks is not None:
+                await loop.run_in_executor(None, self._write_batch, item, chunks, batch)
+                continue
+            result = await loop.run_in_executor(None, self._finish_file, item)
+            self._record_file_progress(item, result, len(run.paths), run.report, run.logger)
+            # Let the event loop process UI events
+            await asyncio.sleep(0)
 
-            # Index each file in executor
-            file_chunks_added = await loop.run_in_executor(None, self._index_single_file, file_path)
-            added_local += file_chunks_added
-            duration = time.monotonic() - start_file
+    async def _ingest_chunks(self, item: _IngestItem, chunker: Chunker, logger: logging.Logger) -> Iterable[ChunkSpan]:
+        """Return the chunks of a new or changed file: its parsed chunks, or a lazy stream of plain text."""
+        if item.chunks_future is None:
+            return _stream_chunks(item.path, chunker)
+        try:
+            chunks = await item.chunks_future
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Skipping %s: text extraction failed: %s", item.path, exc)
+            chunks = None
+        if chunks is None:
+            item.complete = False
+            return []
+        return chunks
 
-            # Progress variables
-            info_tpl = "KB file indexed: file=%s chunks=%d duration=%.2fs total_chunks_after=%d"
-            debug_tpl = "KB progress: %d/%d files (%.1f%%) cumulative_chunks=%d"
+    def _chunk_batches(self, item: _IngestItem, chunks: Iterable[ChunkSpan]) -> Iterator[list[ChunkSpan]]:
+        """Yield a file's chunks in batches that keep every embedding request in flight.
 
-            # Log progress
-            pct = (idx / total_local) * 100 if total_local else 0.0
-            logger.info(info_tpl, file_path, file_chunks_added, duration, self._next_id - 1)
-            logger.debug(debug_tpl, idx, total_local, pct, self._next_id - 1)
+        A read error ends the file early; it is then left incomplete, so it is retried on the next run.
+        """
+        try:
+            batch_size = self._embedder.batch_size * self._embedder.max_in_flight
+            for batch in itertools.batched(chunks, batch_size, strict=False):
+                yield list(batch)
+        except (OSError, UnicodeDecodeError, ValueError) as exc:
+            APP_LOGGER.warning("Stopped reading %s: %s", item.path, exc)
+            item.complete = False
 
-            # Append the combined string as a single entry to the progress log
-            self._progress_log.append(debug_tpl % (idx, total_local, pct, self._next_id - 1))
-            self._progress_log.append(info_tpl % (file_path, file_chunks_added, duration, self._next_id - 1))
+    def _record_file_progress(
+        self,
+        item: _IngestItem,
+        result: _FileResult | None,
+        total: int,
+        report: IndexReport,
+        logger: logging.Logger,
+    ) -> None:
+        """Fold one file's outcome into ``report`` and the progress log."""
+        info_tpl = "KB file indexed: file=%s chunks=%d tokens=%d duration=%.2fs total_chunks_after=%d"
+        debug_tpl = "KB progress: %d/%d files (%.1f%%) cumulative_chunks=%d"
+        pct = (item.index / total) * 100 if total else 0.0
+        stored = self.record_count()
+        if result is None:
+            report.files_skipped += 1
+            logger.debug("KB file unchanged, skipping: file=%s", item.path)
+        else:
+            report.chunks_added += result.added
+            report.chunks_removed += result.removed
+            report.embed_seconds += result.embed_seconds
+            report.chunks_cached += result.cached
+            report.chunks_deduplicated += result.deduplicated
+            report.tokens_embedded += result.tokens
+            report.max_chunk_tokens = max(report.max_chunk_tokens, result.max_tokens)
+            if item.status == _FileStatus.CHANGED:
+                report.files_updated += 1
+            else:
+                report.files_indexed += 1
+            duration = time.monotonic() - item.started
+            logger.info(info_tpl, item.path, result.added, result.tokens, duration, stored)
+            self._progress_log.append(info_tpl % (item.path, result.added, result.tokens, duration, stored))
+        logger.debug(debug_tpl, item.index, total, pct, stored)
+        self._progress_log.append(debug_tpl % (item.index, total, pct, stored))
+
+    def _classify_file(self, p: Path) -> tuple[_FileStatus, _ManifestEntry | None]:
+        """Compare ``p`` with its manifest entry; returns its status and current fingerprint.
+
+        The content hash is only computed when mtime or size differ, so unchanged
+        files cost a single ``stat`` call. A touched file with identical content
+        just has its manifest entry refreshed.
+        """
+        entry = self._manifest.get(str(p))
+        try:
+            st = p.stat()
+        except OSError:
+            return (_FileStatus.CHANGED if entry else _FileStatus.NEW), None
+        current = entry is not None and not self._has_broken_links(entry)
+        if current and entry.mtime == st.st_mtime and entry.size == st.st_size:
+            return _FileStatus.UNCHANGED, entry
+        try:
+            digest = _hash_file(p)
+        except OSError:
+            return (_FileStatus.CHANGED if entry else _FileStatus.NEW), None
+        if current and entry.sha256 == digest:
+            entry.mtime, entry.size = st.st_mtime, st.st_size
+            self._manifest_changes[str(p)] = entry
+            return _FileStatus.UNCHANGED, entry
+        fingerprint = _ManifestEntry(mtime=st.st_mtime, size=st.st_size, sha256=digest, chunks=0)
+        return (_FileStatus.CHANGED if entry else _FileStatus.NEW), fingerprint
+
+    def _has_broken_links(self, entry: _ManifestEntry) -> bool:
+        """Return True if a chunk standing in for a near-duplicate of the file was removed since."""
+        return any(i not in self._records_by_id for i in entry.linked)
+
+    def _broken_links(self, root: Path) -> list[Path]:
+        """Return the indexed files under ``root`` that must be re-indexed because of broken links."""
+        return [
+            Path(src)
+            for src, entry in self._manifest.items()
+            if entry.linked and Path(src).is_relative_to(root) and self._has_broken_links(entry)
+        ]
 
-            # Let the event loop process UI events
-            await asyncio.sleep(0)
-        if added_local:
-            await loop.run_in_executor(None, self._save)
-        ingest_duration_local = time.monotonic() - ingest_start_local
-        finish_tpl = (
-            "KB async indexing finished: root=%s files_processed=%d chunks_added=%d scan_time=%.2fs ingest_time=%.2fs"
-        )
-        logger.info(
-            finish_tpl,
-            ctx.root_path,
-            total_local,
-            added_local,
-            ctx.enum_duration,
-            ingest_duration_local,
-        )
-        self._progress_log.append(
-            finish_tpl % (ctx.root_path, total_local, added_local, ctx.enum_duration, ingest_duration_local),
-        )
-        if added_local == 0:
-            warn_tpl = "KB async indexing produced no new chunks for path=%s"
-            logger.warning(warn_tpl, ctx.root_path)
-            self._progress_log.append(warn_tpl % (ctx.root_path,))
-        return added_local
+    def _remove_missing_sources(self, *roots: Path) -> tuple[int, int]:
+        """Drop chunks and manifest entries for files under any of ``roots`` that no longer exist.
+
+        Returns ``(files_removed, chunks_removed)``.
+        """
+        gone = {
+            src
+            for src in self._indexed_sources()
+            if any(Path(src).is_relative_to(root) for root in roots) and not _is_supported_file(Path(src))
+        }
+        if not gone:
+            return 0, 0
+        chunks_removed = self._drop_sources(gone)
+        for src in sorted(gone):
+            APP_LOGGER.info("KB source removed: file=%s", src)
+        return len(gone), chunks_removed
+
+    def _indexed_sources(self) -> set[str]:
+        """Return the paths of every file with chunks or a manifest entry."""
+        return set(self._manifest) | {r.source_path for r in self._store.metadata}
+
+    def _drop_sources(self, sources: set[str]) -> int:
+        """Remove the chunks and manifest entries of ``sources``; returns the number of chunks removed."""
+        removed = self._remove_records(lambda r: r.source_path in sources)
+        for src in sources:
+            if self._manifest.pop(src, None) is not None:
+                self._manifest_changes[src] = None
+        return removed
 
     # --------------- Progress Access ---------------
     def recent_progress(self, limit: int = 100) -> list[str]:
@@ -504,23 +1568,15 @@ class KnowledgeBase:
         return list(self._progress_log)[-limit:]
 
     # --- helpers extracted to reduce complexity of public API method ---
-    def _gather_files_for_index(self, root_path: Path, logger: logging.Logger) -> tuple[list[Path], float]:  # noqa: C901
+    def _gather_files_for_index(self, root_path: Path, logger: logging.Logger) -> tuple[list[Path], float]:
         """Gather supported files with size & count limits; returns (paths, scan_seconds)."""
         scan_start = time.monotonic()
         max_scan_files = int(os.getenv("KB_MAX_SCAN_FILES", "10000"))
-        max_file_bytes = int(os.getenv("KB_MAX_FILE_BYTES", "2097152"))
+        max_file_bytes = _max_file_bytes()
         paths: list[Path] = []
 
-        def want(fp: Path) -> bool:
-            if not _is_supported_file(fp):
-                return False
-            try:
-                return fp.stat().st_size <= max_file_bytes
-            except OSError:  # pragma: no cover
-                return False
-
         if not root_path.is_dir():  # Simple file case
-            if want(root_path):  # Only append if supported & under size
+            if _wanted_file(root_path, max_file_bytes):  # Only append if supported & under size
                 paths.append(root_path)
             duration = time.monotonic() - scan_start
             logger.info("KB scan complete: supported_files=%d (%.2fs) path=%s", len(paths), duration, root_path)
@@ -530,7 +1586,7 @@ class KnowledgeBase:
             dirnames[:] = list(dirnames)
             for fname in filenames:
                 fp = Path(r) / fname
-                if want(fp):
+                if _wanted_file(fp, max_file_bytes):
                     paths.append(fp)
                     if len(paths) >= max_scan_files:
                         logger.warning(
@@ -551,12 +1607,13 @@ class KnowledgeBase:
         logger: logging.Logger
 
     def _process_files_for_index(self, paths: list[Path], ctx: _ProcessContext) -> int:
+        self._ensure_loaded()
         total_local = len(paths)
         added_local = 0
         ingest_start_local = time.monotonic()
         for idx, file_path in enumerate(paths, start=1):
             file_start = time.monotonic()
-            file_chunks_added = self._index_single_file(file_path)
+            file_chunks_added = self._index_single_file(file_path, root=ctx.root_path).added
             added_local += file_chunks_added
             file_duration = time.monotonic() - file_start
             ctx.logger.info(
@@ -591,85 +1648,677 @@ class KnowledgeBase:
     def _index_single_file(
         self,
         p: Path,
-    ) -> int:
-        """Index a single supported file; returns number of chunks added.
-
-        Skips unreadable or empty files and logs at INFO/WARN levels. Any embedding
-        errors for a single file are contained and won't stop the folder ingestion.
+        fingerprint: _ManifestEntry | None = None,
+        root: Path | None = None,
+    ) -> _FileResult:
+        """Index a single supported file, replacing any chunks previously indexed for it.
+
+        The file is read, embedded and stored a batch at a time, like in the ingest
+        pipeline, and its manifest entry is updated once all its chunks are stored.
+        Skips unreadable or empty files and logs at INFO/WARN levels. Embedding errors
+        are contained: if every batch fails the old chunks stay in place, and if only
+        some batches fail the embedded chunks are stored but the manifest is left
+        untouched so the file is retried on the next run. Neither stops the folder ingestion.
         """
-        try:
-            text = _read_text_file(p)
-        except (OSError, UnicodeDecodeError, ValueError) as exc:
-            APP_LOGGER.warning("Skipping unreadable file %s: %s", p, exc)
-            return 0
-
-        if not text or not text.strip():
-            APP_LOGGER.info("Skipping empty file: %s", p)
-            return 0
-        # Semantic chunking (preferred over recursive / fixed-size)
-        try:
-            max_chunk_size = int(os.getenv("KB_CHUNK_SIZE", "1000"))
-        except ValueError:
-            max_chunk_size = 1000
-        try:
-            chunk_overlap = int(os.getenv("KB_CHUNK_OVERLAP", "200"))
-        except ValueError:
-            chunk_overlap = 200
-
-        chunks = _semantic_chunk_text(text, max_chunk_size=max_chunk_size, chunk_overlap=chunk_overlap)
-        if not chunks:
-            APP_LOGGER.info("No chunks produced for file: %s", p)
-            return 0
+        item = _IngestItem(index=1, path=p, root=root, started=time.monotonic())
+        item.fingerprint = fingerprint if fingerprint is not None else _fingerprint_file(p)
+        chunker = self._chunker or _default_chunker()
+        chunks = _stream_chunks(p, chunker) if _streams_text(p) else _extract_chunks(p, chunker)
+        if chunks is None:
+            item.complete = False
+            chunks = []
+        for batch in self._chunk_batches(item, chunks):
+            if item.skipped:
+                break
+            self._write_batch(item, batch, self._embed_chunks(p, batch))
+        return self._finish_file(item) or _FileResult()
 
+    def _embed_chunks(self, p: Path, chunks: list[ChunkSpan]) -> EmbeddingBatchResult | None:
+        """Embed a batch of a file's chunks; returns None if the backend is unusable."""
         try:
-            embeddings = self._embedder.embed_texts(chunks)
+            return self._embedder.embed_batches([c.text for c in chunks])
         except Exception as exc:  # noqa: BLE001
             APP_LOGGER.warning("Embedding failed for %s: %s", p, exc)
-            return 0
+            return None
+
+    def _write_batch(self, item: _IngestItem, chunks: list[ChunkSpan], batch: EmbeddingBatchResult | None) -> None:
+        """Pipeline writer: store the embedded chunks of one batch of a file."""
+        start = item.chunks_read
+        item.chunks_read += len(chunks)
+        if batch is None:
+            item.complete = False
+            return
+        item.batches += batch.batches
+        item.failed_batches += batch.failed_batches
+        item.embedded += batch.embedded
+        item.result.embed_seconds += batch.seconds
+        item.result.cached += batch.cached
+        if batch.errors:
+            item.last_error = batch.errors[-1]
+        if batch.failed_batches:
+            item.complete = False
+        embedded = [
+            (start + i, chunk)
+            for i, (chunk, vec) in enumerate(zip(chunks, batch.vectors, strict=True))
+            if vec is not None
+        ]
+        embeddings = [vec for vec in batch.vectors if vec is not None]
+        if item.skipped or not embedded:
+            return
+        dim = self._dim() if item.first_id is None else None
+        if dim is not None and len(embeddings[0]) != dim:
+            APP_LOGGER.warning(
+                "Skipping %s: embedding dimension %d does not match the index (%d).",
+                item.path,
+                len(embeddings[0]),
+                dim,
+            )
+            item.skipped, item.complete = True, False
+            return
+        item.candidates += len(embedded)
+        item.result.tokens += sum(chunk.tokens or 0 for _, chunk in embedded)
+        item.result.max_tokens = max(item.result.max_tokens, *(chunk.tokens or 0 for _, chunk in embedded))
+        self._store_chunks(item, embedded, embeddings)
 
-        added = 0
-        for i, (chunk, vec) in enumerate(zip(chunks, embeddings, strict=True)):
-            rec = _KBRecord(id=self._next_id, source_path=str(p), chunk_id=i, text=chunk, embedding=vec)
-            self._records.append(rec)
-            self._next_id += 1
-            added += 1
-        return added
+    def _store_chunks(
+        self,
+        item: _IngestItem,
+        chunks: list[tuple[int, ChunkSpan]],
+        embeddings: list[list[float]],
+    ) -> None:
+        """Add one batch of a file's ``(chunk_id, span)`` pairs; the first batch removes the file's old chunks.
+
+        Chunks that near-duplicate a stored chunk (or an earlier chunk of the file)
+        are not added; the ids of other files' chunks standing in for them are
+        collected for the manifest entry, so the file is re-indexed if those chunks
+        disappear.
+        """
+        source = str(item.path)
+        if item.first_id is None:
+            item.result.removed = self._remove_records(lambda r: r.source_path == source)
+            item.first_id = self._next_id
+        records, vectors, linked = self._new_records(
+            source,
+            chunks,
+            embeddings,
+            item.root,
+            self._next_id,
+            own_from=item.first_id,
+        )
+        self._add_records(vectors, records)
+        self._next_id += len(records)
+        item.linked.update(linked)
+        item.result.added += len(records)
+
+    def _finish_file(self, item: _IngestItem) -> _FileResult | None:
+        """Pipeline writer: complete a file once all its batches are written; returns None for unchanged files."""
+        if item.status == _FileStatus.UNCHANGED:
+            return None
+        if not item.chunks_read:
+            if item.complete:
+                APP_LOGGER.info("Skipping empty file: %s", item.path)
+                item.result.removed = self._replace_source_chunks(item.path, [], [], item.fingerprint, item.root)[0]
+            return item.result
+        rate_tpl = (
+            "KB embed throughput: file=%s chunks=%d cached=%d batches=%d failed_batches=%d duration=%.2fs "
+            "rate=%.1f chunks/s"
+        )
+        seconds = item.result.embed_seconds
+        rate_args = (
+            item.path,
+            item.embedded,
+            item.result.cached,
+            item.batches,
+            item.failed_batches,
+            seconds,
+            item.embedded / seconds if seconds > 0 else 0.0,
+        )
+        APP_LOGGER.info(rate_tpl, *rate_args)
+        self._progress_log.append(rate_tpl % rate_args)
+        if not item.embedded:
+            APP_LOGGER.warning("Embedding failed for %s: %s", item.path, item.last_error)
+        elif item.failed_batches:
+            APP_LOGGER.warning(
+                "Embedding failed for %d/%d batches of %s; storing the embedded chunks and retrying the file next run.",
+                item.failed_batches,
+                item.batches,
+                item.path,
+            )
+        if item.candidates:
+            self._commit_file(item)
+            item.result.deduplicated = item.candidates - item.result.added
+        return item.result
+
+    def _commit_file(self, item: _IngestItem) -> None:
+        """Record the manifest entry of a file whose chunks are all stored; incomplete files are retried next run."""
+        if item.complete and item.fingerprint is not None:
+            self._record_source(str(item.path), item.fingerprint, item.result.added, sorted(item.linked))
+
+    def _record_source(self, source: str, fingerprint: _ManifestEntry, chunks: int, linked: list[int]) -> None:
+        """Set the manifest entry of ``source`` to ``fingerprint``."""
+        fingerprint.chunks = chunks
+        fingerprint.linked = linked
+        self._manifest[source] = fingerprint
+        self._manifest_changes[source] = fingerprint
+
+    def _replace_source_chunks(
+        self,
+        p: Path,
+        chunks: list[tuple[int, ChunkSpan]],
+        embeddings: list[list[float]],
+        fingerprint: _ManifestEntry | None,
+        root: Path | None = None,
+    ) -> tuple[int, int]:
+        """Swap every stored chunk of ``p`` for ``(chunk_id, span)`` pairs at once; returns ``(removed, added)``.
+
+        ``root`` is the folder being indexed, recorded for metadata filters.
+        Near-duplicate chunks are left out as in ``_store_chunks``.
+        """
+        source = str(p)
+        removed = self._remove_records(lambda r: r.source_path == source)
+        records, vectors, linked = self._new_records(source, chunks, embeddings, root, self._next_id)
+        self._add_records(vectors, records)
+        self._next_id += len(records)
+        if fingerprint is not None:
+            self._record_source(source, fingerprint, len(records), linked)
+        return removed, len(records)
+
+    def _add_records(self, vectors: list[list[float]] | np.ndarray, records: list[_KBRecord]) -> None:
+        """Add records and their embeddings to the store and the lexical and metadata indexes."""
+        for record in records:
+            _hold_text(record, self._texts)
+        self._store.add(vectors, records)
+        for record in records:
+            self._lexical.add(record.id, record.text)
+            self._metadata.add(record.id, record.filter_fields())
+            self._records_by_id[record.id] = record
+        if records:
+            self._generation += 1
+
+    def _new_records(  # noqa: PLR0913
+        self,
+        source: str,
+        chunks: list[tuple[int, ChunkSpan]],
+        embeddings: list[list[float]],
+        root: Path | None,
+        first_id: int,
+        own_from: int | None = None,
+    ) -> tuple[list[_KBRecord], list[list[float]], list[int]]:
+        """Build the records of ``source`` from id ``first_id`` on, leaving out near-duplicate chunks.
+
+        Returns the records, their embeddings and the sorted ids of other files'
+        chunks that stand in for left-out chunks. Records from id ``own_from``
+        (default ``first_id``) on are earlier chunks of ``source`` itself.
+        """
+        own_from = first_id if own_from is None else own_from
+        dedup = self._near_duplicate_index()
+        now = time.time()
+        records: list[_KBRecord] = []
+        vectors: list[list[float]] = []
+        linked: set[int] = set()
+        for (chunk_id, span), vector in zip(chunks, embeddings, strict=True):
+            text_hash = simhash(span.text)
+            if dedup is not None and text_hash is not None and (original := dedup.find(text_hash)) is not None:
+                if original < own_from:
+                    linked.add(original)
+                continue
+            record = _KBRecord(
+                id=first_id + len(records),
+                source_path=source,
+                chunk_id=chunk_id,
+                stored_text=span.text,
+                offset=span.offset,
+                root=str(root) if root is not None else None,
+                ingested_at=now,
+                page=span.page,
+                simhash=text_hash,
+            )
+            records.append(record)
+            vectors.append(vector)
+            if dedup is not None and text_hash is not None:
+                dedup.add(record.id, text_hash)
+        return records, vectors, sorted(linked)
+
+    def _near_duplicate_index(self) -> SimHashIndex | None:
+        """Return the fingerprint index of the stored chunks, or None when deduplication is disabled."""
+        distance = _dedup_distance()
+        if distance is None:
+            self._dedup = None
+        elif self._dedup is None or self._dedup.max_distance != distance:
+            self._dedup = SimHashIndex(distance)
+            for record_id, text_hash in self._fingerprints():
+                self._dedup.add(record_id, text_hash)
+        return self._dedup
+
+    def _fingerprints(self) -> Iterator[tuple[int, int]]:
+        """Yield ``(record id, simhash)`` for every stored chunk that has a fingerprint."""
+        return ((r.id, r.simhash) for r in self._records_by_id.values() if r.simhash is not None)
+
+    def _remove_records(self, predicate: Callable[[_KBRecord], bool]) -> int:
+        """Drop matching records from the vector store and the lexical index; returns the number removed."""
+        removed_ids: list[int] = []
+
+        def match(record: _KBRecord) -> bool:
+            if predicate(record):
+                removed_ids.append(record.id)
+                return True
+            return False
+
+        removed = self._store.remove_where(match)
+        # Records of these sources added from now on start a fresh text (see ``_hold_text``)
+        for source in {self._records_by_id[i].source_path for i in removed_ids if i in self._records_by_id}:
+            self._texts.pop(source, None)
+        self._lexical.remove(removed_ids)
+        self._metadata.remove(removed_ids)
+        if self._dedup is not None:
+            self._dedup.remove(removed_ids)
+        # Records added since the last commit are simply not written; older ones are logged as deletes
+        self._pending_deletes.extend(i for i in removed_ids if i < self._committed_next_id)
+        for record_id in removed_ids:
+            self._records_by_id.pop(record_id, None)
+        if removed:
+            self._generation += 1
+        return removed
 
     # --------------- Query ---------------
-    def query(self, query: str, top_k: int = 5) -> list[dict[str, Any]]:
-        """Return the top_k most similar chunks for the given query string.
+    def query(  # noqa: PLR0913
+        self,
+        query: str,
+        top_k: int = 5,
+        nprobe: int | None = None,
+        mode: QueryMode | None = None,
+        latency_budget_ms: float | None = None,
+        *,
+        where: dict[str, Any] | None = None,
+        diversity: float | None = None,
+    ) -> list[dict[str, Any]]:
+        """Return the top_k most relevant chunks for the given query string.
+
+        ``mode`` selects vector, lexical or hybrid ranking (default ``KB_QUERY_MODE``).
+        If ``latency_budget_ms`` is given and recent query embeddings took longer
+        than that, the query falls back to the lexical fast path. When an IVF index
+        is built, only the ``nprobe`` nearest cells are scanned (default
+        ``KB_ANN_NPROBE``); pass ``nprobe=0`` for an exact search.
+        ``where`` filters on record metadata (root, path, suffix, ingested_at, page;
+        see ``metadata``); the matching chunks are resolved from the secondary
+        indexes first and only they are scored. An invalid filter raises ``ValueError``.
+        ``diversity`` (default ``KB_MMR_DIVERSITY``; 0 disables) re-selects the
+        results from a larger candidate pool by maximal marginal relevance, so
+        near-copies do not take several of the ``top_k`` slots.
+        Results are cached until the knowledge base changes (see ``query_cache``).
+        Each result contains: { text, source_path, score, tokens }, where ``tokens``
+        counts the text with ``KB_TOKENIZER``.
+        """
+        with self._in_use():
+            if not query.strip():
+                return []
+            self._last_query = time.monotonic()
+            self._ensure_loaded()
+            mode = self.resolve_mode(mode, latency_budget_ms)
+            top_k = max(1, top_k)
+            diversity = _mmr_diversity() if diversity is None else diversity
+            generation = self.generation
+            key = self._cache_key(query, top_k, nprobe, mode, where=where, diversity=diversity)
+            if (cached := self._cached_results(key, generation)) is not None:
+                return cached
+            if self.is_empty():
+                return []
+            allowed = self._filter_ids(where)
+            if allowed is not None and not allowed:
+                return []
+            k = _candidate_count(mode, top_k, diversity)
+            qvec = None
+            vector = None
+            if mode != QueryMode.LEXICAL:
+                try:
+                    start = time.monotonic()
+                    qvecs = self._embedder.embed_texts([query])
+                    self._embedder.record_query_latency(time.monotonic() - start)
+                    qvec = qvecs[0]
+                    if (cached := self._cached_results(key, generation, qvec)) is not None:
+                        return cached
+                    vector = self._vector_hits(qvecs, k, nprobe, allowed)[0]
+                except Exception as exc:
+                    if mode == QueryMode.VECTOR:
+                        raise
+                    APP_LOGGER.warning("KB query embedding failed (%s); returning lexical results only", exc)
+            lexical = self._lexical_hits(query, k, allowed) if mode != QueryMode.VECTOR else []
+            results = _to_results(self._diversify(_rank(mode, k, vector, lexical), top_k, diversity))
+            _log_retrieval(query, results)
+            if mode == QueryMode.LEXICAL or vector is not None:
+                self._cache_results(key, generation, results, qvec)
+            return results
+
+    async def aquery(  # noqa: PLR0913
+        self,
+        query: str,
+        top_k: int = 5,
+        nprobe: int | None = None,
+        mode: QueryMode | None = None,
+        latency_budget_ms: float | None = None,
+        *,
+        where: dict[str, Any] | None = None,
+        diversity: float | None = None,
+        query_vector: list[float] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Async version of ``query`` that never blocks the event loop.
+
+        The embedding request is awaited on the async client and scoring runs in a
+        worker thread, so concurrent agents can retrieve context at the same time.
+        """
+        vectors = [query_vector] if query_vector is not None else None
+        return (
+            await self.aquery_many(
+                [query],
+                top_k,
+                nprobe,
+                mode,
+                latency_budget_ms,
+                where=where,
+                diversity=diversity,
+                query_vectors=vectors,
+            )
+        )[0]
 
-        Each result contains: { text, source_path, score }.
+    async def aquery_many(  # noqa: PLR0913
+        self,
+        queries: list[str],
+        top_k: int = 5,
+        nprobe: int | None = None,
+        mode: QueryMode | None = None,
+        latency_budget_ms: float | None = None,
+        *,
+        where: dict[str, Any] | None = None,
+        diversity: float | None = None,
+        query_vectors: list[list[float]] | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        """Answer several queries with one batched embedding call and one matrix multiply.
+
+        Returns one result list per query, in order; blank queries get ``[]``.
+        ``query_vectors`` are precomputed embeddings of ``queries`` (as made by a
+        ``KnowledgeBaseRegistry`` fanning one query out over several collections);
+        the embedding call is then skipped. See ``query`` for the other parameters.
         """
-        if not query.strip() or not self._records:
+        with self._in_use():
+            results: list[list[dict[str, Any]]] = [[] for _ in queries]
+            live = [i for i, q in enumerate(queries) if q.strip()]
+            if not live:
+                return results
+            self._last_query = time.monotonic()
+            await asyncio.to_thread(self._ensure_loaded)
+            mode = self.resolve_mode(mode, latency_budget_ms)
+            top_k = max(1, top_k)
+            diversity = _mmr_diversity() if diversity is None else diversity
+            generation = self.generation
+            keys = {i: self._cache_key(queries[i], top_k, nprobe, mode, where=where, diversity=diversity) for i in live}
+            live = self._serve_cached(live, keys, generation, results)
+            if not live or await asyncio.to_thread(self.is_empty):
+                return results
+            allowed = self._filter_ids(where)
+            if allowed is not None and not allowed:
+                return results
+            k = _candidate_count(mode, top_k, diversity)
+            qvecs: dict[int, list[float]] = {}
+            vector: dict[int, list[tuple[_KBRecord, float]]] = {}
+            if mode != QueryMode.LEXICAL:
+                try:
+                    precomputed = [query_vectors[i] for i in live] if query_vectors is not None else None
+                    embedded = await self._embed_queries([queries[i] for i in live], precomputed)
+                    qvecs = dict(zip(live, embedded, strict=True))
+                    live = self._serve_cached(live, keys, generation, results, qvecs)
+                    found = await asyncio.to_thread(self._vector_hits, [qvecs[i] for i in live], k, nprobe, allowed)
+                    vector = dict(zip(live, found, strict=True))
+                except Exception as exc:
+                    if mode == QueryMode.VECTOR:
+                        raise
+                    APP_LOGGER.warning("KB query embedding failed (%s); returning lexical results only", exc)
+            lexical: dict[int, list[tuple[_KBRecord, float]]] = {}
+            if mode != QueryMode.VECTOR:
+                lexical = await asyncio.to_thread(lambda: {i: self._lexical_hits(queries[i], k, allowed) for i in live})
+            for i in live:
+                hits = _rank(mode, k, vector.get(i), lexical.get(i, []))
+                results[i] = _to_results(self._diversify(hits, top_k, diversity))
+                _log_retrieval(queries[i], results[i])
+                if mode == QueryMode.LEXICAL or i in vector:
+                    self._cache_results(keys[i], generation, results[i], qvecs.get(i))
+            return results
+
+    async def _embed_queries(self, texts: list[str], precomputed: list[list[float]] | None) -> list[list[float]]:
+        """Return ``precomputed`` if given, else embed ``texts`` and record the query latency."""
+        if precomputed is not None:
+            return precomputed
+        start = time.monotonic()
+        vectors = await self._embedder.aembed_texts(texts)
+        self._embedder.record_query_latency(time.monotonic() - start)
+        return vectors
+
+    def _cache_key(  # noqa: PLR0913
+        self,
+        query: str,
+        top_k: int,
+        nprobe: int | None,
+        mode: QueryMode,
+        *,
+        where: dict[str, Any] | None,
+        diversity: float,
+    ) -> QueryKey:
+        return normalise_query(query), (top_k, self._nprobe(nprobe), mode.value, diversity, filter_key(where))
+
+    def _cached_results(
+        self,
+        key: QueryKey,
+        generation: int,
+        vector: list[float] | None = None,
+    ) -> list[dict[str, Any]] | None:
+        """Return cached results of ``key``, or with ``vector`` those of a similar cached query; else None."""
+        cache = self._query_cache
+        if cache is None:
+            return None
+        return cache.get(key, generation) if vector is None else cache.get_similar(key, vector, generation)
+
+    def _cache_results(
+        self,
+        key: QueryKey,
+        generation: int,
+        results: list[dict[str, Any]],
+        vector: list[float] | None,
+    ) -> None:
+        if self._query_cache is not None:
+            self._query_cache.put(key, generation, results, vector)
+
+    def _serve_cached(
+        self,
+        live: list[int],
+        keys: dict[int, QueryKey],
+        generation: int,
+        results: list[list[dict[str, Any]]],
+        vectors: dict[int, list[float]] | None = None,
+    ) -> list[int]:
+        """Fill ``results`` of the ``live`` queries found in the cache; returns the ones still to compute."""
+        remaining = []
+        for i in live:
+            cached = self._cached_results(keys[i], generation, vectors[i] if vectors is not None else None)
+            if cached is None:
+                remaining.append(i)
+            else:
+                results[i] = cached
+        return remaining
+
+    def resolve_mode(self, mode: QueryMode | None, latency_budget_ms: float | None) -> QueryMode:
+        """Apply the default mode and fall back to lexical search when embeddings are over budget."""
+        mode = mode or _default_query_mode()
+        embed_seconds = self._embedder.query_seconds
+        if (
+            mode != QueryMode.LEXICAL
+            and latency_budget_ms is not None
+            and embed_seconds is not None
+            and embed_seconds * 1000 > latency_budget_ms
+        ):
+            APP_LOGGER.debug(
+                "KB query embedding latency %.0fms exceeds budget %.0fms; using lexical search",
+                embed_seconds * 1000,
+                latency_budget_ms,
+            )
+            return QueryMode.LEXICAL
+        return mode
+
+    def _diversify(
+        self,
+        hits: list[tuple[_KBRecord, float]],
+        top_k: int,
+        diversity: float,
+    ) -> list[tuple[_KBRecord, float]]:
+        """Pick ``top_k`` of the ranked ``hits`` by maximal marginal relevance over their stored vectors."""
+        if diversity <= 0 or len(hits) <= top_k:
+            return hits[:top_k]
+        vectors = self._vectors_for([record.id for record, _ in hits])
+        picks = mmr(np.array([score for _, score in hits]), vectors, top_k, diversity)
+        return [hits[i] for i in picks]
+
+    def _vector_hits(
+        self,
+        qvecs: list[list[float]],
+        top_k: int,
+        nprobe: int | None,
+        allowed: set[int] | None,
+    ) -> list[list[tuple[_KBRecord, float]]]:
+        """Return the ``top_k`` nearest records of each query vector, restricted to ``allowed`` ids if given."""
+        return self._store.search_many(qvecs, top_k, self._nprobe(nprobe), _quant_settings()[1], _id_array(allowed))
+
+    def _vectors_for(self, ids: list[int]) -> np.ndarray:
+        """Return the normalised embeddings of the records ``ids``, in order."""
+        return self._store.vectors_for(ids)
+
+    def _dim(self) -> int | None:
+        """Return the embedding dimension of the index, or None while it is empty."""
+        return self._store.dim
+
+    @staticmethod
+    def _nprobe(nprobe: int | None) -> int:
+        return _ann_settings()[1] if nprobe is None else nprobe
+
+    def _filter_ids(self, where: dict[str, Any] | None) -> set[int] | None:
+        """Return the ids of the records matching ``where``, or None when there is no filter."""
+        return self._metadata.select(where) if where else None
+
+    def _lexical_hits(self, query: str, top_k: int, allowed: set[int] | None = None) -> list[tuple[_KBRecord, float]]:
+        hits = self._lexical.search(query, top_k, allowed)
+        return [(self._records_by_id[i], score) for i, score in hits if i in self._records_by_id]
+
+    def ann_recall_report(
+        self,
+        k: int = 10,
+        nprobes: tuple[int, ...] = (1, 2, 4, 8, 16, 32, 64),
+        samples: int = 200,
+        seed: int = 0,
+    ) -> list[RecallReport]:
+        """Measure recall@k and latency of the IVF search against the exact scan, per ``nprobe``.
+
+        Queries are midpoints of random pairs of indexed chunks, so no embedding
+        calls are made. If no IVF index is built yet, a temporary one is trained.
+        """
+        self._ensure_loaded()
+        matrix, _ = self._store.snapshot()
+        if not matrix.shape[0]:
             return []
-        qvec = self._embedder.embed_texts([query])[0]
-        scored = [
-            {
-                "text": r.text,
-                "source_path": r.source_path,
-                "score": _cosine_similarity(qvec, r.embedding),
-            }
-            for r in self._records
-        ]
-        scored.sort(key=lambda x: x["score"], reverse=True)
-        return scored[: max(1, top_k)]
+        ann = self._store.ann
+        if ann is None or ann.assignments.shape[0] != matrix.shape[0]:
+            ann = IVFIndex.train(matrix)
+        rng = np.random.default_rng(seed)
+        pairs = rng.integers(0, matrix.shape[0], size=(samples, 2))
+        queries = np.asarray(matrix[pairs[:, 0]], dtype=np.float32) + np.asarray(matrix[pairs[:, 1]], dtype=np.float32)
+        reports = evaluate_recall(matrix, ann, queries, k=k, nprobes=nprobes)
+        for r in reports:
+            APP_LOGGER.info(
+                "KB ANN recall@%d: nprobe=%d/%d recall=%.3f ann=%.2fms exact=%.2fms",
+                r.k,
+                r.nprobe,
+                ann.nlist,
+                r.recall,
+                r.ann_ms,
+                r.exact_ms,
+            )
+        return reports
+
+    def quantization_report(
+        self,
+        k: int = 10,
+        modes: tuple[QuantizationMode, ...] = (QuantizationMode.FLOAT16, QuantizationMode.INT8, QuantizationMode.PQ),
+        samples: int = 200,
+        seed: int = 0,
+    ) -> list[QuantizationReport]:
+        """Measure memory reduction and recall@k of each quantisation mode on the indexed chunks.
+
+        Queries are built like in ``ann_recall_report``; the re-rank factor is
+        ``KB_RERANK_FACTOR``.
+        """
+        self._ensure_loaded()
+        matrix, _ = self._store.snapshot()
+        if not matrix.shape[0]:
+            return []
+        rng = np.random.default_rng(seed)
+        pairs = rng.integers(0, matrix.shape[0], size=(samples, 2))
+        queries = np.asarray(matrix[pairs[:, 0]], dtype=np.float32) + np.asarray(matrix[pairs[:, 1]], dtype=np.float32)
+        reports = benchmark_quantization(matrix, queries, k=k, modes=modes, rerank=_quant_settings()[1])
+        for r in reports:
+            APP_LOGGER.info(
+                "KB quantisation recall@%d: mode=%s bytes=%d reduction=%.1fx recall=%.3f reranked=%.3f",
+                k,
+                r.mode.value,
+                r.bytes_per_vector,
+                r.memory_reduction,
+                r.recall,
+                r.recall_rerank,
+            )
+        return reports
 
     # --------------- Stats ---------------
     def record_count(self) -> int:
         """Return the total number of indexed chunks in the knowledge base."""
-        return len(self._records)
+        self._ensure_loaded()
+        return len(self._store)
+
+    def embedding_cache_stats(self) -> EmbeddingCacheStats | None:
+        """Return the embedding cache counters, or None if the cache is disabled."""
+        cache = self._embedder.cache
+        return cache.stats() if cache is not None else None
+
+    def query_cache_stats(self) -> QueryCacheStats | None:
+        """Return the query result cache counters, or None if the cache is disabled."""
+        return self._query_cache.stats() if self._query_cache is not None else None
+
+    def roots(self) -> list[str]:
+        """Return the distinct roots (indexed folders or files) that chunks were ingested from."""
+        self._ensure_loaded()
+        return self._metadata.values("root")
 
     def is_empty(self) -> bool:
         """Return True if the knowledge base has no indexed content."""
-        return len(self._records) == 0
+        self._ensure_loaded()
+        return len(self._store) == 0
 
     def clear(self) -> None:
-        """Clear all indexed content from the knowledge base."""
-        self._records = []
-        self._next_id = 1
-        self._save()
+        """Clear all indexed content from the knowledge base.
 
-
-# Global singleton to share across UI and actions
-GLOBAL_KB = KnowledgeBase()
+        A running compaction is awaited first, so it cannot bring back the cleared records.
+        """
+        with self._load_lock:
+            self._loaded = True
+        with self._write_lock:
+            compactor = self._compactor
+            if compactor is not None:
+                compactor.join()
+            self._store.clear()
+            self._lexical.clear()
+            self._metadata.clear()
+            self._records_by_id = {}
+            self._texts = {}
+            self._dedup = None
+            self._next_id = self._committed_next_id = 1
+            self._manifest = {}
+            self._pending_deletes, self._manifest_changes = [], {}
+            self._generation += 1
+            # The index may not have been opened; make sure every segment on disk is superseded
+            self._segment_seq = max(self._segment_seq, last_segment(self.storage_path))
+            snapshot = self._base_snapshot()
+        self._write_base(snapshot)
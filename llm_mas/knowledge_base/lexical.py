@@ -0,0 +1,145 @@
+"""BM25 inverted index over knowledge base chunk text.
+
+Complements the embedding search: exact identifiers such as file names, error
+codes or SKUs are matched literally, and a lexical query needs no embedding call.
+
+Documents are keyed by the KB record id. Tokens are lower-cased alphanumeric runs;
+compound identifiers joined by ``. _ - / :`` (``report_v2.pdf``, ``ERR-404``) are
+indexed both whole and as their parts, so either spelling matches.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Container, Iterable, Iterator
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+(?:[._\-/:][0-9a-z]+)*")
+_SPLIT_RE = re.compile(r"[._\-/:]")
+
+RRF_K = 60
+"""Rank offset of reciprocal rank fusion; 60 is the value from the original RRF paper."""
+
+
+def tokenize(text: str) -> Iterator[str]:
+    """Yield the index terms of ``text``."""
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        yield token
+        if _SPLIT_RE.search(token):
+            yield from (part for part in _SPLIT_RE.split(token) if part)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[list[int]], k: int = RRF_K) -> list[tuple[int, float]]:
+    """Fuse best-first id rankings; returns ``(id, score)`` pairs, best first."""
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """Incrementally maintained Okapi BM25 index keyed by integer document ids."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        """Initialize an empty index with the usual BM25 parameters."""
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[int, int]] = {}
+        self._doc_len: dict[int, int] = {}
+        self._doc_terms: dict[int, list[str]] = {}
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of indexed documents."""
+        return len(self._doc_len)
+
+    def add(self, doc_id: int, text: str) -> None:
+        """Index ``text`` under ``doc_id``, replacing any previous text of that id."""
+        terms = Counter(tokenize(text))
+        with self._lock:
+            self._remove_locked(doc_id)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            length = sum(terms.values())
+            self._doc_len[doc_id] = length
+            self._doc_terms[doc_id] = list(terms)
+            self._total_len += length
+
+    def remove(self, doc_ids: Iterable[int]) -> None:
+        """Drop the given documents; unknown ids are ignored."""
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove_locked(doc_id)
+
+    def clear(self) -> None:
+        """Drop every document."""
+        with self._lock:
+            self._postings, self._doc_len, self._doc_terms, self._total_len = {}, {}, {}, 0
+
+    def search(self, query: str, top_k: int, allowed: Container[int] | None = None) -> list[tuple[int, float]]:
+        """Return ``(doc_id, bm25_score)`` pairs for the best ``top_k`` documents.
+
+        ``allowed`` restricts scoring to those document ids; corpus statistics
+        (idf, average length) still cover every document.
+        """
+        terms = set(tokenize(query))
+        if not terms or top_k <= 0:
+            return []
+        scores: dict[int, float] = {}
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs or 1.0
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = self.k1 * (1.0 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def to_json(self) -> dict[str, Any]:
+        """Serialize the postings as ``{"docs": {id: length}, "postings": {term: [[id, tf], ...]}}``."""
+        with self._lock:
+            return {
+                "docs": {str(doc_id): length for doc_id, length in self._doc_len.items()},
+                "postings": {term: [[d, tf] for d, tf in docs.items()] for term, docs in self._postings.items()},
+            }
+
+    @staticmethod
+    def from_json(d: dict[str, Any]) -> BM25Index:
+        """Rebuild an index serialized by ``to_json``."""
+        index = BM25Index()
+        index._doc_len = {int(doc_id): int(length) for doc_id, length in d["docs"].items()}
+        index._total_len = sum(index._doc_len.values())
+        index._postings = {term: {int(d): int(tf) for d, tf in pairs} for term, pairs in d["postings"].items()}
+        index._doc_terms = {doc_id: [] for doc_id in index._doc_len}
+        for term, postings in index._postings.items():
+            for doc_id in postings:
+                index._doc_terms[doc_id].append(term)
+        return index
+
+    def _remove_locked(self, doc_id: int) -> None:
+        length = self._doc_len.pop(doc_id, None)
+        if length is None:
+            return
+        self._total_len -= length
+        for term in self._doc_terms.pop(doc_id, []):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
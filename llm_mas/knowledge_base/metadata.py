@@ -0,0 +1,174 @@
+"""Secondary indexes over knowledge base record metadata, used to filter queries.
+
+Every record carries a few structured fields (see ``FILTER_FIELDS``). For each
+field the index keeps the ids of the records holding each value, plus the sorted
+distinct values, so a filter resolves to a set of ids without touching the
+records: equality and membership are dictionary lookups, and ranges and path
+prefixes are a bisection over the distinct values.
+
+A filter (``where``) is a dict of field conditions that must all hold:
+
+- a scalar matches that value: ``{"suffix": ".pdf"}``
+- a list, tuple or set matches any of its values: ``{"suffix": [".md", ".txt"]}``
+- a dict applies operators: ``eq``, ``in``, ``gt``, ``gte``, ``lt``, ``lte`` and,
+  for strings, ``prefix``: ``{"ingested_at": {"gte": 1718000000}, "page": {"lte": 3}}``
+
+Records without a value for a field (e.g. ``page`` of a text file) never match a
+condition on it.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+FILTER_FIELDS = ("root", "path", "suffix", "ingested_at", "page")
+"""Fields a query filter can use: indexed root folder, source path, lower-case file
+suffix, ingestion time (epoch seconds) and 1-based page (paged formats only)."""
+
+_RANGE_OPS = {"gt", "gte", "lt", "lte"}
+
+
+class _FieldIndex:
+    """Postings of one field: value -> ids, plus the distinct values in sorted order."""
+
+    def __init__(self) -> None:
+        self.postings: dict[Any, set[int]] = {}
+        self.values: list[Any] = []
+
+    def add(self, value: Any, doc_id: int) -> None:  # noqa: ANN401
+        ids = self.postings.get(value)
+        if ids is None:
+            ids = self.postings[value] = set()
+            bisect.insort(self.values, value)
+        ids.add(doc_id)
+
+    def remove(self, value: Any, doc_id: int) -> None:  # noqa: ANN401
+        ids = self.postings.get(value)
+        if ids is None:
+            return
+        ids.discard(doc_id)
+        if not ids:
+            del self.postings[value]
+            del self.values[bisect.bisect_left(self.values, value)]
+
+    def between(self, lo: Any, hi: Any, *, lo_open: bool, hi_open: bool) -> set[int]:  # noqa: ANN401
+        """Return the ids whose value lies between ``lo`` and ``hi`` (either may be None for unbounded)."""
+        start, stop = 0, len(self.values)
+        if lo is not None:
+            start = (bisect.bisect_right if lo_open else bisect.bisect_left)(self.values, lo)
+        if hi is not None:
+            stop = (bisect.bisect_left if hi_open else bisect.bisect_right)(self.values, hi)
+        out: set[int] = set()
+        for value in self.values[start:stop]:
+            out |= self.postings[value]
+        return out
+
+    def lookup(self, values: Iterable[Any]) -> set[int]:
+        out: set[int] = set()
+        for value in values:
+            out |= self.postings.get(value, set())
+        return out
+
+
+class MetadataIndex:
+    """Secondary indexes over the ``FILTER_FIELDS`` of every record, keyed by record id."""
+
+    def __init__(self) -> None:
+        """Initialize empty indexes."""
+        self._fields = {name: _FieldIndex() for name in FILTER_FIELDS}
+        self._docs: dict[int, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of indexed records."""
+        return len(self._docs)
+
+    def add(self, doc_id: int, fields: dict[str, Any]) -> None:
+        """Index the non-None ``fields`` of ``doc_id``, replacing any previous entry."""
+        values = {name: fields[name] for name in FILTER_FIELDS if fields.get(name) is not None}
+        with self._lock:
+            self._remove_locked(doc_id)
+            for name, value in values.items():
+                self._fields[name].add(value, doc_id)
+            self._docs[doc_id] = values
+
+    def remove(self, doc_ids: Iterable[int]) -> None:
+        """Drop the given records; unknown ids are ignored."""
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove_locked(doc_id)
+
+    def clear(self) -> None:
+        """Drop every record."""
+        with self._lock:
+            self._fields = {name: _FieldIndex() for name in FILTER_FIELDS}
+            self._docs = {}
+
+    def values(self, field: str) -> list[Any]:
+        """Return the distinct values of ``field``, sorted."""
+        with self._lock:
+            return list(self._field(field).values)
+
+    def select(self, where: dict[str, Any]) -> set[int]:
+        """Return the ids of the records matching every condition of ``where``.
+
+        Raises ``ValueError`` for an unknown field or operator, or a bound of the wrong type.
+        """
+        result: set[int] | None = None
+        with self._lock:
+            for field, condition in where.items():
+                try:
+                    ids = self._match(self._field(field), condition)
+                except TypeError as exc:
+                    msg = f"Filter on {field!r} compares values of different types: {exc}"
+                    raise ValueError(msg) from exc
+                result = ids if result is None else result & ids
+                if not result:
+                    return set()
+            return result if result is not None else set(self._docs)
+
+    def _field(self, field: str) -> _FieldIndex:
+        index = self._fields.get(field)
+        if index is None:
+            msg = f"Unknown filter field {field!r}; expected one of {', '.join(FILTER_FIELDS)}."
+            raise ValueError(msg)
+        return index
+
+    @staticmethod
+    def _match(index: _FieldIndex, condition: Any) -> set[int]:  # noqa: ANN401
+        if isinstance(condition, (list, tuple, set, frozenset)):
+            return index.lookup(condition)
+        if not isinstance(condition, dict):
+            return index.lookup([condition])
+        unknown = set(condition) - _RANGE_OPS - {"eq", "in", "prefix"}
+        if unknown:
+            msg = f"Unknown filter operator(s): {', '.join(sorted(unknown))}."
+            raise ValueError(msg)
+        ids: set[int] | None = None
+        if "eq" in condition:
+            ids = index.lookup([condition["eq"]])
+        if "in" in condition:
+            found = index.lookup(condition["in"])
+            ids = found if ids is None else ids & found
+        if "prefix" in condition:
+            prefix = str(condition["prefix"])
+            found = index.between(prefix, prefix + "\U0010ffff", lo_open=False, hi_open=True)
+            ids = found if ids is None else ids & found
+        if _RANGE_OPS & set(condition):
+            lo = condition.get("gt", condition.get("gte"))
+            hi = condition.get("lt", condition.get("lte"))
+            found = index.between(lo, hi, lo_open="gt" in condition, hi_open="lt" in condition)
+            ids = found if ids is None else ids & found
+        return ids if ids is not None else set()
+
+    def _remove_locked(self, doc_id: int) -> None:
+        values = self._docs.pop(doc_id, None)
+        if values is None:
+            return
+        for name, value in values.items():
+            self._fields[name].remove(value, doc_id)
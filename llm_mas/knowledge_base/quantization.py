@@ -0,0 +1,323 @@
+"""Quantised embedding codes for the knowledge base vector store.
+
+Every mode encodes a normalised float32 row into a fixed number of bytes, stored as
+one ``uint8`` row per vector so the store can grow, compact and persist codes
+exactly like its float32 matrix:
+
+- ``float16``: half-precision copy (2 bytes per dimension, 2x smaller).
+- ``int8``: symmetric scalar quantisation with one float32 scale per vector
+  (1 byte per dimension + 4 bytes, ~4x smaller).
+- ``pq``: product quantisation; the vector is split into ``m`` sub-vectors, each
+  replaced by the id of its nearest of 256 centroids trained on the corpus
+  (``m`` bytes per vector; the default 4 dimensions per byte is 16x smaller).
+
+Scores are approximate inner products computed from the codes (asymmetric
+distance: the query stays float32). Re-ranking re-scores the best candidates
+against the exact float32 rows, which recovers most of the recall loss; use
+``benchmark_quantization`` to measure it for a corpus.
+"""
+
+from __future__ import annotations
+
+import time
+from abc import abstractmethod
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING, ClassVar
+
+import numpy as np
+
+from llm_mas.knowledge_base.vector_store import normalise_rows, top_k_indices
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+_SCORE_BLOCK_ROWS = 16_384
+"""Rows decoded at a time while scoring, bounding the float32 scratch memory."""
+
+_ENCODE_BLOCK_ROWS = 65_536
+
+_PQ_CENTROIDS = 256
+
+
+class QuantizationMode(Enum):
+    """How the vector store encodes embeddings for scoring."""
+
+    NONE = "none"
+    FLOAT16 = "float16"
+    INT8 = "int8"
+    PQ = "pq"
+
+
+class Quantizer:
+    """Base class of the code formats; ``encode`` and ``score`` must agree on the layout."""
+
+    mode: ClassVar[QuantizationMode]
+
+    def __init__(self, dim: int) -> None:
+        """Initialize a quantizer for ``dim``-dimensional vectors."""
+        self.dim = dim
+
+    @property
+    @abstractmethod
+    def code_bytes(self) -> int:
+        """Return the size of one encoded vector in bytes."""
+
+    @abstractmethod
+    def encode(self, rows: np.ndarray) -> np.ndarray:
+        """Return the ``(n, code_bytes)`` uint8 codes of normalised ``rows``."""
+
+    def encode_blocked(self, matrix: np.ndarray) -> np.ndarray:
+        """Encode a (possibly memory-mapped) matrix in blocks, bounding the scratch memory."""
+        codes = np.empty((matrix.shape[0], self.code_bytes), dtype=np.uint8)
+        for lo in range(0, matrix.shape[0], _ENCODE_BLOCK_ROWS):
+            block = np.asarray(matrix[lo : lo + _ENCODE_BLOCK_ROWS], dtype=np.float32)
+            codes[lo : lo + block.shape[0]] = self.encode(block)
+        return codes
+
+    @abstractmethod
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Return the approximate inner product of normalised ``query`` with each coded row."""
+
+    def search(  # noqa: PLR0913
+        self,
+        codes: np.ndarray,
+        matrix: np.ndarray,
+        query: np.ndarray,
+        top_k: int,
+        *,
+        rerank: int,
+        rows: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return ``(rows, scores)`` of the best ``top_k`` vectors, scored on ``codes``.
+
+        ``rows`` maps each code to its row of ``matrix`` (default: the identity,
+        i.e. ``codes`` covers every row). With ``rerank > 0`` the best
+        ``top_k * rerank`` approximate candidates are re-scored exactly against the
+        float32 ``matrix``; only those rows are read from it.
+        """
+        approx = self.score(codes, query)
+        if rerank <= 0:
+            best = top_k_indices(approx, top_k)
+            return (best if rows is None else rows[best]), approx[best]
+        pool = np.sort(top_k_indices(approx, top_k * rerank))
+        candidates = pool if rows is None else rows[pool]
+        exact = np.asarray(matrix[candidates], dtype=np.float32) @ query
+        best = top_k_indices(exact, top_k)
+        return candidates[best], exact[best]
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """Return the trained state to persist (empty for stateless modes)."""
+        return {}
+
+    @staticmethod
+    def from_arrays(mode: QuantizationMode, dim: int, arrays: dict[str, np.ndarray]) -> Quantizer:
+        """Rebuild a quantizer persisted with ``to_arrays``."""
+        if mode == QuantizationMode.PQ:
+            return PQQuantizer(np.asarray(arrays["codebooks"], dtype=np.float32), int(arrays["trained_rows"]))
+        return make_quantizer(mode, dim)
+
+
+class Float16Quantizer(Quantizer):
+    """Half-precision codes."""
+
+    mode = QuantizationMode.FLOAT16
+
+    @property
+    def code_bytes(self) -> int:
+        """Return two bytes per dimension."""
+        return self.dim * 2
+
+    def encode(self, rows: np.ndarray) -> np.ndarray:
+        """Return the rows as float16 bytes."""
+        return np.ascontiguousarray(rows, dtype=np.float16).view(np.uint8)
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Decode blocks to float32 and take the dot product."""
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for lo in range(0, codes.shape[0], _SCORE_BLOCK_ROWS):
+            block = np.ascontiguousarray(codes[lo : lo + _SCORE_BLOCK_ROWS]).view(np.float16)
+            out[lo : lo + block.shape[0]] = block.astype(np.float32) @ query
+        return out
+
+
+class Int8Quantizer(Quantizer):
+    """Symmetric int8 codes with a per-vector float32 scale appended to each row."""
+
+    mode = QuantizationMode.INT8
+
+    @property
+    def code_bytes(self) -> int:
+        """Return one byte per dimension plus the scale."""
+        return self.dim + 4
+
+    def encode(self, rows: np.ndarray) -> np.ndarray:
+        """Scale each row so its largest component maps to 127 and round."""
+        rows = np.asarray(rows, dtype=np.float32)
+        scales = np.abs(rows).max(axis=1, keepdims=True) / 127.0
+        scales[scales == 0.0] = 1.0
+        codes = np.empty((rows.shape[0], self.code_bytes), dtype=np.uint8)
+        codes[:, : self.dim] = np.clip(np.rint(rows / scales), -127, 127).astype(np.int8).view(np.uint8)
+        codes[:, self.dim :] = scales.astype(np.float32).view(np.uint8)
+        return codes
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Decode blocks to float32, take the dot product and apply each row's scale."""
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for lo in range(0, codes.shape[0], _SCORE_BLOCK_ROWS):
+            block = codes[lo : lo + _SCORE_BLOCK_ROWS]
+            values = np.ascontiguousarray(block[:, : self.dim]).view(np.int8).astype(np.float32)
+            scales = np.ascontiguousarray(block[:, self.dim :]).view(np.float32)[:, 0]
+            out[lo : lo + block.shape[0]] = (values @ query) * scales
+        return out
+
+
+class PQQuantizer(Quantizer):
+    """Product quantisation with 256 centroids per sub-space."""
+
+    mode = QuantizationMode.PQ
+
+    def __init__(self, codebooks: np.ndarray, trained_rows: int) -> None:
+        """Wrap ``(m, 256, dim // m)`` codebooks trained on a corpus of ``trained_rows`` vectors."""
+        m, _, sub = codebooks.shape
+        super().__init__(m * sub)
+        self.codebooks = codebooks
+        self.trained_rows = trained_rows
+
+    @property
+    def subspaces(self) -> int:
+        """Return the number of sub-vectors (bytes per code)."""
+        return self.codebooks.shape[0]
+
+    @property
+    def code_bytes(self) -> int:
+        """Return one byte per sub-space."""
+        return self.subspaces
+
+    @staticmethod
+    def train(matrix: np.ndarray, subspaces: int = 0, *, iterations: int = 8, seed: int = 0) -> PQQuantizer:
+        """Train codebooks on (a sample of) ``matrix``.
+
+        ``subspaces`` must divide the dimension; 0 picks ``dim // 4`` (4 dims per
+        byte), falling back to the largest divisor below it.
+        """
+        rows, dim = matrix.shape
+        m = subspaces or max(1, dim // 4)
+        while dim % m:
+            m -= 1
+        sub = dim // m
+        rng = np.random.default_rng(seed)
+        sample_size = min(rows, _PQ_CENTROIDS * 64)
+        sample = np.asarray(matrix[np.sort(rng.choice(rows, sample_size, replace=False))], dtype=np.float32)
+        k = min(_PQ_CENTROIDS, sample_size)
+        codebooks = np.zeros((m, _PQ_CENTROIDS, sub), dtype=np.float32)
+        for j in range(m):
+            part = sample[:, j * sub : (j + 1) * sub]
+            centroids = part[rng.choice(sample_size, k, replace=False)].copy()
+            for _ in range(iterations):
+                labels = _nearest(part, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, part)
+                counts = np.bincount(labels, minlength=k)[:, None]
+                centroids = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+            codebooks[j, :k] = centroids
+            # Unused slots repeat the first centroid so every code id decodes to something
+            codebooks[j, k:] = centroids[0]
+        return PQQuantizer(codebooks, rows)
+
+    def encode(self, rows: np.ndarray) -> np.ndarray:
+        """Replace each sub-vector by the id of its nearest centroid."""
+        rows = np.asarray(rows, dtype=np.float32)
+        sub = self.codebooks.shape[2]
+        codes = np.empty((rows.shape[0], self.subspaces), dtype=np.uint8)
+        for j in range(self.subspaces):
+            codes[:, j] = _nearest(rows[:, j * sub : (j + 1) * sub], self.codebooks[j])
+        return codes
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Sum per-sub-space lookup tables of centroid-query products (asymmetric distance)."""
+        sub = self.codebooks.shape[2]
+        tables = np.einsum("jcs,js->jc", self.codebooks, query.reshape(self.subspaces, sub))
+        out = np.zeros(codes.shape[0], dtype=np.float32)
+        for j in range(self.subspaces):
+            out += tables[j, codes[:, j]]
+        return out
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """Return the codebooks."""
+        return {"codebooks": self.codebooks, "trained_rows": np.asarray(self.trained_rows, dtype=np.int64)}
+
+
+def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the index of the nearest centroid (Euclidean) of every point."""
+    dists = (centroids * centroids).sum(axis=1)[None, :] - 2.0 * (points @ centroids.T)
+    return np.argmin(dists, axis=1)
+
+
+def make_quantizer(mode: QuantizationMode, dim: int, matrix: np.ndarray | None = None, subspaces: int = 0) -> Quantizer:
+    """Return a quantizer for ``mode``; PQ is trained on ``matrix``."""
+    if mode == QuantizationMode.FLOAT16:
+        return Float16Quantizer(dim)
+    if mode == QuantizationMode.INT8:
+        return Int8Quantizer(dim)
+    if mode == QuantizationMode.PQ:
+        if matrix is None or not matrix.shape[0]:
+            msg = "Product quantisation needs vectors to train its codebooks."
+            raise ValueError(msg)
+        return PQQuantizer.train(matrix, subspaces)
+    msg = f"No quantizer for mode {mode.value!r}."
+    raise ValueError(msg)
+
+
+@dataclass
+class QuantizationReport:
+    """Memory and recall of one quantisation mode against exact float32 search."""
+
+    mode: QuantizationMode
+    bytes_per_vector: int
+    memory_reduction: float
+    """float32 bytes divided by code bytes."""
+    recall: float
+    """recall@k of scoring on the codes alone."""
+    recall_rerank: float
+    """recall@k with exact re-ranking of the top ``k * rerank`` candidates."""
+    ms_per_query: float
+
+
+def benchmark_quantization(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    modes: Iterable[QuantizationMode] = (QuantizationMode.FLOAT16, QuantizationMode.INT8, QuantizationMode.PQ),
+    rerank: int = 4,
+) -> list[QuantizationReport]:
+    """Encode ``matrix`` in each mode and report memory reduction and recall@k loss."""
+    matrix = normalise_rows(matrix)
+    queries = normalise_rows(queries)
+    dim = matrix.shape[1]
+    exact = [set(top_k_indices(matrix @ q, k).tolist()) for q in queries]
+    reports = []
+    for mode in modes:
+        quantizer = make_quantizer(mode, dim, matrix)
+        codes = quantizer.encode_blocked(matrix)
+        hits = hits_rerank = 0
+        start = time.perf_counter()
+        for q, truth in zip(queries, exact, strict=True):
+            rows, _ = quantizer.search(codes, matrix, q, k, rerank=0)
+            hits += len(truth.intersection(rows.tolist()))
+        elapsed = time.perf_counter() - start
+        for q, truth in zip(queries, exact, strict=True):
+            rows, _ = quantizer.search(codes, matrix, q, k, rerank=rerank)
+            hits_rerank += len(truth.intersection(rows.tolist()))
+        total = max(1, sum(len(t) for t in exact))
+        reports.append(
+            QuantizationReport(
+                mode=mode,
+                bytes_per_vector=quantizer.code_bytes,
+                memory_reduction=dim * 4 / quantizer.code_bytes,
+                recall=hits / total,
+                recall_rerank=hits_rerank / total,
+                ms_per_query=elapsed * 1000 / max(1, len(queries)),
+            ),
+        )
+    return reports
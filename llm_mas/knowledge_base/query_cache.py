@@ -0,0 +1,211 @@
+"""In-memory LRU cache of knowledge base query results.
+
+Agents re-query the knowledge base with the same, or nearly the same, question
+turn after turn. The cache maps ``(normalised query, query parameters)`` to the
+results, so a repeated question skips the embedding call and the scan.
+
+Entries are tagged with the knowledge base ``generation``, which changes whenever
+records are added, replaced, removed or cleared. A lookup under a newer generation
+drops every entry, so stale results are never served.
+
+In semantic mode, a query whose embedding is within a cosine threshold of a cached
+query's embedding (with the same parameters) reuses that query's results. This saves
+the scan, not the embedding call.
+
+Configuration (environment variables):
+- ``KB_QUERY_CACHE_SIZE``: maximum number of cached queries per knowledge base
+  (default 256; 0 disables the cache).
+- ``KB_QUERY_CACHE_SIMILARITY``: cosine similarity at which a different query
+  reuses cached results (e.g. ``0.97``; unset or 0 disables semantic reuse).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+_SPACE = re.compile(r"\s+")
+
+QueryKey = tuple[str, tuple[Any, ...]]
+"""``(normalised query, parameters)``; only queries with equal parameters share results."""
+
+
+def normalise_query(query: str) -> str:
+    """Return the cache form of a query: case-folded, with whitespace runs collapsed."""
+    return _SPACE.sub(" ", query).strip().casefold()
+
+
+def filter_key(where: dict[str, Any] | None) -> str | None:
+    """Return a canonical, hashable form of a metadata filter."""
+    if not where:
+        return None
+
+    def canonical(value: Any) -> Any:  # noqa: ANN401
+        return sorted(value, key=repr) if isinstance(value, (set, frozenset)) else str(value)
+
+    return json.dumps(where, sort_keys=True, default=canonical)
+
+
+@dataclass
+class QueryCacheStats:
+    """Counters of a ``QueryCache`` since it was created."""
+
+    hits: int = 0
+    semantic_hits: int = 0
+    """Hits served for a different query with a similar embedding (included in ``hits``)."""
+    misses: int = 0
+    invalidations: int = 0
+    """Times the cache was emptied because the knowledge base changed."""
+    entries: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Return the fraction of lookups served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _Entry:
+    results: list[dict[str, Any]]
+    vector: np.ndarray | None
+
+
+def _copy(results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Return fresh result dicts so callers cannot modify the cached ones."""
+    return [dict(r) for r in results]
+
+
+class QueryCache:
+    """Thread-safe LRU cache of query results for one knowledge base."""
+
+    def __init__(self, max_entries: int = 256, similarity: float | None = None) -> None:
+        """Create a cache of up to ``max_entries`` queries; ``similarity`` enables semantic reuse."""
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries: OrderedDict[QueryKey, _Entry] = OrderedDict()
+        self._generation: int | None = None
+        self._stats = QueryCacheStats()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_env() -> QueryCache | None:
+        """Build the cache configured by ``KB_QUERY_CACHE_SIZE`` / ``KB_QUERY_CACHE_SIMILARITY``, or None."""
+        try:
+            size = int(os.getenv("KB_QUERY_CACHE_SIZE", "256"))
+        except ValueError:
+            size = 256
+        if size <= 0:
+            return None
+        try:
+            similarity = float(os.getenv("KB_QUERY_CACHE_SIMILARITY", "0"))
+        except ValueError:
+            similarity = 0.0
+        return QueryCache(size, similarity if 0 < similarity <= 1 else None)
+
+    def _sync(self, generation: int) -> None:
+        """Drop every entry if the knowledge base changed; the caller holds ``_lock``."""
+        if generation != self._generation:
+            if self._entries:
+                self._stats.invalidations += 1
+                self._entries.clear()
+            self._generation = generation
+
+    def get(self, key: QueryKey, generation: int) -> list[dict[str, Any]] | None:
+        """Return the cached results of ``key`` for this ``generation`` of the knowledge base, or None."""
+        with self._lock:
+            self._sync(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return _copy(entry.results)
+
+    def get_similar(
+        self,
+        key: QueryKey,
+        vector: Sequence[float] | np.ndarray,
+        generation: int,
+    ) -> list[dict[str, Any]] | None:
+        """Return the results of the most similar cached query with the same parameters, or None.
+
+        Only used in semantic mode; a hit is counted as a hit instead of the miss
+        that ``get`` recorded for ``key``.
+        """
+        if self.similarity is None:
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm == 0.0:
+            return None
+        query = query / norm
+        with self._lock:
+            self._sync(generation)
+            candidates = [
+                (k, e)
+                for k, e in self._entries.items()
+                if k[1] == key[1] and e.vector is not None and e.vector.shape == query.shape
+            ]
+            if not candidates:
+                return None
+            scores = np.stack([e.vector for _, e in candidates]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity:
+                return None
+            best_key, entry = candidates[best]
+            self._entries.move_to_end(best_key)
+            self._stats.misses -= 1
+            self._stats.hits += 1
+            self._stats.semantic_hits += 1
+            return _copy(entry.results)
+
+    def put(
+        self,
+        key: QueryKey,
+        generation: int,
+        results: list[dict[str, Any]],
+        vector: Sequence[float] | np.ndarray | None = None,
+    ) -> None:
+        """Cache ``results`` of ``key``, computed against ``generation``; ``vector`` is the query embedding."""
+        stored = None
+        if vector is not None and self.similarity is not None:
+            stored = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(stored))
+            stored = stored / norm if norm else None
+        with self._lock:
+            if self._generation is not None and generation < self._generation:
+                # The knowledge base changed while the query ran; these results may already be stale
+                return
+            self._sync(generation)
+            self._entries[key] = _Entry(_copy(results), stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> QueryCacheStats:
+        """Return a snapshot of the counters."""
+        with self._lock:
+            return QueryCacheStats(
+                hits=self._stats.hits,
+                semantic_hits=self._stats.semantic_hits,
+                misses=self._stats.misses,
+                invalidations=self._stats.invalidations,
+                entries=len(self._entries),
+            )
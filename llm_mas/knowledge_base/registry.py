@@ -0,0 +1,252 @@
+"""Named knowledge base collections that are opened on demand and unloaded when idle.
+
+A ``KnowledgeBaseRegistry`` maps collection names (for example one per agent or
+per uploaded folder) to ``KnowledgeBase`` instances stored side by side:
+
+- the ``default`` collection lives in ``<root>/kb_index`` (the historical location),
+- every other collection in ``<root>/kb_collections/<name>``.
+
+With ``KB_BACKEND=sqlite`` collections are ``SQLiteKnowledgeBase`` instances that
+several processes can share (see ``sqlite_store``); the default ``segments``
+backend keeps each index in memory. Nothing is read from disk until a collection
+is first used, and collections idle
+for ``KB_IDLE_UNLOAD_SECONDS`` (default 900; 0 disables) are unloaded by a
+background sweeper and reopened transparently on next use. All collections share
+one embedding provider, so ``aquery`` can fan a query out over several of them
+concurrently with a single embedding call; near-duplicate results from different
+collections are merged.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from llm_mas.knowledge_base.dedup import hamming, simhash
+from llm_mas.knowledge_base.embedder import EmbeddingProvider
+from llm_mas.knowledge_base.embedding_cache import EmbeddingCache
+from llm_mas.knowledge_base.knowledge_base import KnowledgeBase, QueryMode
+from llm_mas.knowledge_base.sqlite_store import SQLITE_FILE, SQLiteKnowledgeBase
+from llm_mas.knowledge_base.storage import has_index
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+DEFAULT_COLLECTION = "default"
+
+_COLLECTIONS_DIR = "kb_collections"
+_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,127}")
+_DUPLICATE_BITS = 3
+"""SimHash distance at which results from different collections count as the same text."""
+
+
+def _idle_unload_seconds() -> float:
+    """Return ``KB_IDLE_UNLOAD_SECONDS``, the idle time after which a collection is unloaded (0 disables)."""
+    try:
+        return max(0.0, float(os.getenv("KB_IDLE_UNLOAD_SECONDS", "900")))
+    except ValueError:
+        return 900.0
+
+
+def _backend() -> type[KnowledgeBase]:
+    """Return the knowledge base class selected by ``KB_BACKEND`` (``segments``, the default, or ``sqlite``)."""
+    return SQLiteKnowledgeBase if os.getenv("KB_BACKEND", "segments").strip().lower() == "sqlite" else KnowledgeBase
+
+
+def _has_collection(path: Path) -> bool:
+    """Return True if ``path`` holds an index of either backend."""
+    return has_index(path) or (path / SQLITE_FILE).is_file()
+
+
+def collection_name(label: str) -> str:
+    """Return a valid collection name derived from a free-form label such as an agent name."""
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "-", label.strip()).strip("-._")[:128]
+    return name.lower() or DEFAULT_COLLECTION
+
+
+class KnowledgeBaseRegistry:
+    """Lazily opened, named knowledge base collections under one storage root."""
+
+    def __init__(
+        self,
+        root: str | Path | None = None,
+        embed_model: str | None = None,
+        idle_unload_seconds: float | None = None,
+    ) -> None:
+        """Initialize the registry; no collection is opened and nothing is read yet.
+
+        Parameters
+        ----------
+        root:
+            Directory holding the collections. Defaults to the current working directory.
+        embed_model:
+            Optional embedding model name shared by every collection.
+        idle_unload_seconds:
+            Idle time after which a collection is unloaded. Defaults to ``KB_IDLE_UNLOAD_SECONDS``;
+            0 disables unloading.
+
+        """
+        self.root = Path(root) if root is not None else Path.cwd()
+        self._embed_model = embed_model
+        self._idle_unload_seconds = idle_unload_seconds
+        self._embedder: EmbeddingProvider | None = None
+        self._collections: dict[str, KnowledgeBase] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeper: threading.Thread | None = None
+
+    @property
+    def idle_unload_seconds(self) -> float:
+        """Return the idle time after which a collection is unloaded (0 when disabled)."""
+        if self._idle_unload_seconds is not None:
+            return self._idle_unload_seconds
+        return _idle_unload_seconds()
+
+    def storage_path(self, name: str) -> Path:
+        """Return the index directory of collection ``name``; raises ``ValueError`` for an invalid name."""
+        if not _NAME.fullmatch(name):
+            msg = f"Invalid knowledge base collection name {name!r}; use letters, digits, '_', '.' and '-'."
+            raise ValueError(msg)
+        if name == DEFAULT_COLLECTION:
+            return self.root / "kb_index"
+        return self.root / _COLLECTIONS_DIR / name
+
+    def get(self, name: str = DEFAULT_COLLECTION) -> KnowledgeBase:
+        """Return collection ``name``, creating it if needed; its index is opened on first use."""
+        path = self.storage_path(name)
+        with self._lock:
+            kb = self._collections.get(name)
+            if kb is None:
+                if self._embedder is None:
+                    self._embedder = EmbeddingProvider(self._embed_model, cache=EmbeddingCache.from_env())
+                kb = self._collections[name] = _backend()(path, embedder=self._embedder)
+                self._start_sweeper()
+            return kb
+
+    def exists(self, name: str) -> bool:
+        """Return True if collection ``name`` is open or has an index on disk."""
+        path = self.storage_path(name)
+        if name in self._collections:
+            return True
+        legacy = path.with_name(path.name + ".json")
+        return _has_collection(path) or (name == DEFAULT_COLLECTION and legacy.is_file())
+
+    def names(self) -> list[str]:
+        """Return the names of every open or persisted collection, sorted."""
+        found = set(self._collections)
+        if self.exists(DEFAULT_COLLECTION):
+            found.add(DEFAULT_COLLECTION)
+        collections_dir = self.root / _COLLECTIONS_DIR
+        if collections_dir.is_dir():
+            found.update(p.name for p in collections_dir.iterdir() if _NAME.fullmatch(p.name) and _has_collection(p))
+        return sorted(found)
+
+    def loaded(self) -> list[str]:
+        """Return the names of the collections whose index is currently in memory."""
+        with self._lock:
+            return sorted(name for name, kb in self._collections.items() if kb.is_loaded)
+
+    def unload_idle(self, max_idle_seconds: float | None = None) -> list[str]:
+        """Unload the collections unused for ``max_idle_seconds`` (default: the registry setting).
+
+        Collections in use are skipped. Returns the names that were unloaded.
+        """
+        limit = self.idle_unload_seconds if max_idle_seconds is None else max_idle_seconds
+        with self._lock:
+            candidates = [(n, kb) for n, kb in self._collections.items() if kb.is_loaded and kb.idle_seconds() >= limit]
+        unloaded = [name for name, kb in candidates if kb.unload()]
+        if unloaded:
+            APP_LOGGER.info("KB collections unloaded after %.0fs idle: %s", limit, ", ".join(unloaded))
+        return unloaded
+
+    def close(self) -> None:
+        """Stop the idle sweeper and unload every collection, saving pending changes."""
+        self._stop.set()
+        sweeper = self._sweeper
+        if sweeper is not None:
+            sweeper.join()
+        self.unload_idle(0)
+
+    async def aquery(  # noqa: PLR0913
+        self,
+        query: str,
+        collections: Iterable[str] | None = None,
+        top_k: int = 5,
+        mode: QueryMode | None = None,
+        latency_budget_ms: float | None = None,
+        *,
+        where: dict[str, Any] | None = None,
+        diversity: float | None = None,
+    ) -> list[dict[str, Any]]:
+        """Query several collections concurrently and merge their results by score.
+
+        ``collections`` defaults to every collection; names without an index are
+        skipped. The query is embedded once and the vector is shared by all
+        collections. A result whose text near-duplicates a better one from another
+        collection is dropped. Each result is a ``KnowledgeBase.query`` result with
+        an added ``collection`` key. See ``KnowledgeBase.query`` for the other parameters.
+        """
+        names = [n for n in (self.names() if collections is None else dict.fromkeys(collections)) if self.exists(n)]
+        if not query.strip() or not names:
+            return []
+        kbs = [self.get(n) for n in names]
+        mode = kbs[0].resolve_mode(mode, latency_budget_ms)
+        vector = None
+        if len(kbs) > 1 and mode != QueryMode.LEXICAL and self._embedder is not None:
+            try:
+                start = time.monotonic()
+                vector = (await self._embedder.aembed_texts([query]))[0]
+                self._embedder.record_query_latency(time.monotonic() - start)
+            except Exception as exc:
+                if mode == QueryMode.VECTOR:
+                    raise
+                APP_LOGGER.warning("KB query embedding failed (%s); returning lexical results only", exc)
+                mode = QueryMode.LEXICAL
+        outcomes = await asyncio.gather(
+            *(
+                kb.aquery(query, top_k, mode=mode, where=where, diversity=diversity, query_vector=vector)
+                for kb in kbs
+            ),
+        )
+        merged = [
+            {**result, "collection": name} for name, results in zip(names, outcomes, strict=True) for result in results
+        ]
+        merged.sort(key=lambda r: r["score"], reverse=True)
+        return _distinct(merged, top_k) if len(kbs) > 1 else merged[:top_k]
+
+    def _start_sweeper(self) -> None:
+        """Start the idle sweeper thread once; the caller holds ``_lock``."""
+        if self._sweeper is not None or not self.idle_unload_seconds:
+            return
+        self._sweeper = threading.Thread(target=self._sweep, name="kb-idle-unload", daemon=True)
+        self._sweeper.start()
+
+    def _sweep(self) -> None:
+        while not self._stop.wait(max(1.0, self.idle_unload_seconds / 4)):
+            self.unload_idle()
+
+
+def _distinct(results: list[dict[str, Any]], top_k: int) -> list[dict[str, Any]]:
+    """Return the first ``top_k`` results whose text is not a near-copy of an earlier result."""
+    kept: list[dict[str, Any]] = []
+    fingerprints: list[int] = []
+    for result in results:
+        fingerprint = simhash(result["text"])
+        if fingerprint is not None:
+            if any(hamming(fingerprint, seen) <= _DUPLICATE_BITS for seen in fingerprints):
+                continue
+            fingerprints.append(fingerprint)
+        kept.append(result)
+        if len(kept) == top_k:
+            break
+    return kept
+
+
+# Process-wide registry shared by the UI and actions; constructing it reads nothing
+KB_REGISTRY = KnowledgeBaseRegistry()
@@ -0,0 +1,612 @@
+"""SQLite storage for a knowledge base shared by several processes.
+
+``SQLiteKnowledgeBase`` keeps its index in one SQLite database in WAL mode instead
+of in memory, so the desktop app, the MCP servers and CLI tools can use the same
+knowledge base at once. Any number of readers run alongside one writer, and each
+file's chunks are replaced in a single transaction, so readers never see half an
+update and writers never overwrite each other's work. Files are still embedded a
+batch at a time, but a file's embedded chunks are held until its last batch so the
+swap stays one transaction. Each row stores its chunk's full text, which the FTS
+index reads from ``chunks``.
+
+``<storage_path>/kb.sqlite`` holds:
+
+- ``chunks``: one row per chunk, with the metadata filter fields (see ``metadata``)
+  as indexed columns
+- ``vectors``: the L2-normalised float32 embedding of each chunk as a BLOB
+- ``chunks_fts``: an FTS5 index over the chunk text, kept in step by triggers,
+  that answers lexical queries
+- ``manifest``: the fingerprint of each indexed file
+- ``meta``: the embedding dimension, chunk count, next record id and a write generation
+
+Vector queries stream ``vectors`` in pages of ``KB_SQLITE_PAGE_ROWS`` rows (default
+4096) and keep only the best candidates, so memory use is bounded by the page
+size rather than the index size. Select this backend with ``KB_BACKEND=sqlite``
+(see ``registry``). It has no IVF index or quantised codes; ``compact`` optimises
+the FTS index and checkpoints the WAL.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from llm_mas.knowledge_base.knowledge_base import (
+    IndexReport,
+    KnowledgeBase,
+    _FileStatus,
+    _KBRecord,
+    _ManifestEntry,
+)
+from llm_mas.knowledge_base.lexical import tokenize
+from llm_mas.knowledge_base.metadata import FILTER_FIELDS
+from llm_mas.knowledge_base.vector_store import normalise_rows, top_k_indices
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Collection, Iterable, Iterator
+    from pathlib import Path
+
+    from llm_mas.knowledge_base.chunking import Chunker, ChunkSpan
+    from llm_mas.knowledge_base.dedup import SimHashIndex
+    from llm_mas.knowledge_base.embedder import EmbeddingProvider
+    from llm_mas.knowledge_base.knowledge_base import _IngestItem
+
+SQLITE_FILE = "kb.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    source_path TEXT NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    "offset" INTEGER,
+    root TEXT,
+    suffix TEXT NOT NULL,
+    ingested_at REAL,
+    page INTEGER,
+    simhash INTEGER
+);
+CREATE INDEX IF NOT EXISTS chunks_source_path ON chunks(source_path);
+CREATE INDEX IF NOT EXISTS chunks_root ON chunks(root);
+CREATE INDEX IF NOT EXISTS chunks_suffix ON chunks(suffix);
+CREATE INDEX IF NOT EXISTS chunks_ingested_at ON chunks(ingested_at);
+CREATE INDEX IF NOT EXISTS chunks_page ON chunks(page);
+CREATE TABLE IF NOT EXISTS vectors (id INTEGER PRIMARY KEY, vector BLOB NOT NULL);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, content='chunks', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS chunks_inserted AFTER INSERT ON chunks BEGIN
+    INSERT INTO chunks_fts(rowid, text) VALUES (new.id, new.text);
+    UPDATE meta SET value = value + 1 WHERE key = 'count';
+END;
+CREATE TRIGGER IF NOT EXISTS chunks_deleted AFTER DELETE ON chunks BEGIN
+    INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    DELETE FROM vectors WHERE id = old.id;
+    UPDATE meta SET value = value - 1 WHERE key = 'count';
+END;
+CREATE TABLE IF NOT EXISTS manifest (source_path TEXT PRIMARY KEY, entry TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+INSERT OR IGNORE INTO meta VALUES ('count', 0), ('next_id', 1), ('generation', 0);
+"""
+
+_COLUMNS = dict(zip(FILTER_FIELDS, ("root", "source_path", "suffix", "ingested_at", "page"), strict=True))
+_RANGE_OPS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+_RECORD_COLUMNS = 'id, source_path, chunk_id, text, "offset", root, ingested_at, page, simhash'
+_SIGN_BIT = 1 << 63
+
+
+def _page_rows() -> int:
+    """Return ``KB_SQLITE_PAGE_ROWS``, the number of embeddings scored per page of a vector scan."""
+    try:
+        return max(1, int(os.getenv("KB_SQLITE_PAGE_ROWS", "4096")))
+    except ValueError:
+        return 4096
+
+
+def _to_signed(value: int | None) -> int | None:
+    """Map an unsigned 64-bit fingerprint onto SQLite's signed INTEGER."""
+    return value - (1 << 64) if value is not None and value >= _SIGN_BIT else value
+
+
+def _to_unsigned(value: int | None) -> int | None:
+    return value + (1 << 64) if value is not None and value < 0 else value
+
+
+def where_clause(where: dict[str, Any]) -> tuple[str, list[Any]]:
+    """Translate a metadata filter (see ``metadata``) into an SQL condition on ``chunks`` and its parameters.
+
+    Raises ``ValueError`` for an unknown field or operator.
+    """
+    parts: list[str] = []
+    params: list[Any] = []
+    for field, condition in where.items():
+        column = _COLUMNS.get(field)
+        if column is None:
+            msg = f"Unknown filter field {field!r}; expected one of {', '.join(FILTER_FIELDS)}."
+            raise ValueError(msg)
+        if isinstance(condition, (list, tuple, set, frozenset)):
+            condition = {"in": condition}  # noqa: PLW2901
+        elif not isinstance(condition, dict):
+            condition = {"eq": condition}  # noqa: PLW2901
+        unknown = set(condition) - set(_RANGE_OPS) - {"eq", "in", "prefix"}
+        if unknown:
+            msg = f"Unknown filter operator(s): {', '.join(sorted(unknown))}."
+            raise ValueError(msg)
+        for op, value in condition.items():
+            if op == "in":
+                values = list(value)
+                parts.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+                params.extend(values)
+            elif op == "prefix":
+                parts.append(f"{column} >= ? AND {column} < ?")
+                params.extend((str(value), str(value) + "\U0010ffff"))
+            else:
+                parts.append(f"{column} {_RANGE_OPS.get(op, '=')} ?")
+                params.append(value)
+    return " AND ".join(parts) or "1", params
+
+
+def _fts_query(query: str) -> str:
+    """Return an FTS5 expression matching any term of ``query``, each quoted so it is taken literally."""
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in dict.fromkeys(tokenize(query)))
+
+
+def _id_list(ids: Collection[int]) -> str:
+    """Encode ids for ``json_each``, which lets a single parameter carry any number of them."""
+    return json.dumps(sorted(ids))
+
+
+class SQLiteStore:
+    """The ``kb.sqlite`` database: one connection per thread, writes in ``BEGIN IMMEDIATE`` transactions."""
+
+    def __init__(self, path: Path) -> None:
+        """Prepare to open ``path``; the database is created on first use."""
+        self.path = path
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it (and creating the schema) if needed."""
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(f"BEGIN IMMEDIATE;{_SCHEMA}COMMIT;")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close every connection; the store reopens on next use."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a write transaction, waiting for other writers; it is rolled back if the block raises."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def snapshot(self) -> Iterator[sqlite3.Connection]:
+        """Run several reads against one consistent snapshot of the database."""
+        conn = self._conn()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    def _meta(self, key: str) -> Any:  # noqa: ANN401
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def count(self) -> int:
+        """Return the number of stored chunks."""
+        return int(self._meta("count") or 0)
+
+    def dim(self) -> int | None:
+        """Return the embedding dimension, or None before the first chunk is stored."""
+        value = self._meta("dim")
+        return int(value) if value is not None else None
+
+    def generation(self) -> int:
+        """Return a counter that every committed write transaction increments."""
+        return int(self._meta("generation") or 0)
+
+    # --------------- Writes (inside ``transaction``) ---------------
+    def reserve_ids(self, n: int) -> int:
+        """Reserve ``n`` record ids and return the first; ids are never reused."""
+        first = int(self._meta("next_id"))
+        self._conn().execute("UPDATE meta SET value = ? WHERE key = 'next_id'", (first + n,))
+        return first
+
+    def insert(self, records: list[_KBRecord], vectors: list[list[float]]) -> None:
+        """Store records and their embeddings."""
+        if not records:
+            return
+        conn = self._conn()
+        matrix = normalise_rows(np.asarray(vectors, dtype=np.float32))
+        conn.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (matrix.shape[1],))
+        conn.executemany(
+            f"INSERT INTO chunks ({_RECORD_COLUMNS}, suffix) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",  # noqa: S608
+            [
+                (
+                    r.id,
+                    r.source_path,
+                    r.chunk_id,
+                    r.text,
+                    r.offset,
+                    r.root,
+                    r.ingested_at,
+                    r.page,
+                    _to_signed(r.simhash),
+                    r.suffix,
+                )
+                for r in records
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO vectors (id, vector) VALUES (?, ?)",
+            [(r.id, row.tobytes()) for r, row in zip(records, matrix, strict=True)],
+        )
+
+    def delete_sources(self, sources: Iterable[str]) -> list[int]:
+        """Delete the chunks of ``sources``; returns their ids."""
+        conn = self._conn()
+        ids: list[int] = []
+        for source in sources:
+            ids.extend(i for (i,) in conn.execute("SELECT id FROM chunks WHERE source_path = ?", (source,)))
+            conn.execute("DELETE FROM chunks WHERE source_path = ?", (source,))
+        return ids
+
+    def put_manifest(self, entries: dict[str, dict[str, Any] | None]) -> None:
+        """Write manifest entries; None deletes the entry."""
+        conn = self._conn()
+        for source, entry in entries.items():
+            if entry is None:
+                conn.execute("DELETE FROM manifest WHERE source_path = ?", (source,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO manifest VALUES (?, ?)", (source, json.dumps(entry)))
+
+    def clear(self) -> None:
+        """Delete every chunk and manifest entry."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM chunks")
+            conn.execute("DELETE FROM manifest")
+            conn.execute("DELETE FROM meta WHERE key = 'dim'")
+
+    def optimize(self) -> None:
+        """Merge the FTS index segments and fold the WAL back into the database file."""
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('optimize')")
+        self._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # --------------- Reads ---------------
+    def manifest(self, source: str | None = None) -> dict[str, dict[str, Any]]:
+        """Return the manifest entries, or only that of ``source``."""
+        sql, params = "SELECT source_path, entry FROM manifest", ()
+        if source is not None:
+            sql, params = sql + " WHERE source_path = ?", (source,)
+        return {src: json.loads(entry) for src, entry in self._conn().execute(sql, params)}
+
+    def sources(self) -> set[str]:
+        """Return the paths of every file with stored chunks."""
+        return {src for (src,) in self._conn().execute("SELECT DISTINCT source_path FROM chunks")}
+
+    def roots(self) -> list[str]:
+        """Return the distinct roots of the stored chunks, sorted."""
+        sql = "SELECT DISTINCT root FROM chunks WHERE root IS NOT NULL ORDER BY root"
+        return [root for (root,) in self._conn().execute(sql)]
+
+    def missing(self, ids: Collection[int]) -> bool:
+        """Return True if any of ``ids`` is not a stored chunk."""
+        sql = "SELECT count(*) FROM chunks WHERE id IN (SELECT value FROM json_each(?))"
+        return self._conn().execute(sql, (_id_list(ids),)).fetchone()[0] < len(set(ids))
+
+    def fingerprints(self) -> Iterator[tuple[int, int]]:
+        """Yield ``(id, simhash)`` for every chunk that has a fingerprint."""
+        for record_id, value in self._conn().execute("SELECT id, simhash FROM chunks WHERE simhash IS NOT NULL"):
+            yield record_id, int(_to_unsigned(value))
+
+    def select(self, where: dict[str, Any]) -> set[int]:
+        """Return the ids of the chunks matching the metadata filter ``where``."""
+        clause, params = where_clause(where)
+        return {i for (i,) in self._conn().execute(f"SELECT id FROM chunks WHERE {clause}", params)}  # noqa: S608
+
+    def records(self, ids: Collection[int]) -> dict[int, _KBRecord]:
+        """Return the stored records among ``ids``, by id."""
+        sql = f"SELECT {_RECORD_COLUMNS} FROM chunks WHERE id IN (SELECT value FROM json_each(?))"  # noqa: S608
+        out = {}
+        for row in self._conn().execute(sql, (_id_list(ids),)):
+            record = _KBRecord(*row[:-1], simhash=_to_unsigned(row[-1]))
+            out[record.id] = record
+        return out
+
+    def vectors(self, ids: list[int]) -> np.ndarray:
+        """Return the embeddings of ``ids`` in order; unknown ids get zero rows."""
+        dim = self.dim() or 0
+        out = np.zeros((len(ids), dim), dtype=np.float32)
+        sql = "SELECT id, vector FROM vectors WHERE id IN (SELECT value FROM json_each(?))"
+        found = dict(self._conn().execute(sql, (_id_list(ids),)).fetchall())
+        for i, record_id in enumerate(ids):
+            if record_id in found:
+                out[i] = np.frombuffer(found[record_id], dtype=np.float32)
+        return out
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        allowed: Collection[int] | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        """Return the ``top_k`` ``(id, cosine score)`` pairs for each normalised query row.
+
+        The embeddings are read ``KB_SQLITE_PAGE_ROWS`` at a time; each page is
+        scored with one matrix multiply and merged into the running best candidates.
+        ``allowed`` restricts the scan to those ids.
+        """
+        n_queries = queries.shape[0]
+        best_ids = [np.empty(0, dtype=np.int64) for _ in range(n_queries)]
+        best_scores = [np.empty(0, dtype=np.float32) for _ in range(n_queries)]
+        sql, params = "SELECT id, vector FROM vectors", ()
+        if allowed is not None:
+            sql, params = sql + " WHERE id IN (SELECT value FROM json_each(?))", (_id_list(allowed),)  # noqa: S608
+        cursor = self._conn().execute(sql, params)
+        page_rows = _page_rows()
+        while rows := cursor.fetchmany(page_rows):
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            page = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+            if page.shape[1] != queries.shape[1]:
+                cursor.close()
+                return [[] for _ in range(n_queries)]
+            scores = page @ queries.T
+            for col in range(n_queries):
+                candidates = np.concatenate((best_ids[col], ids))
+                candidate_scores = np.concatenate((best_scores[col], scores[:, col]))
+                keep = top_k_indices(candidate_scores, top_k)
+                best_ids[col], best_scores[col] = candidates[keep], candidate_scores[keep]
+        return [
+            list(zip(ids.tolist(), scores.tolist(), strict=True))
+            for ids, scores in zip(best_ids, best_scores, strict=True)
+        ]
+
+    def text_search(self, query: str, top_k: int, allowed: Collection[int] | None = None) -> list[tuple[int, float]]:
+        """Return the ``top_k`` ``(id, BM25 score)`` pairs of the FTS5 index for ``query``, best first."""
+        expression = _fts_query(query)
+        if not expression:
+            return []
+        sql = "SELECT rowid, -bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ?"
+        params: list[Any] = [expression]
+        if allowed is not None:
+            sql += " AND rowid IN (SELECT value FROM json_each(?))"
+            params.append(_id_list(allowed))
+        sql += " ORDER BY bm25(chunks_fts) LIMIT ?"
+        params.append(top_k)
+        return [(int(i), float(score)) for i, score in self._conn().execute(sql, params)]
+
+
+class SQLiteKnowledgeBase(KnowledgeBase):
+    """A ``KnowledgeBase`` stored in SQLite that several processes can read and write at once.
+
+    Nothing but the manifest is held in memory: queries run against the database,
+    so changes committed by other processes are visible immediately.
+    """
+
+    def __init__(
+        self,
+        storage_path: str | Path | None = None,
+        embed_model: str | None = None,
+        *,
+        embedder: EmbeddingProvider | None = None,
+        chunker: Chunker | None = None,
+    ) -> None:
+        """Initialize the knowledge base; the database is ``<storage_path>/kb.sqlite`` (see ``KnowledgeBase``)."""
+        super().__init__(storage_path, embed_model, embedder=embedder, chunker=chunker)
+        self._db = SQLiteStore(self.storage_path / SQLITE_FILE)
+        self._dedup_generation = -1
+
+    # --------------- Persistence ---------------
+    def _load(self) -> None:
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self, source: str | None = None) -> dict[str, _ManifestEntry]:
+        entries = {}
+        for src, entry in self._db.manifest(source).items():
+            try:
+                entries[src] = _ManifestEntry.from_json(entry)
+            except (KeyError, TypeError, ValueError):
+                APP_LOGGER.warning("Ignoring invalid KB manifest entry for %s", src)
+        return entries
+
+    def _save(self) -> None:
+        """Write manifest entries refreshed outside an ingest transaction (touched but unchanged files)."""
+        with self._write_lock:
+            changes, self._manifest_changes = self._manifest_changes, {}
+            if changes:
+                with self._db.transaction():
+                    self._db.put_manifest({src: e.to_json() if e is not None else None for src, e in changes.items()})
+
+    def _commit_ingest(self, report: IndexReport) -> None:  # noqa: ARG002
+        self._save()
+
+    def compact(self) -> None:
+        """Optimise the full-text index and checkpoint the write-ahead log."""
+        with self._in_use():
+            self._ensure_loaded()
+            self._save()
+            self._db.optimize()
+
+    def unload(self) -> bool:
+        """Release the manifest and close the database connections; see ``KnowledgeBase.unload``."""
+        if not super().unload():
+            return False
+        self._db.close()
+        return True
+
+    # --------------- Ingestion ---------------
+    def _store_chunks(
+        self,
+        item: _IngestItem,
+        chunks: list[tuple[int, ChunkSpan]],
+        embeddings: list[list[float]],
+    ) -> None:
+        # Held back so the whole file is swapped in one transaction by ``_commit_file``
+        item.pending.append((chunks, embeddings))
+
+    def _commit_file(self, item: _IngestItem) -> None:
+        chunks = [chunk for batch, _ in item.pending for chunk in batch]
+        embeddings = [vector for _, vectors in item.pending for vector in vectors]
+        item.pending = []
+        fingerprint = item.fingerprint if item.complete else None
+        item.result.removed, item.result.added = self._replace_source_chunks(
+            item.path,
+            chunks,
+            embeddings,
+            fingerprint,
+            item.root,
+        )
+
+    def _replace_source_chunks(
+        self,
+        p: Path,
+        chunks: list[tuple[int, ChunkSpan]],
+        embeddings: list[list[float]],
+        fingerprint: _ManifestEntry | None,
+        root: Path | None = None,
+    ) -> tuple[int, int]:
+        """Swap the chunks of ``p`` and its manifest entry in one transaction; see ``KnowledgeBase``."""
+        source = str(p)
+        with self._write_lock, self._db.transaction():
+            removed = self._db.delete_sources([source])
+            if self._dedup is not None:
+                self._dedup.remove(removed)
+            first_id = self._db.reserve_ids(len(chunks))
+            records, vectors, linked = self._new_records(source, chunks, embeddings, root, first_id)
+            self._db.insert(records, vectors)
+            if fingerprint is not None:
+                fingerprint.chunks = len(records)
+                fingerprint.linked = linked
+                self._db.put_manifest({source: fingerprint.to_json()})
+        self._dedup_generation = self._db.generation()
+        if fingerprint is not None:
+            self._manifest[source] = fingerprint
+        return len(removed), len(records)
+
+    def _drop_sources(self, sources: set[str]) -> int:
+        with self._write_lock, self._db.transaction():
+            removed = self._db.delete_sources(sources)
+            self._db.put_manifest(dict.fromkeys(sources))
+        if self._dedup is not None:
+            self._dedup.remove(removed)
+        for src in sources:
+            self._manifest.pop(src, None)
+        return len(removed)
+
+    def _indexed_sources(self) -> set[str]:
+        return set(self._read_manifest()) | self._db.sources()
+
+    def _classify_file(self, p: Path) -> tuple[_FileStatus, _ManifestEntry | None]:
+        # Another process may have indexed the file since the manifest was read
+        source = str(p)
+        self._manifest.pop(source, None)
+        self._manifest.update(self._read_manifest(source))
+        return super()._classify_file(p)
+
+    def _broken_links(self, root: Path) -> list[Path]:
+        self._manifest = self._read_manifest()
+        return super()._broken_links(root)
+
+    def _has_broken_links(self, entry: _ManifestEntry) -> bool:
+        return bool(entry.linked) and self._db.missing(entry.linked)
+
+    def _near_duplicate_index(self) -> SimHashIndex | None:
+        # Rebuild when another process has written since the index was built
+        generation = self._db.generation()
+        if generation != self._dedup_generation:
+            self._dedup = None
+            self._dedup_generation = generation
+        return super()._near_duplicate_index()
+
+    def _fingerprints(self) -> Iterator[tuple[int, int]]:
+        return self._db.fingerprints()
+
+    # --------------- Query ---------------
+    def _filter_ids(self, where: dict[str, Any] | None) -> set[int] | None:
+        return self._db.select(where) if where else None
+
+    def _vector_hits(
+        self,
+        qvecs: list[list[float]],
+        top_k: int,
+        nprobe: int | None,  # noqa: ARG002
+        allowed: set[int] | None,
+    ) -> list[list[tuple[_KBRecord, float]]]:
+        queries = normalise_rows(np.asarray(qvecs, dtype=np.float32))
+        with self._db.snapshot():
+            hits = self._db.search(queries, top_k, allowed)
+            records = self._db.records({i for found in hits for i, _ in found})
+        return [[(records[i], score) for i, score in found if i in records] for found in hits]
+
+    def _lexical_hits(self, query: str, top_k: int, allowed: set[int] | None = None) -> list[tuple[_KBRecord, float]]:
+        with self._db.snapshot():
+            hits = self._db.text_search(query, top_k, allowed)
+            records = self._db.records({i for i, _ in hits})
+        return [(records[i], score) for i, score in hits if i in records]
+
+    def _vectors_for(self, ids: list[int]) -> np.ndarray:
+        return self._db.vectors(ids)
+
+    def _dim(self) -> int | None:
+        return self._db.dim()
+
+    # --------------- Info ---------------
+    @property
+    def generation(self) -> int:
+        """Return the database write counter, which also advances on writes by other processes."""
+        return self._db.generation()
+
+    def record_count(self) -> int:
+        """Return the total number of indexed chunks in the knowledge base."""
+        self._ensure_loaded()
+        return self._db.count()
+
+    def roots(self) -> list[str]:
+        """Return the distinct roots (indexed folders or files) that chunks were ingested from."""
+        self._ensure_loaded()
+        return self._db.roots()
+
+    def is_empty(self) -> bool:
+        """Return True if the knowledge base has no indexed content."""
+        return self.record_count() == 0
+
+    def clear(self) -> None:
+        """Clear all indexed content from the knowledge base."""
+        with self._load_lock:
+            self._loaded = True
+        with self._write_lock:
+            self._db.clear()
+            self._manifest, self._manifest_changes = {}, {}
+            self._dedup = None
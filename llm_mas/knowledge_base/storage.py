@@ -0,0 +1,515 @@
+"""On-disk format for the knowledge base index.
+
+An index directory is a compacted *base* snapshot plus an append-only log of
+*segments* (a write-ahead log of index changes):
+
+- ``current.json``: names the live base directory (``base-<seq>``) and the last
+  segment folded into it. It is replaced atomically, only by compaction.
+- ``segments/<seq>/``: one committed save each. A segment holds the rows added by
+  that save (``embeddings.f32`` and ``records.jsonl``) and a ``COMMIT`` marker
+  with the ids it deleted, the manifest changes and ``next_id``. The marker is
+  written and fsync'd last, so a segment without one was interrupted and is
+  discarded on recovery; only committed segments are replayed.
+
+Saving therefore writes only what changed, and ``compact`` periodically folds the
+segments into a new base in the background. A directory without ``current.json``
+is a format-1 index whose files are the base itself.
+
+A base directory holds:
+
+- ``header.json``: format name, version, row count, dimension and ``next_id``.
+- ``embeddings.f32``: the normalised embedding matrix as raw row-major float32,
+  opened with ``np.memmap`` so loading never copies vectors into Python objects.
+- ``records.jsonl``: one compact JSON object per row with the chunk metadata and text.
+- ``manifest.json``: per-source-file fingerprints used for incremental re-indexing.
+- ``lexical.json``: the BM25 postings of the chunk text (see ``lexical``). If it is
+  missing or stale it is rebuilt from ``records.jsonl``.
+- ``ann.npz`` (optional): IVF centroids and per-row cell assignments (see ``ann``).
+  It is ignored if its row count does not match the header, and rebuilt later.
+- ``quant.npz`` (optional): the quantisation mode, its trained state and one code
+  row per embedding (see ``quantization``), with the same staleness rule.
+
+The header is written last, so a reader never trusts data files that a crashed
+writer left half-finished. The manifest is written after the data files: if it is
+lost or stale, affected files are simply re-indexed and replace their own chunks.
+
+The legacy single-file ``kb_index.json`` (either a ``{"records": [...], "next_id": n}``
+dict or a bare list of records) can still be read and is migrated once by
+``migrate_legacy_index``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from llm_mas.knowledge_base.vector_store import normalise_rows
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+FORMAT_NAME = "llm_mas-kb"
+FORMAT_VERSION = 1
+
+HEADER_FILE = "header.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+RECORDS_FILE = "records.jsonl"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "current.json"
+SEGMENTS_DIR = "segments"
+COMMIT_FILE = "COMMIT"
+LEXICAL_FILE = "lexical.json"
+ANN_FILE = "ann.npz"
+QUANT_FILE = "quant.npz"
+
+
+class IndexFormatError(ValueError):
+    """Raised when an index directory is missing, inconsistent or of an unknown version."""
+
+
+@dataclass
+class Segment:
+    """One save: the rows it added and the changes it made, replayed on top of the base."""
+
+    seq: int
+    matrix: np.ndarray
+    records: list[dict[str, Any]]
+    deletes: list[int]
+    """Ids of records that existed before this save and were removed by it."""
+    manifest: dict[str, dict[str, Any] | None]
+    """Manifest entries set by this save; ``None`` removes an entry."""
+    next_id: int
+
+
+@dataclass
+class BaseSnapshot:
+    """The complete index state as of segment ``seq``, written by compaction."""
+
+    seq: int
+    matrix: np.ndarray
+    records: list[dict[str, Any]]
+    next_id: int
+    manifest: dict[str, dict[str, Any]]
+    lexical: dict[str, Any]
+    ann: tuple[np.ndarray, np.ndarray, int] | None
+    quant: tuple[str, np.ndarray, dict[str, np.ndarray]] | None = None
+    """``(mode, codes, trained arrays)`` of the installed quantizer."""
+
+
+def has_index(index_dir: Path) -> bool:
+    """Return True if ``index_dir`` contains a base or at least one segment."""
+    return (
+        (index_dir / CURRENT_FILE).is_file()
+        or (index_dir / HEADER_FILE).is_file()
+        or any(_segment_dirs(index_dir))
+    )
+
+
+def _fsync_dir(path: Path) -> None:
+    """Make renames and new files in ``path`` durable (a no-op where directories cannot be opened)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _replace_atomic(tmp: Path, final: Path) -> None:
+    with tmp.open("rb") as fh:
+        os.fsync(fh.fileno())
+    tmp.replace(final)
+
+
+def _segment_dirs(index_dir: Path) -> list[tuple[int, Path]]:
+    root = index_dir / SEGMENTS_DIR
+    if not root.is_dir():
+        return []
+    return sorted((int(d.name), d) for d in root.iterdir() if d.is_dir() and d.name.isdigit())
+
+
+def resolve_base(index_dir: Path) -> tuple[Path | None, int]:
+    """Return ``(base_dir, compacted_through)``; ``base_dir`` is None if nothing was compacted yet."""
+    current = index_dir / CURRENT_FILE
+    if current.is_file():
+        try:
+            data = json.loads(current.read_text(encoding="utf-8"))
+            return index_dir / str(data["base"]), int(data["compacted_through"])
+        except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError) as exc:
+            msg = f"Unreadable KB current pointer in {index_dir}: {exc}"
+            raise IndexFormatError(msg) from exc
+    if (index_dir / HEADER_FILE).is_file():
+        return index_dir, 0
+    return None, 0
+
+
+def last_segment(index_dir: Path) -> int:
+    """Return the sequence number of the newest segment directory (0 if there is none)."""
+    dirs = _segment_dirs(index_dir)
+    return dirs[-1][0] if dirs else 0
+
+
+def write_segment(index_dir: Path, segment: Segment) -> Path:
+    """Append ``segment`` and commit it; returns its directory.
+
+    The data files are fsync'd before the ``COMMIT`` marker is written, and the
+    marker before the directory is, so a crash at any point leaves either a
+    committed segment or one that recovery discards.
+    """
+    matrix, records = segment.matrix, segment.records
+    if matrix.shape[0] != len(records):
+        msg = f"Got {matrix.shape[0]} embeddings but {len(records)} records."
+        raise ValueError(msg)
+    seg_dir = index_dir / SEGMENTS_DIR / f"{segment.seq:08d}"
+    seg_dir.mkdir(parents=True, exist_ok=False)
+
+    emb_tmp = seg_dir / (EMBEDDINGS_FILE + ".tmp")
+    np.ascontiguousarray(matrix, dtype=np.float32).tofile(emb_tmp)
+    _replace_atomic(emb_tmp, seg_dir / EMBEDDINGS_FILE)
+    rec_tmp = seg_dir / (RECORDS_FILE + ".tmp")
+    with rec_tmp.open("w", encoding="utf-8") as fh:
+        for rec in records:
+            fh.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")))
+            fh.write("\n")
+    _replace_atomic(rec_tmp, seg_dir / RECORDS_FILE)
+
+    commit = {
+        "seq": segment.seq,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "next_id": int(segment.next_id),
+        "deletes": segment.deletes,
+        "manifest": segment.manifest,
+    }
+    commit_tmp = seg_dir / (COMMIT_FILE + ".tmp")
+    commit_tmp.write_text(json.dumps(commit, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    _replace_atomic(commit_tmp, seg_dir / COMMIT_FILE)
+    _fsync_dir(seg_dir)
+    _fsync_dir(seg_dir.parent)
+    return seg_dir
+
+
+def read_segments(index_dir: Path, after: int) -> list[Segment]:
+    """Return the committed segments newer than ``after``, oldest first.
+
+    Segments without a valid ``COMMIT`` marker were interrupted by a crash; they
+    are deleted so their sequence numbers can be reused.
+    """
+    segments = []
+    for seq, seg_dir in _segment_dirs(index_dir):
+        if seq <= after:
+            continue
+        try:
+            commit = json.loads((seg_dir / COMMIT_FILE).read_text(encoding="utf-8"))
+            count, dim = int(commit["count"]), int(commit["dim"])
+            if (seg_dir / EMBEDDINGS_FILE).stat().st_size != count * dim * np.dtype(np.float32).itemsize:
+                msg = "embeddings file does not match the commit marker"
+                raise IndexFormatError(msg)
+            matrix = np.fromfile(seg_dir / EMBEDDINGS_FILE, dtype=np.float32).reshape(count, dim)
+            with (seg_dir / RECORDS_FILE).open(encoding="utf-8") as fh:
+                records = [json.loads(line) for line in fh if line.strip()]
+            if len(records) != count:
+                msg = "records file does not match the commit marker"
+                raise IndexFormatError(msg)
+        except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError) as exc:
+            APP_LOGGER.warning("Discarding uncommitted KB segment %s (%s)", seg_dir, exc)
+            shutil.rmtree(seg_dir, ignore_errors=True)
+            continue
+        segments.append(
+            Segment(
+                seq=seq,
+                matrix=matrix,
+                records=records,
+                deletes=[int(i) for i in commit["deletes"]],
+                manifest=dict(commit["manifest"]),
+                next_id=int(commit["next_id"]),
+            ),
+        )
+    return segments
+
+
+def write_base(index_dir: Path, snapshot: BaseSnapshot) -> bool:
+    """Write ``snapshot`` as the new base and switch to it.
+
+    ``current.json`` is replaced only after the new base is complete; the old base,
+    the folded segments and any format-1 files are deleted afterwards. Returns False,
+    writing nothing, if the current base is newer than the snapshot (e.g. a compaction
+    that started before a ``clear`` finishing after it).
+    """
+    seq = snapshot.seq
+    try:
+        _, compacted_through = resolve_base(index_dir)
+    except IndexFormatError:
+        compacted_through = 0
+    if compacted_through > seq:
+        return False
+    base_dir = index_dir / f"base-{seq:08d}"
+    if base_dir.exists():
+        shutil.rmtree(base_dir)
+    write_index(base_dir, snapshot.matrix, snapshot.records, snapshot.next_id)
+    write_manifest(base_dir, snapshot.manifest)
+    write_lexical(base_dir, snapshot.lexical)
+    if snapshot.ann is not None:
+        write_ann(base_dir, *snapshot.ann)
+    if snapshot.quant is not None:
+        write_quant(base_dir, *snapshot.quant)
+    _fsync_dir(base_dir)
+
+    current_tmp = index_dir / (CURRENT_FILE + ".tmp")
+    current_tmp.write_text(
+        json.dumps({"format": FORMAT_NAME, "base": base_dir.name, "compacted_through": seq}),
+        encoding="utf-8",
+    )
+    _replace_atomic(current_tmp, index_dir / CURRENT_FILE)
+    _fsync_dir(index_dir)
+    prune(index_dir)
+    return True
+
+
+def prune(index_dir: Path) -> None:
+    """Delete bases and segments that the current base has superseded."""
+    base_dir, compacted_through = resolve_base(index_dir)
+    if base_dir is None or base_dir == index_dir:
+        return
+    for child in index_dir.iterdir():
+        if child.is_dir() and child.name.startswith("base-") and child != base_dir:
+            # Ignore errors: on Windows an old base may still be memory-mapped
+            shutil.rmtree(child, ignore_errors=True)
+    for seq, seg_dir in _segment_dirs(index_dir):
+        if seq <= compacted_through:
+            shutil.rmtree(seg_dir, ignore_errors=True)
+    for name in (HEADER_FILE, EMBEDDINGS_FILE, RECORDS_FILE, MANIFEST_FILE, LEXICAL_FILE, ANN_FILE):
+        (index_dir / name).unlink(missing_ok=True)
+
+
+def write_index(index_dir: Path, matrix: np.ndarray, records: list[dict[str, Any]], next_id: int) -> None:
+    """Write ``matrix`` and ``records`` to ``index_dir`` in the binary format."""
+    if matrix.shape[0] != len(records):
+        msg = f"Got {matrix.shape[0]} embeddings but {len(records)} records."
+        raise ValueError(msg)
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    emb_tmp = index_dir / (EMBEDDINGS_FILE + ".tmp")
+    np.ascontiguousarray(matrix, dtype=np.float32).tofile(emb_tmp)
+    _replace_atomic(emb_tmp, index_dir / EMBEDDINGS_FILE)
+
+    rec_tmp = index_dir / (RECORDS_FILE + ".tmp")
+    with rec_tmp.open("w", encoding="utf-8") as fh:
+        for rec in records:
+            fh.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")))
+            fh.write("\n")
+    _replace_atomic(rec_tmp, index_dir / RECORDS_FILE)
+
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "dtype": "float32",
+        "next_id": int(next_id),
+    }
+    head_tmp = index_dir / (HEADER_FILE + ".tmp")
+    head_tmp.write_text(json.dumps(header), encoding="utf-8")
+    _replace_atomic(head_tmp, index_dir / HEADER_FILE)
+
+
+def read_index(index_dir: Path) -> tuple[np.ndarray, list[dict[str, Any]], int]:
+    """Open an index directory; returns ``(memmapped_matrix, records, next_id)``.
+
+    Raises ``IndexFormatError`` if the files are missing or disagree with the header.
+    """
+    try:
+        header = json.loads((index_dir / HEADER_FILE).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as exc:
+        msg = f"Unreadable KB header in {index_dir}: {exc}"
+        raise IndexFormatError(msg) from exc
+    if header.get("format") != FORMAT_NAME or header.get("version") != FORMAT_VERSION:
+        msg = f"Unsupported KB index format {header.get('format')!r} v{header.get('version')!r}."
+        raise IndexFormatError(msg)
+
+    count, dim = int(header["count"]), int(header["dim"])
+    emb_path = index_dir / EMBEDDINGS_FILE
+    expected_bytes = count * dim * np.dtype(np.float32).itemsize
+    if not emb_path.is_file() or emb_path.stat().st_size != expected_bytes:
+        msg = f"KB embeddings file does not match header ({count}x{dim}) in {index_dir}."
+        raise IndexFormatError(msg)
+    if count:
+        matrix: np.ndarray = np.memmap(emb_path, dtype=np.float32, mode="r", shape=(count, dim))
+    else:
+        matrix = np.empty((0, dim), dtype=np.float32)
+
+    try:
+        with (index_dir / RECORDS_FILE).open(encoding="utf-8") as fh:
+            records = [json.loads(line) for line in fh if line.strip()]
+    except (OSError, json.JSONDecodeError) as exc:
+        msg = f"Unreadable KB records sidecar in {index_dir}: {exc}"
+        raise IndexFormatError(msg) from exc
+    if len(records) != count:
+        msg = f"KB records sidecar has {len(records)} rows, header says {count}."
+        raise IndexFormatError(msg)
+    return matrix, records, int(header.get("next_id", count + 1))
+
+
+def read_manifest(index_dir: Path) -> dict[str, dict[str, Any]]:
+    """Return the per-file manifest of ``index_dir`` (empty if missing or unreadable)."""
+    path = index_dir / MANIFEST_FILE
+    if not path.is_file():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as exc:
+        APP_LOGGER.warning("KB manifest is unreadable (%s); all files will be re-indexed.", exc)
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_manifest(index_dir: Path, manifest: dict[str, dict[str, Any]]) -> None:
+    """Atomically replace the manifest of ``index_dir``."""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tmp = index_dir / (MANIFEST_FILE + ".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    _replace_atomic(tmp, index_dir / MANIFEST_FILE)
+
+
+def read_lexical(index_dir: Path) -> dict[str, Any] | None:
+    """Return the serialized BM25 index of ``index_dir``, or None if missing or unreadable."""
+    path = index_dir / LEXICAL_FILE
+    if not path.is_file():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as exc:
+        APP_LOGGER.warning("KB lexical index is unreadable (%s); it will be rebuilt.", exc)
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def write_lexical(index_dir: Path, data: dict[str, Any]) -> None:
+    """Atomically replace the serialized BM25 index of ``index_dir``."""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tmp = index_dir / (LEXICAL_FILE + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    _replace_atomic(tmp, index_dir / LEXICAL_FILE)
+
+
+def write_ann(index_dir: Path, centroids: np.ndarray, assignments: np.ndarray, trained_rows: int) -> None:
+    """Atomically replace the IVF index of ``index_dir``."""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tmp = index_dir / (ANN_FILE + ".tmp")
+    with tmp.open("wb") as fh:
+        np.savez(
+            fh,
+            centroids=np.asarray(centroids, dtype=np.float32),
+            assignments=np.asarray(assignments, dtype=np.int32),
+            trained_rows=np.asarray(trained_rows, dtype=np.int64),
+        )
+    _replace_atomic(tmp, index_dir / ANN_FILE)
+
+
+def remove_ann(index_dir: Path) -> None:
+    """Delete the IVF index of ``index_dir`` if there is one."""
+    (index_dir / ANN_FILE).unlink(missing_ok=True)
+
+
+def read_ann(index_dir: Path, count: int) -> tuple[np.ndarray, np.ndarray, int] | None:
+    """Return ``(centroids, assignments, trained_rows)``, or None if missing, unreadable or stale."""
+    path = index_dir / ANN_FILE
+    if not path.is_file():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            centroids, assignments = data["centroids"], data["assignments"]
+            trained_rows = int(data["trained_rows"])
+    except (OSError, KeyError, ValueError) as exc:
+        APP_LOGGER.warning("KB ANN index is unreadable (%s); it will be rebuilt.", exc)
+        return None
+    if assignments.shape != (count,) or centroids.ndim != 2:  # noqa: PLR2004
+        APP_LOGGER.warning("KB ANN index does not match the index (%d rows); it will be rebuilt.", count)
+        return None
+    return centroids, assignments, trained_rows
+
+
+def write_quant(index_dir: Path, mode: str, codes: np.ndarray, arrays: dict[str, np.ndarray]) -> None:
+    """Atomically replace the quantised codes of ``index_dir``."""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tmp = index_dir / (QUANT_FILE + ".tmp")
+    with tmp.open("wb") as fh:
+        np.savez(fh, mode=np.asarray(mode), codes=np.asarray(codes, dtype=np.uint8), **arrays)
+    _replace_atomic(tmp, index_dir / QUANT_FILE)
+
+
+def read_quant(index_dir: Path, count: int) -> tuple[str, np.ndarray, dict[str, np.ndarray]] | None:
+    """Return ``(mode, codes, trained arrays)``, or None if missing, unreadable or stale."""
+    path = index_dir / QUANT_FILE
+    if not path.is_file():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            mode, codes = str(data["mode"]), data["codes"]
+            arrays = {name: data[name] for name in data.files if name not in {"mode", "codes"}}
+    except (OSError, KeyError, ValueError) as exc:
+        APP_LOGGER.warning("KB quantised codes are unreadable (%s); they will be rebuilt.", exc)
+        return None
+    if codes.ndim != 2 or codes.shape[0] != count:  # noqa: PLR2004
+        APP_LOGGER.warning("KB quantised codes do not match the index (%d rows); they will be rebuilt.", count)
+        return None
+    return mode, codes, arrays
+
+
+def read_legacy_json(json_path: Path) -> tuple[list[dict[str, Any]], list[list[float]], int]:
+    """Parse a legacy ``kb_index.json``; returns ``(records, embeddings, next_id)``.
+
+    Records are returned without their ``embedding`` key. Invalid items in the
+    list format are skipped with a warning, as the original loader did.
+    """
+    data = json.loads(json_path.read_text(encoding="utf-8"))
+    if isinstance(data, list):
+        items = []
+        for item in data:
+            if isinstance(item, dict):
+                items.append(item)
+            else:
+                APP_LOGGER.warning("Ignoring non-dict item in KB index list: %r", item)
+        next_id = None
+    elif isinstance(data, dict):
+        items = list(data.get("records", []))
+        next_id = data.get("next_id")
+    else:
+        items, next_id = [], None
+
+    records: list[dict[str, Any]] = []
+    embeddings: list[list[float]] = []
+    for item in items:
+        try:
+            embedding = [float(x) for x in item["embedding"]]
+            record = {k: v for k, v in item.items() if k != "embedding"}
+        except (KeyError, TypeError, ValueError) as exc:
+            APP_LOGGER.warning("Skipping invalid KB record in legacy index: %s", exc)
+            continue
+        records.append(record)
+        embeddings.append(embedding)
+    return records, embeddings, int(next_id) if next_id is not None else len(records) + 1
+
+
+def migrate_legacy_index(json_path: Path, index_dir: Path) -> int:
+    """Convert a legacy JSON index into the binary format; returns the number of rows migrated.
+
+    The JSON file is renamed to ``<name>.migrated`` afterwards so the migration
+    runs once but the original data is kept.
+    """
+    records, embeddings, next_id = read_legacy_json(json_path)
+    matrix = normalise_rows(np.asarray(embeddings, dtype=np.float32)) if embeddings else np.empty((0, 0), np.float32)
+    write_index(index_dir, matrix, records, next_id)
+    json_path.replace(json_path.with_name(json_path.name + ".migrated"))
+    APP_LOGGER.info("Migrated legacy KB index %s -> %s (%d records)", json_path, index_dir, len(records))
+    return len(records)
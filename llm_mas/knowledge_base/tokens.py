@@ -0,0 +1,106 @@
+"""Token counting for chunk budgets and retrieval reports.
+
+Chunks and retrieved context end up in a model prompt, so their cost is measured
+in that model's tokens, not in characters. ``get_tokenizer`` returns a
+``Tokenizer`` by name:
+
+- any tiktoken encoding (``cl100k_base``, ``o200k_base``, ...) when ``tiktoken``
+  is installed;
+- ``regex``: a dependency-free estimate that counts punctuation marks and every
+  started run of four word characters, which tracks BPE token counts of English
+  prose and code within a few percent.
+
+A name tiktoken does not know, or any name without tiktoken, falls back to
+``regex`` with a warning. Tokenizers are built once per process and memoise the
+counts of recently seen texts, so re-counting the same chunk (a repeated query
+result, a shrinking chunk candidate) is a dictionary lookup.
+
+Configuration (environment variables):
+- ``KB_TOKENIZER``: tokenizer used by the knowledge base (default ``cl100k_base``).
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import re
+from abc import abstractmethod
+
+from llm_mas.logging.loggers import APP_LOGGER
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+DEFAULT_TOKENIZER = "cl100k_base"
+REGEX_TOKENIZER = "regex"
+
+_COUNT_CACHE_SIZE = 8192
+"""Texts whose token counts each tokenizer remembers."""
+
+_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class Tokenizer:
+    """Base class of the token counters; ``count`` is memoised per instance."""
+
+    def __init__(self, name: str) -> None:
+        """Initialize a tokenizer called ``name``."""
+        self.name = name
+        self._cached_count = functools.lru_cache(maxsize=_COUNT_CACHE_SIZE)(self._count)
+
+    def count(self, text: str) -> int:
+        """Return the number of tokens in ``text``."""
+        return self._cached_count(text) if text else 0
+
+    @abstractmethod
+    def _count(self, text: str) -> int: ...
+
+
+class RegexTokenizer(Tokenizer):
+    """Estimates BPE token counts without a vocabulary (see the module docstring)."""
+
+    def __init__(self) -> None:
+        """Initialize the estimator."""
+        super().__init__(REGEX_TOKENIZER)
+
+    def _count(self, text: str) -> int:
+        return sum(1 for _ in _TOKEN.finditer(text))
+
+
+class TiktokenTokenizer(Tokenizer):
+    """Exact counts of a tiktoken encoding."""
+
+    def __init__(self, name: str) -> None:
+        """Load the tiktoken encoding ``name``; raises ``ValueError`` if it is unknown."""
+        super().__init__(name)
+        if tiktoken is None:
+            msg = "tiktoken is not installed."
+            raise ValueError(msg)
+        self._encoding = tiktoken.get_encoding(name)
+
+    def _count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+def default_tokenizer_name() -> str:
+    """Return ``KB_TOKENIZER``, the name of the tokenizer the knowledge base counts with."""
+    return os.getenv("KB_TOKENIZER", DEFAULT_TOKENIZER).strip() or DEFAULT_TOKENIZER
+
+
+def get_tokenizer(name: str | None = None) -> Tokenizer:
+    """Return the tokenizer called ``name`` (default ``KB_TOKENIZER``), built once per process."""
+    return _tokenizer(name or default_tokenizer_name())
+
+
+@functools.cache
+def _tokenizer(name: str) -> Tokenizer:
+    if name == REGEX_TOKENIZER:
+        return RegexTokenizer()
+    try:
+        return TiktokenTokenizer(name)
+    # An unknown name, or an encoding that could not be downloaded
+    except Exception as exc:  # noqa: BLE001
+        APP_LOGGER.warning("Tokenizer %r is unavailable (%s); estimating token counts instead.", name, exc)
+        return RegexTokenizer()
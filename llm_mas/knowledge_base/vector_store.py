@@ -0,0 +1,387 @@
+"""Contiguous float32 vector store backing the knowledge base.
+
+Embeddings are L2-normalised once on insert and kept in a single row-major
+``float32`` matrix, so cosine similarity against a query is one matrix-vector
+product. Per-row metadata lives in a parallel list that always has exactly one
+entry per matrix row.
+
+Writers never modify live rows in place: appends write past the current size and
+removals build a new matrix, so a search only needs a consistent snapshot of
+``(size, matrix, metadata)`` and can score without holding the lock.
+
+An optional IVF index (see ``ann``) can be installed; it is kept in step with
+every append and removal, and ``search`` uses it when given an ``nprobe``.
+
+An optional quantizer (see ``quantization``) keeps compact codes parallel to the
+rows. Searches then scan the codes and re-rank only the best candidates against
+the float32 rows, so a memory-mapped matrix is mostly never paged in.
+
+A store built with a ``key`` function also keeps each row's integer key, which
+must increase with every append. Searches can then be restricted to a set of keys
+(e.g. the result of a metadata filter): only those rows are scored.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+    from llm_mas.knowledge_base.ann import IVFIndex
+    from llm_mas.knowledge_base.quantization import Quantizer
+
+_MIN_CAPACITY = 64
+
+DEFAULT_RERANK = 4
+"""Candidates re-ranked exactly per requested result when searching quantised codes."""
+
+
+def normalise_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of ``vectors`` with every row scaled to unit length.
+
+    Zero rows are left as zeros so they score 0.0 against any query.
+    """
+    mat = np.asarray(vectors, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat.reshape(1, -1)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return mat / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the ``k`` highest scores, best first.
+
+    Uses ``argpartition`` so only the selected candidates are fully sorted.
+    """
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class VectorStore[T]:
+    """Pre-normalised float32 embedding matrix with a parallel metadata list."""
+
+    def __init__(self, key: Callable[[T], int] | None = None) -> None:
+        """Initialize an empty store; the dimension is fixed by the first insert.
+
+        ``key`` maps metadata to an integer key that increases with every appended
+        row; it enables the ``allowed`` restriction of ``search``.
+        """
+        self._matrix: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self._size = 0
+        self.metadata: list[T] = []
+        self._key = key
+        self._keys: np.ndarray = np.empty(0, dtype=np.int64)
+        self._ann: IVFIndex | None = None
+        self._quantizer: Quantizer | None = None
+        self._codes: np.ndarray = np.empty((0, 0), dtype=np.uint8)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of stored vectors."""
+        return self._size
+
+    @property
+    def dim(self) -> int | None:
+        """Return the embedding dimension, or None while the store is empty."""
+        return self._matrix.shape[1] if self._size else None
+
+    @property
+    def ann(self) -> IVFIndex | None:
+        """Return the installed IVF index, if any."""
+        return self._ann
+
+    @property
+    def quantizer(self) -> Quantizer | None:
+        """Return the installed quantizer, if any."""
+        return self._quantizer
+
+    @property
+    def codes(self) -> np.ndarray:
+        """Return the quantised codes of the live rows (empty without a quantizer)."""
+        with self._lock:
+            return self._codes[: self._size] if self._quantizer is not None else self._codes[:0]
+
+    @property
+    def generation(self) -> int:
+        """Return a counter that changes whenever existing rows are removed or replaced."""
+        return self._generation
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Return a read-only view of the live (normalised) rows."""
+        return self.snapshot()[0]
+
+    def snapshot(self) -> tuple[np.ndarray, list[T]]:
+        """Return a consistent ``(read-only matrix view, metadata)`` pair of the live rows."""
+        with self._lock:
+            view = self._matrix[: self._size]
+            metadata = self.metadata[: self._size]
+        view.flags.writeable = False
+        return view, metadata
+
+    def add(self, vectors: Sequence[Sequence[float]] | np.ndarray, metadata: Sequence[T]) -> None:
+        """Append vectors and their metadata, growing the matrix geometrically."""
+        if len(vectors) != len(metadata):
+            msg = f"Got {len(vectors)} vectors but {len(metadata)} metadata entries."
+            raise ValueError(msg)
+        if len(metadata) == 0:
+            return
+        rows = normalise_rows(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            if self._size and rows.shape[1] != self._matrix.shape[1]:
+                msg = f"Embedding dimension mismatch: store has {self._matrix.shape[1]}, got {rows.shape[1]}."
+                raise ValueError(msg)
+            self._reserve(self._size + rows.shape[0], rows.shape[1])
+            self._matrix[self._size : self._size + rows.shape[0]] = rows
+            if self._ann is not None:
+                self._ann.append(rows)
+            if self._quantizer is not None:
+                self._codes[self._size : self._size + rows.shape[0]] = self._quantizer.encode(rows)
+            if self._key is not None:
+                self._keys[self._size : self._size + rows.shape[0]] = [self._key(m) for m in metadata]
+            self.metadata.extend(metadata)
+            self._size += rows.shape[0]
+
+    def attach(
+        self,
+        matrix: np.ndarray,
+        metadata: list[T],
+        ann: IVFIndex | None = None,
+        quantized: tuple[Quantizer, np.ndarray] | None = None,
+    ) -> None:
+        """Adopt an already-normalised matrix (e.g. a read-only memmap) without copying it.
+
+        The matrix is only copied into memory if rows are appended later. ``ann``
+        is installed if it has exactly one assignment per row, and ``quantized``
+        (a quantizer and its codes) if it has exactly one code per row.
+        """
+        if matrix.shape[0] != len(metadata):
+            msg = f"Got {matrix.shape[0]} vectors but {len(metadata)} metadata entries."
+            raise ValueError(msg)
+        if ann is not None and ann.assignments.shape[0] != matrix.shape[0]:
+            ann = None
+        if quantized is not None and quantized[1].shape != (matrix.shape[0], quantized[0].code_bytes):
+            quantized = None
+        keys = np.fromiter(map(self._key, metadata), dtype=np.int64, count=len(metadata)) if self._key else None
+        with self._lock:
+            self._matrix, self.metadata, self._size = matrix, metadata, matrix.shape[0]
+            if keys is not None:
+                self._keys = keys
+            self._ann = ann
+            self._quantizer, self._codes = quantized or (None, np.empty((0, 0), dtype=np.uint8))
+            self._generation += 1
+
+    def install_ann(self, ann: IVFIndex, trained_rows: int, generation: int) -> bool:
+        """Install an IVF index trained on the first ``trained_rows`` rows of ``generation``.
+
+        Rows appended while it was being trained are assigned now. Returns False
+        (and discards the index) if rows were removed in the meantime.
+        """
+        with self._lock:
+            if generation != self._generation or ann.assignments.shape[0] != trained_rows:
+                return False
+            if trained_rows < self._size:
+                ann.append(self._matrix[trained_rows : self._size])
+            self._ann = ann
+        return True
+
+    def drop_ann(self) -> None:
+        """Remove the IVF index so searches scan every row."""
+        with self._lock:
+            self._ann = None
+
+    def install_quantizer(self, quantizer: Quantizer, codes: np.ndarray, generation: int) -> bool:
+        """Install ``quantizer`` with the codes of the first ``len(codes)`` rows of ``generation``.
+
+        Rows appended while the codes were being computed are encoded now. Returns
+        False (and discards the codes) if rows were removed in the meantime.
+        """
+        with self._lock:
+            if generation != self._generation or codes.shape[0] > self._size:
+                return False
+            full = np.empty((max(self._matrix.shape[0], self._size), quantizer.code_bytes), dtype=np.uint8)
+            full[: codes.shape[0]] = codes
+            if codes.shape[0] < self._size:
+                full[codes.shape[0] : self._size] = quantizer.encode(self._matrix[codes.shape[0] : self._size])
+            self._quantizer, self._codes = quantizer, full
+        return True
+
+    def drop_quantizer(self) -> None:
+        """Remove the quantizer so searches score the float32 rows."""
+        with self._lock:
+            self._quantizer, self._codes = None, np.empty((0, 0), dtype=np.uint8)
+
+    def remove_where(self, predicate: Callable[[T], bool]) -> int:
+        """Drop every row whose metadata matches ``predicate``; returns the number removed.
+
+        Surviving rows are compacted into a fresh matrix so in-flight searches keep
+        reading a consistent snapshot.
+        """
+        with self._lock:
+            keep = np.fromiter((not predicate(m) for m in self.metadata), dtype=bool, count=self._size)
+            removed = int(self._size - keep.sum())
+            if not removed:
+                return 0
+            matrix = np.ascontiguousarray(self._matrix[: self._size][keep])
+            metadata = [m for m, k in zip(self.metadata, keep, strict=True) if k]
+            self._matrix, self.metadata, self._size = matrix, metadata, matrix.shape[0]
+            if self._ann is not None:
+                self._ann.keep(keep)
+            if self._quantizer is not None:
+                self._codes = np.ascontiguousarray(self._codes[: keep.shape[0]][keep])
+            if self._key is not None:
+                self._keys = self._keys[: keep.shape[0]][keep]
+            self._generation += 1
+        return removed
+
+    def clear(self) -> None:
+        """Drop all rows and release the backing matrix."""
+        with self._lock:
+            self._matrix, self.metadata, self._size = np.empty((0, 0), dtype=np.float32), [], 0
+            self._keys = np.empty(0, dtype=np.int64)
+            self._ann = None
+            self._quantizer, self._codes = None, np.empty((0, 0), dtype=np.uint8)
+            self._generation += 1
+
+    def search(
+        self,
+        query: Sequence[float] | np.ndarray,
+        top_k: int,
+        nprobe: int | None = None,
+        rerank: int = DEFAULT_RERANK,
+        allowed: np.ndarray | None = None,
+    ) -> list[tuple[T, float]]:
+        """Return ``(metadata, cosine_score)`` pairs for the best ``top_k`` rows.
+
+        With an IVF index installed and a positive ``nprobe``, only the rows of the
+        ``nprobe`` nearest cells are scanned; otherwise every row is. With a
+        quantizer installed the scan scores the codes, and the best
+        ``top_k * rerank`` candidates are re-scored exactly (``rerank=0`` returns
+        the approximate scores). ``allowed`` restricts the search to the rows with
+        those keys; they are scanned directly, without the IVF index.
+        Returns an empty list if the store is empty or the query dimension differs.
+        """
+        return self.search_many([query], top_k, nprobe, rerank, allowed)[0]
+
+    def search_many(
+        self,
+        queries: Sequence[Sequence[float]] | np.ndarray,
+        top_k: int,
+        nprobe: int | None = None,
+        rerank: int = DEFAULT_RERANK,
+        allowed: np.ndarray | None = None,
+    ) -> list[list[tuple[T, float]]]:
+        """Run ``search`` for several queries, scoring them all with one matrix multiply."""
+        with self._lock:
+            size, matrix, metadata, ann = self._size, self._matrix, self.metadata, self._ann
+            assignments = ann.assignments if ann is not None else None
+            quantizer, codes = self._quantizer, self._codes[: self._size]
+            rows = self._rows_for(allowed) if allowed is not None else None
+        if not size or not len(queries):
+            return [[] for _ in range(len(queries))]
+        q = normalise_rows(np.asarray(queries, dtype=np.float32))
+        if q.shape[1] != matrix.shape[1]:
+            return [[] for _ in range(len(queries))]
+        if rows is not None:
+            return self._search_rows(q, rows, top_k, rerank, (matrix, metadata, quantizer, codes))
+        probing = ann is not None and assignments is not None and bool(nprobe)
+        if quantizer is not None:
+            out = []
+            for row in q:
+                candidates = ann.candidates(assignments, row, nprobe) if probing else None
+                scan = codes if candidates is None else codes[candidates]
+                rows, scores = quantizer.search(scan, matrix, row, top_k, rerank=rerank, rows=candidates)
+                out.append([(metadata[i], float(s)) for i, s in zip(rows, scores, strict=True)])
+            return out
+        if probing:
+            out = []
+            for row in q:
+                rows, scores = ann.search(matrix, assignments, row, top_k, nprobe)
+                out.append([(metadata[i], float(s)) for i, s in zip(rows, scores, strict=True)])
+            return out
+        scores = matrix[:size] @ q.T
+        out = []
+        for col in range(q.shape[0]):
+            column = scores[:, col]
+            out.append([(metadata[i], float(column[i])) for i in top_k_indices(column, top_k)])
+        return out
+
+    def vectors_for(self, keys: Sequence[int] | np.ndarray) -> np.ndarray:
+        """Return the normalised rows stored under ``keys``, in order; unknown keys get zero rows."""
+        with self._lock:
+            if self._key is None:
+                msg = "Looking up vectors by key needs a VectorStore created with a key function."
+                raise ValueError(msg)
+            size, matrix, live = self._size, self._matrix, self._keys[: self._size]
+        wanted = np.asarray(keys, dtype=np.int64)
+        out = np.zeros((wanted.shape[0], matrix.shape[1] if size else 0), dtype=np.float32)
+        if not size:
+            return out
+        pos = np.minimum(np.searchsorted(live, wanted), size - 1)
+        found = live[pos] == wanted
+        out[found] = matrix[pos[found]]
+        return out
+
+    def _rows_for(self, keys: np.ndarray) -> np.ndarray:
+        """Return the sorted live row positions holding ``keys``; the caller holds the lock."""
+        if self._key is None:
+            msg = "Restricting a search by key needs a VectorStore created with a key function."
+            raise ValueError(msg)
+        live = self._keys[: self._size]
+        keys = np.unique(np.asarray(keys, dtype=np.int64))
+        pos = np.searchsorted(live, keys)
+        found = pos < live.shape[0]
+        pos = pos[found]
+        return pos[live[pos] == keys[found]]
+
+    @staticmethod
+    def _search_rows(
+        q: np.ndarray,
+        rows: np.ndarray,
+        top_k: int,
+        rerank: int,
+        snapshot: tuple[np.ndarray, list[T], Quantizer | None, np.ndarray],
+    ) -> list[list[tuple[T, float]]]:
+        """Score only ``rows`` of the snapshot, on the codes if there is a quantizer."""
+        matrix, metadata, quantizer, codes = snapshot
+        out = []
+        if quantizer is not None:
+            for row in q:
+                hits, scores = quantizer.search(codes[rows], matrix, row, top_k, rerank=rerank, rows=rows)
+                out.append([(metadata[i], float(s)) for i, s in zip(hits, scores, strict=True)])
+            return out
+        scores = np.asarray(matrix[rows], dtype=np.float32) @ q.T
+        for col in range(q.shape[0]):
+            column = scores[:, col]
+            out.append([(metadata[rows[i]], float(column[i])) for i in top_k_indices(column, top_k)])
+        return out
+
+    def _reserve(self, needed: int, dim: int) -> None:
+        """Ensure capacity for ``needed`` rows, doubling to amortise copies."""
+        capacity = self._matrix.shape[0] if self._matrix.shape[1] == dim else 0
+        if needed <= capacity:
+            return
+        new_capacity = max(_MIN_CAPACITY, capacity * 2, needed)
+        grown = np.empty((new_capacity, dim), dtype=np.float32)
+        if self._size:
+            grown[: self._size] = self._matrix[: self._size]
+        self._matrix = grown
+        if self._quantizer is not None:
+            codes = np.empty((new_capacity, self._quantizer.code_bytes), dtype=np.uint8)
+            codes[: self._size] = self._codes[: self._size]
+            self._codes = codes
+        if self._key is not None:
+            keys = np.empty(new_capacity, dtype=np.int64)
+            keys[: self._size] = self._keys[: self._size]
+            self._keys = keys
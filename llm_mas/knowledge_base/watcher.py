@@ -0,0 +1,471 @@
+"""Continuous background ingestion of watched folders into a knowledge base.
+
+``KBWatcher`` watches ingested roots and keeps their chunks up to date without
+rescanning them:
+
+- Change detection uses inotify on Linux (through ``ctypes``, so no extra
+  dependency) and falls back to a scanner that compares file mtimes and sizes
+  every ``KB_WATCH_POLL_SECONDS`` (default 5) where inotify is unavailable or out
+  of watches.
+- Events are coalesced per path, and a path is only ingested once it has been
+  quiet for ``KB_WATCH_DEBOUNCE_SECONDS`` (default 1), so an editor's save or a
+  long copy triggers a single re-index.
+- Only the created, modified or deleted files are passed to
+  ``KnowledgeBase.index_files``; unchanged files are never touched.
+- Ingestion is throttled so it never competes with interactive agent turns: it
+  waits until no query has started for ``KB_WATCH_QUIET_SECONDS`` (default 2),
+  ingests at most ``KB_WATCH_BATCH`` files (default 8) per round, parses on
+  threads rather than processes, and pauses ``KB_WATCH_COOLDOWN_SECONDS``
+  (default 0.5) between rounds.
+
+Watching is opt-in: ``KB_WATCH=1`` makes the upload screen watch its ingested roots.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Protocol
+
+from llm_mas.knowledge_base.knowledge_base import SUPPORTED_SUFFIXES
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from llm_mas.knowledge_base.knowledge_base import KnowledgeBase
+
+# inotify(7) event flags
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+)
+_EVENT = struct.Struct("iIII")
+_READ_BYTES = 1 << 16
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def watch_enabled() -> bool:
+    """Return True if ``KB_WATCH`` turns on watching of ingested roots."""
+    return os.getenv("KB_WATCH", "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+@dataclass
+class WatchSettings:
+    """Debounce and throttling of a ``KBWatcher``."""
+
+    debounce: float = 1.0
+    """Seconds a path must be quiet before it is ingested."""
+    poll_interval: float = 5.0
+    """Seconds between scans of the polling fallback."""
+    batch: int = 8
+    """Most files ingested per round."""
+    cooldown: float = 0.5
+    """Pause after each ingest round."""
+    quiet: float = 2.0
+    """Seconds without a KB query before ingestion may start."""
+
+    @staticmethod
+    def from_env() -> WatchSettings:
+        """Build the settings from the ``KB_WATCH_*`` variables."""
+        defaults = WatchSettings()
+        return WatchSettings(
+            debounce=_env_float("KB_WATCH_DEBOUNCE_SECONDS", defaults.debounce),
+            poll_interval=max(0.1, _env_float("KB_WATCH_POLL_SECONDS", defaults.poll_interval)),
+            batch=max(1, int(_env_float("KB_WATCH_BATCH", defaults.batch))),
+            cooldown=_env_float("KB_WATCH_COOLDOWN_SECONDS", defaults.cooldown),
+            quiet=_env_float("KB_WATCH_QUIET_SECONDS", defaults.quiet),
+        )
+
+
+class _Backend(Protocol):
+    name: str
+
+    def add_tree(self, root: Path) -> None: ...
+
+    def remove_tree(self, root: Path) -> None: ...
+
+    def poll(self, timeout: float) -> set[Path] | None:
+        """Wait up to ``timeout`` seconds and return the changed paths, or None if events were lost."""
+        ...
+
+    def close(self) -> None: ...
+
+
+class _InotifyBackend:
+    """Linux inotify watches on every directory of the watched trees."""
+
+    name = "inotify"
+
+    def __init__(self) -> None:
+        if not sys.platform.startswith("linux"):
+            msg = "inotify is only available on Linux"
+            raise OSError(errno.ENOSYS, msg)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        self._dirs: dict[int, Path] = {}
+
+    def add_tree(self, root: Path) -> None:
+        """Watch ``root`` (or the folder of a watched file) and every folder below it."""
+        top = root if root.is_dir() else root.parent
+        self._add_watch(top)
+        if root.is_dir():
+            for current, dirnames, _ in os.walk(root):
+                for dirname in dirnames:
+                    self._add_watch(Path(current) / dirname)
+
+    def _add_watch(self, path: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in {errno.ENOENT, errno.ENOTDIR}:
+                return  # removed before we got to it
+            raise OSError(err, f"inotify_add_watch {path}: {os.strerror(err)}")
+        self._dirs[wd] = path
+
+    def remove_tree(self, root: Path) -> None:
+        """Stop watching ``root`` and the folders below it."""
+        for wd, path in list(self._dirs.items()):
+            if path.is_relative_to(root):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def poll(self, timeout: float) -> set[Path] | None:
+        """Return the paths touched by the events read within ``timeout``; None after a queue overflow."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed: set[Path] = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self._fd, _READ_BYTES)
+            except BlockingIOError:
+                break
+            overflow |= self._parse(data, changed)
+        return None if overflow else changed
+
+    def _parse(self, data: bytes, changed: set[Path]) -> bool:
+        """Add the paths of the events in ``data`` to ``changed``; returns True on a queue overflow."""
+        overflow = False
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+            name = data[pos + _EVENT.size : pos + _EVENT.size + length].rstrip(b"\0")
+            pos += _EVENT.size + length
+            if mask & _IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            base = self._dirs.get(wd)
+            if mask & _IN_IGNORED:
+                self._dirs.pop(wd, None)
+            if base is None:
+                continue
+            path = base / os.fsdecode(name) if name else base
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                # Files may land in a new folder before its watch exists
+                self.add_tree(path)
+                changed.update(p for p in path.rglob("*") if p.is_file())
+            changed.add(path)
+        return overflow
+
+    def close(self) -> None:
+        """Release the inotify descriptor."""
+        os.close(self._fd)
+
+
+def _scan(root: Path) -> dict[Path, tuple[int, int]]:
+    """Return ``(mtime_ns, size)`` of every supported file under ``root`` (or of ``root`` itself)."""
+    found: dict[Path, tuple[int, int]] = {}
+    if root.is_file():
+        st = root.stat()
+        return {root: (st.st_mtime_ns, st.st_size)}
+    stack = [root]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.is_file() and Path(entry.name).suffix.lower() in SUPPORTED_SUFFIXES:
+                    st = entry.stat()
+                    found[Path(entry.path)] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+    return found
+
+
+class _PollingBackend:
+    """Portable fallback: rescan the watched trees' mtimes and sizes at a fixed interval."""
+
+    name = "polling"
+
+    def __init__(self, interval: float) -> None:
+        self._interval = interval
+        self._snapshots: dict[Path, dict[Path, tuple[int, int]]] = {}
+        self._next_scan = time.monotonic() + interval
+
+    def add_tree(self, root: Path) -> None:
+        self._snapshots[root] = _scan(root)
+
+    def remove_tree(self, root: Path) -> None:
+        self._snapshots.pop(root, None)
+
+    def poll(self, timeout: float) -> set[Path] | None:
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(0.0, wait))
+        self._next_scan = time.monotonic() + self._interval
+        changed: set[Path] = set()
+        for root, before in self._snapshots.items():
+            after = _scan(root)
+            changed.update(p for p in before.keys() | after.keys() if before.get(p) != after.get(p))
+            self._snapshots[root] = after
+        return changed
+
+    def close(self) -> None:
+        self._snapshots.clear()
+
+
+class KBWatcher:
+    """Watch folders and feed their changed files into a knowledge base on a background thread."""
+
+    def __init__(
+        self,
+        kb: KnowledgeBase,
+        roots: Iterable[Path] = (),
+        settings: WatchSettings | None = None,
+        *,
+        polling: bool = False,
+    ) -> None:
+        """Initialize the watcher; nothing is watched until ``start``.
+
+        ``polling`` forces the mtime-polling backend even where inotify is available.
+        """
+        self._kb = kb
+        self._settings = settings or WatchSettings.from_env()
+        self._force_polling = polling
+        self._roots: set[Path] = {Path(r).absolute() for r in roots}
+        self._added: set[Path] = set(self._roots)
+        self._removed: set[Path] = set()
+        self._pending: dict[Path, float] = {}
+        self._rescan: set[Path] = set()
+        self._busy = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.backend_name: str | None = None
+
+    @property
+    def roots(self) -> list[Path]:
+        """Return the watched roots."""
+        with self._lock:
+            return sorted(self._roots)
+
+    def add_root(self, root: Path) -> None:
+        """Start watching ``root``, a folder or a single file."""
+        root = Path(root).absolute()
+        with self._lock:
+            if root not in self._roots:
+                self._roots.add(root)
+                self._added.add(root)
+                self._removed.discard(root)
+
+    def remove_root(self, root: Path) -> None:
+        """Stop watching ``root``; its indexed chunks are kept."""
+        root = Path(root).absolute()
+        with self._lock:
+            if root in self._roots:
+                self._roots.discard(root)
+                self._removed.add(root)
+                self._added.discard(root)
+
+    def start(self) -> None:
+        """Start the background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kb-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread, finishing the ingest round in progress."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Wait until no change is pending or being ingested; returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending and not self._rescan and not self._busy and not self._added:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def _make_backend(self) -> _Backend:
+        if not self._force_polling:
+            try:
+                return _InotifyBackend()
+            except OSError as exc:
+                interval = self._settings.poll_interval
+                APP_LOGGER.info("KB watch: inotify unavailable (%s); polling every %.1fs", exc, interval)
+        return _PollingBackend(self._settings.poll_interval)
+
+    def _apply_root_changes(self, backend: _Backend) -> _Backend:
+        """Register added and removed roots with the backend; switches to polling if inotify runs out of watches."""
+        with self._lock:
+            added, removed = list(self._added), list(self._removed)
+        for root in removed:
+            backend.remove_tree(root)
+        for root in added:
+            try:
+                backend.add_tree(root)
+            except OSError as exc:
+                if isinstance(backend, _PollingBackend):
+                    APP_LOGGER.warning("KB watch: cannot watch %s: %s", root, exc)
+                    continue
+                APP_LOGGER.warning("KB watch: inotify failed for %s (%s); switching to polling", root, exc)
+                backend.close()
+                backend = _PollingBackend(self._settings.poll_interval)
+                self.backend_name = backend.name
+                with self._lock:
+                    self._added = set(self._roots)
+                    self._removed.clear()
+                return self._apply_root_changes(backend)
+        with self._lock:
+            self._added.difference_update(added)
+            self._removed.difference_update(removed)
+        return backend
+
+    def _run(self) -> None:
+        backend = self._make_backend()
+        self.backend_name = backend.name
+        APP_LOGGER.info("KB watch started: backend=%s roots=%d", backend.name, len(self._roots))
+        try:
+            with asyncio.Runner() as runner:
+                while not self._stop.is_set():
+                    backend = self._apply_root_changes(backend)
+                    changed = backend.poll(min(0.5, max(0.05, self._settings.debounce)))
+                    self._record(changed)
+                    batch = self._due_batch()
+                    if batch:
+                        self._ingest(runner, batch)
+                        self._stop.wait(self._settings.cooldown)
+        finally:
+            backend.close()
+            APP_LOGGER.info("KB watch stopped")
+
+    def _record(self, changed: set[Path] | None) -> None:
+        """Coalesce change events: each path keeps only the time of its latest event."""
+        now = time.monotonic()
+        with self._lock:
+            if changed is None:
+                APP_LOGGER.warning("KB watch: event queue overflowed; rescanning watched roots")
+                self._rescan.update(self._roots)
+                return
+            for path in changed:
+                suffix = path.suffix.lower()
+                # Skip editor swap files and the like; folders and deleted paths are kept
+                if suffix and suffix not in SUPPORTED_SUFFIXES and path.is_file():
+                    continue
+                if self._root_of(path) is not None:
+                    self._pending[path] = now
+
+    def _due_batch(self) -> list[Path] | None:
+        """Take up to ``batch`` debounced paths (or a root to rescan) if no query ran recently.
+
+        Returns None if there is nothing to do yet.
+        """
+        if self._kb.seconds_since_query() < self._settings.quiet:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._rescan:
+                self._busy = True
+                return [self._rescan.pop()]
+            due = sorted(p for p, t in self._pending.items() if now - t >= self._settings.debounce)
+            due = due[: self._settings.batch]
+            for path in due:
+                del self._pending[path]
+            self._busy = bool(due)
+            return due or None
+
+    def _root_of(self, path: Path) -> Path | None:
+        """Return the watched root containing ``path``; the caller holds ``_lock``."""
+        matches = [r for r in self._roots if path.is_relative_to(r)]
+        return max(matches, key=lambda r: len(r.parts)) if matches else None
+
+    def _ingest(self, runner: asyncio.Runner, batch: list[Path]) -> None:
+        """Index one batch of changed paths, grouped by root."""
+        try:
+            with self._lock:
+                groups: dict[Path, list[Path]] = {}
+                for path in batch:
+                    root = self._root_of(path)
+                    if root is not None:
+                        groups.setdefault(root, []).append(path)
+            for root, paths in groups.items():
+                if paths == [root] and root.is_dir():
+                    report = runner.run(self._kb.index_path(root))
+                else:
+                    report = runner.run(self._kb.index_files(paths, root, parse_workers=0))
+                APP_LOGGER.info(
+                    "KB watch ingested: root=%s paths=%d added=%d removed=%d skipped=%d",
+                    root,
+                    len(paths),
+                    report.chunks_added,
+                    report.chunks_removed,
+                    report.files_skipped,
+                )
+        except Exception:  # noqa: BLE001
+            APP_LOGGER.exception("KB watch: ingest failed for %d paths", len(batch))
+        finally:
+            with self._lock:
+                self._busy = False
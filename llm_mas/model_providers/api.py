@@ -1,9 +1,16 @@
 """Models API layer."""
 
-from llm_mas.model_providers.gemini.call_llm import GeminiProvider
-from llm_mas.model_providers.ollama.call_llm import OllamaProvider
-from llm_mas.model_providers.openai.call_llm import OpenAIProvider
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from llm_mas.logging.loggers import APP_LOGGER
+from llm_mas.model_providers.batching import EmbeddingBatchStats
+from llm_mas.model_providers.pool import PoolStats
 from llm_mas.model_providers.provider import ModelProvider
+from llm_mas.model_providers.registry import PROVIDER_REGISTRY
+from llm_mas.model_providers.response_cache import ResponseCache, ResponseCacheStats, response_key
+from llm_mas.model_providers.semantic_cache import Namespace, SemanticCache, SemanticCacheStats
+from llm_mas.model_providers.streaming import StreamStats, collect_stream
 from llm_mas.utils.config.general_config import GENERAL_CONFIG, GeneralConfig
 from llm_mas.utils.config.models_config import ModelConfig, ModelType
 
@@ -11,6 +18,11 @@ from llm_mas.utils.config.models_config import ModelConfig, ModelType
 class ModelsAPI:
     """Models API layer."""
 
+    # Opt-in response cache (see ``response_cache``); None when ``LLM_RESPONSE_CACHE`` is unset
+    _response_cache: ResponseCache | None = ResponseCache.from_env()
+    # Opt-in semantic cache (see ``semantic_cache``); None unless ``LLM_SEMANTIC_CACHE`` is set
+    _semantic_cache: SemanticCache | None = SemanticCache.from_env()
+
     @staticmethod
     def _get_model_config(
         config: GeneralConfig,
@@ -24,59 +36,219 @@ class ModelsAPI:
         )
 
     @staticmethod
-    def _get_config_and_providers() -> tuple[GeneralConfig, dict[str, ModelProvider]]:
-        """Get the general configuration and model providers."""
-        config = GENERAL_CONFIG
-        providers: dict[str, ModelProvider] = {
-            "ollama": OllamaProvider(),
-            "openai": OpenAIProvider(),
-            "google": GeminiProvider(),
-        }
-        return config, providers
+    def _get_provider(model: ModelType | str) -> tuple[ModelProvider, ModelConfig]:
+        """Get the shared provider of the given model type or name, and the model's configuration."""
+        model_config = ModelsAPI._get_model_config(GENERAL_CONFIG, model)
+        if not model_config:
+            msg = f"Model configuration for '{model}' not found."
+            raise ValueError(msg)
+        return PROVIDER_REGISTRY.get(model_config.provider), model_config
 
     @staticmethod
-    async def call_llm(
+    def _caches_for(
+        model: ModelType | str,
+        *,
+        cache: bool | None,
+        semantic_cache: bool,
+    ) -> tuple[ResponseCache | None, SemanticCache | None]:
+        """Get the response and semantic caches this call uses (None for those it does not).
+
+        The response cache follows ``cache`` if given, else whether the model type is listed for it;
+        the semantic cache is only used when ``semantic_cache`` is True.
+        """
+        response_cache = ModelsAPI._response_cache
+        if response_cache is not None and cache is None:
+            cache = isinstance(model, ModelType) and model.name in response_cache.model_types
+        return response_cache if cache else None, ModelsAPI._semantic_cache if semantic_cache else None
+
+    @staticmethod
+    async def _embed_prompt(semantic_cache: SemanticCache | None, text: str) -> list[float] | None:
+        """Embed ``text`` for a semantic cache lookup, or return None if the lookup is skipped."""
+        if semantic_cache is None or not text.strip() or not semantic_cache.accepts(text):
+            return None
+        try:
+            return await ModelsAPI.get_embedding(text)
+        # The cache must never fail the call it is in front of
+        except Exception as exc:  # noqa: BLE001
+            APP_LOGGER.warning("Skipping semantic cache lookup; embedding the prompt failed: %s", exc)
+            return None
+
+    @staticmethod
+    async def _complete(  # noqa: PLR0913
+        provider: ModelProvider,
+        model: str,
+        messages: list[dict],
+        call: Callable[[], Awaitable[str]],
+        *,
+        on_text: Callable[[str], None] | None,
+        caches: tuple[ResponseCache | None, SemanticCache | None],
+        template: str | None,
+        semantic_text: str | None,
+    ) -> str:
+        """Answer ``messages`` from the caches, or with ``call`` (streamed to ``on_text`` if given).
+
+        The semantic cache embeds ``semantic_text`` (default: the whole final message); everything else in
+        the messages, including the template text around it, must match exactly.
+        """
+        response_cache, semantic_cache = caches
+        key = response_key(provider.name, model, messages)
+        cached = response_cache.get(key) if response_cache is not None else None
+        prompt = str(messages[-1].get("content", "")) if messages else ""
+        text = prompt if semantic_text is None else semantic_text
+        rest = [*messages[:-1], {"role": "user", "content": prompt.replace(text, "") if text else prompt}]
+        namespace = Namespace(provider.name, model, template, response_key(provider.name, model, rest))
+        vector = None
+        if cached is None:
+            vector = await ModelsAPI._embed_prompt(semantic_cache, text)
+            if semantic_cache is not None and vector is not None:
+                cached = semantic_cache.get(namespace, vector)
+        if cached is not None:
+            if on_text is not None:
+                on_text(cached)
+            return cached
+
+        start = time.perf_counter()
+        if on_text is not None:
+            response = await collect_stream(provider.stream_llm_with_chat_history(messages, model), on_text)
+        else:
+            response = await call()
+        latency = time.perf_counter() - start
+        if response_cache is not None:
+            response_cache.put(key, provider.name, model, response, latency)
+        if semantic_cache is not None and vector is not None:
+            semantic_cache.put(namespace, text, vector, response, latency)
+        return response
+
+    @staticmethod
+    async def call_llm(  # noqa: PLR0913
         prompt: str,
         model: ModelType | str = ModelType.DEFAULT,
+        on_text: Callable[[str], None] | None = None,
+        *,
+        cache: bool | None = None,
+        semantic_cache: bool = False,
+        semantic_text: str | None = None,
+        template: str | None = None,
     ) -> str:
-        """Call the LLM with the given prompt and model type."""
-        config, providers = ModelsAPI._get_config_and_providers()
-        model_config = ModelsAPI._get_model_config(config, model)
-
-        if not model_config:
-            msg = f"Model configuration for '{model}' not found."
-            raise ValueError(msg)
+        """Call the LLM with the given prompt and model type.
 
-        provider_name = model_config.provider
-        if provider_name not in providers:
-            msg = f"Model provider '{provider_name}' not found."
-            raise ValueError(msg)
-        provider = providers[provider_name]
-        return await provider.call_llm(prompt, model_config.model)
+        With ``on_text``, the response is streamed and each text delta is passed to it as it arrives.
+        ``cache`` opts the call in to (True) or out of (False) the exact-match response cache; None follows its
+        model type. ``semantic_cache`` also lets an earlier call whose ``semantic_text`` (the variable user text
+        inside the prompt; default the whole prompt) is similar, and whose prompt is otherwise identical, answer
+        it; only pass it where a near-duplicate answer is acceptable. ``template`` names the call site's prompt
+        template, which scopes semantic cache hits.
+        """
+        provider, model_config = ModelsAPI._get_provider(model)
+        return await ModelsAPI._complete(
+            provider,
+            model_config.model,
+            [{"role": "user", "content": prompt}],
+            lambda: provider.call_llm(prompt, model_config.model),
+            on_text=on_text,
+            caches=ModelsAPI._caches_for(model, cache=cache, semantic_cache=semantic_cache),
+            template=template,
+            semantic_text=semantic_text,
+        )
 
     @staticmethod
-    async def call_llm_with_chat_history(
+    async def call_llm_with_chat_history(  # noqa: PLR0913
         chat_history: list[dict],
         model: ModelType | str = ModelType.DEFAULT,
+        on_text: Callable[[str], None] | None = None,
+        *,
+        cache: bool | None = None,
+        semantic_cache: bool = False,
+        semantic_text: str | None = None,
+        template: str | None = None,
     ) -> str:
-        """Call the LLM with the given chat history and model type."""
-        config, providers = ModelsAPI._get_config_and_providers()
-        model_config = ModelsAPI._get_model_config(config, model)
-        provider_name = model_config.provider
-        if provider_name not in providers:
-            msg = f"Model provider '{provider_name}' not found."
-            raise ValueError(msg)
-        provider = providers[provider_name]
-        return await provider.call_llm_with_chat_history(chat_history, model_config.model)
+        """Call the LLM with the given chat history and model type.
+
+        With ``on_text``, the response is streamed and each text delta is passed to it as it arrives.
+        ``cache`` opts the call in to (True) or out of (False) the exact-match response cache; None follows its
+        model type. ``semantic_cache`` also lets an earlier call whose ``semantic_text`` (the variable user text
+        inside the prompt; default the whole prompt) is similar, and whose prompt is otherwise identical, answer
+        it; only pass it where a near-duplicate answer is acceptable. ``template`` names the call site's prompt
+        template, which scopes semantic cache hits.
+        """
+        provider, model_config = ModelsAPI._get_provider(model)
+        return await ModelsAPI._complete(
+            provider,
+            model_config.model,
+            chat_history,
+            lambda: provider.call_llm_with_chat_history(chat_history, model_config.model),
+            on_text=on_text,
+            caches=ModelsAPI._caches_for(model, cache=cache, semantic_cache=semantic_cache),
+            template=template,
+            semantic_text=semantic_text,
+        )
+
+    @staticmethod
+    def stream_llm(prompt: str, model: ModelType | str = ModelType.DEFAULT) -> AsyncIterator[str]:
+        """Stream the LLM's response to the given prompt as text deltas."""
+        provider, model_config = ModelsAPI._get_provider(model)
+        return provider.stream_llm(prompt, model_config.model)
+
+    @staticmethod
+    def stream_llm_with_chat_history(
+        chat_history: list[dict],
+        model: ModelType | str = ModelType.DEFAULT,
+    ) -> AsyncIterator[str]:
+        """Stream the LLM's response to the given chat history as text deltas."""
+        provider, model_config = ModelsAPI._get_provider(model)
+        return provider.stream_llm_with_chat_history(chat_history, model_config.model)
 
     @staticmethod
     async def get_embedding(text: str, model: ModelType | str = ModelType.EMBEDDING) -> list[float]:
-        """Get the embedding for the given text and model type."""
-        config, providers = ModelsAPI._get_config_and_providers()
-        model_config = ModelsAPI._get_model_config(config, model)
-        provider_name = model_config.provider
-        if provider_name not in providers:
-            msg = f"Model provider '{provider_name}' not found."
-            raise ValueError(msg)
-        provider = providers[provider_name]
-        return await provider.get_embedding(text, model_config.model)
+        """Get the embedding for the given text and model type.
+
+        Concurrent calls are coalesced into batched requests (see ``batching``).
+        """
+        provider, model_config = ModelsAPI._get_provider(model)
+        return await provider.embed_batched(text, model_config.model)
+
+    @staticmethod
+    async def get_embeddings(texts: list[str], model: ModelType | str = ModelType.EMBEDDING) -> list[list[float]]:
+        """Get the embeddings for the given texts and model type, in order, in one request."""
+        provider, model_config = ModelsAPI._get_provider(model)
+        return await provider.get_embeddings(texts, model_config.model)
+
+    @staticmethod
+    def connection_stats() -> dict[str, PoolStats]:
+        """Get the request and connection reuse counters of each provider used so far."""
+        return PROVIDER_REGISTRY.connection_stats()
+
+    @staticmethod
+    def embedding_batch_stats() -> dict[str, EmbeddingBatchStats]:
+        """Get the embedding batching counters (calls per request) of each provider used so far."""
+        return PROVIDER_REGISTRY.embedding_batch_stats()
+
+    @staticmethod
+    def stream_stats() -> dict[str, StreamStats]:
+        """Get the streaming counters (time to first token, duration) of each provider used so far."""
+        return PROVIDER_REGISTRY.stream_stats()
+
+    @staticmethod
+    def set_response_cache(response_cache: ResponseCache | None) -> None:
+        """Replace the response cache configured by ``LLM_RESPONSE_CACHE``; None disables caching."""
+        ModelsAPI._response_cache = response_cache
+
+    @staticmethod
+    def response_cache_stats() -> ResponseCacheStats | None:
+        """Get the response cache's hit rate and saved latency, or None if the cache is off."""
+        return ModelsAPI._response_cache.stats() if ModelsAPI._response_cache is not None else None
+
+    @staticmethod
+    def set_semantic_cache(semantic_cache: SemanticCache | None) -> None:
+        """Replace the semantic cache configured by ``LLM_SEMANTIC_CACHE``; None disables it."""
+        ModelsAPI._semantic_cache = semantic_cache
+
+    @staticmethod
+    def semantic_cache_stats() -> SemanticCacheStats | None:
+        """Get the semantic cache's hit rate and saved latency, or None if the cache is off."""
+        return ModelsAPI._semantic_cache.stats() if ModelsAPI._semantic_cache is not None else None
+
+    @staticmethod
+    async def aclose() -> None:
+        """Close the providers' pooled connections; call on application shutdown."""
+        await PROVIDER_REGISTRY.aclose()
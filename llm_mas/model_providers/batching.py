@@ -0,0 +1,149 @@
+"""Micro-batching of embedding requests.
+
+Selectors and actions embed one text per call (the user prompt, then each
+candidate action, tool or friend), so ranking a dozen candidates costs a dozen
+round trips. ``EmbeddingBatcher`` sits in front of a provider's list-input
+``get_embeddings``: calls for the same model that arrive within a short window
+are coalesced into one request (duplicate texts are sent once), and every
+caller gets its own vector back. A batch is sent as soon as it reaches the
+maximum size, without waiting for the window.
+
+Only concurrent calls can be coalesced: callers embedding several texts should
+start the calls together (``asyncio.gather``, see ``utils.embeddings.embed_all``)
+or use ``ModelsAPI.get_embeddings`` directly.
+
+Configuration (environment variables):
+- ``LLM_EMBED_BATCH_WINDOW_MS``: how long a batch waits for more calls (default 5).
+- ``LLM_EMBED_BATCH_SIZE``: maximum texts per request (default 64; 1 disables batching).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    EmbedMany = Callable[[list[str], str], Awaitable[list[list[float]]]]
+
+
+def batch_settings() -> tuple[float, int]:
+    """Return ``(window in seconds, maximum batch size)`` configured by the ``LLM_EMBED_BATCH_*`` variables."""
+    try:
+        window_ms = max(0.0, float(os.getenv("LLM_EMBED_BATCH_WINDOW_MS", "5")))
+    except ValueError:
+        window_ms = 5.0
+    try:
+        size = max(1, int(os.getenv("LLM_EMBED_BATCH_SIZE", "64")))
+    except ValueError:
+        size = 64
+    return window_ms / 1000, size
+
+
+@dataclass
+class EmbeddingBatchStats:
+    """Counters of an ``EmbeddingBatcher`` since it was created."""
+
+    calls: int = 0
+    """Texts requested by callers."""
+    requests: int = 0
+    """Batched requests sent to the provider."""
+    texts_sent: int = 0
+    """Distinct texts sent (duplicates within a batch are sent once)."""
+
+    @property
+    def mean_batch_size(self) -> float:
+        """Return the mean number of calls served per request."""
+        return self.calls / self.requests if self.requests else 0.0
+
+
+@dataclass
+class _Batch:
+    timer: asyncio.TimerHandle
+    items: list[tuple[str, asyncio.Future[list[float]]]] = field(default_factory=list)
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding calls into list-input requests."""
+
+    def __init__(
+        self,
+        name: str,
+        embed_many: EmbedMany,
+        window: float | None = None,
+        max_size: int | None = None,
+    ) -> None:
+        """Batch calls to ``embed_many(texts, model)``; ``window`` (seconds) and ``max_size`` default to the env."""
+        default_window, default_size = batch_settings()
+        self.name = name
+        self.window = default_window if window is None else window
+        self.max_size = default_size if max_size is None else max(1, max_size)
+        self._embed_many = embed_many
+        self._pending: dict[tuple[asyncio.AbstractEventLoop, str], _Batch] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._stats = EmbeddingBatchStats()
+        self._lock = threading.Lock()
+
+    async def embed(self, text: str, model: str) -> list[float]:
+        """Return the embedding of ``text``, requested together with concurrent calls for ``model``."""
+        if self.max_size == 1:
+            self._record(calls=1, texts=1)
+            return (await self._embed_many([text], model))[0]
+        loop = asyncio.get_running_loop()
+        key = (loop, model)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch(loop.call_later(self.window, self._flush, key))
+        future: asyncio.Future[list[float]] = loop.create_future()
+        batch.items.append((text, future))
+        if len(batch.items) >= self.max_size:
+            self._flush(key)
+        return await future
+
+    def stats(self) -> EmbeddingBatchStats:
+        """Return a snapshot of the counters."""
+        with self._lock:
+            return EmbeddingBatchStats(**vars(self._stats))
+
+    def _record(self, calls: int, texts: int) -> None:
+        with self._lock:
+            self._stats.calls += calls
+            self._stats.requests += 1
+            self._stats.texts_sent += texts
+
+    def _flush(self, key: tuple[asyncio.AbstractEventLoop, str]) -> None:
+        """Send the pending batch of ``key`` (a loop and a model), if any."""
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = key[0].create_task(self._send(key[1], batch.items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, model: str, items: list[tuple[str, asyncio.Future[list[float]]]]) -> None:
+        """Embed the distinct texts of ``items`` in one request and resolve every caller's future."""
+        texts = list(dict.fromkeys(text for text, _ in items))
+        self._record(calls=len(items), texts=len(texts))
+        try:
+            vectors = await self._embed_many(texts, model)
+            if len(vectors) != len(texts):
+                msg = f"{self.name} returned {len(vectors)} embeddings for {len(texts)} texts."
+                raise ValueError(msg)  # noqa: TRY301
+        # Every caller of the batch gets the error of the shared request
+        except Exception as exc:  # noqa: BLE001
+            APP_LOGGER.warning("Batched %s embedding request of %d texts failed: %s", self.name, len(texts), exc)
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        by_text = dict(zip(texts, vectors, strict=True))
+        for text, future in items:
+            if not future.done():
+                future.set_result(list(by_text[text]))
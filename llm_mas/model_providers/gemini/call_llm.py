@@ -1,9 +1,12 @@
 """Gemini call LLM model."""
 
 import os
+from collections.abc import AsyncIterator
 
 from google import genai
+from google.genai import types
 
+from llm_mas.model_providers.pool import CountingTransport
 from llm_mas.model_providers.provider import ModelProvider
 
 
@@ -25,18 +28,17 @@ class GeminiProvider(ModelProvider):
         return ["gemini-2.5-flash"]
 
     @staticmethod
-    def _init_client() -> genai.Client:
-        """Initialize the Gemini client."""
+    def _make_client(transport: CountingTransport) -> genai.Client:
+        """Create a Gemini client (``GEMINI_KEY``) whose async requests use the pooled transport."""
         api_key = os.environ.get("GEMINI_KEY")
         if not api_key:
             msg = "GEMINI_KEY environment variable not set."
             raise ValueError(msg)
-        return genai.Client(api_key=api_key)
+        return genai.Client(api_key=api_key, http_options=types.HttpOptions(async_client_args={"transport": transport}))
 
-    @staticmethod
-    async def call_llm(prompt: str, model: str) -> str:
+    async def call_llm(self, prompt: str, model: str) -> str:
         """Call the LLM with the given prompt."""
-        client = GeminiProvider._init_client()
+        client = self._client()
 
         response = await client.aio.models.generate_content(model=model, contents=prompt)
 
@@ -69,10 +71,9 @@ class GeminiProvider(ModelProvider):
             )
         return gemini_messages
 
-    @staticmethod
-    async def call_llm_with_messages(messages: list[dict], model: str) -> str:
+    async def call_llm_with_messages(self, messages: list[dict], model: str) -> str:
         """Call the LLM with the given chat history."""
-        client = GeminiProvider._init_client()
+        client = self._client()
 
         response = await client.aio.models.generate_content(model=model, contents=messages)
 
@@ -82,8 +83,18 @@ class GeminiProvider(ModelProvider):
 
         return response.text
 
-    @staticmethod
-    async def get_embedding(text: str, model: str) -> list[float]:
+    async def _stream_chat(self, chat_history: list[dict], model: str) -> AsyncIterator[str]:
+        """Yield the text deltas of a streamed Gemini completion of the (OpenAI-format) chat history."""
+        contents = self._convert_openai_messages_to_gemini(chat_history)
+        stream = await self._client().aio.models.generate_content_stream(
+            model=model,
+            contents=contents,  # pyright: ignore[reportArgumentType]
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    async def get_embedding(self, text: str, model: str) -> list[float]:
         """Get the embedding for the given text using Gemini."""
         msg = "Gemini embeddings have not been implemented yet."
         raise NotImplementedError(msg)
@@ -1,10 +1,11 @@
 """Ollama call LLM model."""
 
-import asyncio
+from collections.abc import AsyncIterator
 
 import ollama
 
 from llm_mas.logging.loggers import APP_LOGGER
+from llm_mas.model_providers.pool import CountingTransport
 from llm_mas.model_providers.provider import ModelProvider
 
 
@@ -26,42 +27,33 @@ class OllamaProvider(ModelProvider):
         return ["gemma3"]
 
     @staticmethod
-    async def call_llm(prompt: str, model: str) -> str:
+    def _make_client(transport: CountingTransport) -> ollama.AsyncClient:
+        """Create an Ollama client (``OLLAMA_HOST``) on the pooled transport."""
+        return ollama.AsyncClient(transport=transport)
+
+    async def call_llm(self, prompt: str, model: str) -> str:
         """Call the LLM with the given prompt."""
-        response = await asyncio.to_thread(
-            ollama.chat,
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        content = response.message.content
-        if not content:
-            msg = "No content returned from Ollama LLM."
-            raise ValueError(msg)
-        return content
+        return await self.call_llm_with_chat_history([{"role": "user", "content": prompt}], model)
 
-    @staticmethod
-    async def call_llm_with_chat_history(chat_history: list[dict], model: str) -> str:
+    async def call_llm_with_chat_history(self, chat_history: list[dict], model: str) -> str:
         """Call the LLM with the given chat history."""
-        response = await asyncio.to_thread(
-            ollama.chat,
-            model=model,
-            messages=chat_history,
-        )
+        response = await self._client().chat(model=model, messages=chat_history)
         content = response.message.content
         if not content:
             msg = "No content returned from Ollama LLM."
             raise ValueError(msg)
         return content
 
-    @staticmethod
-    async def get_embedding(text: str, model: str) -> list[float]:
+    async def _stream_chat(self, chat_history: list[dict], model: str) -> AsyncIterator[str]:
+        """Yield the content deltas of a streamed Ollama chat completion."""
+        async for part in await self._client().chat(model=model, messages=chat_history, stream=True):
+            if part.message.content:
+                yield part.message.content
+
+    async def get_embedding(self, text: str, model: str) -> list[float]:
         """Get the embedding for the given text using Ollama."""
         APP_LOGGER.info("Getting embedding for text using Ollama model: %s", model)
-        response = await asyncio.to_thread(
-            ollama.embed,
-            model=model,
-            input=text,
-        )
+        response = await self._client().embed(model=model, input=text)
 
         # as vector
         embeddings = response.embeddings
@@ -70,3 +62,14 @@ class OllamaProvider(ModelProvider):
             raise ValueError(msg)
 
         return list(embeddings[0])
+
+    async def get_embeddings(self, texts: list[str], model: str) -> list[list[float]]:
+        """Get the embeddings of the given texts in one Ollama request."""
+        if not texts:
+            return []
+        APP_LOGGER.info("Getting %d embeddings using Ollama model: %s", len(texts), model)
+        response = await self._client().embed(model=model, input=texts)
+        if len(response.embeddings) != len(texts):
+            msg = f"Ollama returned {len(response.embeddings)} embeddings for {len(texts)} texts."
+            raise ValueError(msg)
+        return [list(e) for e in response.embeddings]
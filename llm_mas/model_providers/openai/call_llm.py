@@ -1,9 +1,11 @@
 """OpenAI call LLM model."""
 
 import os
+from collections.abc import AsyncIterator
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 
+from llm_mas.model_providers.pool import CountingTransport
 from llm_mas.model_providers.provider import ModelProvider
 
 
@@ -26,24 +28,20 @@ class OpenAIProvider(ModelProvider):
         return ["gpt-4o-mini"]
 
     @staticmethod
-    async def call_llm(prompt: str, model: str) -> str:
-        """Call the LLM with the given prompt."""
-        client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        response = await client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
+    def _make_client(transport: CountingTransport) -> AsyncOpenAI:
+        """Create an OpenAI client (``OPENAI_API_KEY``) on the pooled transport."""
+        return AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            http_client=DefaultAsyncHttpxClient(transport=transport),
         )
-        content = response.choices[0].message.content
-        if not content:
-            msg = f"No content returned from {model}."
-            raise ValueError(msg)
-        return content
 
-    @staticmethod
-    async def call_llm_with_messages(messages: list[dict], model: str) -> str:
+    async def call_llm(self, prompt: str, model: str) -> str:
+        """Call the LLM with the given prompt."""
+        return await self.call_llm_with_messages([{"role": "user", "content": prompt}], model)
+
+    async def call_llm_with_messages(self, messages: list[dict], model: str) -> str:
         """Call the LLM with the given chat history."""
-        client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        response = await client.chat.completions.create(
+        response = await self._client().chat.completions.create(
             model=model,
             messages=messages,  # pyright: ignore[reportArgumentType]
         )
@@ -53,25 +51,25 @@ class OpenAIProvider(ModelProvider):
             raise ValueError(msg)
         return content
 
-    @staticmethod
-    async def call_llm_with_chat_history(messages: list[dict], model: str) -> str:
+    async def call_llm_with_chat_history(self, messages: list[dict], model: str) -> str:
         """Call the LLM with the given chat history."""
-        client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        response = await client.chat.completions.create(
+        return await self.call_llm_with_messages(messages, model)
+
+    async def _stream_chat(self, chat_history: list[dict], model: str) -> AsyncIterator[str]:
+        """Yield the content deltas of a streamed chat completion."""
+        stream = await self._client().chat.completions.create(
             model=model,
-            messages=messages,  # pyright: ignore[reportArgumentType]
+            messages=chat_history,  # pyright: ignore[reportArgumentType]
+            stream=True,
         )
-        content = response.choices[0].message.content
-        if not content:
-            msg = f"No content returned from {model}."
-            raise ValueError(msg)
-        return content
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
 
-    @staticmethod
-    async def get_embedding(text: str, model: str) -> list[float]:
+    async def get_embedding(self, text: str, model: str) -> list[float]:
         """Get the embedding for the given text using openai."""
-        client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        response = await client.embeddings.create(
+        response = await self._client().embeddings.create(
             model=model,
             input=text,
         )
@@ -82,3 +80,16 @@ class OpenAIProvider(ModelProvider):
             raise ValueError(msg)
 
         return list(embeddings)
+
+    async def get_embeddings(self, texts: list[str], model: str) -> list[list[float]]:
+        """Get the embeddings of the given texts in one openai request."""
+        if not texts:
+            return []
+        response = await self._client().embeddings.create(
+            model=model,
+            input=texts,
+        )
+        if len(response.data) != len(texts):
+            msg = f"OpenAI returned {len(response.data)} embeddings for {len(texts)} texts."
+            raise ValueError(msg)
+        return [list(d.embedding) for d in sorted(response.data, key=lambda d: d.index)]
@@ -0,0 +1,153 @@
+"""Pooled keep-alive HTTP clients for the model providers.
+
+Every provider sends its requests through a ``CountingTransport``: an httpx
+transport with a bounded pool of keep-alive connections that also counts
+requests and the connections it had to open, so connection reuse can be
+measured per provider.
+
+httpx connections belong to the event loop that opened them, so a provider
+keeps one client per running loop (``LoopClients``). In the application there
+is a single loop and so a single client per provider, built on first use and
+closed by ``ProviderRegistry.aclose`` on shutdown.
+
+Configuration (environment variables):
+- ``LLM_POOL_MAX_CONNECTIONS``: open connections per provider and loop (default 20).
+- ``LLM_POOL_MAX_KEEPALIVE``: idle connections kept open (default 10).
+- ``LLM_POOL_KEEPALIVE_SECONDS``: how long an idle connection is kept (default 60).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+import httpx
+
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def pool_limits() -> httpx.Limits:
+    """Return the connection pool limits configured by the ``LLM_POOL_*`` variables."""
+    return httpx.Limits(
+        max_connections=max(1, int(_env_number("LLM_POOL_MAX_CONNECTIONS", 20))),
+        max_keepalive_connections=int(_env_number("LLM_POOL_MAX_KEEPALIVE", 10)),
+        keepalive_expiry=_env_number("LLM_POOL_KEEPALIVE_SECONDS", 60.0),
+    )
+
+
+@dataclass
+class PoolStats:
+    """Connection counters of one provider since the process started."""
+
+    requests: int = 0
+    connections_opened: int = 0
+    clients_created: int = 0
+    clients_closed: int = 0
+
+    @property
+    def connections_reused(self) -> int:
+        """Return the number of requests sent on an already open connection."""
+        return max(0, self.requests - self.connections_opened)
+
+    @property
+    def reuse_rate(self) -> float:
+        """Return the fraction of requests that did not open a connection."""
+        return self.connections_reused / self.requests if self.requests else 0.0
+
+
+class PoolMetrics:
+    """Thread-safe ``PoolStats`` shared by all of a provider's transports."""
+
+    def __init__(self) -> None:
+        """Start with zeroed counters."""
+        self._stats = PoolStats()
+        self._lock = threading.Lock()
+
+    def add(self, **counts: int) -> None:
+        """Add ``counts`` to the counters of the same names."""
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self._stats, name, getattr(self._stats, name) + n)
+
+    def snapshot(self) -> PoolStats:
+        """Return a copy of the counters."""
+        with self._lock:
+            return PoolStats(**vars(self._stats))
+
+
+class CountingTransport(httpx.AsyncHTTPTransport):
+    """Keep-alive transport with ``pool_limits`` that records requests and newly opened connections."""
+
+    def __init__(self, metrics: PoolMetrics, **kwargs: Any) -> None:  # noqa: ANN401
+        """Create a transport reporting to ``metrics``; ``kwargs`` go to ``httpx.AsyncHTTPTransport``."""
+        kwargs.setdefault("limits", pool_limits())
+        super().__init__(**kwargs)
+        self._metrics = metrics
+        self._seen: weakref.WeakSet[Any] = weakref.WeakSet()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """Send ``request`` and count the connections the pool opened for it."""
+        response = await super().handle_async_request(request)
+        opened = 0
+        for connection in self._pool.connections:
+            if connection not in self._seen:
+                self._seen.add(connection)
+                opened += 1
+        self._metrics.add(requests=1, connections_opened=opened)
+        return response
+
+
+class LoopClients:
+    """One SDK client per running event loop, each on its own ``CountingTransport``."""
+
+    def __init__(self, name: str, factory: Callable[[CountingTransport], Any]) -> None:
+        """Build clients with ``factory(transport)``; ``name`` labels log messages."""
+        self.name = name
+        self.metrics = PoolMetrics()
+        self._factory = factory
+        self._clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[Any, CountingTransport]] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:  # noqa: ANN401
+        """Return the client of the running event loop, building it on first use."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._clients.get(loop)
+            if entry is None:
+                transport = CountingTransport(self.metrics)
+                entry = (self._factory(transport), transport)
+                self._clients[loop] = entry
+                self.metrics.add(clients_created=1)
+                APP_LOGGER.debug("Created pooled %s client", self.name)
+        return entry[0]
+
+    async def aclose(self) -> None:
+        """Close every client's connections; clients of other live loops are closed on their loop."""
+        with self._lock:
+            entries = list(self._clients.items())
+            self._clients.clear()
+        current = asyncio.get_running_loop()
+        for loop, (_, transport) in entries:
+            if loop is current:
+                await transport.aclose()
+            elif not loop.is_closed():
+                asyncio.run_coroutine_threadsafe(transport.aclose(), loop)
+        if entries:
+            self.metrics.add(clients_closed=len(entries))
+            APP_LOGGER.info("Closed %d pooled %s client(s)", len(entries), self.name)
@@ -1,16 +1,38 @@
 """The model provider base class."""
 
+import asyncio
 from abc import abstractmethod
+from collections.abc import AsyncIterator
+from typing import Any
+
+from llm_mas.model_providers.batching import EmbeddingBatcher, EmbeddingBatchStats
+from llm_mas.model_providers.pool import CountingTransport, LoopClients, PoolStats
+from llm_mas.model_providers.streaming import StreamMetrics, StreamStats, timed_stream
 
 
 class ModelProvider:
-    """Base class for model providers."""
+    """Base class for model providers.
+
+    Providers are long-lived (see ``registry``): each keeps a pooled keep-alive
+    client per event loop, built by ``_make_client`` on first use (see ``pool``).
+
+    ``stream_llm`` / ``stream_llm_with_chat_history`` yield the completion as
+    text deltas and record the time to first token (see ``streaming``).
+    Subclasses stream natively by overriding ``_stream_chat``; the default yields
+    the full completion at once.
+
+    ``embed_batched`` coalesces concurrent embedding calls into list-input
+    ``get_embeddings`` requests (see ``batching``).
+    """
 
     def __init__(self, name: str) -> None:
         """Initialize the ModelProvider with a name."""
         self.name = name
         self.provided_models = self._init_provided_models()
         self.suggested_models = self._init_suggested_models()
+        self._clients = LoopClients(name, self._make_client)
+        self._stream_metrics = StreamMetrics()
+        self._embed_batcher = EmbeddingBatcher(name, self.get_embeddings)
 
     def get_name(self) -> str:
         """Get the name of the model provider."""
@@ -24,27 +46,71 @@ class ModelProvider:
         """Get the list of models suggested by this provider."""
         return self.suggested_models
 
-    @staticmethod
+    def connection_stats(self) -> PoolStats:
+        """Get the request and connection reuse counters of this provider's clients."""
+        return self._clients.metrics.snapshot()
+
+    def stream_stats(self) -> StreamStats:
+        """Get the streaming counters (time to first token, duration) of this provider."""
+        return self._stream_metrics.snapshot()
+
+    def embedding_batch_stats(self) -> EmbeddingBatchStats:
+        """Get the counters of this provider's embedding micro-batcher."""
+        return self._embed_batcher.stats()
+
+    async def aclose(self) -> None:
+        """Close the provider's pooled clients; they are rebuilt if the provider is used again."""
+        await self._clients.aclose()
+
+    def _client(self) -> Any:  # noqa: ANN401
+        """Get the pooled client of the running event loop."""
+        return self._clients.get()
+
     @abstractmethod
-    async def call_llm(prompt: str, model: str) -> str:
+    async def call_llm(self, prompt: str, model: str) -> str:
         """Call the LLM with the given prompt. To be implemented by subclasses."""
         msg = "call_llm method not implemented."
         raise NotImplementedError(msg)
 
-    @staticmethod
     @abstractmethod
-    async def call_llm_with_chat_history(chat_history: list[dict], model: str) -> str:
+    async def call_llm_with_chat_history(self, chat_history: list[dict], model: str) -> str:
         """Call the LLM with the given chat history. To be implemented by subclasses."""
         msg = "call_llm_with_chat_history method not implemented."
         raise NotImplementedError(msg)
 
-    @staticmethod
+    def stream_llm(self, prompt: str, model: str) -> AsyncIterator[str]:
+        """Stream the LLM's response to the given prompt as text deltas."""
+        return self.stream_llm_with_chat_history([{"role": "user", "content": prompt}], model)
+
+    def stream_llm_with_chat_history(self, chat_history: list[dict], model: str) -> AsyncIterator[str]:
+        """Stream the LLM's response to the given chat history as text deltas."""
+        return timed_stream(self._stream_chat(chat_history, model), self._stream_metrics, f"{self.name}:{model}")
+
+    async def _stream_chat(self, chat_history: list[dict], model: str) -> AsyncIterator[str]:
+        """Yield the raw text deltas of a chat completion; defaults to the full completion at once."""
+        yield await self.call_llm_with_chat_history(chat_history, model)
+
     @abstractmethod
-    async def get_embedding(text: str, model: str) -> list[float]:
+    async def get_embedding(self, text: str, model: str) -> list[float]:
         """Get the embedding for the given text. To be implemented by subclasses."""
         msg = "get_embedding method not implemented."
         raise NotImplementedError(msg)
 
+    async def get_embeddings(self, texts: list[str], model: str) -> list[list[float]]:
+        """Get the embeddings of the given texts, in order; defaults to one ``get_embedding`` call per text."""
+        return list(await asyncio.gather(*(self.get_embedding(text, model) for text in texts)))
+
+    async def embed_batched(self, text: str, model: str) -> list[float]:
+        """Get the embedding of the given text, requested together with concurrent calls for the same model."""
+        return await self._embed_batcher.embed(text, model)
+
+    @staticmethod
+    @abstractmethod
+    def _make_client(transport: CountingTransport) -> Any:  # noqa: ANN401
+        """Build the provider's SDK client on ``transport``. To be implemented by subclasses."""
+        msg = "_make_client method not implemented."
+        raise NotImplementedError(msg)
+
     @staticmethod
     @abstractmethod
     def _init_provided_models() -> list[str]:
@@ -58,5 +124,3 @@ class ModelProvider:
         """Initialize the list of suggested models. To be implemented by subclasses."""
         msg = "init_suggested_models method not implemented."
         raise NotImplementedError(msg)
-
-    # TODO: Add streaming support  # noqa: TD003
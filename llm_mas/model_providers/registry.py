@@ -0,0 +1,91 @@
+"""Process-wide registry of model providers.
+
+Each provider is built once, on first use, and then shared by every caller, so
+its pooled keep-alive clients (see ``pool``) are reused across LLM and embedding
+calls instead of paying for a new connection and TLS handshake per call.
+``aclose`` closes the clients on shutdown.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+
+from llm_mas.model_providers.gemini.call_llm import GeminiProvider
+from llm_mas.model_providers.ollama.call_llm import OllamaProvider
+from llm_mas.model_providers.openai.call_llm import OpenAIProvider
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from llm_mas.model_providers.batching import EmbeddingBatchStats
+    from llm_mas.model_providers.pool import PoolStats
+    from llm_mas.model_providers.provider import ModelProvider
+    from llm_mas.model_providers.streaming import StreamStats
+
+
+class ProviderRegistry:
+    """Lazily built, long-lived model providers keyed by provider name."""
+
+    def __init__(self, factories: dict[str, Callable[[], ModelProvider]] | None = None) -> None:
+        """Create a registry that builds each provider with its factory the first time it is requested."""
+        self._factories: dict[str, Callable[[], ModelProvider]] = dict(factories or {})
+        self._providers: dict[str, ModelProvider] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], ModelProvider]) -> None:
+        """Add or replace the factory of provider ``name``; a provider already built is kept."""
+        with self._lock:
+            self._factories[name] = factory
+
+    def names(self) -> list[str]:
+        """Return the names of the registered providers."""
+        with self._lock:
+            return sorted(self._factories)
+
+    def get(self, name: str) -> ModelProvider:
+        """Return the provider ``name``, building it on first use; raises ``ValueError`` if it is unknown."""
+        with self._lock:
+            provider = self._providers.get(name)
+            if provider is None:
+                factory = self._factories.get(name)
+                if factory is None:
+                    msg = f"Model provider '{name}' not found."
+                    raise ValueError(msg)
+                provider = self._providers[name] = factory()
+            return provider
+
+    def connection_stats(self) -> dict[str, PoolStats]:
+        """Return the connection counters of every provider built so far."""
+        with self._lock:
+            providers = dict(self._providers)
+        return {name: provider.connection_stats() for name, provider in providers.items()}
+
+    def stream_stats(self) -> dict[str, StreamStats]:
+        """Return the streaming counters of every provider built so far."""
+        with self._lock:
+            providers = dict(self._providers)
+        return {name: provider.stream_stats() for name, provider in providers.items()}
+
+    def embedding_batch_stats(self) -> dict[str, EmbeddingBatchStats]:
+        """Return the embedding batching counters of every provider built so far."""
+        with self._lock:
+            providers = dict(self._providers)
+        return {name: provider.embedding_batch_stats() for name, provider in providers.items()}
+
+    async def aclose(self) -> None:
+        """Close the pooled clients of every provider; a provider used again opens new ones."""
+        with self._lock:
+            providers = list(self._providers.values())
+        for provider in providers:
+            await provider.aclose()
+
+
+# Process-wide registry used by ``ModelsAPI``; providers are built on first use
+PROVIDER_REGISTRY = ProviderRegistry(
+    {
+        "ollama": OllamaProvider,
+        "openai": OpenAIProvider,
+        "google": GeminiProvider,
+    },
+)
@@ -0,0 +1,261 @@
+"""Persistent, exact-match cache of LLM responses.
+
+Many prompts are deterministic templates over the same inputs (input
+classification, contextualisation, tool parameters, task descriptions), and a
+repeated user question re-runs all of them. The cache stores each completion in
+SQLite keyed by ``sha256(provider, model, normalised messages)``, so the same
+request is answered from disk across turns and sessions.
+
+Messages are normalised by collapsing whitespace runs, so re-indented prompt
+templates share entries; case and punctuation are kept. ``ModelsAPI`` does not
+pass sampling parameters, so every call uses the provider defaults and they
+are not part of the key.
+
+The cache is opt-in twice: it is off unless ``LLM_RESPONSE_CACHE`` names a file,
+and then only calls that pass ``cache=True`` to ``ModelsAPI``, or whose
+``ModelType`` is listed in ``LLM_RESPONSE_CACHE_MODEL_TYPES``, use it
+(``cache=False`` always bypasses it). The flag does not enable the fuzzy
+``semantic_cache``, which calls opt in to separately. Entries expire after a
+TTL, and the least recently used entries are evicted when the stored responses
+exceed the size cap.
+Each entry remembers how long its call took, so ``stats`` reports the latency
+that hits saved.
+
+Configuration (environment variables):
+- ``LLM_RESPONSE_CACHE``: path of the SQLite file (unset or ``off`` disables the cache).
+- ``LLM_RESPONSE_CACHE_TTL``: seconds an entry stays valid (default 86400; 0 never expires).
+- ``LLM_RESPONSE_CACHE_MAX_MB``: size cap of the stored responses in MiB (default 64).
+- ``LLM_RESPONSE_CACHE_MODEL_TYPES``: comma-separated ``ModelType`` names (e.g.
+  ``QUICK,SUPER_QUICK``) whose calls are cached without ``cache=True``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    digest BLOB PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    latency REAL NOT NULL,
+    created INTEGER NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+_EVICT_TARGET = 0.9
+"""Fraction of the size cap to shrink to when evicting, so eviction is not triggered on every insert."""
+
+_SPACE = re.compile(r"\s+")
+
+
+def response_key(provider: str, model: str, messages: list[dict]) -> bytes:
+    """Return the cache key of a chat completion request."""
+    normalised = [(str(m.get("role", "")), _SPACE.sub(" ", str(m.get("content", ""))).strip()) for m in messages]
+    payload = json.dumps([provider, model, normalised], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+@dataclass
+class ResponseCacheStats:
+    """Counters of a ``ResponseCache``; all but ``entries`` and ``bytes`` are counted since it was opened."""
+
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    """Lookups that found an entry past its TTL (included in ``misses``)."""
+    evictions: int = 0
+    latency_saved: float = 0.0
+    """Seconds the cached calls took originally, summed over the hits."""
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Return the fraction of lookups served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache of LLM responses with a TTL."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        ttl: float = 86400.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        model_types: Iterable[str] = (),
+    ) -> None:
+        """Create a cache at ``path``; the database is opened on first use.
+
+        ``model_types`` are the ``ModelType`` names whose calls are cached by default.
+        """
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.model_types = frozenset(t.strip().upper() for t in model_types if t.strip())
+        self._conn: sqlite3.Connection | None = None
+        self._disabled = False
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = ResponseCacheStats()
+
+    @staticmethod
+    def from_env() -> ResponseCache | None:
+        """Build the cache configured by the ``LLM_RESPONSE_CACHE*`` variables, or None if it is off."""
+        location = os.getenv("LLM_RESPONSE_CACHE", "")
+        if location.strip().lower() in {"", "0", "off", "false", "none"}:
+            return None
+        try:
+            ttl = float(os.getenv("LLM_RESPONSE_CACHE_TTL", "86400"))
+        except ValueError:
+            ttl = 86400.0
+        try:
+            max_mb = float(os.getenv("LLM_RESPONSE_CACHE_MAX_MB", "64"))
+        except ValueError:
+            max_mb = 64.0
+        return ResponseCache(
+            Path(location).expanduser(),
+            ttl=ttl,
+            max_bytes=int(max_mb * 1024 * 1024),
+            model_types=os.getenv("LLM_RESPONSE_CACHE_MODEL_TYPES", "").split(","),
+        )
+
+    def get(self, key: bytes) -> str | None:
+        """Return the cached response of ``key``, or None if it is missing or expired."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                self._stats.misses += 1
+                return None
+            row = conn.execute(
+                "SELECT response, latency, created FROM responses WHERE digest = ?",
+                (key,),
+            ).fetchone()
+            now = time.time_ns()
+            if row is not None and self.ttl > 0 and now - row[2] > self.ttl * 1e9:
+                self._remove(conn, key)
+                self._stats.expired += 1
+                row = None
+            if row is None:
+                self._stats.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE digest = ?", (now, key))
+            conn.commit()
+            self._stats.hits += 1
+            self._stats.latency_saved += row[1]
+            return row[0]
+
+    def put(self, key: bytes, provider: str, model: str, response: str, latency: float) -> None:
+        """Store ``response`` of ``key``; ``latency`` is how long the call took, in seconds."""
+        now = time.time_ns()
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            self._bytes += len(response.encode("utf-8")) - self._stored_size(conn, key)
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, latency, now, now),
+            )
+            if self._bytes > self.max_bytes:
+                self._evict(conn)
+            conn.commit()
+
+    def stats(self) -> ResponseCacheStats:
+        """Return a snapshot of the counters, including the current number of entries and bytes."""
+        with self._lock:
+            conn = self._connect()
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] if conn is not None else 0
+            return ResponseCacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                expired=self._stats.expired,
+                evictions=self._stats.evictions,
+                latency_saved=self._stats.latency_saved,
+                entries=int(entries),
+                bytes=self._bytes,
+            )
+
+    def clear(self) -> None:
+        """Delete every cached response."""
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+            self._bytes = 0
+
+    def close(self) -> None:
+        """Close the database connection; it is reopened on next use."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self) -> sqlite3.Connection | None:
+        """Open the database on first use; returns None (cache disabled) if it cannot be opened."""
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._bytes = int(
+                conn.execute("SELECT COALESCE(SUM(LENGTH(CAST(response AS BLOB))), 0) FROM responses").fetchone()[0],
+            )
+        except (OSError, sqlite3.Error) as exc:
+            APP_LOGGER.warning("LLM response cache %s is unavailable (%s); calling without cache.", self.path, exc)
+            self._disabled = True
+            return None
+        self._conn = conn
+        return conn
+
+    @staticmethod
+    def _stored_size(conn: sqlite3.Connection, key: bytes) -> int:
+        """Return the size in bytes of the response stored under ``key`` (0 if there is none)."""
+        row = conn.execute("SELECT LENGTH(CAST(response AS BLOB)) FROM responses WHERE digest = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def _remove(self, conn: sqlite3.Connection, key: bytes) -> None:
+        self._bytes -= self._stored_size(conn, key)
+        conn.execute("DELETE FROM responses WHERE digest = ?", (key,))
+        conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        target = int(self.max_bytes * _EVICT_TARGET)
+        while self._bytes > target:
+            victims = conn.execute(
+                "SELECT rowid, LENGTH(CAST(response AS BLOB)) FROM responses ORDER BY last_used LIMIT 256",
+            ).fetchall()
+            if not victims:
+                self._bytes = 0
+                return
+            doomed = []
+            for rowid, size in victims:
+                doomed.append((rowid,))
+                self._bytes -= size
+                if self._bytes <= target:
+                    break
+            conn.executemany("DELETE FROM responses WHERE rowid = ?", doomed)
+            self._stats.evictions += len(doomed)
@@ -0,0 +1,244 @@
+"""In-memory semantic cache of LLM responses.
+
+Users rephrase the same question ("what's the weather tomorrow" / "tomorrow's
+weather?"), which misses the exact-match ``response_cache`` and re-runs every
+LLM call of the chain. The semantic cache embeds only the variable user text of
+a call's prompt, not the template around it, and returns the response of the
+most similar earlier text when their cosine similarity reaches the threshold.
+Embedding the whole prompt would let the long fixed template dominate, so
+requests differing in one entity ("weather in Paris" / "weather in London")
+would look like duplicates.
+
+Texts are only compared within a namespace: the same provider, model and
+prompt template (named by the call site), the same earlier messages and the
+same prompt outside the user text. Each template can have its own threshold.
+Even so, "Paris" and "London" can embed closely, so calls whose output depends
+on the entities in the text (tool parameters, task descriptions, summaries)
+must not opt in; the cache suits classifications and similar answers that a
+rephrasing does not change.
+
+Prompts that refer to relative time ("today", "tomorrow", "latest", clock
+times, ...) are neither looked up nor stored: their answer changes with the
+moment they are asked, whatever the similarity.
+
+The cache is opt-in twice: it is off unless ``LLM_SEMANTIC_CACHE`` is set, and
+then only calls that pass ``semantic_cache=True`` to ``ModelsAPI`` use it. This
+is independent of the exact-match cache's ``cache`` flag and model types, since
+a fuzzy hit is only acceptable where a near-duplicate prompt may share an
+answer. Entries expire after a TTL, and the least recently used are dropped
+past ``max_entries``.
+
+Configuration (environment variables):
+- ``LLM_SEMANTIC_CACHE``: ``1`` enables the cache (default off).
+- ``LLM_SEMANTIC_CACHE_THRESHOLD``: default cosine similarity for a hit (default 0.95).
+- ``LLM_SEMANTIC_CACHE_THRESHOLDS``: per-template thresholds, e.g.
+  ``assess_input=0.97``.
+- ``LLM_SEMANTIC_CACHE_TTL``: seconds an entry stays valid (default 3600; 0 never expires).
+- ``LLM_SEMANTIC_CACHE_SIZE``: maximum number of cached prompts (default 1024).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+_TIME_SENSITIVE = re.compile(
+    r"\b(?:now|today|tonight|tomorrow|yesterday|currently|latest|upcoming|weekend|ago|breaking|live"
+    r"|this (?:morning|afternoon|evening|week|month|year)|(?:next|last) (?:week|month|year)|at the moment)\b"
+    r"|\b\d{1,2}:\d{2}\b|\b\d{4}-\d{2}-\d{2}\b",
+    re.IGNORECASE,
+)
+"""Words and patterns of prompts whose answer depends on when they are asked."""
+
+
+class Namespace(NamedTuple):
+    """Where a prompt is cached; only prompts in the same namespace are compared."""
+
+    provider: str
+    model: str
+    template: str | None
+    history: bytes
+    """Digest of the messages before the prompt and of the prompt outside the embedded text."""
+
+
+def is_time_sensitive(text: str) -> bool:
+    """Return whether ``text`` refers to relative time, so a cached answer may be out of date."""
+    return _TIME_SENSITIVE.search(text) is not None
+
+
+def _parse_thresholds(spec: str) -> dict[str, float]:
+    """Parse ``template=threshold`` pairs separated by commas, skipping malformed ones."""
+    thresholds: dict[str, float] = {}
+    for item in spec.split(","):
+        template, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            thresholds[template.strip()] = float(value)
+        except ValueError:
+            APP_LOGGER.warning("Ignoring semantic cache threshold %r", item)
+    return thresholds
+
+
+@dataclass
+class SemanticCacheStats:
+    """Counters of a ``SemanticCache`` since it was created."""
+
+    hits: int = 0
+    misses: int = 0
+    skipped: int = 0
+    """Calls not looked up because their prompt is time-sensitive."""
+    latency_saved: float = 0.0
+    """Seconds the cached calls took originally, summed over the hits."""
+    entries: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Return the fraction of lookups served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray
+    response: str
+    latency: float
+    created: float
+
+
+class SemanticCache:
+    """Thread-safe cache of LLM responses looked up by prompt embedding similarity."""
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        thresholds: dict[str, float] | None = None,
+        ttl: float = 3600.0,
+        max_entries: int = 1024,
+    ) -> None:
+        """Create an empty cache; ``thresholds`` override ``threshold`` per template."""
+        self.threshold = threshold
+        self.thresholds = dict(thresholds or {})
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[Namespace, str], _Entry] = OrderedDict()
+        self._stats = SemanticCacheStats()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_env() -> SemanticCache | None:
+        """Build the cache configured by the ``LLM_SEMANTIC_CACHE*`` variables, or None if it is off."""
+        if os.getenv("LLM_SEMANTIC_CACHE", "").strip().lower() not in {"1", "true", "yes", "on"}:
+            return None
+        try:
+            threshold = float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+        except ValueError:
+            threshold = 0.95
+        try:
+            ttl = float(os.getenv("LLM_SEMANTIC_CACHE_TTL", "3600"))
+        except ValueError:
+            ttl = 3600.0
+        try:
+            size = int(os.getenv("LLM_SEMANTIC_CACHE_SIZE", "1024"))
+        except ValueError:
+            size = 1024
+        return SemanticCache(
+            threshold,
+            _parse_thresholds(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLDS", "")),
+            ttl=ttl,
+            max_entries=max(1, size),
+        )
+
+    def threshold_for(self, template: str | None) -> float:
+        """Return the similarity a prompt of ``template`` needs to reuse a cached response."""
+        return self.thresholds.get(template, self.threshold) if template else self.threshold
+
+    def accepts(self, prompt: str) -> bool:
+        """Return whether ``prompt`` may be cached; a time-sensitive prompt is counted as skipped."""
+        if is_time_sensitive(prompt):
+            with self._lock:
+                self._stats.skipped += 1
+            return False
+        return True
+
+    def get(self, namespace: Namespace, vector: Sequence[float] | np.ndarray) -> str | None:
+        """Return the response of the most similar live prompt in ``namespace``, or None below its threshold."""
+        query = _unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            if self.ttl > 0:
+                for key in [k for k, e in self._entries.items() if now - e.created > self.ttl]:
+                    del self._entries[key]
+            candidates = [
+                (k, e)
+                for k, e in self._entries.items()
+                if k[0] == namespace and query is not None and e.vector.shape == query.shape
+            ]
+            if not candidates or query is None:
+                self._stats.misses += 1
+                return None
+            scores = np.stack([e.vector for _, e in candidates]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold_for(namespace.template):
+                self._stats.misses += 1
+                return None
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            self._stats.latency_saved += entry.latency
+            return entry.response
+
+    def put(
+        self,
+        namespace: Namespace,
+        prompt: str,
+        vector: Sequence[float] | np.ndarray,
+        response: str,
+        latency: float,
+    ) -> None:
+        """Cache ``response`` to ``prompt`` (embedded as ``vector``); ``latency`` is how long the call took."""
+        unit = _unit(vector)
+        if unit is None:
+            return
+        with self._lock:
+            key = (namespace, prompt)
+            self._entries[key] = _Entry(unit, response, latency, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> SemanticCacheStats:
+        """Return a snapshot of the counters."""
+        with self._lock:
+            return SemanticCacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                skipped=self._stats.skipped,
+                latency_saved=self._stats.latency_saved,
+                entries=len(self._entries),
+            )
+
+
+def _unit(vector: Sequence[float] | np.ndarray) -> np.ndarray | None:
+    """Return ``vector`` scaled to unit length as float32, or None for a zero vector."""
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm else None
@@ -0,0 +1,115 @@
+"""Token streaming from the model providers.
+
+A provider's ``stream_llm*`` methods return an async iterator of text deltas,
+so a caller (e.g. the chat UI) can show a response while it is generated instead
+of after the full completion. ``timed_stream`` wraps a provider's raw stream and
+records per call:
+
+- the time to first token (TTFT): from the start of the call to the first
+  non-empty delta, i.e. how long the user waits before anything appears;
+- the total duration and the number of deltas.
+
+The counters are kept per provider (``StreamStats``) and each call is logged at
+debug level. ``collect_stream`` drains a stream into the full text while handing
+every delta to a callback.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from llm_mas.logging.loggers import APP_LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Callable
+
+
+@dataclass
+class StreamStats:
+    """Streaming counters of one provider since the process started."""
+
+    calls: int = 0
+    chunks: int = 0
+    ttft_total: float = 0.0
+    """Sum of the calls' times to first token, in seconds."""
+    ttft_max: float = 0.0
+    last_ttft: float | None = None
+    duration_total: float = 0.0
+    """Sum of the calls' durations, in seconds."""
+
+    @property
+    def mean_ttft(self) -> float:
+        """Return the mean time to first token, in seconds."""
+        return self.ttft_total / self.calls if self.calls else 0.0
+
+    @property
+    def mean_duration(self) -> float:
+        """Return the mean duration of a streamed call, in seconds."""
+        return self.duration_total / self.calls if self.calls else 0.0
+
+
+class StreamMetrics:
+    """Thread-safe ``StreamStats`` of one provider."""
+
+    def __init__(self) -> None:
+        """Start with zeroed counters."""
+        self._stats = StreamStats()
+        self._lock = threading.Lock()
+
+    def record(self, ttft: float, duration: float, chunks: int) -> None:
+        """Record one completed call."""
+        with self._lock:
+            self._stats.calls += 1
+            self._stats.chunks += chunks
+            self._stats.ttft_total += ttft
+            self._stats.ttft_max = max(self._stats.ttft_max, ttft)
+            self._stats.last_ttft = ttft
+            self._stats.duration_total += duration
+
+    def snapshot(self) -> StreamStats:
+        """Return a copy of the counters."""
+        with self._lock:
+            return StreamStats(**vars(self._stats))
+
+
+async def timed_stream(
+    chunks: AsyncIterator[str],
+    metrics: StreamMetrics,
+    label: str,
+) -> AsyncIterator[str]:
+    """Yield the non-empty deltas of ``chunks`` and record the call in ``metrics``.
+
+    Raises ``ValueError`` if the stream ends without any text, like the
+    non-streaming calls do for an empty completion.
+    """
+    start = time.perf_counter()
+    ttft: float | None = None
+    count = 0
+    async with contextlib.aclosing(chunks):  # pyright: ignore[reportArgumentType]
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            count += 1
+            yield chunk
+    if ttft is None:
+        msg = f"No content returned from {label}."
+        raise ValueError(msg)
+    duration = time.perf_counter() - start
+    metrics.record(ttft, duration, count)
+    APP_LOGGER.debug("Streamed %s: ttft=%.3fs total=%.3fs chunks=%d", label, ttft, duration, count)
+
+
+async def collect_stream(stream: AsyncIterator[str], on_text: Callable[[str], None]) -> str:
+    """Pass every delta of ``stream`` to ``on_text`` and return the full text."""
+    parts: list[str] = []
+    async with contextlib.aclosing(stream):  # pyright: ignore[reportArgumentType]
+        async for chunk in stream:
+            parts.append(chunk)
+            on_text(chunk)
+    return "".join(parts)
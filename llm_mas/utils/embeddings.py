@@ -1,7 +1,8 @@
 """Utility functions for vector embeddings and selection."""
 
+import asyncio
 import logging
-from collections.abc import Awaitable, Callable
+from collections.abc import Awaitable, Callable, Sequence
 from enum import Enum, auto
 from typing import TypeVar
 
@@ -24,6 +25,15 @@ class SelectionStrategy(Enum):
 type EmbeddingFunction = Callable[[str, str | ModelType], Awaitable[list[float]]]
 
 
+async def embed_all(
+    embedding_model: EmbeddingFunction,
+    texts: Sequence[str],
+    model: str | ModelType = ModelType.EMBEDDING,
+) -> list[list[float]]:
+    """Embed ``texts`` with concurrent calls, which ``ModelsAPI.get_embedding`` coalesces into one request."""
+    return list(await asyncio.gather(*(embedding_model(text, model) for text in texts)))
+
+
 class VectorSelector:
     """Generic class for selecting items based on vector similarity."""
 
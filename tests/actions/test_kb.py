@@ -10,7 +10,7 @@ from llm_mas.action_system.base.selectors.embedding_selector import EmbeddingSel
 from llm_mas.action_system.core.action_context import ActionContext
 from llm_mas.action_system.core.action_result import ActionResult
 from llm_mas.action_system.core.action_space import ActionSpace
-from llm_mas.knowledge_base.knowledge_base import GLOBAL_KB
+from llm_mas.knowledge_base.registry import KB_REGISTRY
 from llm_mas.mas.agent import Agent
 from llm_mas.mas.conversation import Conversation, ConversationManager
 from llm_mas.mas.mas import MAS
@@ -40,8 +40,9 @@ class TestKnowledgeBase:
         # agent adds the knowledge base action here
         agent.add_action(RetrieveKnowledge())
 
-        # clear global KB
-        GLOBAL_KB.clear()
+        # clear the shared KB collection
+        self.kb = KB_REGISTRY.get()
+        self.kb.clear()
 
         self.mas = mas
 
@@ -60,16 +61,16 @@ class TestKnowledgeBase:
             msg = "Embedding model is not available. Skipping test_can_ingest_knowledge."
             raise pytest.skip(msg) from None
 
-        assert GLOBAL_KB.is_empty(), "Global KB should be empty at the start of the test."
+        assert self.kb.is_empty(), "Global KB should be empty at the start of the test."
 
         assert self.path.exists(), "README.md file should exist for this test."
 
-        await GLOBAL_KB.index_path(self.path)
+        await self.kb.index_path(self.path)
 
-        assert not GLOBAL_KB.is_empty(), "Global KB should not be empty after indexing a file."
+        assert not self.kb.is_empty(), "Global KB should not be empty after indexing a file."
 
         # query the knowledge base
-        results = GLOBAL_KB.query("test")
+        results = self.kb.query("test")
 
         assert len(results) > 0, "Knowledge base query should return some results."
 
@@ -98,7 +99,7 @@ class TestKnowledgeBase:
             msg = "Embedding model is not available. Skipping test_retrieve_knowledge_action."
             raise pytest.skip(msg) from None
 
-        await GLOBAL_KB.index_path(self.path)
+        await self.kb.index_path(self.path)
 
         conv = Conversation(name="TestConversation")
         user = User("TestUser", " A user for testing.")
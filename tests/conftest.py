@@ -0,0 +1,54 @@
+"""Shared fixtures for the test suite."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from llm_mas.knowledge_base.knowledge_base import KnowledgeBase
+from llm_mas.knowledge_base.registry import KnowledgeBaseRegistry
+from llm_mas.knowledge_base.sqlite_store import SQLiteKnowledgeBase
+from tests.fakes import FakeEmbedder
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+
+@pytest.fixture
+def make_embedder() -> type[FakeEmbedder]:
+    """Return the fake embedder class, for tests that need a failing or cached one."""
+    return FakeEmbedder
+
+
+@pytest.fixture
+def make_kb() -> Callable[[Path], KnowledgeBase]:
+    """Return a factory of knowledge bases stored in ``<folder>/kb_index`` that embed with ``FakeEmbedder``."""
+
+    def make(folder: Path) -> KnowledgeBase:
+        return KnowledgeBase(storage_path=folder / "kb_index", embedder=FakeEmbedder())
+
+    return make
+
+
+@pytest.fixture
+def make_sqlite_kb() -> Callable[[Path], SQLiteKnowledgeBase]:
+    """Return a factory of SQLite knowledge bases stored in ``<folder>/kb_index`` that embed with ``FakeEmbedder``."""
+
+    def make(folder: Path) -> SQLiteKnowledgeBase:
+        return SQLiteKnowledgeBase(storage_path=folder / "kb_index", embedder=FakeEmbedder())
+
+    return make
+
+
+@pytest.fixture
+def make_registry() -> Callable[[Path], KnowledgeBaseRegistry]:
+    """Return a factory of registries rooted at a folder that never unload and embed with ``FakeEmbedder``."""
+
+    def make(root: Path) -> KnowledgeBaseRegistry:
+        registry = KnowledgeBaseRegistry(root=root, idle_unload_seconds=0)
+        registry._embedder = FakeEmbedder()  # noqa: SLF001
+        return registry
+
+    return make
@@ -0,0 +1,42 @@
+"""Test doubles shared by the test suite."""
+
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from llm_mas.knowledge_base.embedder import EmbeddingProvider
+
+if TYPE_CHECKING:
+    from llm_mas.knowledge_base.embedding_cache import EmbeddingCache
+
+
+class FakeEmbedder(EmbeddingProvider):
+    """Deterministic bag-of-words embedder so tests never need Ollama."""
+
+    dim = 64
+
+    def __init__(self, fail_marker: str | None = None, cache: EmbeddingCache | None = None) -> None:
+        """Initialize the embedder; batches containing ``fail_marker`` raise a connection error."""
+        super().__init__(batch_size=2, max_in_flight=2, max_retries=1, cache=cache)
+        self.retry_backoff = 0.0
+        self.fail_marker = fail_marker
+        self.requests = 0
+
+    def _embed_batch(self, batch: list[str]) -> list[list[float]]:
+        self.requests += 1
+        if self.fail_marker and any(self.fail_marker in text for text in batch):
+            msg = "simulated embedding outage"
+            raise ConnectionError(msg)
+        vectors = []
+        for text in batch:
+            vec = np.zeros(self.dim, dtype=np.float32)
+            for word in text.lower().split():
+                vec[int(hashlib.sha256(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+            vectors.append(vec.tolist())
+        return vectors
+
+    async def _aembed_batch(self, batch: list[str]) -> list[list[float]]:
+        return self._embed_batch(batch)
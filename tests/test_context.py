@@ -123,3 +123,22 @@ class TestContext:
         assert stop_action_record[2].last_result.get_param("greeting") == "Hello, world!", (
             "StopAction context's last result should have greeting from SayHello action."
         )
+
+    def test_response_stream_is_not_passed_to_delegated_contexts(self) -> None:
+        """Test that derived contexts keep the response sink unless they are for delegated work."""
+        conv = self.mas.conversation_manager.start_conversation("TestConversation")
+        seen: list[str] = []
+        context = ActionContext(
+            conv,
+            ActionResult(),
+            MCPClient(),
+            self.agent,
+            self.user,
+            self.mas.conversation_manager,
+            on_response_text=seen.append,
+        )
+
+        assert ActionContext.from_action_result(ActionResult(), context).on_response_text is not None
+        delegated = ActionContext.from_action_result(ActionResult(), context, stream_responses=False)
+        assert delegated.on_response_text is None
+        assert ActionContext.from_action_result(ActionResult(), delegated).on_response_text is None
@@ -0,0 +1,1426 @@
+"""Test suite for the knowledge base vector store (no embedding server required)."""
+
+import asyncio
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from llm_mas.knowledge_base.ann import IVFIndex, evaluate_recall
+from llm_mas.knowledge_base.benchmark import BenchmarkConfig, HashEmbedder, compare_results, run_benchmark
+from llm_mas.knowledge_base.chunking import (
+    CharChunker,
+    ChunkSpan,
+    SourceText,
+    TextStream,
+    TokenChunker,
+    iter_chunks,
+    iter_text,
+)
+from llm_mas.knowledge_base.dedup import SimHashIndex, hamming, mmr, simhash
+from llm_mas.knowledge_base.embedding_cache import EmbeddingCache
+from llm_mas.knowledge_base.knowledge_base import (
+    KnowledgeBase,
+    QueryMode,
+    _fingerprint_file,
+)
+from llm_mas.knowledge_base.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+from llm_mas.knowledge_base.metadata import MetadataIndex
+from llm_mas.knowledge_base.quantization import QuantizationMode, benchmark_quantization, make_quantizer
+from llm_mas.knowledge_base.query_cache import QueryCache, filter_key, normalise_query
+from llm_mas.knowledge_base.registry import DEFAULT_COLLECTION, KnowledgeBaseRegistry, collection_name
+from llm_mas.knowledge_base.sqlite_store import SQLiteKnowledgeBase
+from llm_mas.knowledge_base.storage import read_index, write_base
+from llm_mas.knowledge_base.tokens import RegexTokenizer, get_tokenizer
+from llm_mas.knowledge_base.vector_store import VectorStore
+from llm_mas.knowledge_base.watcher import KBWatcher, WatchSettings
+from tests.fakes import FakeEmbedder
+
+
+def _span(source: str, text: str) -> ChunkSpan:
+    return ChunkSpan(source=source, offset=0, length=len(text), text=text)
+
+
+class TestVectorStore:
+    """Test suite for the matrix-backed vector store."""
+
+    def test_search_matches_bruteforce_cosine(self) -> None:
+        """Test that vectorised top-k agrees with a brute-force cosine ranking."""
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(500, 16)).astype(np.float32)
+        store: VectorStore[int] = VectorStore()
+        # add in uneven batches to exercise incremental growth
+        store.add(vectors[:7], list(range(7)))
+        store.add(vectors[7:], list(range(7, 500)))
+
+        query = rng.normal(size=16)
+        expected = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+        expected_rows = list(np.argsort(-expected)[:10])
+
+        hits = store.search(query, 10)
+        assert [row for row, _ in hits] == expected_rows
+        assert hits[0][1] == pytest.approx(float(expected[expected_rows[0]]), abs=1e-5)
+
+    def test_remove_where_compacts_rows(self) -> None:
+        """Test that removed rows disappear from both the matrix and the metadata."""
+        store: VectorStore[str] = VectorStore()
+        store.add([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]], ["a", "b", "c"])
+        assert store.remove_where(lambda m: m == "b") == 1
+        assert store.metadata == ["a", "c"]
+        assert [m for m, _ in store.search([0.0, 1.0], 5)] == ["c", "a"]
+
+    def test_dimension_mismatch(self) -> None:
+        """Test that mixed dimensions are rejected and mismatched queries return nothing."""
+        store: VectorStore[str] = VectorStore()
+        store.add([[1.0, 0.0]], ["a"])
+        with pytest.raises(ValueError, match="dimension mismatch"):
+            store.add([[1.0, 0.0, 0.0]], ["b"])
+        assert store.search([1.0, 0.0, 0.0], 5) == []
+
+    def test_search_many_matches_single_searches(self) -> None:
+        """Test that batched scoring returns the same hits as one search per query."""
+        rng = np.random.default_rng(1)
+        store: VectorStore[int] = VectorStore()
+        store.add(rng.normal(size=(200, 8)), list(range(200)))
+        queries = rng.normal(size=(5, 8))
+        batched = store.search_many(queries, 4)
+        for hits, q in zip(batched, queries, strict=True):
+            single = store.search(q, 4)
+            assert [m for m, _ in hits] == [m for m, _ in single]
+            assert [s for _, s in hits] == pytest.approx([s for _, s in single], abs=1e-5)
+        assert store.search_many(rng.normal(size=(2, 3)), 4) == [[], []]
+
+    def test_search_restricted_to_allowed_keys(self) -> None:
+        """Test that ``allowed`` limits hits to the given keys, including after removals."""
+        rng = np.random.default_rng(2)
+        vectors = rng.normal(size=(100, 8))
+        store: VectorStore[int] = VectorStore(key=int)
+        store.add(vectors, list(range(100)))
+        store.remove_where(lambda m: m % 10 == 0)
+        allowed = np.array([3, 10, 42, 77, 1000], dtype=np.int64)
+        hits = store.search(vectors[42], 10, allowed=allowed)
+        assert hits[0][0] == 42  # noqa: PLR2004
+        assert {m for m, _ in hits} == {3, 42, 77}
+        with pytest.raises(ValueError, match="key"):
+            VectorStore().search(vectors[0], 1, allowed=allowed)
+
+    def test_clear(self) -> None:
+        """Test that clearing resets size, dimension and metadata."""
+        store: VectorStore[str] = VectorStore()
+        store.add([[1.0, 2.0]], ["a"])
+        store.clear()
+        assert len(store) == 0
+        assert store.dim is None
+        assert store.search([1.0, 2.0], 1) == []
+
+
+class TestIVFIndex:
+    """Test suite for the IVF approximate nearest-neighbour index."""
+
+    def _clustered(self, rows: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        centres = rng.normal(size=(20, dim))
+        return (centres[rng.integers(0, len(centres), rows)] + 0.3 * rng.normal(size=(rows, dim))).astype(np.float32)
+
+    def test_recall_reaches_exact_when_probing_every_cell(self) -> None:
+        """Test that recall grows with nprobe and is perfect when every cell is probed."""
+        store: VectorStore[int] = VectorStore()
+        vectors = self._clustered(2000)
+        store.add(vectors, list(range(len(vectors))))
+        index = IVFIndex.train(store.matrix, nlist=32)
+        queries = self._clustered(50, seed=1)
+        reports = evaluate_recall(store.matrix, index, queries, k=10, nprobes=(1, 4, 32))
+        recalls = [r.recall for r in reports]
+        assert recalls == sorted(recalls)
+        assert reports[-1].nprobe == index.nlist
+        assert reports[-1].recall == pytest.approx(1.0)
+
+    def test_store_keeps_assignments_in_step(self) -> None:
+        """Test that appends and removals after training keep one assignment per row."""
+        store: VectorStore[int] = VectorStore()
+        vectors = self._clustered(600)
+        store.add(vectors[:400], list(range(400)))
+        generation = store.generation
+        index = IVFIndex.train(store.matrix, nlist=8)
+        store.add(vectors[400:500], list(range(400, 500)))
+        assert store.install_ann(index, 400, generation)
+        store.add(vectors[500:], list(range(500, 600)))
+        store.remove_where(lambda m: m % 3 == 0)
+        assert index.assignments.shape[0] == len(store)
+
+        query = vectors[598]
+        exact = store.search(query, 5)
+        assert store.search(query, 5, nprobe=index.nlist) == exact
+        assert store.search(query, 1, nprobe=1)[0][0] == exact[0][0]
+
+    def test_install_is_rejected_after_removal(self) -> None:
+        """Test that an index trained before rows were removed is discarded."""
+        store: VectorStore[int] = VectorStore()
+        vectors = self._clustered(100)
+        store.add(vectors, list(range(100)))
+        generation = store.generation
+        index = IVFIndex.train(store.matrix, nlist=4)
+        store.remove_where(lambda m: m == 0)
+        assert not store.install_ann(index, 100, generation)
+        assert store.ann is None
+
+
+class TestQuantization:
+    """Test suite for quantised embedding codes."""
+
+    def _clustered(self, rows: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        centres = rng.normal(size=(20, dim))
+        return (centres[rng.integers(0, len(centres), rows)] + 0.3 * rng.normal(size=(rows, dim))).astype(np.float32)
+
+    def test_benchmark_reports_memory_and_recall(self) -> None:
+        """Test that every mode shrinks the vectors and re-ranking keeps recall high."""
+        reports = benchmark_quantization(self._clustered(2000), self._clustered(30, seed=1), k=10)
+        by_mode = {r.mode: r for r in reports}
+        assert by_mode[QuantizationMode.FLOAT16].memory_reduction == pytest.approx(2.0)
+        assert by_mode[QuantizationMode.INT8].memory_reduction > 3.5  # noqa: PLR2004
+        assert by_mode[QuantizationMode.PQ].memory_reduction == pytest.approx(16.0)
+        assert by_mode[QuantizationMode.FLOAT16].recall > 0.99  # noqa: PLR2004
+        assert by_mode[QuantizationMode.INT8].recall_rerank > 0.99  # noqa: PLR2004
+        assert by_mode[QuantizationMode.PQ].recall_rerank >= by_mode[QuantizationMode.PQ].recall
+
+    @pytest.mark.parametrize("mode", [QuantizationMode.FLOAT16, QuantizationMode.INT8, QuantizationMode.PQ])
+    def test_store_keeps_codes_in_step(self, mode: QuantizationMode) -> None:
+        """Test that appends and removals keep one code per row and reranked hits carry exact scores."""
+        store: VectorStore[int] = VectorStore()
+        vectors = self._clustered(600)
+        store.add(vectors[:400], list(range(400)))
+        generation = store.generation
+        quantizer = make_quantizer(mode, vectors.shape[1], store.matrix)
+        codes = quantizer.encode_blocked(store.matrix)
+        store.add(vectors[400:500], list(range(400, 500)))
+        assert store.install_quantizer(quantizer, codes, generation)
+        store.add(vectors[500:], list(range(500, 600)))
+        store.remove_where(lambda m: m % 3 == 0)
+        assert store.codes.shape == (len(store), quantizer.code_bytes)
+
+        query = vectors[598]
+        hits = store.search(query, 3, rerank=20)
+        assert hits[0][0] == 598  # noqa: PLR2004
+        assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+
+    def test_install_is_rejected_after_removal(self) -> None:
+        """Test that codes computed before rows were removed are discarded."""
+        store: VectorStore[int] = VectorStore()
+        store.add(self._clustered(50), list(range(50)))
+        generation = store.generation
+        quantizer = make_quantizer(QuantizationMode.INT8, 32)
+        codes = quantizer.encode(store.matrix)
+        store.remove_where(lambda m: m == 0)
+        assert not store.install_quantizer(quantizer, codes, generation)
+        assert store.quantizer is None
+
+
+class TestChunking:
+    """Test suite for the streaming, offset-based chunker."""
+
+    def test_chunks_are_verbatim_spans_of_the_stream(self) -> None:
+        """Test that chunks cut from small blocks are exact, bounded slices that cover all the text."""
+        rng = np.random.default_rng(0)
+        words = ["alpha", "beta.", "gamma", "delta!", "\n\n", "epsilon\n", "zeta?"]
+        text = " ".join(rng.choice(words, size=2000))
+        blocks = [text[i : i + 37] for i in range(0, len(text), 37)]
+        spans = list(iter_chunks(blocks, "doc.txt", max_chunk_size=120, chunk_overlap=30))
+        covered = np.zeros(len(text), dtype=bool)
+        for span in spans:
+            assert span.text == text[span.offset : span.end]
+            assert 0 < span.length <= 120  # noqa: PLR2004
+            covered[span.offset : span.end] = True
+        assert all(text[i].isspace() for i in np.flatnonzero(~covered))
+        assert any(b.offset < a.end for a, b in itertools.pairwise(spans))
+
+    def test_source_text_holds_overlaps_once(self) -> None:
+        """Test that overlapping spans are read back exactly while their shared text is stored once."""
+        text = " ".join(f"word{i}" for i in range(500))
+        spans = list(iter_chunks([text], "doc.txt", max_chunk_size=100, chunk_overlap=40))
+        held = SourceText()
+        for span in spans:
+            assert held.add(span.offset, span.text)
+        assert [held.slice(s.offset, s.length) for s in spans] == [s.text for s in spans]
+        assert sum(len(piece) for piece in held._pieces) <= len(text)  # noqa: SLF001
+        assert sum(s.length for s in spans) > len(text)
+        assert not held.add(spans[0].offset, spans[0].text)  # spans must come in offset order
+        assert not held.add(spans[-1].offset, "something else")
+
+    def test_paragraph_breaks_are_preferred(self) -> None:
+        """Test that chunks end at paragraph breaks when one falls inside the size window."""
+        text = "\n\n".join(f"Paragraph {i} is about topic {i}." for i in range(6))
+        spans = list(iter_chunks([text], "doc.txt", max_chunk_size=40, chunk_overlap=0))
+        assert [s.text for s in spans] == [f"Paragraph {i} is about topic {i}." for i in range(6)]
+
+    def test_token_chunks_stay_within_the_budget(self) -> None:
+        """Test that token-budgeted chunks are verbatim, within budget, overlapping and nearly full."""
+        rng = np.random.default_rng(1)
+        words = ["a", "tokenisation", "x=1;", "value,", "CSV", "12.5", "internationalisation.", "\n"]
+        text = " ".join(rng.choice(words, size=3000))
+        blocks = [text[i : i + 101] for i in range(0, len(text), 101)]
+        budget = 50
+        spans = list(TokenChunker(budget, 10, tokenizer="regex").chunks(blocks, "data.csv"))
+        tokenizer = get_tokenizer("regex")
+        for span in spans:
+            assert span.text == text[span.offset : span.end]
+            assert span.tokens == tokenizer.count(span.text) <= budget
+        assert any(b.offset < a.end for a, b in itertools.pairwise(spans))
+        assert sum(s.tokens for s in spans[:-1]) / (len(spans) - 1) > budget * 0.6
+
+    def test_chunks_do_not_span_page_breaks(self) -> None:
+        """Test that with page breaks every chunk lies within one page and is attributed to it."""
+        pages = [f"Page {n} text. " * 5 for n in range(1, 4)]
+
+        def read(stream: TextStream) -> Iterator[str]:
+            for i, page in enumerate(pages):
+                if i:
+                    yield "\n"
+                stream.start_page()
+                yield page
+
+        text = "\n".join(pages)
+        spans = list(CharChunker(60, 20, tokenizer="regex").chunks(TextStream(read), "doc.pdf"))
+        for span in spans:
+            assert span.text == text[span.offset : span.end]
+            assert f"Page {span.page} " in span.text
+            assert span.text.count("Page") == span.text.count(f"Page {span.page} ")
+        assert {s.page for s in spans} == {1, 2, 3}
+        unbroken = list(CharChunker(60, 0, page_breaks=False).chunks(TextStream(read), "doc.pdf"))
+        assert any(len(set(re.findall(r"Page (\d)", s.text))) > 1 for s in unbroken)
+
+    def test_tokenizer_counts_and_falls_back(self) -> None:
+        """Test the regex estimate and that an unknown tokenizer falls back to it."""
+        tokenizer = RegexTokenizer()
+        assert tokenizer.count("") == 0
+        assert tokenizer.count("Hi, you!") == len(["Hi", ",", "you", "!"])
+        assert tokenizer.count("internationalisation") == len("internationalisation") // 4
+        assert isinstance(get_tokenizer("no-such-encoding"), RegexTokenizer)
+        assert get_tokenizer("regex") is get_tokenizer("regex")
+
+    def test_plain_text_falls_back_to_latin1(self, tmp_path: Path) -> None:
+        """Test that a file that is not valid UTF-8 is streamed as Latin-1."""
+        doc = tmp_path / "legacy.txt"
+        doc.write_bytes("caf\xe9 cr\xe8me".encode("latin-1"))
+        assert "".join(iter_text(doc)) == "caf\xe9 cr\xe8me"
+
+
+class TestEmbeddingCache:
+    """Test suite for the persistent embedding cache."""
+
+    def test_hits_misses_and_persistence(self, tmp_path: Path) -> None:
+        """Test that cached vectors are keyed by model and survive reopening."""
+        cache = EmbeddingCache(tmp_path / "cache.sqlite3")
+        assert cache.get_many("m1", ["a", "b"]) == [None, None]
+        cache.put_many("m1", ["a"], [[1.0, 2.0]])
+        assert cache.get_many("m1", ["a", "b"]) == [[1.0, 2.0], None]
+        assert cache.get_many("m2", ["a"]) == [None]
+        stats = cache.stats()
+        assert (stats.hits, stats.misses, stats.entries) == (1, 4, 1)
+        cache.close()
+
+        reopened = EmbeddingCache(tmp_path / "cache.sqlite3")
+        assert reopened.get_many("m1", ["a"]) == [[1.0, 2.0]]
+        assert reopened.stats().bytes == len(np.zeros(2, dtype=np.float32).tobytes())
+
+    def test_lru_eviction_respects_the_size_cap(self, tmp_path: Path) -> None:
+        """Test that the least recently used vectors are evicted first."""
+        row_bytes = len(np.zeros(4, dtype=np.float32).tobytes())
+        cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_bytes=3 * row_bytes)
+        cache.put_many("m", ["a", "b", "c"], [[1.0] * 4, [2.0] * 4, [3.0] * 4])
+        cache.get_many("m", ["a"])  # "a" is now more recent than "b"
+        cache.put_many("m", ["d"], [[4.0] * 4])
+        assert cache.get_many("m", ["a", "b", "c", "d"])[1] is None
+        stats = cache.stats()
+        assert stats.bytes <= cache.max_bytes
+        assert stats.evictions >= 1
+
+    def test_provider_skips_cached_and_duplicate_texts(self, tmp_path: Path, make_embedder: type[FakeEmbedder]) -> None:
+        """Test that the embedder only sends distinct uncached texts."""
+        embedder = make_embedder(cache=EmbeddingCache(tmp_path / "cache.sqlite3"))
+        first = embedder.embed_batches(["x y", "x y", "z"])
+        assert embedder.requests == 1
+        assert first.vectors[0] == first.vectors[1]
+
+        second = embedder.embed_batches(["z", "x y", "new text"])
+        assert embedder.requests == len(["new text"]) + 1
+        assert second.cached == len(["z", "x y"])
+        assert second.vectors[:2] == [first.vectors[2], first.vectors[0]]
+        assert embedder.embed_texts(["z"]) == [first.vectors[2]]
+        assert embedder.requests == len(["new text"]) + 1
+
+
+class TestBM25Index:
+    """Test suite for the BM25 inverted index."""
+
+    def test_identifiers_are_indexed_whole_and_in_parts(self) -> None:
+        """Test that compound identifiers yield the whole token and its parts."""
+        assert list(tokenize("See ERR-404 in report_v2.pdf")) == [
+            "see",
+            "err-404",
+            "err",
+            "404",
+            "in",
+            "report_v2.pdf",
+            "report",
+            "v2",
+            "pdf",
+        ]
+
+    def test_search_ranks_rare_terms_and_supports_removal(self) -> None:
+        """Test BM25 ranking, replacement and removal."""
+        index = BM25Index()
+        index.add(1, "the cat sat on the mat")
+        index.add(2, "the dog chased the cat")
+        index.add(3, "order SKU-7731 shipped")
+        assert [doc for doc, _ in index.search("sku-7731", 5)] == [3]
+        assert [doc for doc, _ in index.search("dog cat", 5)] == [2, 1]
+
+        index.add(2, "the bird sang")
+        assert [doc for doc, _ in index.search("dog cat", 5)] == [1]
+        index.remove([1, 99])
+        assert index.search("cat", 5) == []
+        assert len(index) == len([2, 3])
+
+    def test_json_round_trip(self) -> None:
+        """Test that a serialized index scores identically after reloading."""
+        index = BM25Index()
+        index.add(1, "alpha beta beta")
+        index.add(2, "beta gamma")
+        restored = BM25Index.from_json(json.loads(json.dumps(index.to_json())))
+        assert restored.search("beta gamma", 2) == index.search("beta gamma", 2)
+        restored.remove([2])
+        assert [doc for doc, _ in restored.search("gamma beta", 2)] == [1]
+
+    def test_reciprocal_rank_fusion(self) -> None:
+        """Test that ids ranked well in both lists win the fusion."""
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]])
+        assert [doc for doc, _ in fused] == [1, 3, 2, 4]
+
+
+class TestMetadataIndex:
+    """Test suite for the secondary indexes behind metadata filters."""
+
+    def _index(self) -> MetadataIndex:
+        index = MetadataIndex()
+        index.add(1, {"root": "/docs", "path": "/docs/a.md", "suffix": ".md", "ingested_at": 10.0})
+        index.add(2, {"root": "/docs", "path": "/docs/sub/b.pdf", "suffix": ".pdf", "ingested_at": 20.0, "page": 1})
+        index.add(3, {"root": "/docs", "path": "/docs/sub/b.pdf", "suffix": ".pdf", "ingested_at": 20.0, "page": 4})
+        index.add(4, {"root": "/notes", "path": "/notes/c.txt", "suffix": ".txt", "ingested_at": 30.0})
+        return index
+
+    def test_conditions(self) -> None:
+        """Test equality, membership, ranges, prefixes and their conjunction."""
+        index = self._index()
+        assert index.select({"suffix": ".pdf"}) == {2, 3}
+        assert index.select({"suffix": [".md", ".txt"]}) == {1, 4}
+        assert index.select({"ingested_at": {"gt": 10.0, "lte": 30.0}}) == {2, 3, 4}
+        assert index.select({"page": {"gte": 2}}) == {3}
+        assert index.select({"path": {"prefix": "/docs/sub/"}}) == {2, 3}
+        assert index.select({"root": "/docs", "ingested_at": {"lt": 20.0}}) == {1}
+        assert index.select({"root": "/nowhere"}) == set()
+        assert index.select({}) == {1, 2, 3, 4}
+        assert index.values("root") == ["/docs", "/notes"]
+
+    def test_remove_and_replace(self) -> None:
+        """Test that removed or re-added records leave no stale postings."""
+        index = self._index()
+        index.remove([4, 99])
+        index.add(1, {"root": "/docs", "suffix": ".txt"})
+        assert index.values("root") == ["/docs"]
+        assert index.select({"suffix": ".txt"}) == {1}
+        assert index.select({"suffix": ".md"}) == set()
+        assert len(index) == len([1, 2, 3])
+
+    def test_invalid_filters_raise(self) -> None:
+        """Test that unknown fields, unknown operators and mistyped bounds are rejected."""
+        index = self._index()
+        with pytest.raises(ValueError, match="Unknown filter field"):
+            index.select({"author": "x"})
+        with pytest.raises(ValueError, match="operator"):
+            index.select({"page": {"near": 3}})
+        with pytest.raises(ValueError, match="different types"):
+            index.select({"ingested_at": {"gt": "yesterday"}})
+
+
+class TestDedup:
+    """Test suite for SimHash near-duplicate detection and MMR diversification."""
+
+    _LICENCE = (
+        "Licensed under the Apache License, Version 2.0 (the License); you may not use this file except in "
+        "compliance with the License. You may obtain a copy of the License at the project website."
+    )
+
+    def test_near_duplicates_have_close_fingerprints(self) -> None:
+        """Test that a one-word edit keeps the fingerprint close and unrelated text does not."""
+        edited = self._LICENCE.replace("website", "homepage")
+        unrelated = "Rockets travel to orbit around the moon and return with samples of lunar rock and dust."
+        assert simhash(self._LICENCE) == simhash(self._LICENCE.upper())
+        assert hamming(simhash(self._LICENCE), simhash(edited)) < hamming(simhash(self._LICENCE), simhash(unrelated))
+        assert hamming(simhash(self._LICENCE), simhash(unrelated)) > 3  # noqa: PLR2004
+        assert simhash("") is None
+        assert simhash("--- *** ---") is None
+
+    def test_index_finds_within_distance_and_forgets_removed_ids(self) -> None:
+        """Test band lookup against brute force, and removal."""
+        rng = np.random.default_rng(0)
+        index = SimHashIndex(max_distance=3)
+        stored = {i: int(rng.integers(0, 2**63)) for i in range(200)}
+        for record_id, fingerprint in stored.items():
+            index.add(record_id, fingerprint)
+        target = 7
+        probe = stored[target] ^ (1 << 3) ^ (1 << 40) ^ (1 << 62)
+        assert index.find(probe) == target
+        assert index.find(stored[target] ^ 0b1111) is None
+        index.remove([target, 999])
+        assert index.find(probe) is None
+        assert len(index) == len(stored) - 1
+        with pytest.raises(ValueError, match="max_distance"):
+            SimHashIndex(max_distance=16)
+
+    def test_mmr_skips_near_copies(self) -> None:
+        """Test that MMR keeps the best hit first and prefers a distinct result over a copy of it."""
+        vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+        relevance = np.array([0.9, 0.89, 0.7])
+        assert mmr(relevance, vectors, 2, diversity=0.0) == [0, 1]
+        assert mmr(relevance, vectors, 2, diversity=0.3) == [0, 2]
+        assert mmr(relevance, vectors, 5, diversity=0.3) == [0, 2, 1]
+
+
+class TestQueryCache:
+    """Test suite for the query result cache."""
+
+    def test_lru_eviction_and_generation_invalidation(self) -> None:
+        """Test that the oldest entry is evicted and a new generation empties the cache."""
+        cache = QueryCache(max_entries=2)
+        for name in ("a", "b"):
+            cache.put((name, ()), 0, [{"text": name}])
+        assert cache.get(("a", ()), 0) == [{"text": "a"}]
+        cache.put(("c", ()), 0, [{"text": "c"}])
+        assert cache.get(("b", ()), 0) is None
+        assert cache.get(("c", ()), 0)[0]["text"] == "c"
+
+        assert cache.get(("a", ()), 1) is None
+        cache.put(("a", ()), 0, [{"text": "stale"}])
+        stats = cache.stats()
+        assert (stats.entries, stats.invalidations, stats.hits, stats.misses) == (0, 1, 2, 2)
+
+    def test_similar_queries_reuse_results(self) -> None:
+        """Test that only queries above the similarity threshold with the same parameters reuse results."""
+        cache = QueryCache(similarity=0.9)
+        cache.put(("disk full", (5,)), 0, [{"text": "E-4711"}], [1.0, 0.0])
+        assert cache.get(("disk is full", (5,)), 0) is None
+        assert cache.get_similar(("disk is full", (5,)), [0.95, 0.05], 0) == [{"text": "E-4711"}]
+        assert cache.get_similar(("disk is full", (3,)), [0.95, 0.05], 0) is None
+        assert cache.get_similar(("apples", (5,)), [0.0, 1.0], 0) is None
+        stats = cache.stats()
+        assert (stats.semantic_hits, stats.hits, stats.misses) == (1, 1, 0)
+        assert QueryCache().get_similar(("disk full", (5,)), [1.0, 0.0], 0) is None
+
+    def test_keys_ignore_case_whitespace_and_filter_order(self) -> None:
+        """Test that equivalent queries and filters map to the same key."""
+        assert normalise_query("  Disk\tFULL ") == normalise_query("disk full")
+        where = {"suffix": {".md", ".txt"}, "root": "a"}
+        assert filter_key(where) == filter_key({"root": "a", "suffix": {".txt", ".md"}})
+        assert filter_key({}) is None
+
+
+class TestKnowledgeBaseStore:
+    """Test suite for KnowledgeBase indexing and querying with a fake embedder."""
+
+    @pytest.mark.asyncio
+    async def test_index_query_and_reload(self, tmp_path: Path, make_kb: Callable[[Path], KnowledgeBase]) -> None:
+        """Test that indexed chunks are queryable and survive a save/load round trip."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "fruit.txt").write_text("Apples and pears grow on trees.", encoding="utf-8")
+        (docs / "space.md").write_text("Rockets travel to orbit around the moon.", encoding="utf-8")
+
+        n_docs = len(list(docs.iterdir()))
+        kb = make_kb(tmp_path)
+        report = await kb.index_path(docs)
+        assert report.chunks_added == n_docs
+        assert kb.record_count() == n_docs
+
+        results = kb.query("rockets moon orbit", top_k=1)
+        assert len(results) == 1
+        assert results[0]["source_path"].endswith("space.md")
+
+        reloaded = make_kb(tmp_path)
+        assert reloaded.record_count() == n_docs
+        assert reloaded.query("apples trees", top_k=1)[0]["source_path"].endswith("fruit.txt")
+
+        reloaded.clear()
+        assert reloaded.is_empty()
+        assert reloaded.query("apples", top_k=1) == []
+
+    @pytest.mark.asyncio
+    async def test_reindex_after_clear(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that chunks indexed again after a clear are stored rather than deduplicated against cleared ones."""
+        monkeypatch.setenv("KB_DEDUP_DISTANCE", "3")
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "fruit.txt").write_text("Apples and pears grow on trees in the orchard.", encoding="utf-8")
+        kb = make_kb(tmp_path)
+        assert (await kb.index_path(docs)).chunks_added == 1
+
+        kb.clear()
+        report = await kb.index_path(docs)
+        assert report.chunks_added > 0
+        assert report.chunks_deduplicated == 0
+        assert kb.query("apples pears", top_k=1)[0]["source_path"].endswith("fruit.txt")
+
+    @pytest.mark.asyncio
+    async def test_plain_text_is_streamed_past_the_size_cap(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that plain text above KB_MAX_FILE_BYTES is stored in batches while parsed formats are skipped."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        paragraphs = [f"Paragraph {i} is about topic {i}." for i in range(30)]
+        (docs / "long.txt").write_text("\n\n".join(paragraphs), encoding="utf-8")
+        (docs / "page.html").write_text(f"<p>{' '.join(paragraphs)}</p>", encoding="utf-8")
+        monkeypatch.setenv("KB_MAX_FILE_BYTES", "200")
+        monkeypatch.setenv("KB_CHUNK_SIZE", "40")
+        monkeypatch.setenv("KB_CHUNK_OVERLAP", "0")
+
+        kb = make_kb(tmp_path)
+        report = await kb.index_path(docs)
+        assert report.files_scanned == 1
+        assert report.chunks_added == len(paragraphs)
+        assert str(docs / "long.txt") in kb._manifest  # noqa: SLF001
+        assert "topic 29." in kb.query("topic 29", top_k=1, mode=QueryMode.LEXICAL)[0]["text"]
+
+    def test_legacy_json_index_is_migrated(self, tmp_path: Path, make_embedder: type[FakeEmbedder]) -> None:
+        """Test that a legacy list-format kb_index.json is migrated to the binary format once."""
+        legacy = tmp_path / "kb_index.json"
+        legacy.write_text(
+            json.dumps(
+                [
+                    {"id": 1, "source_path": "a.txt", "chunk_id": 0, "text": "alpha", "embedding": [1.0, 0.0]},
+                    "not a record",
+                    {"id": 2, "source_path": "b.txt", "chunk_id": 0, "text": "beta", "embedding": [0.0, 3.0]},
+                ],
+            ),
+            encoding="utf-8",
+        )
+        kb = KnowledgeBase(storage_path=legacy)
+        kb._embedder = make_embedder()  # noqa: SLF001
+        assert kb.record_count() == len(["alpha", "beta"])
+        assert not legacy.exists()
+        assert (tmp_path / "kb_index.json.migrated").exists()
+
+        matrix, records, next_id = read_index(tmp_path / "kb_index")
+        assert isinstance(matrix, np.memmap)
+        assert np.allclose(matrix, [[1.0, 0.0], [0.0, 1.0]])
+        assert [r["text"] for r in records] == ["alpha", "beta"]
+        assert next_id == len(records) + 1
+
+    def test_corrupt_index_starts_fresh(self, tmp_path: Path, make_kb: Callable[[Path], KnowledgeBase]) -> None:
+        """Test that a base whose embeddings disagree with its header is ignored and then replaced."""
+        kb = make_kb(tmp_path)
+        kb._replace_source_chunks(Path("a"), [(0, _span("a", "alpha"))], [[1.0, 0.0]], None)  # noqa: SLF001
+        kb.compact()
+        current = json.loads((tmp_path / "kb_index" / "current.json").read_text(encoding="utf-8"))
+        with (tmp_path / "kb_index" / current["base"] / "embeddings.f32").open("ab") as fh:
+            fh.write(b"\0\0")
+
+        fresh = make_kb(tmp_path)
+        assert fresh.is_empty()
+        fresh._replace_source_chunks(Path("b"), [(0, _span("b", "beta"))], [[0.0, 1.0]], None)  # noqa: SLF001
+        fresh._save()  # noqa: SLF001
+        assert [r["text"] for r in make_kb(tmp_path).query("beta", mode=QueryMode.LEXICAL)] == ["beta"]
+
+    def test_compaction_older_than_a_clear_is_discarded(
+        self,
+        tmp_path: Path,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that a base snapshot taken before a clear cannot replace the cleared base."""
+        kb = make_kb(tmp_path)
+        kb._replace_source_chunks(Path("a"), [(0, _span("a", "alpha"))], [[1.0, 0.0]], None)  # noqa: SLF001
+        kb._save()  # noqa: SLF001
+        with kb._write_lock:  # noqa: SLF001
+            stale = kb._base_snapshot()  # noqa: SLF001
+
+        kb.clear()
+        assert not write_base(tmp_path / "kb_index", stale)
+        kb._write_base(stale)  # noqa: SLF001
+        assert make_kb(tmp_path).is_empty()
+
+    @pytest.mark.asyncio
+    async def test_saves_append_segments_and_recover_after_a_crash(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that saves only append segments, uncommitted ones are discarded and compaction folds them."""
+        monkeypatch.setenv("KB_COMPACT_SEGMENTS", "3")
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        index_dir = tmp_path / "kb_index"
+        kb = make_kb(tmp_path)
+        for name in ["one", "two"]:
+            (docs / f"{name}.txt").write_text(f"notes about {name}", encoding="utf-8")
+            await kb.index_path(docs)
+        segments = sorted(d.name for d in (index_dir / "segments").iterdir())
+        assert len(segments) == len(["one", "two"])
+        assert not (index_dir / "current.json").exists()
+        second = json.loads((index_dir / "segments" / segments[-1] / "COMMIT").read_text(encoding="utf-8"))
+        assert second["count"] == 1
+
+        # A save that crashed before writing its commit marker
+        torn = index_dir / "segments" / f"{int(segments[-1]) + 1:08d}"
+        torn.mkdir()
+        (torn / "embeddings.f32").write_bytes(b"\0" * 7)
+        recovered = make_kb(tmp_path)
+        assert recovered.record_count() == len(["one", "two"])
+        assert not torn.exists()
+        (docs / "one.txt").unlink()
+        (docs / "three.txt").write_text("notes about three", encoding="utf-8")
+        await recovered.index_path(docs)
+
+        # The third segment triggers a background compaction into a new base
+        assert recovered._compactor is not None  # noqa: SLF001
+        recovered._compactor.join()  # noqa: SLF001
+        current = json.loads((index_dir / "current.json").read_text(encoding="utf-8"))
+        assert list((index_dir / "segments").iterdir()) == []
+        _, records, _ = read_index(index_dir / current["base"])
+        assert sorted(Path(r["source_path"]).name for r in records) == ["three.txt", "two.txt"]
+        reopened = make_kb(tmp_path)
+        assert reopened.record_count() == len(records)
+        assert reopened.query("three", top_k=1, mode=QueryMode.LEXICAL)[0]["source_path"].endswith("three.txt")
+
+    @pytest.mark.asyncio
+    async def test_reindex_is_incremental(self, tmp_path: Path, make_kb: Callable[[Path], KnowledgeBase]) -> None:
+        """Test that unchanged files are skipped, changed files replaced and deleted files removed."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        keep, edit, drop = docs / "keep.txt", docs / "edit.txt", docs / "drop.txt"
+        keep.write_text("Unchanged notes about gardening.", encoding="utf-8")
+        edit.write_text("Draft notes about sailing.", encoding="utf-8")
+        drop.write_text("Temporary notes about cooking.", encoding="utf-8")
+
+        kb = make_kb(tmp_path)
+        first = await kb.index_path(docs)
+        assert first.files_indexed == first.files_scanned
+        assert kb.record_count() == first.files_scanned
+
+        second = await kb.index_path(docs)
+        assert second.files_skipped == second.files_scanned
+        assert second.chunks_added == 0
+        assert kb.record_count() == first.files_scanned
+
+        edit.write_text("Final notes about sailing boats and harbours.", encoding="utf-8")
+        drop.unlink()
+        reloaded = make_kb(tmp_path)
+        third = await reloaded.index_path(docs)
+        assert (third.files_skipped, third.files_updated, third.files_removed) == (1, 1, 1)
+        assert third.chunks_removed == len([edit, drop])
+        assert reloaded.record_count() == len([keep, edit])
+        assert "harbours" in reloaded.query("sailing boats harbours", top_k=1)[0]["text"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("workers", ["0", "2"])
+    async def test_pipeline_indexes_every_file_in_order(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        workers: str,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that the parse/embed/write pipeline indexes all files, with and without parser processes."""
+        monkeypatch.setenv("KB_INGEST_WORKERS", workers)
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        topics = ["apples", "rockets", "violins", "glaciers", "tigers", "pottery"]
+        for i, topic in enumerate(topics):
+            (docs / f"{i}_{topic}.txt").write_text(f"A short note about {topic}", encoding="utf-8")
+        (docs / "empty.txt").write_text("   ", encoding="utf-8")
+
+        kb = make_kb(tmp_path)
+        report = await kb.index_path(docs)
+        assert report.files_indexed == report.files_scanned
+        assert report.chunks_added == len(topics)
+        assert kb.query("violins", top_k=1)[0]["source_path"].endswith("2_violins.txt")
+
+        progress = [line for line in kb.recent_progress() if line.startswith("KB progress:")]
+        assert progress[-1].startswith(f"KB progress: {len(topics) + 1}/{len(topics) + 1} files")
+
+    def test_concurrent_ingests_on_other_threads_do_not_interleave(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that ingests running on separate threads and event loops keep ids unique and ordered."""
+        monkeypatch.setenv("KB_INGEST_WORKERS", "0")
+        monkeypatch.setenv("KB_CHUNK_SIZE", "40")
+        monkeypatch.setenv("KB_CHUNK_OVERLAP", "0")
+        folders = [tmp_path / "watched", tmp_path / "uploaded"]
+        for folder in folders:
+            folder.mkdir()
+            for i in range(20):
+                paragraphs = (f"{folder.name} file {i} paragraph {j} text." for j in range(6))
+                (folder / f"{i}.txt").write_text("\n\n".join(paragraphs), encoding="utf-8")
+        kb = make_kb(tmp_path)
+        errors: list[Exception] = []
+
+        def ingest(folder: Path) -> None:
+            try:
+                asyncio.run(kb.index_path(folder))
+            except Exception as exc:  # noqa: BLE001
+                errors.append(exc)
+
+        threads = [threading.Thread(target=ingest, args=(folder,)) for folder in folders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        ids = [r.id for r in kb._store.snapshot()[1]]  # noqa: SLF001
+        assert ids == sorted(set(ids))
+        assert len(ids) == len(folders) * 20 * 6
+        assert make_kb(tmp_path).record_count() == len(ids)
+
+    @pytest.mark.asyncio
+    async def test_ann_index_is_built_and_persisted(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that the IVF index is trained past KB_ANN_MIN_ROWS and reloaded with the index."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+        for i, word in enumerate(words):
+            (docs / f"{word}.txt").write_text(f"{word} {words[(i + 1) % len(words)]}", encoding="utf-8")
+        monkeypatch.setenv("KB_ANN_MIN_ROWS", str(len(words) // 2))
+
+        kb = make_kb(tmp_path)
+        await kb.index_path(docs)
+        assert kb._store.ann is not None  # noqa: SLF001
+        assert any("KB ANN index built" in line for line in kb.recent_progress())
+
+        kb.compact()  # the IVF index is persisted with the compacted base
+        reloaded = make_kb(tmp_path)
+        assert reloaded.record_count() == len(words)
+        ann = reloaded._store.ann  # noqa: SLF001
+        assert ann is not None
+        assert ann.assignments.shape[0] == len(words)
+        exact = reloaded.query("delta echo", top_k=1, nprobe=0)
+        assert reloaded.query("delta echo", top_k=1, nprobe=ann.nlist) == exact
+
+        reports = reloaded.ann_recall_report(k=2, nprobes=(1, ann.nlist), samples=10)
+        assert reports[-1].recall == pytest.approx(1.0)
+
+    @pytest.mark.asyncio
+    async def test_quantised_codes_are_built_and_persisted(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that KB_QUANTIZATION codes are built after indexing and reloaded with the base."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+        for i, word in enumerate(words):
+            (docs / f"{word}.txt").write_text(f"{word} {words[(i + 1) % len(words)]}", encoding="utf-8")
+        monkeypatch.setenv("KB_QUANTIZATION", "int8")
+
+        kb = make_kb(tmp_path)
+        exact_kb = make_kb(tmp_path / "exact")
+        await kb.index_path(docs)
+        assert kb._store.quantizer is not None  # noqa: SLF001
+        assert any("KB quantised codes built: mode=int8" in line for line in kb.recent_progress())
+
+        kb.compact()
+        reloaded = make_kb(tmp_path)
+        assert reloaded.record_count() == len(words)
+        quantizer = reloaded._store.quantizer  # noqa: SLF001
+        assert quantizer is not None
+        assert quantizer.mode == QuantizationMode.INT8
+        monkeypatch.setenv("KB_QUANTIZATION", "none")
+        await exact_kb.index_path(docs)
+        hits, exact = reloaded.query("delta echo", top_k=2), exact_kb.query("delta echo", top_k=2)
+        assert [h["source_path"] for h in hits] == [h["source_path"] for h in exact]
+        assert [h["score"] for h in hits] == pytest.approx([h["score"] for h in exact], abs=1e-5)
+
+        reloaded.compact()  # switching the mode off drops the codes
+        assert reloaded._store.quantizer is None  # noqa: SLF001
+
+    @pytest.mark.asyncio
+    async def test_overlapping_chunks_are_stored_once(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that persisted records keep offsets and store the text shared with the previous chunk once."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        sentences = [f"Sentence {i} mentions the keyword k{i} once." for i in range(40)]
+        (docs / "long.txt").write_text(" ".join(sentences), encoding="utf-8")
+        monkeypatch.setenv("KB_CHUNK_SIZE", "200")
+        monkeypatch.setenv("KB_CHUNK_OVERLAP", "60")
+
+        kb = make_kb(tmp_path)
+        await kb.index_path(docs)
+        kb.compact()
+        texts = [r.text for r in kb._store.snapshot()[1]]  # noqa: SLF001
+        current = json.loads((tmp_path / "kb_index" / "current.json").read_text(encoding="utf-8"))
+        _, rows, _ = read_index(tmp_path / "kb_index" / current["base"])
+        assert [r["length"] for r in rows] == [len(t) for t in texts]
+        assert sum(len(r["text"]) for r in rows) < sum(len(t) for t in texts)
+
+        held = kb._texts[str(docs / "long.txt")]  # noqa: SLF001
+        assert sum(len(piece) for piece in held._pieces) < sum(len(t) for t in texts)  # noqa: SLF001
+
+        reloaded = make_kb(tmp_path)
+        assert reloaded.record_count() == len(texts)
+        assert [r.text for r in reloaded._store.snapshot()[1]] == texts  # noqa: SLF001
+        assert "k37" in reloaded.query("keyword k37", top_k=1, mode=QueryMode.LEXICAL)[0]["text"]
+
+    @pytest.mark.asyncio
+    async def test_near_duplicate_chunks_are_linked_not_stored(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that boilerplate shared by files is stored once and re-indexed when its original goes away."""
+        monkeypatch.setenv("KB_DEDUP_DISTANCE", "3")
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        licence = TestDedup._LICENCE  # noqa: SLF001
+        (docs / "a.txt").write_text(licence, encoding="utf-8")
+        (docs / "b.txt").write_text(licence.upper().replace(";", ","), encoding="utf-8")
+
+        kb = make_kb(tmp_path)
+        report = await kb.index_path(docs)
+        assert (report.chunks_added, report.chunks_deduplicated) == (1, 1)
+        assert len(kb.query("apache licence", top_k=5)) == 1
+
+        reloaded = make_kb(tmp_path)
+        assert reloaded.record_count() == 1
+        original = Path(reloaded.query("apache licence", top_k=1)[0]["source_path"])
+        (docs / original.name).unlink()
+        report = await reloaded.index_path(docs)
+        assert (report.files_removed, report.files_updated) == (1, 1)
+        assert [r["source_path"] for r in reloaded.query("apache licence", top_k=5)] != [str(original)]
+        assert reloaded.record_count() == 1
+
+    @pytest.mark.asyncio
+    async def test_dedup_and_diversity_are_opt_in(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that by default copies are stored and ranked plainly, and that chunks without words never dedupe."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "a.txt").write_text("solar panels convert sunlight into power", encoding="utf-8")
+        (docs / "b.txt").write_text("solar panels convert sunlight into power", encoding="utf-8")
+        (docs / "rule.md").write_text("-----", encoding="utf-8")
+        (docs / "stars.md").write_text("* * *", encoding="utf-8")
+
+        kb = make_kb(tmp_path)
+        report = await kb.index_path(docs)
+        assert (report.chunks_added, report.chunks_deduplicated) == (4, 0)
+        hits = kb.query("solar sunlight power", top_k=2)
+        assert [h["text"] for h in hits] == ["solar panels convert sunlight into power"] * 2
+
+        # the two files without words have no fingerprint, so they are not near-duplicates of each other
+        monkeypatch.setenv("KB_DEDUP_DISTANCE", "3")
+        (tmp_path / "deduped").mkdir()
+        deduped = make_kb(tmp_path / "deduped")
+        report = await deduped.index_path(docs)
+        assert (report.chunks_added, report.chunks_deduplicated) == (3, 1)
+
+    @pytest.mark.asyncio
+    async def test_results_are_diversified(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that near-copies give way to distinct chunks unless diversity is 0."""
+        monkeypatch.setenv("KB_DEDUP_DISTANCE", "-1")
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "a.txt").write_text("solar panels convert sunlight into power", encoding="utf-8")
+        (docs / "b.txt").write_text("solar panels convert sunlight into power", encoding="utf-8")
+        (docs / "c.txt").write_text("solar farms store energy in batteries", encoding="utf-8")
+
+        kb = make_kb(tmp_path)
+        await kb.index_path(docs)
+        assert kb.record_count() == len(["a", "b", "c"])
+        plain = kb.query("solar sunlight power", top_k=2, diversity=0.0)
+        assert [r["text"] for r in plain] == ["solar panels convert sunlight into power"] * 2
+        diverse = kb.query("solar sunlight power", top_k=2, diversity=0.5)
+        assert [Path(r["source_path"]).name for r in diverse][1] == "c.txt"
+        batched = await kb.aquery_many(["solar sunlight power"], top_k=2, diversity=0.5)
+        assert batched[0] == diverse
+
+    @pytest.mark.asyncio
+    async def test_query_results_are_cached_until_the_index_changes(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that repeated queries skip the embedder, and that an ingest invalidates them."""
+        monkeypatch.setenv("KB_QUERY_CACHE_SIMILARITY", "0.99")
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "fruit.txt").write_text("Apples and pears grow on trees.", encoding="utf-8")
+        kb = make_kb(tmp_path)
+        await kb.index_path(docs)
+        embedder = kb._embedder  # noqa: SLF001
+
+        first = kb.query("apples trees", top_k=1)
+        requests = embedder.requests
+        assert kb.query("  Apples   TREES ", top_k=1) == first
+        assert (await kb.aquery_many(["apples trees", "rockets"], top_k=1))[0] == first
+        assert embedder.requests == requests + 1
+        assert kb.query("trees apples", top_k=1) == first  # same bag of words, so the same embedding
+        stats = kb.query_cache_stats()
+        assert (stats.hits, stats.semantic_hits) == (3, 1)
+
+        first[0]["text"] = "modified by the caller"
+        assert kb.query("apples trees", top_k=1)[0]["text"] != first[0]["text"]
+        generation = kb.generation
+        (docs / "space.md").write_text("Rockets travel to orbit around the moon.", encoding="utf-8")
+        await kb.index_path(docs)
+        assert kb.generation > generation
+        assert Path(kb.query("rockets", top_k=1)[0]["source_path"]).name == "space.md"
+        assert kb.query_cache_stats().invalidations == 1
+
+        monkeypatch.setenv("KB_QUERY_CACHE_SIZE", "0")
+        assert make_kb(tmp_path).query_cache_stats() is None
+
+    @pytest.mark.asyncio
+    async def test_token_budgeted_ingest_reports_tokens(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that ``KB_CHUNK_STRATEGY=tokens`` bounds chunk tokens and that reports and results count them."""
+        monkeypatch.setenv("KB_CHUNK_STRATEGY", "tokens")
+        monkeypatch.setenv("KB_CHUNK_TOKENS", "40")
+        monkeypatch.setenv("KB_TOKENIZER", "regex")
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "notes.md").write_text(" ".join(f"Note {i} covers topic {i}." for i in range(60)), encoding="utf-8")
+        kb = make_kb(tmp_path)
+        report = await kb.index_path(docs)
+        assert report.chunks_added > 1
+        assert 0 < report.max_chunk_tokens <= 40  # noqa: PLR2004
+        assert report.tokens_per_chunk == report.tokens_embedded / report.chunks_added
+        results = kb.query("topic 7", top_k=2)
+        assert all(r["tokens"] == get_tokenizer("regex").count(r["text"]) for r in results)
+        assert any("tokens=" in line for line in kb.recent_progress())
+
+    @pytest.mark.asyncio
+    async def test_lexical_and_hybrid_queries(self, tmp_path: Path, make_kb: Callable[[Path], KnowledgeBase]) -> None:
+        """Test that lexical queries skip the embedder and the postings survive a reload."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "errors.txt").write_text("Code E-4711 means the disk is full.", encoding="utf-8")
+        (docs / "notes.txt").write_text("The disk is almost full, clean up soon.", encoding="utf-8")
+
+        kb = make_kb(tmp_path)
+        await kb.index_path(docs)
+        embedder = kb._embedder  # noqa: SLF001
+        requests_before = embedder.requests
+        hits = kb.query("e-4711", top_k=2, mode=QueryMode.LEXICAL)
+        assert [Path(h["source_path"]).name for h in hits] == ["errors.txt"]
+        assert embedder.requests == requests_before
+
+        hybrid = kb.query("what does e-4711 mean", top_k=2, mode=QueryMode.HYBRID)
+        assert Path(hybrid[0]["source_path"]).name == "errors.txt"
+        assert embedder.requests == requests_before + 1
+
+        reloaded = make_kb(tmp_path)
+        assert reloaded.query("e-4711", top_k=2, mode=QueryMode.LEXICAL)[0]["text"] == hits[0]["text"]
+
+    @pytest.mark.asyncio
+    async def test_aquery_many_batches_the_embedding_call(
+        self,
+        tmp_path: Path,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that several async queries share one embedding request and match the sync results."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "fruit.txt").write_text("apples pears plums", encoding="utf-8")
+        (docs / "space.txt").write_text("rockets orbit moon", encoding="utf-8")
+        kb = make_kb(tmp_path)
+        await kb.index_path(docs)
+
+        queries = ["moon rockets", "", "plums apples"]
+        requests_before = kb._embedder.requests  # noqa: SLF001
+        batched = await kb.aquery_many(queries, top_k=1, mode=QueryMode.VECTOR)
+        assert kb._embedder.requests == requests_before + 1  # noqa: SLF001
+        assert batched[1] == []
+        assert batched[0] == kb.query(queries[0], top_k=1, mode=QueryMode.VECTOR)
+        assert batched[2][0]["source_path"].endswith("fruit.txt")
+
+        single = await kb.aquery("orbit", top_k=1, mode=QueryMode.HYBRID)
+        assert single[0]["source_path"].endswith("space.txt")
+
+    @pytest.mark.asyncio
+    async def test_metadata_filters(self, tmp_path: Path, make_kb: Callable[[Path], KnowledgeBase]) -> None:
+        """Test that ``where`` filters apply to every query mode and survive a reload and compaction."""
+        docs, notes = tmp_path / "docs", tmp_path / "notes"
+        docs.mkdir()
+        notes.mkdir()
+        (docs / "guide.md").write_text("rockets orbit the moon", encoding="utf-8")
+        (docs / "log.txt").write_text("rockets launch at dawn", encoding="utf-8")
+        (notes / "todo.txt").write_text("buy rockets for the moon party", encoding="utf-8")
+        kb = make_kb(tmp_path)
+        await kb.index_path(docs)
+        await kb.index_path(notes)
+
+        for mode in QueryMode:
+            names = {
+                Path(h["source_path"]).name
+                for h in kb.query("rockets moon", top_k=5, mode=mode, where={"suffix": ".txt"})
+            }
+            assert names == {"log.txt", "todo.txt"}
+        by_root = await kb.aquery("rockets moon", top_k=5, where={"root": str(notes)})
+        assert [Path(h["source_path"]).name for h in by_root] == ["todo.txt"]
+        assert kb.query("rockets", where={"suffix": ".pdf"}) == []
+        with pytest.raises(ValueError, match="Unknown filter field"):
+            kb.query("rockets", where={"author": "me"})
+
+        kb.compact()
+        reloaded = make_kb(tmp_path)
+        assert reloaded.roots() == sorted([str(docs), str(notes)])
+        since = {"ingested_at": {"gte": 0}, "path": {"prefix": str(docs)}}
+        hits = reloaded.query("rockets", top_k=5, mode=QueryMode.LEXICAL, where=since)
+        assert {Path(h["source_path"]).name for h in hits} == {"guide.md", "log.txt"}
+
+    def test_latency_budget_falls_back_to_lexical(
+        self,
+        tmp_path: Path,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that a slow embedder is skipped when the query has a latency budget."""
+        kb = make_kb(tmp_path)
+        kb._replace_source_chunks(Path("a.txt"), [(0, _span("a.txt", "invoice INV-2291 overdue"))], [[1.0, 0.0]], None)  # noqa: SLF001
+        kb._embedder.query_seconds = 5.0  # noqa: SLF001
+        requests_before = kb._embedder.requests  # noqa: SLF001
+        hits = kb.query("inv-2291", mode=QueryMode.HYBRID, latency_budget_ms=100)
+        assert hits[0]["source_path"] == "a.txt"
+        assert kb._embedder.requests == requests_before  # noqa: SLF001
+
+    def test_failed_batches_do_not_lose_the_rest_of_the_file(
+        self,
+        tmp_path: Path,
+        make_kb: Callable[[Path], KnowledgeBase],
+        make_embedder: type[FakeEmbedder],
+    ) -> None:
+        """Test that a permanently failing batch only drops its own chunks and leaves the file unrecorded."""
+        doc = tmp_path / "long.txt"
+        doc.write_text("\n\n".join(f"Paragraph {i} is about topic {i}." for i in range(6)), encoding="utf-8")
+
+        kb = make_kb(tmp_path)
+        kb._chunker = CharChunker(30, 0)  # noqa: SLF001
+        kb._embedder = make_embedder(fail_marker="topic 3")  # noqa: SLF001
+        result = kb._index_single_file(doc, _fingerprint_file(doc))  # noqa: SLF001
+        # requests of two chunks: the one holding paragraphs 2 and 3 fails twice (attempt + retry)
+        assert result.added == len(range(6)) - 2
+        assert kb._embedder.requests == len(range(6)) // 2 + 1  # noqa: SLF001
+        assert str(doc) not in kb._manifest  # noqa: SLF001
+        assert any("KB embed throughput" in line for line in kb.recent_progress())
+
+
+class TestKnowledgeBaseRegistry:
+    """Test suite for named, lazily opened knowledge base collections."""
+
+    @pytest.mark.asyncio
+    async def test_collections_open_lazily_and_fan_out(
+        self,
+        tmp_path: Path,
+        make_registry: Callable[[Path], KnowledgeBaseRegistry],
+    ) -> None:
+        """Test that collections are separate, created on demand and queried together with one embedding."""
+        registry = make_registry(tmp_path)
+        assert registry.names() == []
+        for name, text in (("weather", "rain and wind tomorrow"), ("docs", "the rain gauge manual")):
+            folder = tmp_path / f"src-{name}"
+            folder.mkdir()
+            (folder / f"{name}.txt").write_text(text, encoding="utf-8")
+            await registry.get(name).index_path(folder)
+        assert not registry.exists(DEFAULT_COLLECTION)
+        assert registry.storage_path("docs") == tmp_path / "kb_collections" / "docs"
+
+        fresh = make_registry(tmp_path)
+        assert fresh.names() == ["docs", "weather"]
+        assert fresh.loaded() == []
+        embedder = fresh._embedder  # noqa: SLF001
+        hits = await fresh.aquery("rain", ["weather", "docs", "missing"], top_k=5, mode=QueryMode.HYBRID)
+        assert {h["collection"] for h in hits} == {"weather", "docs"}
+        assert embedder.requests == 1
+        assert fresh.loaded() == ["docs", "weather"]
+        assert [h["collection"] for h in await fresh.aquery("wind", ["weather"], mode=QueryMode.LEXICAL)] == ["weather"]
+
+    @pytest.mark.asyncio
+    async def test_idle_collections_are_unloaded_and_reopened(
+        self,
+        tmp_path: Path,
+        make_registry: Callable[[Path], KnowledgeBaseRegistry],
+    ) -> None:
+        """Test that unloading saves pending changes and the collection reopens on next use."""
+        registry = make_registry(tmp_path)
+        kb = registry.get("notes")
+        assert kb.record_count() == 0
+        kb._replace_source_chunks(Path("a.txt"), [(0, _span("a.txt", "alpha beta"))], [[1.0, 0.0]], None)  # noqa: SLF001
+        assert registry.unload_idle(60) == []
+        assert registry.unload_idle(0) == ["notes"]
+        assert not kb.is_loaded
+        assert kb.query("alpha", mode=QueryMode.LEXICAL)[0]["text"] == "alpha beta"
+        assert registry.loaded() == ["notes"]
+        registry.close()
+        assert registry.loaded() == []
+
+    def test_collection_names(self, tmp_path: Path, make_registry: Callable[[Path], KnowledgeBaseRegistry]) -> None:
+        """Test that invalid names are rejected and labels map to valid names."""
+        registry = make_registry(tmp_path)
+        with pytest.raises(ValueError, match="Invalid knowledge base collection name"):
+            registry.get("../escape")
+        assert collection_name("Weather Agent") == "weather-agent"
+        assert collection_name("***") == DEFAULT_COLLECTION
+
+
+class TestSQLiteKnowledgeBase:
+    """Test suite for the SQLite backend shared by several readers and writers."""
+
+    @pytest.mark.asyncio
+    async def test_writes_are_visible_to_other_instances(
+        self,
+        tmp_path: Path,
+        make_sqlite_kb: Callable[[Path], SQLiteKnowledgeBase],
+    ) -> None:
+        """Test that another instance sees committed files at once, and that FTS and filters work."""
+        docs = tmp_path / "docs"
+        docs.mkdir()
+        (docs / "errors.txt").write_text("Code E-4711 means the disk is full.", encoding="utf-8")
+        (docs / "fruit.md").write_text("Apples and pears grow on trees.", encoding="utf-8")
+        writer, reader = make_sqlite_kb(tmp_path), make_sqlite_kb(tmp_path)
+        assert reader.is_empty()
+
+        report = await writer.index_path(docs)
+        assert report.chunks_added == len(["errors", "fruit"])
+        assert reader.record_count() == len(["errors", "fruit"])
+        assert reader.roots() == [str(docs)]
+        assert Path(reader.query("apples trees", top_k=1)[0]["source_path"]).name == "fruit.md"
+        lexical = reader.query("e-4711", top_k=2, mode=QueryMode.LEXICAL)
+        assert [Path(h["source_path"]).name for h in lexical] == ["errors.txt"]
+        assert [Path(h["source_path"]).name for h in reader.query("disk", where={"suffix": ".md"})] == ["fruit.md"]
+        with pytest.raises(ValueError, match="Unknown filter field"):
+            reader.query("disk", where={"author": "x"})
+
+        assert (await reader.index_path(docs)).files_skipped == len(["errors", "fruit"])
+        (docs / "errors.txt").unlink()
+        assert (await reader.index_path(docs)).files_removed == 1
+        assert writer.query("e-4711", mode=QueryMode.LEXICAL) == []
+        writer.compact()
+        assert writer.unload()
+        assert writer.record_count() == 1
+        writer.clear()
+        assert reader.is_empty()
+
+    def test_registry_selects_the_backend(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that ``KB_BACKEND=sqlite`` makes the registry open SQLite collections and list them."""
+        monkeypatch.setenv("KB_BACKEND", "sqlite")
+        registry = KnowledgeBaseRegistry(root=tmp_path, idle_unload_seconds=0)
+        kb = registry.get("notes")
+        assert isinstance(kb, SQLiteKnowledgeBase)
+        kb._replace_source_chunks(Path("a.txt"), [(0, _span("a.txt", "alpha beta"))], [[1.0, 0.0]], None)  # noqa: SLF001
+        assert KnowledgeBaseRegistry(root=tmp_path).names() == ["notes"]
+        registry.close()
+
+    def test_paged_scan_matches_the_in_memory_store(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+        make_sqlite_kb: Callable[[Path], SQLiteKnowledgeBase],
+    ) -> None:
+        """Test that scanning a few rows at a time returns the same neighbours as the exact in-memory search."""
+        monkeypatch.setenv("KB_SQLITE_PAGE_ROWS", "7")
+        monkeypatch.setenv("KB_DEDUP_DISTANCE", "-1")
+        rng = np.random.default_rng(3)
+        vectors = rng.standard_normal((50, 8)).astype(np.float32)
+        kb = make_sqlite_kb(tmp_path)
+        store: VectorStore[int] = VectorStore()
+        for i, vec in enumerate(vectors):
+            kb._replace_source_chunks(Path(f"f{i}.txt"), [(0, _span(f"f{i}.txt", f"doc {i}"))], [vec.tolist()], None)  # noqa: SLF001
+        store.add(vectors, list(range(len(vectors))))
+        queries = rng.standard_normal((3, 8)).astype(np.float32)
+        hits = kb._vector_hits(queries.tolist(), 5, None, None)  # noqa: SLF001
+        expected = store.search_many(queries, 5)
+        for got, want in zip(hits, expected, strict=True):
+            assert [r.source_path for r, _ in got] == [f"f{i}.txt" for i, _ in want]
+            assert np.allclose([score for _, score in got], [score for _, score in want], atol=1e-5)
+        allowed = {3, 10, 20}
+        restricted = kb._vector_hits(queries[:1].tolist(), 5, None, allowed)[0]  # noqa: SLF001
+        assert {r.id for r, _ in restricted} == allowed
+
+    def test_readers_run_alongside_a_writer(
+        self,
+        tmp_path: Path,
+        make_sqlite_kb: Callable[[Path], SQLiteKnowledgeBase],
+    ) -> None:
+        """Test that queries from other threads succeed and see whole files while one thread writes."""
+        kb = make_sqlite_kb(tmp_path)
+        reader = make_sqlite_kb(tmp_path)
+        chunks = [(i, _span("big.txt", f"shared word part {i}")) for i in range(3)]
+        kb._replace_source_chunks(Path("big.txt"), chunks, [[1.0, float(i)] for i in range(3)], None)  # noqa: SLF001
+        counts: list[int] = []
+        errors: list[Exception] = []
+
+        def read() -> None:
+            try:
+                counts.extend(len(reader.query("shared word", top_k=10, mode=QueryMode.LEXICAL)) for _ in range(30))
+            except Exception as exc:  # noqa: BLE001
+                errors.append(exc)
+
+        threads = [threading.Thread(target=read) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for round_ in range(20):
+            vectors = [[1.0, float(round_ + i)] for i in range(3)]
+            kb._replace_source_chunks(Path("big.txt"), chunks, vectors, None)  # noqa: SLF001
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert set(counts) == {len(chunks)}
+
+
+class TestBenchmark:
+    """Test suite for the offline knowledge base benchmark."""
+
+    def test_hash_embedder_is_deterministic(self) -> None:
+        """Test that the hash embedder is stable, normalised and similarity-preserving."""
+        embedder = HashEmbedder(dim=32)
+        first, again, other = embedder.embed_texts(["Red apples", "red APPLES", "blue rockets"])
+        assert first == again
+        assert float(np.linalg.norm(first)) == pytest.approx(1.0)
+        assert float(np.dot(first, other)) < float(np.dot(first, again))
+
+    def test_small_run_reports_every_stage(self, tmp_path: Path) -> None:
+        """Test that a tiny run produces JSON-ready results for ingest and every scale and mode."""
+        config = BenchmarkConfig(
+            files=3,
+            words_per_file=300,
+            scales=(300,),
+            queries=5,
+            ann_min_rows=300,
+            workdir=tmp_path,
+        )
+        results = run_benchmark(config)
+        json.dumps(results)
+        assert set(results["ingest"]["chunking"]) == {"txt", "pdf", "docx"}
+        assert results["ingest"]["index"]["files"] == len(config.formats)
+        (scale,) = results["scales"]
+        assert scale["records"] == config.scales[0]
+        assert scale["ann_build_seconds"] is not None
+        assert set(scale["query"]) == {m.value for m in QueryMode}
+
+        slower = json.loads(json.dumps(results))
+        slower["scales"][0]["load_seconds"] = scale["load_seconds"] * 2
+        assert any(line.startswith("scales[300].load_seconds") for line in compare_results(results, slower))
+
+
+def _eventually(predicate: Callable[[], bool], timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestKBWatcher:
+    """Test suite for continuous ingestion of watched folders."""
+
+    _FAST = WatchSettings(debounce=0.1, poll_interval=0.1, batch=8, cooldown=0.0, quiet=0.0)
+
+    def _sources(self, kb: KnowledgeBase) -> set[str]:
+        return {Path(h["source_path"]).name for h in kb.query("report", top_k=20, mode=QueryMode.LEXICAL)}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "polling",
+        [True, pytest.param(False, marks=pytest.mark.skipif(sys.platform != "linux", reason="inotify is Linux-only"))],
+    )
+    async def test_changes_are_ingested_in_the_background(
+        self,
+        tmp_path: Path,
+        *,
+        polling: bool,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that created, modified and deleted files (and folders) are re-indexed without a rescan."""
+        docs = tmp_path / "docs"
+        (docs / "old").mkdir(parents=True)
+        (docs / "a.txt").write_text("first report", encoding="utf-8")
+        (docs / "old" / "b.txt").write_text("archived report", encoding="utf-8")
+        kb = make_kb(tmp_path)
+        await kb.index_path(docs)
+        watcher = KBWatcher(kb, [docs], self._FAST, polling=polling)
+        watcher.start()
+        try:
+            assert watcher.wait_idle(5)
+            await asyncio.sleep(0.2)  # let the polling backend take its first snapshot
+            (docs / "new").mkdir()
+            (docs / "new" / "c.md").write_text("fresh report", encoding="utf-8")
+            (docs / "a.txt").write_text("first report revised", encoding="utf-8")
+            (docs / "old" / "b.txt").unlink()
+            (docs / "old").rmdir()
+            (docs / "notes.tmp").write_text("report scratch", encoding="utf-8")
+            assert _eventually(lambda: self._sources(kb) == {"a.txt", "c.md"})
+            assert _eventually(lambda: "revised" in kb.query("revised", mode=QueryMode.LEXICAL)[0]["text"])
+        finally:
+            watcher.stop()
+        assert watcher.backend_name == ("polling" if polling else "inotify")
+        assert kb.roots() == [str(docs)]
+
+    def test_ingestion_waits_for_queries_to_pause(
+        self,
+        tmp_path: Path,
+        make_kb: Callable[[Path], KnowledgeBase],
+    ) -> None:
+        """Test that debounced paths are held back while queries are running."""
+        kb = make_kb(tmp_path)
+        settings = WatchSettings(debounce=0.0, poll_interval=1.0, batch=2, cooldown=0.0, quiet=60.0)
+        watcher = KBWatcher(kb, [tmp_path], settings)
+        (tmp_path / "x.swp").write_text("editor state", encoding="utf-8")
+        watcher._record({tmp_path / "a.txt", tmp_path / "b.txt", tmp_path / "c.txt", tmp_path / "x.swp"})  # noqa: SLF001
+        kb.query("anything", mode=QueryMode.LEXICAL)
+        assert watcher._due_batch() is None  # noqa: SLF001
+        watcher._settings.quiet = 0.0  # noqa: SLF001
+        assert watcher._due_batch() == [tmp_path / "a.txt", tmp_path / "b.txt"]  # noqa: SLF001
+        assert watcher._due_batch() == [tmp_path / "c.txt"]  # noqa: SLF001
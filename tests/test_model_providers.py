@@ -0,0 +1,367 @@
+"""Test suite for the model provider registry and pooled clients (no model server required)."""
+
+import asyncio
+import contextlib
+import json
+import re
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+
+from llm_mas.model_providers.api import ModelsAPI
+from llm_mas.model_providers.batching import EmbeddingBatcher
+from llm_mas.model_providers.ollama.call_llm import OllamaProvider
+from llm_mas.model_providers.registry import ProviderRegistry
+from llm_mas.model_providers.response_cache import ResponseCache, response_key
+from llm_mas.model_providers.semantic_cache import Namespace, SemanticCache, is_time_sensitive
+from llm_mas.model_providers.streaming import collect_stream
+from llm_mas.utils.config.models_config import ModelConfig, ModelType
+
+_CONTENT_LENGTH = re.compile(rb"content-length:\s*(\d+)", re.IGNORECASE)
+
+
+@contextlib.asynccontextmanager
+async def _fake_ollama(reply: str = "hi") -> AsyncIterator[str]:
+    """Serve canned Ollama chat replies (word by word when streamed) and embeddings locally; yields the URL."""
+    writers: set[asyncio.StreamWriter] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writers.add(writer)
+        with contextlib.suppress(asyncio.IncompleteReadError, ConnectionError):
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = _CONTENT_LENGTH.search(head)
+                request = json.loads(await reader.readexactly(int(length[1]) if length else 0) or b"{}")
+                if "input" in request:
+                    # embed: a vector of (text length, 1) per input text
+                    texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+                    body = json.dumps({"model": "m", "embeddings": [[float(len(t)), 1.0] for t in texts]})
+                else:
+                    # a stream is one JSON line per word, then an empty final message
+                    parts = [*re.findall(r"\S+\s*", reply), ""] if request.get("stream") else [reply]
+                    body = "\n".join(
+                        json.dumps(
+                            {
+                                "model": "m",
+                                "message": {"role": "assistant", "content": part},
+                                "done": i == len(parts) - 1,
+                            },
+                        )
+                        for i, part in enumerate(parts)
+                    )
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                    % (len(body), body.encode()),
+                )
+                await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        try:
+            yield f"http://127.0.0.1:{port}"
+        finally:
+            # drop connections a failed test left open, so closing the server does not wait for them
+            for writer in writers:
+                writer.close()
+
+
+class TestProviderRegistry:
+    """Test suite for the process-wide provider registry."""
+
+    def test_providers_are_built_once(self) -> None:
+        """Test that a provider is built on first use and then shared."""
+        built: list[OllamaProvider] = []
+
+        def factory() -> OllamaProvider:
+            built.append(OllamaProvider())
+            return built[-1]
+
+        registry = ProviderRegistry({"ollama": factory})
+        assert registry.names() == ["ollama"]
+        assert registry.connection_stats() == {}
+        assert registry.get("ollama") is registry.get("ollama")
+        assert len(built) == 1
+        with pytest.raises(ValueError, match="not found"):
+            registry.get("nope")
+
+    @pytest.mark.asyncio
+    async def test_connections_are_reused_and_closed(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that calls share one keep-alive connection and that ``aclose`` closes it."""
+        async with _fake_ollama() as url:
+            monkeypatch.setenv("OLLAMA_HOST", url)
+            registry = ProviderRegistry({"ollama": OllamaProvider})
+            provider = registry.get("ollama")
+            calls = 3
+            for _ in range(calls):
+                assert await provider.call_llm("hello", "m") == "hi"
+            stats = registry.connection_stats()["ollama"]
+            assert (stats.requests, stats.connections_opened, stats.clients_created) == (calls, 1, 1)
+            assert stats.connections_reused == calls - 1
+
+            await registry.aclose()
+            assert provider.connection_stats().clients_closed == 1
+            assert await provider.call_llm("hello again", "m") == "hi"
+            stats = provider.connection_stats()
+            assert (stats.requests, stats.connections_opened, stats.clients_created) == (calls + 1, 2, 2)
+            await registry.aclose()
+
+
+class TestStreaming:
+    """Test suite for streamed completions."""
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_deltas_and_records_ttft(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that a streamed reply arrives in deltas and that the call's TTFT is recorded."""
+        async with _fake_ollama("streamed reply text") as url:
+            monkeypatch.setenv("OLLAMA_HOST", url)
+            provider = OllamaProvider()
+            parts = [part async for part in provider.stream_llm("hello", "m")]
+            assert parts == ["streamed ", "reply ", "text"]
+
+            seen: list[str] = []
+            text = await collect_stream(
+                provider.stream_llm_with_chat_history([{"role": "user", "content": "hi"}], "m"),
+                seen.append,
+            )
+            assert text == "streamed reply text"
+            assert seen == parts
+
+            stats = provider.stream_stats()
+            assert (stats.calls, stats.chunks) == (2, 6)
+            assert stats.last_ttft is not None
+            assert 0 < stats.mean_ttft <= stats.ttft_max <= stats.mean_duration * 2
+            assert provider.connection_stats().connections_opened == 1
+            await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_empty_stream_raises(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that a stream without any text fails like an empty non-streamed completion."""
+        async with _fake_ollama("") as url:
+            monkeypatch.setenv("OLLAMA_HOST", url)
+            provider = OllamaProvider()
+            with pytest.raises(ValueError, match="No content"):
+                _ = [part async for part in provider.stream_llm("hello", "m")]
+            assert provider.stream_stats().calls == 0
+            await provider.aclose()
+
+
+class TestResponseCache:
+    """Test suite for the persistent LLM response cache."""
+
+    def test_hits_expiry_and_persistence(self, tmp_path: Path) -> None:
+        """Test that responses are keyed by normalised request, survive reopening and expire."""
+        key = response_key("ollama", "m", [{"role": "user", "content": "  Hello\n      world "}])
+        assert key == response_key("ollama", "m", [{"role": "user", "content": "Hello world"}])
+        assert key != response_key("ollama", "m2", [{"role": "user", "content": "Hello world"}])
+        assert key != response_key("ollama", "m", [{"role": "user", "content": "hello world"}])
+
+        cache = ResponseCache(tmp_path / "responses.sqlite3")
+        assert cache.get(key) is None
+        cache.put(key, "ollama", "m", "hi there", latency=1.5)
+        assert cache.get(key) == "hi there"
+        stats = cache.stats()
+        assert (stats.hits, stats.misses, stats.entries, stats.bytes) == (1, 1, 1, len("hi there"))
+        assert stats.latency_saved == pytest.approx(1.5)
+        cache.close()
+
+        reopened = ResponseCache(tmp_path / "responses.sqlite3", ttl=0.05)
+        assert reopened.get(key) == "hi there"
+        time.sleep(0.1)
+        assert reopened.get(key) is None
+        stats = reopened.stats()
+        assert (stats.expired, stats.entries, stats.bytes) == (1, 0, 0)
+
+    def test_lru_eviction_respects_the_size_cap(self, tmp_path: Path) -> None:
+        """Test that the least recently used responses are evicted first."""
+        keys = [response_key("p", "m", [{"role": "user", "content": c}]) for c in "abcd"]
+        cache = ResponseCache(tmp_path / "responses.sqlite3", max_bytes=35)
+        for key in keys[:3]:
+            cache.put(key, "p", "m", "x" * 10, latency=0.1)
+        cache.get(keys[0])  # "a" is now more recent than "b"
+        cache.put(keys[3], "p", "m", "x" * 10, latency=0.1)
+        assert [cache.get(k) is not None for k in keys] == [True, False, True, True]
+        stats = cache.stats()
+        assert stats.bytes <= cache.max_bytes
+        assert stats.evictions == 1
+
+    @pytest.mark.asyncio
+    async def test_models_api_serves_opted_in_calls(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+        """Test that only opted-in calls are answered from the cache, streamed or not."""
+        async with _fake_ollama("cached answer") as url:
+            monkeypatch.setenv("OLLAMA_HOST", url)
+            provider = OllamaProvider()
+            monkeypatch.setattr(
+                ModelsAPI,
+                "_get_provider",
+                staticmethod(lambda model: (provider, ModelConfig(provider="ollama", model=str(model)))),
+            )
+            monkeypatch.setattr(
+                ModelsAPI,
+                "_response_cache",
+                ResponseCache(tmp_path / "responses.sqlite3", model_types=["QUICK"]),
+            )
+
+            assert await ModelsAPI.call_llm("hello", cache=True) == "cached answer"
+            assert await ModelsAPI.call_llm("hello", cache=True) == "cached answer"
+            assert provider.connection_stats().requests == 1
+            await ModelsAPI.call_llm("hello")
+            await ModelsAPI.call_llm("hello", ModelType.QUICK, cache=False)
+            assert provider.connection_stats().requests == 1 + 2
+
+            seen: list[str] = []
+            await ModelsAPI.call_llm_with_chat_history([{"role": "user", "content": "hi"}], ModelType.QUICK)
+            answer = await ModelsAPI.call_llm_with_chat_history(
+                [{"role": "user", "content": "hi"}],
+                ModelType.QUICK,
+                on_text=seen.append,
+            )
+            assert (answer, seen) == ("cached answer", ["cached answer"])
+            assert provider.connection_stats().requests == 1 + 2 + 1
+
+            stats = ModelsAPI.response_cache_stats()
+            assert stats is not None
+            assert (stats.hits, stats.misses, stats.entries) == (2, 2, 2)
+            await provider.aclose()
+
+
+class TestSemanticCache:
+    """Test suite for the semantic LLM response cache."""
+
+    def test_similar_prompts_share_responses_per_namespace(self) -> None:
+        """Test that hits need the namespace's threshold and the same namespace."""
+        cache = SemanticCache(threshold=0.9, thresholds={"strict": 0.999})
+        loose = Namespace("ollama", "m", "loose", b"")
+        strict = loose._replace(template="strict")
+        for namespace in (loose, strict):
+            cache.put(namespace, "capital of France?", [1.0, 0.0], "Paris", latency=2.0)
+
+        rephrased = [0.98, 0.2]  # cosine ~0.98
+        assert cache.get(loose, rephrased) == "Paris"
+        assert cache.get(strict, rephrased) is None
+        assert cache.get(loose, [0.0, 1.0]) is None
+        assert cache.get(loose._replace(model="other"), [1.0, 0.0]) is None
+        stats = cache.stats()
+        assert (stats.hits, stats.misses, stats.entries) == (1, 3, 2)
+        assert stats.latency_saved == pytest.approx(2.0)
+
+    def test_time_sensitive_prompts_are_detected(self) -> None:
+        """Test the guard on prompts that refer to relative time."""
+        assert is_time_sensitive("What's the weather tomorrow?")
+        assert is_time_sensitive("Any meetings at 14:30?")
+        assert not is_time_sensitive("What is the capital of France?")
+        assert not is_time_sensitive("Summarise the user's current needs.")
+
+    @pytest.mark.asyncio
+    async def test_models_api_reuses_answers_to_rephrased_prompts(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that a rephrased prompt is answered from the cache unless it is time-sensitive."""
+        vectors = {
+            "What is the capital of France?": [1.0, 0.0, 0.0],
+            "Which city is France's capital?": [0.98, 0.2, 0.0],
+            "What's the weather tomorrow?": [0.0, 1.0, 0.0],
+            "Tomorrow's weather?": [0.0, 1.0, 0.0],
+        }
+
+        async def embed(text: str, model: ModelType | str = ModelType.EMBEDDING) -> list[float]:  # noqa: ARG001
+            return vectors[text]
+
+        async with _fake_ollama("Paris") as url:
+            monkeypatch.setenv("OLLAMA_HOST", url)
+            provider = OllamaProvider()
+            monkeypatch.setattr(
+                ModelsAPI,
+                "_get_provider",
+                staticmethod(lambda model: (provider, ModelConfig(provider="ollama", model=str(model)))),
+            )
+            monkeypatch.setattr(ModelsAPI, "get_embedding", staticmethod(embed))
+            monkeypatch.setattr(ModelsAPI, "_response_cache", None)
+            monkeypatch.setattr(ModelsAPI, "_semantic_cache", SemanticCache(threshold=0.95))
+
+            for prompt in vectors:
+                assert await ModelsAPI.call_llm(prompt, semantic_cache=True, template="qa") == "Paris"
+            assert await ModelsAPI.call_llm("Which city is France's capital?", template="qa") == "Paris"
+            # the rephrased question is the only one answered from the cache
+            assert provider.connection_stats().requests == len(vectors) - 1 + 1
+
+            stats = ModelsAPI.semantic_cache_stats()
+            assert stats is not None
+            assert (stats.hits, stats.misses, stats.skipped, stats.entries) == (1, 1, 2, 1)
+            await provider.aclose()
+
+
+    @pytest.mark.asyncio
+    async def test_models_api_embeds_only_the_user_text(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that only the user text is embedded and the rest of the prompt must match exactly."""
+        embedded: list[str] = []
+
+        async def embed(text: str, model: ModelType | str = ModelType.EMBEDDING) -> list[float]:  # noqa: ARG001
+            embedded.append(text)
+            return [1.0, 0.0]
+
+        async with _fake_ollama("answer") as url:
+            monkeypatch.setenv("OLLAMA_HOST", url)
+            provider = OllamaProvider()
+            monkeypatch.setattr(
+                ModelsAPI,
+                "_get_provider",
+                staticmethod(lambda model: (provider, ModelConfig(provider="ollama", model=str(model)))),
+            )
+            monkeypatch.setattr(ModelsAPI, "get_embedding", staticmethod(embed))
+            monkeypatch.setattr(ModelsAPI, "_response_cache", None)
+            monkeypatch.setattr(ModelsAPI, "_semantic_cache", SemanticCache(threshold=0.95))
+
+            for schema in ["{city}", "{city}", "{country}"]:
+                prompt = f"Long fixed template. Input: weather in Paris. Schema: {schema}"
+                await ModelsAPI.call_llm(prompt, semantic_cache=True, semantic_text="weather in Paris", template="t")
+            assert embedded == ["weather in Paris"] * 3
+            # a different schema around the same user text is not a hit
+            assert provider.connection_stats().requests == 1 + 1
+            await provider.aclose()
+
+
+class TestEmbeddingBatching:
+    """Test suite for the embedding micro-batcher."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_request(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test that concurrent embedding calls are sent as one request and fanned back out in order."""
+        async with _fake_ollama() as url:
+            monkeypatch.setenv("OLLAMA_HOST", url)
+            provider = OllamaProvider()
+            texts = ["a", "bb", "ccc", "bb"]
+            vectors = await asyncio.gather(*(provider.embed_batched(t, "m") for t in texts))
+            assert vectors == [[float(len(t)), 1.0] for t in texts]
+            assert provider.connection_stats().requests == 1
+            stats = provider.embedding_batch_stats()
+            assert (stats.calls, stats.requests, stats.texts_sent) == (4, 1, 3)
+            assert stats.mean_batch_size == len(texts)
+
+            assert await provider.get_embeddings(["x", "yy"], "m") == [[1.0, 1.0], [2.0, 1.0]]
+            assert await provider.get_embeddings([], "m") == []
+            await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_full_batches_are_sent_at_once_and_errors_reach_every_caller(self) -> None:
+        """Test the maximum batch size and that a failed request fails each of its callers."""
+        requests: list[list[str]] = []
+
+        async def embed_many(texts: list[str], model: str) -> list[list[float]]:
+            requests.append(texts)
+            if "bad" in texts:
+                msg = f"{model} failed"
+                raise RuntimeError(msg)
+            return [[float(len(t))] for t in texts]
+
+        batcher = EmbeddingBatcher("fake", embed_many, window=60.0, max_size=2)
+        # a full batch does not wait for the (long) window
+        assert await asyncio.gather(batcher.embed("a", "m"), batcher.embed("bb", "m")) == [[1.0], [2.0]]
+        results = await asyncio.gather(batcher.embed("bad", "m"), batcher.embed("ok", "m"), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert requests == [["a", "bb"], ["bad", "ok"]]
+
+        direct = EmbeddingBatcher("fake", embed_many, max_size=1)
+        assert await direct.embed("ccc", "m") == [3.0]
+        assert direct.stats().requests == 1